@@ -0,0 +1,258 @@
+# antwort_cache.py
+# Zwischenspeicher für Antworten der Datenquelle, über Läufe hinweg.
+#
+# Modus A läuft jeden Monat über Kundendateien, die sich weitgehend
+# überschneiden. Dieselbe Frage (SearchString, PLZ) kostet bei Apify jedes Mal
+# wieder Kontingent, obwohl die Antwort vom letzten Monat noch daliegt.
+#
+# Gespeichert werden die Candidate-Objekte, wie der Provider sie geliefert hat
+# — dieselbe Form, die auch in der Tabelle `kandidat` steht. Ein Treffer im
+# Zwischenspeicher geht deshalb durch dieselbe Fachlogik wie eine frische
+# Antwort; der Lauf merkt keinen Unterschied.
+#
+# Drei Regeln:
+#   - nur Antworten werden gespeichert, auch leere. Ein Fehler ist keine
+#     Antwort (s. QuelleNichtVerfuegbar), eine leere Liste ohne Antwort
+#     dahinter auch nicht (s. OhneAntwort) — beide werden nie gespeichert
+#   - eine Antwort gilt eine begrenzte Zeit, danach wird neu gefragt
+#   - der Speicher hat eine Obergrenze; was am längsten nicht gebraucht wurde,
+#     fällt zuerst heraus
+#
+# Die Datei liegt neben der Laufdatenbank, ist aber eine eigene: sie gehört
+# keinem Job, und 02_DATENVERTRAG.md §5 bleibt unberührt.
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+from place_provider import Candidate, OhneAntwort, ist_asynchron
+
+logger = logging.getLogger(__name__)
+
+# Geschätzt: ein Monat plus Reserve, damit der monatliche Lauf die Antworten
+# des letzten noch vorfindet. Öffnungszeiten und Telefonnummern ändern sich
+# seltener; wer frischere Daten will, setzt die Frist herunter.
+STANDARD_GUELTIG_TAGE = 35
+
+# Eine Antwort wiegt einige Kilobyte. 100'000 Antworten sind einige hundert
+# Megabyte und decken mehr als zehn volle Läufe ab.
+STANDARD_MAX_EINTRAEGE = 100_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS antwort (
+  schluessel TEXT PRIMARY KEY,
+  kandidaten TEXT NOT NULL,
+  gespeichert_am REAL NOT NULL,
+  zuletzt_benutzt REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_antwort_benutzt ON antwort(zuletzt_benutzt);
+"""
+
+
+DATEINAME = 'antworten.sqlite'
+
+
+def pfad_neben(datenbank_pfad) -> Path:
+    """Die Datei des Zwischenspeichers liegt im Ordner der Laufdatenbank."""
+    return Path(datenbank_pfad).parent / DATEINAME
+
+
+def schluessel_text(quelle: str, search_string: str, plz: str) -> str:
+    return json.dumps(['text', quelle, str(search_string).strip(), str(plz).strip()],
+                      ensure_ascii=False)
+
+
+def schluessel_id(quelle: str, place_id: str) -> str:
+    return json.dumps(['id', quelle, str(place_id).strip()], ensure_ascii=False)
+
+
+class Antwortspeicher:
+    """Die SQLite-Datei mit den gespeicherten Antworten, samt Zählern."""
+
+    def __init__(self, pfad: str = ':memory:',
+                 gueltig_tage: float = STANDARD_GUELTIG_TAGE,
+                 max_eintraege: int = STANDARD_MAX_EINTRAEGE):
+        if max_eintraege < 1:
+            raise ValueError('Der Zwischenspeicher braucht Platz für mindestens '
+                             'eine Antwort.')
+        self.pfad = str(pfad)
+        self.gueltig_sekunden = float(gueltig_tage) * 86_400
+        self.max_eintraege = int(max_eintraege)
+        self.treffer = 0
+        self.fehlgriffe = 0
+
+        if self.pfad != ':memory:':
+            Path(self.pfad).parent.mkdir(parents=True, exist_ok=True)
+        # Die Arbeiter eines Laufs fragen aus mehreren Threads. Eine Verbindung
+        # mit Sperre genügt: jeder Zugriff dauert Mikrosekunden, verglichen
+        # mit einer Abfrage bei der Datenquelle.
+        self._sperre = threading.Lock()
+        self.verbindung = sqlite3.connect(self.pfad, timeout=10,
+                                          check_same_thread=False)
+        if self.pfad != ':memory:':
+            self.verbindung.execute('PRAGMA journal_mode = WAL')
+            self.verbindung.execute('PRAGMA busy_timeout = 10000')
+        self.verbindung.executescript(SCHEMA)
+        self.verbindung.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.schliessen()
+
+    def schliessen(self) -> None:
+        with self._sperre:
+            self.verbindung.close()
+
+    def lesen(self, schluessel: str) -> list | None:
+        """
+        Die gespeicherte Antwort, oder `None`, wenn es keine (gültige) gibt.
+
+        Eine leere Liste ist eine gespeicherte Antwort: «nichts gefunden».
+        """
+        jetzt = time.time()
+        with self._sperre:
+            zeile = self.verbindung.execute(
+                'SELECT kandidaten, gespeichert_am FROM antwort WHERE schluessel = ?',
+                (schluessel,)).fetchone()
+            if zeile and jetzt - zeile[1] > self.gueltig_sekunden:
+                self.verbindung.execute('DELETE FROM antwort WHERE schluessel = ?',
+                                        (schluessel,))
+                self.verbindung.commit()
+                zeile = None
+            if zeile is None:
+                self.fehlgriffe += 1
+                return None
+            self.verbindung.execute(
+                'UPDATE antwort SET zuletzt_benutzt = ? WHERE schluessel = ?',
+                (jetzt, schluessel))
+            self.verbindung.commit()
+            self.treffer += 1
+        return [Candidate(**felder) for felder in json.loads(zeile[0])]
+
+    def schreiben(self, schluessel: str, kandidaten: list) -> None:
+        """Legt eine Antwort ab und hält die Obergrenze ein."""
+        if isinstance(kandidaten, OhneAntwort):
+            return
+        inhalt = json.dumps([asdict(k) for k in kandidaten], ensure_ascii=False)
+        jetzt = time.time()
+        with self._sperre:
+            self.verbindung.execute(
+                'INSERT OR REPLACE INTO antwort (schluessel, kandidaten, '
+                'gespeichert_am, zuletzt_benutzt) VALUES (?, ?, ?, ?)',
+                (schluessel, inhalt, jetzt, jetzt))
+            anzahl = self.verbindung.execute(
+                'SELECT COUNT(*) FROM antwort').fetchone()[0]
+            if anzahl > self.max_eintraege:
+                logger.info(f'Zwischenspeicher voll, {anzahl - self.max_eintraege} '
+                            f'Antworten werden verdrängt.')
+                self.verbindung.execute(
+                    'DELETE FROM antwort WHERE schluessel IN (SELECT schluessel '
+                    'FROM antwort ORDER BY zuletzt_benutzt LIMIT ?)',
+                    (anzahl - self.max_eintraege,))
+            self.verbindung.commit()
+
+    def eintraege(self) -> int:
+        with self._sperre:
+            return self.verbindung.execute('SELECT COUNT(*) FROM antwort').fetchone()[0]
+
+    def statistik(self) -> dict:
+        """Treffer, Fehlgriffe und Trefferquote seit dem Öffnen."""
+        gefragt = self.treffer + self.fehlgriffe
+        return {
+            'treffer': self.treffer,
+            'fehlgriffe': self.fehlgriffe,
+            'trefferquote': round(self.treffer / gefragt, 4) if gefragt else 0.0,
+            'eintraege': self.eintraege(),
+        }
+
+
+class ZwischengespeicherterProvider:
+    """
+    Legt den Zwischenspeicher vor einen beliebigen Provider.
+
+    Nach aussen ein gewöhnlicher Provider (02_DATENVERTRAG.md §7). `quelle`
+    trennt die Antworten verschiedener Datenquellen: dieselbe Frage an Apify
+    und an eine Antwortdatei hat nicht dieselbe Antwort. `fetch_by_texts`
+    gibt es nur, wenn der Provider dahinter es hat — der Lauf entscheidet
+    danach, ob er stapelt.
+    """
+
+    def __init__(self, provider, speicher: Antwortspeicher, quelle: str = None):
+        if ist_asynchron(provider):
+            raise ValueError('Der Zwischenspeicher kann nur vor einen Provider '
+                             'ohne async def gelegt werden.')
+        self.provider = provider
+        self.speicher = speicher
+        self.quelle = quelle or type(provider).__name__
+        if hasattr(provider, 'fetch_by_texts'):
+            self.fetch_by_texts = self._stapel_holen
+
+    def fetch_by_text(self, search_string: str, plz: str) -> list[Candidate]:
+        schluessel = schluessel_text(self.quelle, search_string, plz)
+        gespeichert = self.speicher.lesen(schluessel)
+        if gespeichert is not None:
+            return gespeichert
+        kandidaten = self.provider.fetch_by_text(search_string, plz)
+        if kandidaten is None:
+            kandidaten = []
+        self.speicher.schreiben(schluessel, kandidaten)
+        return kandidaten
+
+    def fetch_by_id(self, place_id: str) -> Candidate | None:
+        schluessel = schluessel_id(self.quelle, place_id)
+        gespeichert = self.speicher.lesen(schluessel)
+        if gespeichert is not None:
+            return gespeichert[0] if gespeichert else None
+        kandidat = self.provider.fetch_by_id(place_id)
+        self.speicher.schreiben(schluessel, [kandidat] if kandidat else [])
+        return kandidat
+
+    def _stapel_holen(self, anfragen: list) -> list:
+        """
+        Wie `fetch_by_texts` des Providers, aber nur für die Fragen, die noch
+        keine Antwort haben.
+        """
+        schluessel = [schluessel_text(self.quelle, text, plz) for text, plz in anfragen]
+        antworten = [self.speicher.lesen(s) for s in schluessel]
+        offen = [i for i, antwort in enumerate(antworten) if antwort is None]
+        if not offen:
+            return antworten
+
+        neu = self.provider.fetch_by_texts([anfragen[i] for i in offen])
+        for i, kandidaten in zip(offen, neu):
+            antworten[i] = kandidaten if kandidaten is not None else []
+            self.speicher.schreiben(schluessel[i], antworten[i])
+        return antworten
+
+    def abbrechen(self):
+        abbrechen_beim_provider = getattr(self.provider, 'abbrechen', None)
+        if callable(abbrechen_beim_provider):
+            return abbrechen_beim_provider()
+        return 0
+
+    def statistik(self) -> dict:
+        return self.speicher.statistik()
+
+
+def davorlegen(provider, datenbank_pfad, quelle: str,
+               gueltig_tage: float = STANDARD_GUELTIG_TAGE,
+               speicher: Antwortspeicher = None):
+    """
+    Der Provider mit Zwischenspeicher neben der Laufdatenbank.
+
+    `gueltig_tage` 0 heisst: kein Zwischenspeicher, der Provider bleibt, wie
+    er ist. Wer Provider für viele Läufe baut (die Weboberfläche), gibt den
+    offenen `speicher` mit — sonst öffnet jeder Aufruf eine eigene Verbindung
+    zur Datei, und niemand schliesst sie.
+    """
+    if not gueltig_tage or gueltig_tage <= 0:
+        return provider
+    if speicher is None:
+        speicher = Antwortspeicher(pfad_neben(datenbank_pfad), gueltig_tage=gueltig_tage)
+    return ZwischengespeicherterProvider(provider, speicher, quelle)
@@ -9,6 +9,9 @@
 #   - der Lauf wird bei Zeitüberschreitung auf Apify wirklich abgebrochen,
 #     damit er kein Kontingent weiterverbraucht
 #   - Rückgabe sind Candidate-Objekte, keine Apify-Dictionaries
+#   - mehrere Suchbegriffe können sich einen Actor-Lauf teilen (Stapel). Jeder
+#     Lauf kostet einen Kaltstart von 83 bis 91 Sekunden; bei 2'500 Kunden
+#     einzeln sind das 2'500 Kaltstarts
 
 import copy
 import logging
@@ -17,7 +20,8 @@ import threading
 from apify_client import ApifyClient
 from apify_client.errors import ApifyApiError
 
-from place_provider import Candidate, QuelleNichtVerfuegbar
+from place_provider import (ABBRUCH, Candidate, OhneAntwort,
+                            QuelleNichtVerfuegbar, stapel_frist)
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +38,15 @@ STANDARD_TIMEOUT_SEKUNDEN = 180
 # weiter. Beobachtet am 03.08.2026 bei einem Lauf, der 91 Sekunden brauchte.
 RESERVE_SEKUNDEN = 5
 
+# Für die Drosselung (drosselung.py). Geschätzt nach der Preisliste des Actors:
+# bis zu sechs Betriebe je Suchbegriff, mit Detailseite und Kontakten. Die
+# Rechnung bei Apify ist massgebend; die Schätzung soll nur vor ihr warnen.
+KOSTEN_JE_SUCHBEGRIFF_USD = 0.03
+# Actor-Läufe starten höchstens so oft je Sekunde. Die Grenze der API liegt
+# weit darüber; was hier bremst, ist der Speicher des Kontos für
+# gleichzeitige Läufe.
+LAEUFE_JE_SEKUNDE = 2
+
 # Die Einstellungen des Actors. Sie standen bisher in config.py und wichen dort
 # von config.template.py ab (Umbauplan §9). Hier sind die Werte, mit denen die
 # 5'000 produktiven Kunden gelaufen sind — und nur noch an einer Stelle.
@@ -128,21 +141,27 @@ FELD_ZUORDNUNG = {
 class ApifyProvider:
     """Holt Kandidaten über den Apify-Actor (Modus A, Suche über Text)."""
 
+    anfragen_je_sekunde = LAEUFE_JE_SEKUNDE
+    kosten_je_abfrage = KOSTEN_JE_SUCHBEGRIFF_USD
+
     def __init__(self, api_token: str, actor_id: str, actor_input: dict = None,
-                 timeout_sekunden: int = STANDARD_TIMEOUT_SEKUNDEN):
+                 timeout_sekunden: int = STANDARD_TIMEOUT_SEKUNDEN, client=None):
         self.actor_id = actor_id
         self.actor_input = actor_input if actor_input is not None else STANDARD_ACTOR_INPUT
         self.timeout_sekunden = timeout_sekunden
         # Die Frist, die Apify tatsächlich bekommt: etwas kürzer als die des
         # Laufs, damit dieser Provider selbst entscheidet und aufräumt.
         self.wartezeit = max(5, int(timeout_sekunden) - RESERVE_SEKUNDEN)
-        # Läufe, die gerade bei Apify rechnen. Der Abbruch-Knopf muss sie
-        # erreichen, sonst laufen sie auf Kosten des Kontingents weiter.
-        self._laufende = set()
+        # Läufe, die gerade bei Apify rechnen, mit dem Abbruch-Signal des
+        # Laufs, für den sie rechnen (place_provider.ABBRUCH). Der Abbruch-Knopf
+        # muss sie erreichen, sonst laufen sie auf Kosten des Kontingents weiter.
+        self._laufende = {}
         self._sperre = threading.Lock()
         self._abgebrochen = False
         try:
-            self.client = ApifyClient(api_token)
+            # `client` ist für Tests: ein Stellvertreter mit denselben drei
+            # Methoden (actor, run, dataset), ohne Netz und ohne Kosten.
+            self.client = client if client is not None else ApifyClient(api_token)
             self.actor = self.client.actor(actor_id)
         except Exception as fehler:
             logger.error(f'Apify-Client liess sich nicht aufbauen: {fehler}')
@@ -160,7 +179,8 @@ class ApifyProvider:
         **Eine leere Liste heisst: nichts gefunden.** Das ist ein Ergebnis, und
         der Kunde landet damit in Datei ③ (03_ENTSCHEIDUNGEN.md C). Denselben
         Weg nimmt ein Aufruf, der in den Timeout gelaufen ist oder den Apify
-        nicht erfolgreich beendet hat — auch dort steht am Ende kein Treffer.
+        nicht erfolgreich beendet hat — auch dort steht am Ende kein Treffer,
+        nur als `OhneAntwort`, damit sie niemand als Antwort aufbewahrt.
 
         **Ein Fehler von Apify ist dagegen kein Ergebnis** und kommt als
         `QuelleNichtVerfuegbar` heraus, nicht als leere Liste. Die Frage wurde
@@ -170,14 +190,101 @@ class ApifyProvider:
         stoppen den Lauf sofort, alle anderen erst nach zehn Fehlschlägen
         hintereinander.
         """
+        rohdaten = self._actor_laufen_lassen([search_string], plz,
+                                             self.wartezeit, f'"{search_string}"')
+        if rohdaten is None:
+            return OhneAntwort()
+
+        kandidaten = [self.normalisieren(eintrag) for eintrag in rohdaten]
+        kandidaten = [k for k in kandidaten if not k.ist_leer()]
+        logger.info(f'Apify: {len(kandidaten)} Treffer für "{search_string}".')
+        return kandidaten
+
+    def fetch_by_texts(self, anfragen: list) -> list:
+        """
+        Sucht mehrere Texte in einem einzigen Actor-Lauf.
+
+        `anfragen` ist eine Liste von (Suchbegriff, PLZ); zurück kommt je
+        Anfrage eine Liste von Candidate, in derselben Reihenfolge. Apify
+        vermerkt an jedem Treffer den Suchbegriff, aus dem er stammt — darüber
+        werden die Treffer den Anfragen wieder zugeteilt. Zwei Anfragen mit
+        demselben Suchbegriff bekommen dieselben Treffer.
+
+        Alle Anfragen eines Stapels müssen dieselbe PLZ tragen: der Actor kennt
+        nur eine Postleitzahl je Lauf, und die Suche soll dieselbe bleiben wie
+        beim Einzelaufruf.
+
+        Für leere Ergebnisse und Fehler gilt dasselbe wie bei `fetch_by_text`,
+        nur für den ganzen Stapel: endet der Lauf nicht erfolgreich, ist jede
+        Liste leer, und ein Fehler von Apify trifft alle Anfragen darin.
+        """
+        if not anfragen:
+            return []
+        postleitzahlen = {str(plz).strip() for _, plz in anfragen}
+        if len(postleitzahlen) != 1:
+            raise ValueError(f'Ein Stapel braucht eine einzige PLZ, bekommen: '
+                             f'{", ".join(sorted(postleitzahlen))}.')
+
+        suchbegriffe = list(dict.fromkeys(str(text).strip() for text, _ in anfragen))
+        wartezeit = max(5, int(stapel_frist(self.timeout_sekunden, len(suchbegriffe)))
+                        - RESERVE_SEKUNDEN)
+        bezeichnung = f'Stapel mit {len(suchbegriffe)} Suchbegriffen'
+        rohdaten = self._actor_laufen_lassen(suchbegriffe, postleitzahlen.pop(),
+                                             wartezeit, bezeichnung)
+        if rohdaten is None:
+            return [OhneAntwort() for _ in anfragen]
+
+        je_suchbegriff = {text: [] for text in suchbegriffe}
+        for eintrag in rohdaten:
+            herkunft = str(eintrag.get('searchString') or '').strip()
+            if herkunft not in je_suchbegriff and len(suchbegriffe) == 1:
+                herkunft = suchbegriffe[0]
+            if herkunft not in je_suchbegriff:
+                logger.warning(f'Apify-Treffer ohne zuordenbaren Suchbegriff '
+                               f'("{herkunft}") im {bezeichnung}, verworfen.')
+                continue
+            kandidat = self.normalisieren(eintrag)
+            if not kandidat.ist_leer():
+                je_suchbegriff[herkunft].append(kandidat)
+
+        logger.info(f'Apify: {sum(len(t) for t in je_suchbegriff.values())} '
+                    f'Treffer im {bezeichnung}.')
+        return [list(je_suchbegriff[str(text).strip()]) for text, _ in anfragen]
+
+    def fetch_by_id(self, place_id: str) -> Candidate | None:
+        """Modus B läuft über GoogleProvider (Phase 6), nicht über Apify."""
+        raise NotImplementedError(
+            'ApifyProvider beherrscht nur die Textsuche. Der Abruf über placeId '
+            'gehört zum GoogleProvider.')
+
+    # ------------------------------------------------------------------
+    # Innereien
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def normalisieren(rohdaten: dict) -> Candidate:
+        """Aus einem Apify-Dictionary wird ein Candidate. Unbekannte Felder entfallen."""
+        werte = {ziel: rohdaten.get(quelle) for quelle, ziel in FELD_ZUORDNUNG.items()}
+        return Candidate(**werte)
+
+    def _actor_laufen_lassen(self, suchbegriffe: list, plz: str, wartezeit: int,
+                             bezeichnung: str):
+        """
+        Ein Actor-Lauf: starten, warten, Rohdaten holen.
+
+        None heisst: kein Ergebnis — Client nicht bereit, abgebrochen, Lauf
+        nicht erfolgreich beendet oder Datensatz nicht lesbar. Fehler von Apify
+        kommen als `QuelleNichtVerfuegbar` heraus (s. `fetch_by_text`).
+        """
         if not self.actor:
             logger.error('Apify-Client ist nicht einsatzbereit, Aufruf übersprungen.')
-            return []
-        if self._abgebrochen:
-            return []
+            return None
+        abbruch = ABBRUCH.get()
+        if self._abgebrochen or (abbruch and abbruch.is_set()):
+            return None
 
         run_input = copy.deepcopy(self.actor_input)
-        run_input['searchStringsArray'] = [search_string]
+        run_input['searchStringsArray'] = list(suchbegriffe)
         run_input['postalCode'] = str(plz)
 
         # Erst starten, dann warten — nicht in einem Rutsch. Nur so ist die
@@ -185,22 +292,21 @@ class ApifyProvider:
         # der Abbruch-Knopf ihn erreichen.
         lauf_id = None
         try:
-            lauf = self.actor.start(run_input=run_input,
-                                    timeout_secs=self.wartezeit)
+            lauf = self.actor.start(run_input=run_input, timeout_secs=wartezeit)
             lauf_id = lauf.get('id') if lauf else None
             if not lauf_id:
-                logger.error(f'Apify lieferte keine Lauf-Nummer für "{search_string}".')
-                return []
+                logger.error(f'Apify lieferte keine Lauf-Nummer für {bezeichnung}.')
+                return None
 
             with self._sperre:
-                if self._abgebrochen:
+                if self._abgebrochen or (abbruch and abbruch.is_set()):
                     self.client.run(lauf_id).abort()
-                    return []
-                self._laufende.add(lauf_id)
+                    return None
+                self._laufende[lauf_id] = abbruch
 
-            fertig = self.client.run(lauf_id).wait_for_finish(wait_secs=self.wartezeit)
+            fertig = self.client.run(lauf_id).wait_for_finish(wait_secs=wartezeit)
         except ApifyApiError as fehler:
-            logger.error(f'Apify meldet einen Fehler für "{search_string}": {fehler}')
+            logger.error(f'Apify meldet einen Fehler für {bezeichnung}: {fehler}')
             # Ein Fehler von Apify ist nie «nichts gefunden» — die Frage wurde
             # gar nicht beantwortet. Bekannte Arten stoppen den Lauf sofort,
             # unbekannte nach zehn hintereinander. Ein einzelner Ausrutscher
@@ -211,62 +317,49 @@ class ApifyProvider:
         except QuelleNichtVerfuegbar:
             raise
         except Exception as fehler:
-            logger.error(f'Unerwarteter Fehler bei "{search_string}": {fehler}')
+            logger.error(f'Unerwarteter Fehler bei {bezeichnung}: {fehler}')
             raise QuelleNichtVerfuegbar(NETZ_MELDUNG, endgueltig=False) from fehler
         finally:
             with self._sperre:
-                self._laufende.discard(lauf_id)
+                self._laufende.pop(lauf_id, None)
 
         status = (fertig or {}).get('status')
         if status != 'SUCCEEDED':
             # Häufigster Fall: nach wait_secs rechnet der Actor noch. Abbrechen,
             # sonst verbraucht er weiter Kontingent, obwohl niemand wartet.
-            logger.warning(f'Apify-Lauf für "{search_string}" endete mit Status '
+            logger.warning(f'Apify-Lauf für {bezeichnung} endete mit Status '
                            f'{status} statt SUCCEEDED, wird als leeres Ergebnis '
                            f'behandelt.')
             self._lauf_abbrechen(lauf_id)
-            return []
+            return None
 
         try:
-            rohdaten = list(
-                self.client.dataset(fertig['defaultDatasetId']).iterate_items())
+            return list(self.client.dataset(fertig['defaultDatasetId']).iterate_items())
         except Exception as fehler:
-            logger.error(f'Ergebnisse von Apify nicht lesbar für "{search_string}": {fehler}')
-            return []
-
-        kandidaten = [self.normalisieren(eintrag) for eintrag in rohdaten]
-        kandidaten = [k for k in kandidaten if not k.ist_leer()]
-        logger.info(f'Apify: {len(kandidaten)} Treffer für "{search_string}".')
-        return kandidaten
-
-    def fetch_by_id(self, place_id: str) -> Candidate | None:
-        """Modus B läuft über GoogleProvider (Phase 6), nicht über Apify."""
-        raise NotImplementedError(
-            'ApifyProvider beherrscht nur die Textsuche. Der Abruf über placeId '
-            'gehört zum GoogleProvider.')
-
-    # ------------------------------------------------------------------
-    # Innereien
-    # ------------------------------------------------------------------
-
-    @staticmethod
-    def normalisieren(rohdaten: dict) -> Candidate:
-        """Aus einem Apify-Dictionary wird ein Candidate. Unbekannte Felder entfallen."""
-        werte = {ziel: rohdaten.get(quelle) for quelle, ziel in FELD_ZUORDNUNG.items()}
-        return Candidate(**werte)
+            logger.error(f'Ergebnisse von Apify nicht lesbar für {bezeichnung}: {fehler}')
+            return None
 
     def abbrechen(self) -> int:
         """
-        Beendet alle Läufe, die gerade bei Apify rechnen.
+        Beendet die Läufe, die gerade bei Apify rechnen.
 
         Wird vom Abbruch-Knopf gerufen. Ohne das rechnet Apify weiter und
-        stellt in Rechnung, was niemand mehr abholt. Weitere Aufrufe dieses
-        Providers liefern sofort nichts mehr zurück.
+        stellt in Rechnung, was niemand mehr abholt.
+
+        Ist `ABBRUCH` gesetzt, gilt der Abbruch nur den Läufen dieses einen
+        Auftrags; andere Aufträge fragen denselben Provider weiter. Weitere
+        Aufrufe des abgebrochenen Auftrags liefern ohnehin nichts mehr, sein
+        Signal ist gesetzt. Ohne `ABBRUCH` werden alle Läufe beendet, und jeder
+        weitere Aufruf dieses Providers liefert sofort nichts mehr zurück.
         """
+        abbruch = ABBRUCH.get()
         with self._sperre:
-            self._abgebrochen = True
-            offene = list(self._laufende)
-            self._laufende.clear()
+            if abbruch is None:
+                self._abgebrochen = True
+            offene = [lauf_id for lauf_id, signal in self._laufende.items()
+                      if abbruch is None or signal is abbruch]
+            for lauf_id in offene:
+                del self._laufende[lauf_id]
 
         for lauf_id in offene:
             self._lauf_abbrechen(lauf_id)
@@ -14,12 +14,43 @@
 #   python cli.py lauf <eingabe.csv> --quelle echt
 #       dasselbe über Apify. Kostet Kontingent.
 #
+#   python cli.py lauf <eingabe.csv> --quelle echt --stapel 20
+#       bis zu 20 Kunden derselben PLZ teilen sich einen Apify-Lauf
+#
+#   python cli.py lauf <eingabe.csv> --quelle echt --sammeln 50 --sammeln-ms 500
+#       bis zu 50 Kunden oder eine halbe Sekunde je Commit in der Datenbank
+#
 #   python cli.py lauf <eingabe.csv> --modus B --quelle echt
 #       Auffrischen über die gespeicherte Google-Id
 #
+#   python cli.py lauf <eingabe.csv> --quelle echt --spalten
+#       schreibt neben den CSV-Dateien dieselben Zeilen und alle Kandidaten
+#       als Parquet, für Auswertungen (braucht pyarrow)
+#
 #   python cli.py fortsetzen <eingabe.csv> --quelle echt
 #       nimmt einen Lauf wieder auf, der abgestürzt ist
 #
+#   python cli.py fortsetzen <eingabe.csv> --quelle echt --uebernehmen
+#       dasselbe, die schon verarbeiteten Kunden werden aber aus der
+#       Datenbank übernommen statt neu entschieden (schneller, ohne
+#       Diagnosezeilen für diese Kunden)
+#
+#   python cli.py einreihen <eingabe.csv> --modus B
+#       stellt die Datei in die Warteschlange, statt sie gleich zu starten
+#
+#   python cli.py abarbeiten --quelle echt --laeufe 4
+#       arbeitet die Warteschlange ab, mehrere Aufträge gleichzeitig; was
+#       ein Absturz unterbrochen hat, wird dabei fortgesetzt
+#
+#   python cli.py messlauf --groessen 1000 10000 --wartezeit lognormal:20,0.5
+#       misst den Lauf gegen erfundene Kunden und schreibt die Zeiten als
+#       JSON nach logs/ (auch als «benchmark»)
+#
+#   python cli.py neu-entscheiden --letzte 20 --hoch 75 --abstand 25
+#       entscheidet die Kunden der letzten 20 Jobs mit anderen Schwellen neu,
+#       aus der Datenbank und ohne eine einzige Abfrage, und schreibt jeden
+#       Kunden, der die Datei wechseln würde, als CSV nach logs/
+#
 # Der Lauf arbeitet im Hintergrund. Strg+C bricht ihn ab, ohne die bisher
 # verarbeiteten Kunden zu verlieren — sie stehen in der Datenbank.
 #
@@ -27,18 +58,30 @@
 # logs/bereinigung.log, nicht auf dem Bildschirm.
 
 import argparse
+import json
 import logging
 import sys
+import tempfile
 import time
+from datetime import datetime
 from pathlib import Path
 
 import pandas as pd
 
+import antwort_cache
+import drosselung
+import messlauf
+import neu_entscheiden
+import spaltenexport
 from data_cleaner import DataCleaner
+from db import SYNCHRONOUS_STUFEN, lesend
 from fake_provider import FakeProvider
-from pipeline import STANDARD_ARBEITER, STANDARD_TIMEOUT_SEKUNDEN
+from fenstersteuerung import Fenstersteuerung
+from pipeline import (STANDARD_ARBEITER, STANDARD_STAPELGROESSE,
+                      STANDARD_STICHPROBE, STANDARD_TIMEOUT_SEKUNDEN)
 from upload_pruefung import KOPFZEILE_JE_MODUS, pruefe_datei
-from worker import LaeuftBereits, Worker, offener_lauf
+from worker import (STANDARD_MAX_LAEUFE, LaeuftBereits, Planer, Worker,
+                    einreihen as auftrag_einreihen, offener_lauf)
 
 LOG_DIR = Path(__file__).resolve().parent / 'logs'
 STANDARD_DATENBANK = Path(__file__).resolve().parent / 'laeufe.sqlite'
@@ -181,6 +224,9 @@ def fortsetzen(args) -> int:
 
 def _lauf_oder_fortsetzen(args, fortsetzen: bool) -> int:
     eingabe: Path = args.eingabe
+    if args.spalten and not spaltenexport.verfuegbar():
+        print(spaltenexport.FEHLT_MELDUNG)
+        return 1
     pflicht = ('placeId', 'KundenNr') if args.modus == 'B' \
         else ('SearchString', 'PLZ', 'KundenNr')
     df = _eingabe_pruefen(eingabe, pflicht)
@@ -205,7 +251,14 @@ def _lauf_oder_fortsetzen(args, fortsetzen: bool) -> int:
         return 1
 
     worker = Worker(provider, args.datenbank, timeout_sekunden=args.timeout,
-                    arbeiter=args.arbeiter, modus=args.modus)
+                    arbeiter=args.arbeiter, modus=args.modus,
+                    stapelgroesse=args.stapel, anpassend=args.anpassen,
+                    sammel_kunden=args.sammeln, sammel_ms=args.sammeln_ms,
+                    synchronous=args.synchronous,
+                    wiederaufnahme=('uebernehmen' if getattr(args, 'uebernehmen', False)
+                                    else 'herleiten'),
+                    stichprobe=getattr(args, 'stichprobe', STANDARD_STICHPROBE),
+                    spalten=args.spalten)
 
     if fortsetzen:
         offen = offener_lauf(args.datenbank)
@@ -218,6 +271,9 @@ def _lauf_oder_fortsetzen(args, fortsetzen: bool) -> int:
             return 1
         print(f'Auftrag Nummer {offen["id"]} wird fortgesetzt '
               f'({_zahl(offen["kunden_erledigt"])} Kunden lagen schon vor).')
+        if not _budget_reicht(provider, args,
+                              offen['kunden_total'] - offen['kunden_erledigt']):
+            return 1
         job_id = worker.fortsetzen(offen['id'], eingabe,
                                    str(args.ausgabe) if args.ausgabe else None)
     else:
@@ -228,6 +284,8 @@ def _lauf_oder_fortsetzen(args, fortsetzen: bool) -> int:
         print(f'Quelle: {_quelle_in_worten(args)}')
         print(f'Es arbeiten {args.arbeiter} Abfragen gleichzeitig. '
               f'Abbrechen mit Strg+C.')
+        if not _budget_reicht(provider, args, _abfragen_der_datei(df, args.modus)):
+            return 1
         try:
             job_id = worker.starten(eingabe,
                                     str(args.ausgabe) if args.ausgabe else None,
@@ -236,7 +294,241 @@ def _lauf_oder_fortsetzen(args, fortsetzen: bool) -> int:
             print(str(hinweis))
             return 1
 
-    return _auf_lauf_warten(worker, job_id, args)
+    code = _auf_lauf_warten(worker, job_id, args)
+    _zwischenspeicher_zeigen(provider)
+    _abrufzeiten_zeigen(provider)
+    return code
+
+
+# ==========================================================================
+# Befehle: einreihen, abarbeiten
+# ==========================================================================
+
+def einreihen(args) -> int:
+    """Stellt eine Datei in die Warteschlange. Gestartet wird sie von `abarbeiten`."""
+    eingabe: Path = args.eingabe
+    pflicht = ('placeId', 'KundenNr') if args.modus == 'B' \
+        else ('SearchString', 'PLZ', 'KundenNr')
+    df = _eingabe_pruefen(eingabe, pflicht)
+    if df is None:
+        return 1
+
+    bericht = pruefe_datei(eingabe, modus=args.modus)
+    if not bericht.start_moeglich:
+        for hinweis in bericht.befunde:
+            print()
+            print(hinweis.als_text())
+        print()
+        print('Die Datei wird nicht eingereiht.')
+        return 1
+
+    job_id = auftrag_einreihen(args.datenbank, str(eingabe.resolve()), args.modus,
+                               str(args.ausgabe) if args.ausgabe else None,
+                               email=args.email,
+                               kunden_total=int(df['KundenNr'].nunique()))
+    print(f'Eingereiht als Auftrag Nummer {job_id} '
+          f'({_zahl(df["KundenNr"].nunique())} Kunden, Modus {args.modus}).')
+    print('Gestartet wird er mit: python cli.py abarbeiten')
+    return 0
+
+
+def abarbeiten(args) -> int:
+    """Arbeitet die Warteschlange ab, bis sie leer ist. Strg+C hält an."""
+    if args.spalten and not spaltenexport.verfuegbar():
+        print(spaltenexport.FEHLT_MELDUNG)
+        return 1
+    provider_je_modus = {}
+    for modus in ('A', 'B'):
+        try:
+            provider_je_modus[modus] = _provider_bauen(argparse.Namespace(
+                **{**vars(args), 'modus': modus}))
+        except Exception as fehler:
+            print(f'Modus {modus}: {fehler}')
+
+    planer = Planer(provider_je_modus, args.datenbank,
+                    kontingente={'A': args.arbeiter, 'B': args.arbeiter},
+                    max_laeufe=args.laeufe, timeout_sekunden=args.timeout,
+                    stapelgroesse=args.stapel, anpassend=args.anpassen,
+                    sammel_kunden=args.sammeln, sammel_ms=args.sammeln_ms,
+                    synchronous=args.synchronous, spalten=args.spalten)
+    print(f'Bis zu {args.laeufe} Aufträge gleichzeitig, je Quelle '
+          f'{args.arbeiter} Abfragen. Anhalten mit Strg+C.')
+    with lesend(args.datenbank) as datenbank:
+        gesehen = {auftrag['job_id'] for auftrag in datenbank.warteschlange_lesen()}
+    planer.starten()
+
+    try:
+        while not planer.warten(timeout=2.0):
+            laufend = planer.laufend
+            gesehen.update(laufend)
+            if laufend:
+                print('  läuft: ' + ', '.join(f'Nummer {job_id}' for job_id in laufend))
+    except KeyboardInterrupt:
+        print()
+        print('Anhalten angefordert, die laufenden Aufträge werden gestoppt ...')
+    planer.beenden(timeout=10)
+
+    if not gesehen:
+        print('Die Warteschlange ist leer.')
+        return 0
+    fehlgeschlagen = 0
+    with lesend(args.datenbank) as datenbank:
+        for job_id in sorted(gesehen):
+            job = datenbank.job_lesen(job_id)
+            print(f'  Auftrag Nummer {job_id} ({job["dateiname"]}): {job["status"]}')
+            fehlgeschlagen += job['status'] != 'FERTIG'
+    return 1 if fehlgeschlagen else 0
+
+
+# ==========================================================================
+# Befehl: messlauf
+# ==========================================================================
+
+def messen(args) -> int:
+    """Misst den Lauf gegen erfundene Kunden, eine Grösse nach der anderen."""
+    try:
+        messlauf.verteilung_lesen(args.wartezeit)
+    except ValueError as fehler:
+        print(str(fehler))
+        return 1
+    if not 0 <= args.fehlerquote < 1:
+        print('Die Fehlerquote liegt zwischen 0 und 1, zum Beispiel 0.02 für '
+              'zwei Prozent.')
+        return 1
+    if args.spalten and not spaltenexport.verfuegbar():
+        print(spaltenexport.FEHLT_MELDUNG)
+        return 1
+
+    einstellungen = {'modus': args.modus, 'wartezeit': args.wartezeit,
+                     'fehlerquote': args.fehlerquote, 'arbeiter': args.arbeiter,
+                     'sammeln': args.sammeln, 'synchronous': args.synchronous,
+                     'zufall': args.zufall, 'spalten': args.spalten}
+    ziel = args.json or LOG_DIR / f'messlauf_{datetime.now():%Y%m%d_%H%M%S}.json'
+    print(f'Messlauf im Modus {args.modus}, Wartezeit {args.wartezeit}, '
+          f'Fehlerquote {args.fehlerquote:g}, {args.arbeiter} Arbeiter.')
+
+    laeufe = []
+    with tempfile.TemporaryDirectory(prefix='messlauf_') as ordner:
+        for anzahl in args.groessen:
+            lauf = messlauf.messen(anzahl, args.ordner or ordner, modus=args.modus,
+                                   wartezeit=args.wartezeit,
+                                   fehlerquote=args.fehlerquote,
+                                   arbeiter=args.arbeiter, sammel_kunden=args.sammeln,
+                                   synchronous=args.synchronous, zufall=args.zufall,
+                                   spalten=args.spalten)
+            print(messlauf.als_text(lauf))
+            laeufe.append(lauf)
+
+    Path(ziel).parent.mkdir(parents=True, exist_ok=True)
+    Path(ziel).write_text(json.dumps(messlauf.bericht(einstellungen, laeufe),
+                                     indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f'Die Messwerte stehen in: {ziel}')
+    return 0 if all(lauf['status'] == 'FERTIG' for lauf in laeufe) else 1
+
+
+# ==========================================================================
+# Befehl: neu-entscheiden
+# ==========================================================================
+
+def schwellen_vergleichen(args) -> int:
+    """Entscheidet gespeicherte Jobs mit anderen Schwellen neu und zeigt, wer wechselt."""
+    schwellen = {name: getattr(args, name) for name in neu_entscheiden.SCHWELLEN
+                 if getattr(args, name) is not None}
+    if not args.datenbank.exists():
+        print(f'Die Datenbank "{args.datenbank}" gibt es nicht.')
+        return 1
+
+    with lesend(args.datenbank) as datenbank:
+        if args.jobs:
+            jobs = []
+            for job_id in args.jobs:
+                job = datenbank.job_lesen(job_id)
+                if job is None:
+                    print(f'Einen Auftrag Nummer {job_id} gibt es nicht.')
+                    return 1
+                if job['modus'] != 'A':
+                    print(f'Auftrag Nummer {job_id} lief im Modus B; dort gibt es '
+                          f'keine Schwellen. Er wird übergangen.')
+                    continue
+                jobs.append(job)
+        else:
+            jobs = datenbank.letzte_jobs(args.letzte, modus='A')
+        if not jobs:
+            print('Es gibt keinen fertigen Auftrag im Modus A zum Neu-Entscheiden.')
+            return 1
+
+        print(f'{len(jobs)} Aufträge werden neu entschieden, ohne Abfrage bei der Quelle ...')
+        auswertung = neu_entscheiden.neu_entscheiden(
+            datenbank, [job['id'] for job in jobs], schwellen, prozesse=args.prozesse)
+
+    print()
+    for name in neu_entscheiden.SCHWELLEN:
+        alt, neu = auswertung['vorher'][name], auswertung['nachher'][name]
+        print(f'  Schwelle {name:<14} {alt:g}' + (f' → {neu:g}' if neu != alt else ''))
+    print()
+    for job in jobs:
+        zahlen = auswertung['jobs'][job['id']]
+        print(f'Auftrag Nummer {job["id"]} ({job["dateiname"]}), '
+              f'{_zahl(zahlen["kunden"])} Kunden:')
+        for datei in neu_entscheiden.HAUPTDATEIEN:
+            alt, neu = zahlen['vorher'][datei], zahlen['nachher'][datei]
+            print(f'  {BESCHRIFTUNG[datei]:<34} {_zahl(alt):>7} → {_zahl(neu):>7}')
+
+    ziel = args.bericht or LOG_DIR / f'neu_entschieden_{datetime.now():%Y%m%d_%H%M%S}.csv'
+    neu_entscheiden.bericht_schreiben(auswertung, ziel)
+    print()
+    print(f'{_zahl(auswertung["kunden"])} Kunden in {auswertung["sekunden"]:.1f} s '
+          f'({auswertung["prozesse"]} Prozesse). '
+          f'{_zahl(len(auswertung["wechsel"]))} würden die Datei wechseln.')
+    print(f'Sie stehen in: {ziel}')
+    return 0
+
+
+def _abfragen_der_datei(df: pd.DataFrame, modus: str) -> int:
+    """So viele Abfragen stellt ein Lauf höchstens: gleiche teilen sich eine."""
+    if modus == 'B':
+        ids = df['placeId'].str.strip()
+        return ids[ids != ''].nunique()
+    abfragen = df.drop_duplicates(subset=['KundenNr'])[['SearchString', 'PLZ']]
+    abfragen = abfragen.apply(lambda spalte: spalte.str.strip())
+    return len(abfragen[abfragen['SearchString'] != ''].drop_duplicates())
+
+
+def _budget_reicht(provider, args, abfragen: int) -> bool:
+    """Schätzt die Kosten vor dem Start. Reicht das Monatsbudget nicht, kein Start."""
+    budget = drosselung.budget_von(provider)
+    if budget is None or not budget.kosten_je_abfrage:
+        return True
+    schaetzung = budget.schaetzen(abfragen)
+    print(drosselung.schaetzung_als_text(budget.quelle, schaetzung))
+    if not schaetzung['passt']:
+        print('Der Lauf wird nicht gestartet.')
+    return schaetzung['passt']
+
+
+def _zwischenspeicher_zeigen(provider) -> None:
+    if not hasattr(provider, 'statistik'):
+        return
+    zahlen = provider.statistik()
+    gefragt = zahlen['treffer'] + zahlen['fehlgriffe']
+    if gefragt:
+        print(f'Zwischenspeicher: {_zahl(zahlen["treffer"])} von {_zahl(gefragt)} '
+              f'Abfragen ohne Datenquelle beantwortet.')
+
+
+def _abrufzeiten_zeigen(provider) -> None:
+    """Wo die Zeit der Abrufe bei Google geblieben ist, falls gemessen."""
+    while provider is not None and not hasattr(provider, 'zeitmessung'):
+        provider = getattr(provider, 'provider', None)
+    if provider is None:
+        return
+    zeiten = provider.zeitmessung.zusammenfassung()
+    if zeiten['abrufe']:
+        print(f'Abrufe bei Google: {_zahl(zeiten["abrufe"])} in im Mittel '
+              f'{zeiten["gesamt_ms"]:.0f} ms (Verbinden {zeiten["verbinden_ms"]:.0f}, '
+              f'TLS {zeiten["tls_ms"]:.0f}, Server {zeiten["server_ms"]:.0f}, '
+              f'Lesen {zeiten["lesen_ms"]:.0f}), {_zahl(zeiten["neue_verbindungen"])} '
+              f'Verbindungen aufgebaut.')
 
 
 def _auf_lauf_warten(worker: Worker, job_id: int, args) -> int:
@@ -248,7 +540,9 @@ def _auf_lauf_warten(worker: Worker, job_id: int, args) -> int:
             erledigt = stand.get('kunden_erledigt', 0)
             if erledigt != letzter_stand:
                 gesamt = stand.get('kunden_total', 0)
-                print(f'  {_zahl(erledigt)} von {_zahl(gesamt)} Kunden ...')
+                gleichzeitig = stand.get('gleichzeitig')
+                zusatz = f' ({gleichzeitig} gleichzeitig)' if gleichzeitig else ''
+                print(f'  {_zahl(erledigt)} von {_zahl(gesamt)} Kunden{zusatz} ...')
                 letzter_stand = erledigt
     except KeyboardInterrupt:
         print()
@@ -275,25 +569,70 @@ def _auf_lauf_warten(worker: Worker, job_id: int, args) -> int:
     if ergebnis.get('doppelte_kundennummern'):
         print(f'Hinweis: {_zahl(ergebnis["doppelte_kundennummern"])} Zeilen hatten '
               f'eine Kundennummer, die schon vorkam. Es zählt die erste Zeile.')
+    if ergebnis.get('gesparte_abfragen'):
+        print(f'{_zahl(ergebnis["gesparte_abfragen"])} Kunden hatten dieselbe Abfrage '
+              f'wie ein anderer Kunde und wurden mit dessen Antwort entschieden — '
+              f'so viele Abfragen weniger.')
 
     code = _ergebnis_zeigen(ergebnis['dateien'], ergebnis['kunden_total'])
+    if ergebnis.get('spaltendateien'):
+        print(f'Dazu als Parquet: {len(ergebnis["spaltendateien"])} Dateien, '
+              f'die Kandidaten in {spaltenexport.KANDIDATEN_DATEI}')
     print(f'Lauf Nummer {job_id} in der Datenbank: {args.datenbank}')
     return code
 
 
+def _gueltig_tage(args) -> float:
+    """
+    Wie lange eine Antwort der echten Quelle gilt.
+
+    Im Modus B ist der Zwischenspeicher ohne Angabe aus: Auffrischen heisst,
+    den heutigen Stand bei Google zu holen, nicht den vom letzten Monat.
+    """
+    if args.zwischenspeicher is not None:
+        return args.zwischenspeicher
+    return antwort_cache.STANDARD_GUELTIG_TAGE if args.modus == 'A' else 0
+
+
 def _quelle_in_worten(args) -> str:
     if args.quelle != 'echt':
         return 'feste Antworten'
     return 'Google Place Details' if args.modus == 'B' else 'Apify'
 
 
+def _monatsbudget(args, quelle: str) -> float:
+    budget = getattr(args, 'budget', None)
+    if budget is not None:
+        return budget
+    return drosselung.monatsbudget_aus_konfiguration(quelle)
+
+
+def _hoechstens_gleichzeitig(args) -> int:
+    """So viele Abfragen laufen höchstens gleichzeitig — so viele Verbindungen."""
+    if getattr(args, 'anpassen', False):
+        return Fenstersteuerung(args.arbeiter).maximum
+    return args.arbeiter
+
+
 def _provider_bauen(args):
+    # Der Zwischenspeicher liegt vor der Drosselung: eine gespeicherte Antwort
+    # kostet nichts und muss auf keine Marke warten.
     if args.quelle == 'echt':
         if args.modus == 'B':
             import google_provider
-            return google_provider.aus_konfiguration(timeout_sekunden=args.timeout)
+            return antwort_cache.davorlegen(
+                drosselung.davorlegen(
+                    google_provider.aus_konfiguration(
+                        timeout_sekunden=args.timeout,
+                        verbindungen=_hoechstens_gleichzeitig(args)),
+                    args.datenbank, 'google', _monatsbudget(args, 'google')),
+                args.datenbank, 'google', _gueltig_tage(args))
         import apify_provider
-        return apify_provider.aus_konfiguration(timeout_sekunden=args.timeout)
+        return antwort_cache.davorlegen(
+            drosselung.davorlegen(
+                apify_provider.aus_konfiguration(timeout_sekunden=args.timeout),
+                args.datenbank, 'apify', _monatsbudget(args, 'apify')),
+            args.datenbank, 'apify', _gueltig_tage(args))
 
     if not args.antworten:
         raise ValueError('Für feste Antworten fehlt die Angabe --antworten '
@@ -348,8 +687,40 @@ def main(argv=None) -> int:
     lauf_optionen.add_argument('--arbeiter', type=int, default=STANDARD_ARBEITER,
                                help=f'gleichzeitige Abfragen '
                                     f'(Standard: {STANDARD_ARBEITER})')
+    lauf_optionen.add_argument('--anpassen', action='store_true',
+                               help='die Zahl gleichzeitiger Abfragen nach '
+                                    'Antwortzeit und Fehlern anpassen, '
+                                    '--arbeiter ist dann der Anfang')
+    lauf_optionen.add_argument('--stapel', type=int, default=STANDARD_STAPELGROESSE,
+                               help=f'Kunden mit derselben PLZ je Abfrage, nur '
+                                    f'Modus A mit Apify '
+                                    f'(Standard: {STANDARD_STAPELGROESSE})')
+    lauf_optionen.add_argument('--zwischenspeicher', type=float, default=None,
+                               metavar='TAGE',
+                               help=f'so lange gilt eine Antwort der echten '
+                                    f'Quelle, 0 schaltet ab (Standard: '
+                                    f'{antwort_cache.STANDARD_GUELTIG_TAGE} im '
+                                    f'Modus A, aus im Modus B)')
+    lauf_optionen.add_argument('--sammeln', type=int, default=1, metavar='KUNDEN',
+                               help='so viele Kunden teilen sich einen Commit in '
+                                    'der Datenbank; ein Absturz verliert höchstens '
+                                    'sie, das Fortsetzen holt sie neu (Standard: 1)')
+    lauf_optionen.add_argument('--sammeln-ms', type=float, default=0, metavar='MS',
+                               help='spätestens nach so vielen Millisekunden wird '
+                                    'trotzdem festgeschrieben (Standard: 0, nur '
+                                    'nach --sammeln)')
+    lauf_optionen.add_argument('--synchronous', choices=SYNCHRONOUS_STUFEN,
+                               type=str.upper, default=None,
+                               help='PRAGMA synchronous der Laufdatenbank '
+                                    '(Standard: der von SQLite, FULL)')
     lauf_optionen.add_argument('--email', default=None,
                                help='Adresse für die Benachrichtigung (Phase 7)')
+    lauf_optionen.add_argument('--budget', type=float, default=None, metavar='DOLLAR',
+                               help='Monatsbudget der echten Quelle, 0 heisst '
+                                    'keines (Standard: aus config.py)')
+    lauf_optionen.add_argument('--spalten', action='store_true',
+                               help='zusätzlich Parquet-Dateien für Auswertungen, '
+                                    'mit allen Kandidaten (braucht pyarrow)')
 
     l = befehle.add_parser('lauf', parents=[gemeinsam, lauf_optionen],
                            help='anreichern und auswerten')
@@ -357,8 +728,106 @@ def main(argv=None) -> int:
 
     f = befehle.add_parser('fortsetzen', parents=[gemeinsam, lauf_optionen],
                            help='einen unterbrochenen Lauf wieder aufnehmen')
+    f.add_argument('--uebernehmen', action='store_true',
+                   help='die schon verarbeiteten Kunden aus der Datenbank '
+                        'übernehmen statt neu entscheiden; aussortiert.csv '
+                        'enthält dann nur die neu verarbeiteten Kunden')
+    f.add_argument('--stichprobe', type=int, default=STANDARD_STICHPROBE,
+                   metavar='KUNDEN',
+                   help=f'mit --uebernehmen: so viele Kunden zur Kontrolle '
+                        f'trotzdem neu entscheiden; weicht einer ab, werden '
+                        f'alle neu entschieden (Standard: {STANDARD_STICHPROBE})')
     f.set_defaults(funktion=fortsetzen)
 
+    e = befehle.add_parser('einreihen', parents=[gemeinsam],
+                           help='eine Datei in die Warteschlange stellen')
+    e.add_argument('--modus', choices=('A', 'B'), default='A',
+                   help='A = Erstanreicherung, B = Auffrischen über die Google-Id')
+    e.add_argument('--datenbank', type=Path, default=STANDARD_DATENBANK,
+                   help=f'SQLite-Datei (Standard: {STANDARD_DATENBANK.name})')
+    e.add_argument('--email', default=None,
+                   help='Adresse für die Benachrichtigung (Phase 7)')
+    e.set_defaults(funktion=einreihen)
+
+    a = befehle.add_parser('abarbeiten', parents=[lauf_optionen],
+                           help='die Warteschlange abarbeiten, mehrere '
+                                'Aufträge gleichzeitig')
+    a.add_argument('--laeufe', type=int, default=STANDARD_MAX_LAEUFE,
+                   help=f'so viele Aufträge laufen höchstens gleichzeitig; '
+                        f'--arbeiter gilt je Quelle und wird geteilt '
+                        f'(Standard: {STANDARD_MAX_LAEUFE})')
+    a.add_argument('--protokoll-anzeigen', action='store_true',
+                   help='technische Meldungen zusätzlich auf dem Bildschirm')
+    a.set_defaults(funktion=abarbeiten)
+
+    m = befehle.add_parser('messlauf', aliases=['benchmark'],
+                           help='den Lauf gegen erfundene Kunden messen')
+    m.add_argument('--groessen', type=int, nargs='+',
+                   default=list(messlauf.STANDARD_GROESSEN), metavar='KUNDEN',
+                   help=f'so viele erfundene Kunden je Messung (Standard: '
+                        f'{" ".join(str(g) for g in messlauf.STANDARD_GROESSEN)})')
+    m.add_argument('--modus', choices=('A', 'B'), default='A',
+                   help='A = Erstanreicherung, B = Auffrischen über die Google-Id')
+    m.add_argument('--wartezeit', default=messlauf.STANDARD_WARTEZEIT,
+                   help=f'Antwortzeit der erfundenen Quelle: '
+                        f'{messlauf.WARTEZEIT_HILFE} '
+                        f'(Standard: {messlauf.STANDARD_WARTEZEIT})')
+    m.add_argument('--fehlerquote', type=float, default=0.0,
+                   help='Anteil der Abfragen, die ausfallen (Standard: 0)')
+    m.add_argument('--arbeiter', type=int, default=STANDARD_ARBEITER,
+                   help=f'gleichzeitige Abfragen (Standard: {STANDARD_ARBEITER})')
+    m.add_argument('--sammeln', type=int, default=1, metavar='KUNDEN',
+                   help='so viele Kunden teilen sich einen Commit (Standard: 1)')
+    m.add_argument('--synchronous', choices=SYNCHRONOUS_STUFEN, type=str.upper,
+                   default=None, help='PRAGMA synchronous der Laufdatenbank')
+    m.add_argument('--zufall', type=int, default=1,
+                   help='Startwert für die erfundenen Kunden; gleicher Wert, '
+                        'gleiche Kunden (Standard: 1)')
+    m.add_argument('--spalten', action='store_true',
+                   help='auch Parquet schreiben und Schreibzeit und Grösse '
+                        'mit CSV vergleichen (braucht pyarrow)')
+    m.add_argument('--ordner', type=Path, default=None,
+                   help='hier bleiben Eingabe, Datenbank und Ausgabe liegen '
+                        '(Standard: ein Ordner, der danach gelöscht wird)')
+    m.add_argument('--json', type=Path, default=None, metavar='DATEI',
+                   help='wohin die Messwerte gehen (Standard: '
+                        'logs/messlauf_<Zeitpunkt>.json)')
+    m.add_argument('--protokoll-anzeigen', action='store_true',
+                   help='technische Meldungen zusätzlich auf dem Bildschirm')
+    m.set_defaults(funktion=messen)
+
+    n = befehle.add_parser('neu-entscheiden',
+                           help='gespeicherte Aufträge mit anderen Schwellen neu '
+                                'entscheiden, ohne Abfrage bei der Quelle')
+    n.add_argument('--jobs', type=int, nargs='+', default=None, metavar='NUMMER',
+                   help='diese Aufträge (Standard: die letzten fertigen im Modus A)')
+    n.add_argument('--letzte', type=int, default=20, metavar='ANZAHL',
+                   help='ohne --jobs: so viele der letzten fertigen Aufträge '
+                        '(Standard: 20)')
+    heute = neu_entscheiden.heutige_schwellen()
+    n.add_argument('--hoch', type=float, default=None, metavar='SCORE',
+                   help=f'ab diesem Score ist ein Treffer hoch (B3, heute {heute["hoch"]})')
+    n.add_argument('--abstand', type=float, default=None, metavar='PUNKTE',
+                   help=f'Abstand zum zweitbesten für «dynamisch eindeutig» '
+                        f'(B3, heute {heute["abstand"]})')
+    n.add_argument('--einzeltreffer', type=float, default=None, metavar='SCORE',
+                   help=f'Namensscore, ab dem ein Einzeltreffer reicht '
+                        f'(B2, heute {heute["einzeltreffer"]})')
+    n.add_argument('--strasse', type=float, default=None, metavar='PROZENT',
+                   help=f'Ähnlichkeit, ab der ein Strassenname passt '
+                        f'(B1, heute {heute["strasse"]})')
+    n.add_argument('--prozesse', type=int, default=None,
+                   help='so viele Prozesse entscheiden gleichzeitig '
+                        '(Standard: einer je Kern)')
+    n.add_argument('--datenbank', type=Path, default=STANDARD_DATENBANK,
+                   help=f'SQLite-Datei (Standard: {STANDARD_DATENBANK.name})')
+    n.add_argument('--bericht', type=Path, default=None, metavar='DATEI',
+                   help='wohin die wechselnden Kunden gehen (Standard: '
+                        'logs/neu_entschieden_<Zeitpunkt>.csv)')
+    n.add_argument('--protokoll-anzeigen', action='store_true',
+                   help='technische Meldungen zusätzlich auf dem Bildschirm')
+    n.set_defaults(funktion=schwellen_vergleichen)
+
     args = parser.parse_args(argv)
     _setup_logging(args.protokoll_anzeigen)
     return args.funktion(args)
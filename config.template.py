@@ -39,6 +39,12 @@ SMTP_PASSWORT = os.getenv("SMTP_PASSWORT", "")
 SMTP_ABSENDER = os.getenv("SMTP_ABSENDER", "")
 SMTP_TLS = os.getenv("SMTP_TLS", "ja").lower() in ("ja", "true", "1")
 
+# Monatsbudget je Datenquelle in Dollar (drosselung.py). Der Lauf hält an,
+# bevor er es überschreitet, und schätzt vor dem Start, ob die Datei noch
+# hineinpasst. 0 heisst: kein Budget, es wird nur gezählt.
+APIFY_MONATSBUDGET_USD = float(os.getenv("APIFY_MONATSBUDGET_USD", "0"))
+GOOGLE_MONATSBUDGET_USD = float(os.getenv("GOOGLE_MONATSBUDGET_USD", "0"))
+
 # Der Mindestabstand zwischen dem besten und zweitbesten Score,
 # wenn kein Ergebnis den festen Schwellenwert erreicht (03_ENTSCHEIDUNGEN.md B3).
 DYNAMIC_THRESHOLD_GAP = 30
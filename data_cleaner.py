@@ -15,10 +15,17 @@
 
 import logging
 import re
+from functools import lru_cache
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+from rapidfuzz import fuzz as rf_fuzz
+from rapidfuzz import process as rf_process
 from thefuzz import fuzz
+from thefuzz import utils as fuzz_utils
+
+from place_provider import leere_ausgabezeile
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +48,99 @@ OUTPUT_FILES = {
 }
 
 
+# ==========================================================================
+# Textnormalisierung mit Zwischenspeicher
+# ==========================================================================
+#
+# Dieselben Google-Titel und Strassennamen werden immer wieder normalisiert:
+# für jeden Kandidaten, in jedem Strassenvergleich, und im selben Prozess auch
+# über Läufe und Wiederaufnahmen hinweg. Die Ergebnisse hängen nur vom Text
+# ab, deshalb liegen sie in einem begrenzten Zwischenspeicher je Hilfsfunktion
+# (functools.lru_cache; was am längsten nicht gebraucht wurde, fällt heraus).
+# `typed=True`: nicht jedes Feld einer Datenquelle ist Text, und 1, 1.0 und
+# True sind als Schlüssel gleich, ergeben aber verschiedene Texte.
+# Die Methoden von DataCleaner rufen diese Funktionen auf.
+
+# Geschätzt: deutlich mehr verschiedene Titel und Strassen, als eine Datei mit
+# 10'000 Kunden hat, bei wenigen Megabyte Speicher je Hilfsfunktion.
+NORMALISIERUNG_MAX_EINTRAEGE = 50_000
+
+_LEERRAUM = re.compile(r'\s+')
+_HAUSNUMMER = re.compile(r'\d+\s*[a-zA-Z]?')
+_HAUSNUMMER_AM_ENDE = re.compile(r'\d+\s*[a-zA-Z]?\s*$')
+# Umlaute → Doppelvokal, französische Akzente entfernen (für Westschweiz)
+_UMLAUTE_UND_AKZENTE = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue',
+                                      'é': 'e', 'è': 'e', 'ê': 'e', 'à': 'a', 'â': 'a'})
+# Bindestriche und Schrägstriche → Leerzeichen
+_TRENNZEICHEN = str.maketrans({'-': ' ', '/': ' '})
+
+
+@lru_cache(maxsize=NORMALISIERUNG_MAX_EINTRAEGE, typed=True)
+def _normalisiert(text) -> str:
+    """Siehe DataCleaner._normalize_text."""
+    if not text:
+        return ''
+    text = str(text).lower().strip().translate(_UMLAUTE_UND_AKZENTE)
+    # Schweizer Strassenabkürzungen ausschreiben — vor den Bindestrichen,
+    # sonst würde aus "str-" ein "str " und damit eine "strasse".
+    text = text.replace('str.', 'strasse').replace('str ', 'strasse ')
+    text = text.replace('g.', 'gasse')
+    text = text.replace('pl.', 'platz')
+    text = text.translate(_TRENNZEICHEN)
+    return _LEERRAUM.sub(' ', text).strip()
+
+
+@lru_cache(maxsize=NORMALISIERUNG_MAX_EINTRAEGE, typed=True)
+def _ohne_rechtsform(text: str, rechtsformen: re.Pattern) -> str:
+    """Siehe DataCleaner._strip_legal_suffixes."""
+    return _LEERRAUM.sub(' ', rechtsformen.sub('', text)).strip()
+
+
+@lru_cache(maxsize=NORMALISIERUNG_MAX_EINTRAEGE, typed=True)
+def _hausnummer(street_text: str) -> str:
+    """Siehe DataCleaner._extract_house_number."""
+    numbers = _HAUSNUMMER.findall(street_text)
+    return numbers[-1].strip() if numbers else ''
+
+
+@lru_cache(maxsize=NORMALISIERUNG_MAX_EINTRAEGE, typed=True)
+def _strassenname(street_text: str) -> str:
+    """Siehe DataCleaner._extract_street_name."""
+    return _HAUSNUMMER_AM_ENDE.sub('', street_text).strip()
+
+
+_ZWISCHENGESPEICHERT = {
+    'normalisieren': _normalisiert,
+    'rechtsform': _ohne_rechtsform,
+    'hausnummer': _hausnummer,
+    'strassenname': _strassenname,
+}
+
+
+def normalisierung_statistik() -> dict:
+    """
+    Treffer, Fehlgriffe, Trefferquote und Einträge je Hilfsfunktion, seit dem
+    Start des Prozesses oder dem letzten normalisierung_leeren().
+    """
+    statistik = {}
+    for name, funktion in _ZWISCHENGESPEICHERT.items():
+        info = funktion.cache_info()
+        gefragt = info.hits + info.misses
+        statistik[name] = {
+            'treffer': info.hits,
+            'fehlgriffe': info.misses,
+            'trefferquote': round(info.hits / gefragt, 4) if gefragt else 0.0,
+            'eintraege': info.currsize,
+        }
+    return statistik
+
+
+def normalisierung_leeren() -> None:
+    """Leert alle Zwischenspeicher der Normalisierung (und ihre Zähler)."""
+    for funktion in _ZWISCHENGESPEICHERT.values():
+        funktion.cache_clear()
+
+
 def leere_ablage() -> dict:
     """Vier leere Listen, eine je Ausgabedatei."""
     return {schluessel: [] for schluessel in OUTPUT_FILES}
@@ -77,6 +177,103 @@ def schreibe_ausgabedateien(ablage: dict, ziel_ordner: str) -> dict:
     return pfade
 
 
+# So viele Zeilen sammelt der Ausgabeschreiber je Datei, bevor er sie anhängt.
+SCHREIB_ZEILEN = 1_000
+
+# Endung des Ordners, in dem die Ausgabedateien entstehen, bis der Lauf
+# fertig ist. Er liegt neben dem Zielordner.
+TEIL_ENDUNG = '.teil'
+
+
+class Ausgabeschreiber:
+    """
+    Schreibt die vier Dateien nach und nach, Kunde für Kunde.
+
+    `schreibe_ausgabedateien` braucht die Zeilen aller Kunden auf einmal; bei
+    einem grossen Lauf liegt damit jede Ausgabezeile bis zum Schluss im
+    Speicher. Hier hängt `anhaengen` die Zeilen eines Kunden an, gesammelt in
+    Blöcken von `SCHREIB_ZEILEN` Zeilen je Datei. Das Ergebnis ist Byte für
+    Byte dasselbe: Jede Zeile ist Text bis auf `score`, und der ist immer
+    eine Kommazahl — jeder Block wird also gleich formatiert wie das Ganze.
+
+    Die Reihenfolge bestimmt der Aufrufer. Geschrieben wird in einen Ordner
+    `<ziel>.teil` daneben; erst `abschliessen` verschiebt die Dateien in den
+    Zielordner. Ein abgestürzter Lauf hinterlässt also keine halben
+    Ausgabedateien, ein abgebrochener mit `verwerfen` gar nichts — wie bisher.
+    """
+
+    def __init__(self, ziel_ordner: str, zeilen_je_block: int = SCHREIB_ZEILEN):
+        self.ziel = Path(ziel_ordner)
+        self.zeilen_je_block = max(1, int(zeilen_je_block))
+        self._teil = Path(str(self.ziel.resolve()) + TEIL_ENDUNG)
+        self._teil.mkdir(parents=True, exist_ok=True)
+
+        self._puffer = leere_ablage()
+        self.zeilen = dict.fromkeys(OUTPUT_FILES, 0)
+        self.kunden = dict.fromkeys(OUTPUT_FILES, 0)
+        self._dateien = {}
+        for schluessel, dateiname in OUTPUT_FILES.items():
+            datei = open(self._teil / dateiname, 'w',
+                         encoding='utf-8-sig', newline='')
+            self._dateien[schluessel] = datei
+            pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(datei, sep=';', index=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, art, *_):
+        if art is None:
+            self.abschliessen()
+        else:
+            self.verwerfen()
+
+    def anhaengen(self, ablage: dict) -> None:
+        """Hängt die Zeilen eines Kunden an, je Datei in der Reihenfolge der Ablage."""
+        for schluessel, zeilen in ablage.items():
+            if not zeilen:
+                continue
+            self._puffer[schluessel].extend(zeilen)
+            self.zeilen[schluessel] += len(zeilen)
+            self.kunden[schluessel] += 1
+            if len(self._puffer[schluessel]) >= self.zeilen_je_block:
+                self._leeren(schluessel)
+
+    def abschliessen(self) -> dict:
+        """Schreibt den Rest, schliesst die Dateien und verschiebt sie ans Ziel."""
+        self.ziel.mkdir(parents=True, exist_ok=True)
+        pfade = {}
+        for schluessel, dateiname in OUTPUT_FILES.items():
+            self._leeren(schluessel)
+            self._dateien[schluessel].close()
+            pfad = self.ziel / dateiname
+            (self._teil / dateiname).replace(pfad)
+            pfade[schluessel] = str(pfad)
+            logger.info(f'{schluessel}: {self.kunden[schluessel]} Kunden, '
+                        f'{self.zeilen[schluessel]} Zeilen → {pfad}')
+        self._teil_ordner_entfernen()
+        return pfade
+
+    def verwerfen(self) -> None:
+        """Löscht, was geschrieben wurde."""
+        for schluessel, dateiname in OUTPUT_FILES.items():
+            self._dateien[schluessel].close()
+            (self._teil / dateiname).unlink(missing_ok=True)
+        self._teil_ordner_entfernen()
+
+    def _teil_ordner_entfernen(self) -> None:
+        # Nur wenn leer: was nicht von diesem Lauf stammt, bleibt liegen.
+        if not any(self._teil.iterdir()):
+            self._teil.rmdir()
+
+    def _leeren(self, schluessel: str) -> None:
+        zeilen = self._puffer[schluessel]
+        if not zeilen:
+            return
+        pd.DataFrame(zeilen, columns=OUTPUT_COLUMNS).fillna('').to_csv(
+            self._dateien[schluessel], sep=';', index=False, header=False)
+        self._puffer[schluessel] = []
+
+
 class DataCleaner:
     """Bereinigt und dedupliziert die angereicherten Google Maps Daten."""
 
@@ -114,6 +311,9 @@ class DataCleaner:
                                    Standard: 30 Punkte Unterschied.
         """
         self.dynamic_gap_threshold = dynamic_gap_threshold
+        # re.compile liefert für dasselbe Muster dasselbe Objekt — alle
+        # Instanzen teilen sich damit einen Zwischenspeicher.
+        self._rechtsformen = re.compile(self.LEGAL_SUFFIXES)
 
     # ==========================================================================
     # HILFSMETHODEN: Textnormalisierung
@@ -131,24 +331,11 @@ class DataCleaner:
         4. Strassenabkürzungen ausschreiben (Str.→Strasse, G.→Gasse)
         5. Bindestriche und Schrägstriche durch Leerzeichen ersetzen
         6. Mehrfache Leerzeichen zusammenfassen
+
+        Beispiel: "Denner-Satellit" → "denner satellit"
+        Zwischengespeichert (s. normalisierung_statistik).
         """
-        if not text:
-            return ''
-        text = str(text).lower().strip()
-        # Umlaute → Doppelvokal
-        text = text.replace('ä', 'ae').replace('ö', 'oe').replace('ü', 'ue')
-        # Französische Akzente entfernen (für Westschweiz)
-        text = text.replace('é', 'e').replace('è', 'e').replace('ê', 'e')
-        text = text.replace('à', 'a').replace('â', 'a')
-        # Schweizer Strassenabkürzungen ausschreiben
-        text = text.replace('str.', 'strasse').replace('str ', 'strasse ')
-        text = text.replace('g.', 'gasse')
-        text = text.replace('pl.', 'platz')
-        # Bindestriche und Schrägstriche → Leerzeichen (z.B. "Denner-Satellit" → "Denner Satellit")
-        text = text.replace('-', ' ').replace('/', ' ')
-        # Mehrfache Leerzeichen zu einem zusammenfassen
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        return _normalisiert(text)
 
     def _normalize_plz(self, plz_value: str) -> str:
         """
@@ -166,8 +353,7 @@ class DataCleaner:
         Entfernt Rechtsform-Suffixe aus einem bereits normalisierten Text.
         Beispiel: "volg detailhandels ag" → "volg"
         """
-        cleaned = re.sub(self.LEGAL_SUFFIXES, '', text)
-        return re.sub(r'\s+', ' ', cleaned).strip()
+        return _ohne_rechtsform(text, self._rechtsformen)
 
     # ==========================================================================
     # HILFSMETHODEN: Strassenvergleich
@@ -183,8 +369,7 @@ class DataCleaner:
             "bahnhofstrasse 12a" → "12a"
             "dorfstrasse"        → "" (keine Hausnummer)
         """
-        numbers = re.findall(r'\d+\s*[a-zA-Z]?', street_text)
-        return numbers[-1].strip() if numbers else ''
+        return _hausnummer(street_text)
 
     def _extract_street_name(self, street_text: str) -> str:
         """
@@ -195,8 +380,7 @@ class DataCleaner:
             "dorfstrasse 19"    → "dorfstrasse"
             "dorfstrasse"       → "dorfstrasse"
         """
-        name = re.sub(r'\d+\s*[a-zA-Z]?\s*$', '', street_text).strip()
-        return name
+        return _strassenname(street_text)
 
     def _street_matches(self, input_street: str, google_street: str) -> bool:
         """
@@ -294,32 +478,13 @@ class DataCleaner:
         else:
             return (0.70, 0.30)
 
-    def _calculate_scores(self, group: pd.DataFrame) -> pd.DataFrame:
+    def _suchname_vorbereiten(self, search_name) -> tuple:
         """
-        Berechnet den gewichteten Ähnlichkeitsscore für jede Zeile in einer Kundengruppe.
-
-        Vergleicht den Suchbegriff (SearchString) mit jedem Google-Titel.
-
-        Score-Berechnung:
-            1. Erst-Wort-Score: Wie ähnlich ist das erste Wort des Suchbegriffs
-               zum ersten Wort des Google-Titels? (fuzz.ratio)
-            2. Gesamt-Score: Wie ähnlich ist der gesamte Suchbegriff zum gesamten
-               Google-Titel? (fuzz.token_set_ratio — reihenfolge-unabhängig)
-            3. Gewichteter Score = (Gewicht₁ × Erst-Wort) + (Gewicht₂ × Gesamt)
-
-        Gibt die Gruppe mit einer neuen 'score' Spalte zurück.
-
-        Der Score haengt nur vom Suchbegriff des Kunden und vom jeweiligen Titel ab,
-        nicht von den uebrigen Zeilen der Gruppe. Er wird deshalb einmal fuer alle
-        Kandidaten berechnet und danach nur noch gelesen — jede Ausgabezeile traegt
-        ihn (02_DATENVERTRAG.md §2).
+        Normalisierter Namensteil eines Suchbegriffs, sein erstes Wort und die
+        Gewichtung (s. _scores_berechnen).
         """
-        if group.empty:
-            return group
-
         # Den Namensteil aus dem SearchString extrahieren (alles vor dem ersten Komma)
         # Beispiel: "Denner-Satellit, Hauptstrasse 5, 5620" → "Denner-Satellit"
-        search_name = group.iloc[0].get('SearchString', '')
         search_name_part = search_name.split(',')[0].strip() if search_name else ''
 
         # Normalisieren und Rechtsformen entfernen für fairen Vergleich
@@ -334,41 +499,81 @@ class DataCleaner:
         logger.debug(f"Scoring '{search_name_part}' | first_word='{search_first_word}' | "
                      f"weights=({first_word_weight:.0%}/{full_title_weight:.0%}) | "
                      f"generic={'YES' if first_word_weight == 0.30 else 'NO'}")
+        return norm_search_name, search_first_word, first_word_weight, full_title_weight
 
-        # Score für jedes Google-Ergebnis berechnen
-        scores = []
-        for _, row in group.iterrows():
-            google_title = str(row.get('title', ''))
-            norm_google_title = self._normalize_text(google_title)
-            norm_google_title = self._strip_legal_suffixes(norm_google_title)
-
-            # Erstes Wort des Google-Titels extrahieren
-            google_words = norm_google_title.split()
-            google_first_word = google_words[0] if google_words else ''
-
-            # Erst-Wort-Vergleich: exakter Zeichenvergleich (fuzz.ratio)
-            # "denner" vs "denner" → 100, "denner" vs "spar" → niedrig
-            if search_first_word and google_first_word:
-                core_score = fuzz.ratio(search_first_word, google_first_word)
-            else:
-                core_score = 0
-
-            # Gesamtvergleich: reihenfolge-unabhängig (fuzz.token_set_ratio)
-            # "denner satellit" vs "satellit denner bremgarten" → hoch
-            full_score = fuzz.token_set_ratio(norm_search_name, norm_google_title)
-
-            # Gewichteter Gesamtscore
-            weighted_score = (first_word_weight * core_score) + (full_title_weight * full_score)
+    def _titel_vorbereiten(self, google_title) -> tuple:
+        """Normalisierter Google-Titel ohne Rechtsform und sein erstes Wort."""
+        norm_google_title = self._normalize_text(str(google_title))
+        norm_google_title = self._strip_legal_suffixes(norm_google_title)
+        google_words = norm_google_title.split()
+        return norm_google_title, google_words[0] if google_words else ''
 
-            logger.debug(f"  vs '{google_title}' | core={core_score} full={full_score} "
-                         f"weighted={weighted_score:.1f}")
+    def _scores_berechnen(self, search_names, titles) -> list:
+        """
+        Der Score für Paare aus Suchbegriff und Google-Titel, über ganze Spalten.
 
-            scores.append(round(weighted_score, 2))
+        Score-Berechnung je Paar:
+            1. Erst-Wort-Score: Wie ähnlich ist das erste Wort des Suchbegriffs
+               zum ersten Wort des Google-Titels? (fuzz.ratio)
+            2. Gesamt-Score: Wie ähnlich ist der gesamte Suchbegriff zum gesamten
+               Google-Titel? (fuzz.token_set_ratio — reihenfolge-unabhängig)
+            3. Gewichteter Score = (Gewicht₁ × Erst-Wort) + (Gewicht₂ × Gesamt)
+
+        Der Score haengt nur vom Suchbegriff des Kunden und vom jeweiligen Titel ab,
+        nicht von den uebrigen Zeilen der Gruppe. Er wird deshalb einmal fuer alle
+        Kandidaten berechnet und danach nur noch gelesen — jede Ausgabezeile traegt
+        ihn (02_DATENVERTRAG.md §2).
+
+        Dieselbe Rechnung wie früher Zeile für Zeile mit fuzz.ratio und
+        fuzz.token_set_ratio, nur gebündelt: jeder Suchbegriff und jeder Titel
+        wird einmal normalisiert, gleich oft er vorkommt, und die Vergleiche
+        laufen paarweise in rapidfuzz (`process.cpdist`), dem Unterbau von
+        thefuzz. Die Scores sind bitgleich zu den Einzelaufrufen — die
+        Schwellenwerte aus 03_ENTSCHEIDUNGEN.md B gelten unverändert. Geprüft
+        gegen agent/testdaten/golden_scores.csv.
+
+        Args:
+            search_names: je Zeile der vollständige SearchString des Kunden
+            titles:       je Zeile der Google-Titel
+
+        Returns:
+            Liste der Scores (auf zwei Stellen gerundet), in Zeilenreihenfolge.
+        """
+        search_names = list(search_names)
+        titles = list(titles)
+        if len(search_names) != len(titles):
+            raise ValueError('Suchbegriffe und Titel müssen gleich viele Zeilen haben.')
+        if not titles:
+            return []
+
+        suche = {s: self._suchname_vorbereiten(s) for s in dict.fromkeys(search_names)}
+        titel = {t: self._titel_vorbereiten(t) for t in dict.fromkeys(titles)}
+        # thefuzz.fuzz.token_set_ratio bereitet beide Seiten mit full_process
+        # (force_ascii=True) auf, fuzz.ratio nicht. Hier einmal je Text.
+        aufbereitet = {}
+        for norm in [v[0] for v in suche.values()] + [v[0] for v in titel.values()]:
+            if norm not in aufbereitet:
+                aufbereitet[norm] = fuzz_utils.full_process(norm, force_ascii=True)
+
+        erste_suche = [suche[s][1] for s in search_names]
+        erste_titel = [titel[t][1] for t in titles]
+        core = rf_process.cpdist(erste_suche, erste_titel, scorer=rf_fuzz.ratio,
+                                 dtype=np.float64)
+        full = rf_process.cpdist([aufbereitet[suche[s][0]] for s in search_names],
+                                 [aufbereitet[titel[t][0]] for t in titles],
+                                 scorer=rf_fuzz.token_set_ratio, dtype=np.float64)
 
-        # Score-Spalte zur Gruppe hinzufügen (Kopie, um SettingWithCopyWarning zu vermeiden)
-        group = group.copy()
-        group['score'] = scores
-        return group
+        scores = []
+        for s, erstes_suche, erstes_titel, c, f in zip(
+                search_names, erste_suche, erste_titel, core.tolist(), full.tolist()):
+            _, _, first_word_weight, full_title_weight = suche[s]
+            # Erst-Wort-Vergleich nur, wenn beide Seiten ein erstes Wort haben.
+            # Gerundet wie thefuzz: int(round(...)) auf den rapidfuzz-Wert.
+            core_score = int(round(c)) if erstes_suche and erstes_titel else 0
+            full_score = int(round(f))
+            weighted_score = (first_word_weight * core_score) + (full_title_weight * full_score)
+            scores.append(round(weighted_score, 2))
+        return scores
 
     # ==========================================================================
     # HILFSMETHODEN: Datenprüfung
@@ -393,7 +598,7 @@ class DataCleaner:
                 return street_part
         return ''
 
-    def _plz_matches(self, row: pd.Series, input_plz: str) -> bool:
+    def _plz_matches(self, row: dict, input_plz: str) -> bool:
         """
         Prüft ob die Postleitzahl des Google-Ergebnisses mit der erwarteten PLZ übereinstimmt.
 
@@ -407,7 +612,7 @@ class DataCleaner:
             return True
         return google_plz == input_plz_clean
 
-    def _is_empty_result(self, row: pd.Series) -> bool:
+    def _is_empty_result(self, row: dict) -> bool:
         """
         Prüft ob ein API-Ergebnis leer ist (die Google Maps API hat nichts gefunden).
 
@@ -420,6 +625,19 @@ class DataCleaner:
                 return False
         return True
 
+    def _spalte(self, group: pd.DataFrame, name: str) -> pd.Series:
+        """Eine Spalte als Text; fehlt sie, eine leere (wie row.get(name, ''))."""
+        if name in group.columns:
+            return group[name].astype(str)
+        return pd.Series([''] * len(group), index=group.index, dtype=object)
+
+    def _leer_maske(self, group: pd.DataFrame) -> pd.Series:
+        """_is_empty_result für alle Zeilen auf einmal."""
+        maske = pd.Series(True, index=group.index)
+        for field in ['title', 'address', 'street', 'placeId']:
+            maske &= self._spalte(group, field).str.strip() == ''
+        return maske
+
     # ==========================================================================
     # HILFSMETHODEN: Klartextgründe (02_DATENVERTRAG.md §4)
     # ==========================================================================
@@ -507,13 +725,34 @@ class DataCleaner:
         # Ergebnis-Listen für die drei Ausgabedateien plus Diagnose
         gesamt = leere_ablage()
 
-        # Daten nach KundenNr gruppieren — jede Gruppe = 1 Kunde mit N Google-Ergebnissen
-        grouped = df.groupby('KundenNr', sort=False)
-        logger.info(f"Verarbeite {len(grouped)} Kundengruppen...")
-
-        for kunden_nr, group in grouped:
-            for datei, zeilen in self.entscheide_kunde(kunden_nr, group).items():
-                gesamt[datei].extend(zeilen)
+        # Scores für die ganze Datei in einem Durchgang. Jede Zeile wird mit dem
+        # Suchbegriff aus der ersten nicht leeren Zeile ihres Kunden verglichen,
+        # wie in _process_customer; leere Zeilen bekommen keinen Score.
+        scores = [0.0] * len(df)
+        if not df.empty:
+            leer = self._leer_maske(df)
+            gefuellt = df[~leer]
+            suchbegriffe = self._spalte(gefuellt, 'SearchString').groupby(
+                gefuellt['KundenNr'], sort=False).transform('first')
+            berechnet = self._scores_berechnen(suchbegriffe, self._spalte(gefuellt, 'title'))
+            for position, score in zip((~leer).to_numpy().nonzero()[0], berechnet):
+                scores[position] = score
+
+        # Daten nach KundenNr gruppieren — jede Gruppe = 1 Kunde mit N Google-Ergebnissen.
+        # Als Listen von Zeilen, in der Reihenfolge des ersten Auftretens.
+        gruppen = {}
+        for zeile, score in zip(df.to_dict('records'), scores):
+            zeilen, werte = gruppen.setdefault(zeile['KundenNr'], ([], []))
+            zeilen.append(zeile)
+            werte.append(score)
+        logger.info(f"Verarbeite {len(gruppen)} Kundengruppen...")
+
+        for kunden_nr, (zeilen, werte) in gruppen.items():
+            for datei, ausgabe in self.entscheide_kunde(kunden_nr, zeilen, werte).items():
+                gesamt[datei].extend(ausgabe)
+
+        quote = normalisierung_statistik()['normalisieren']['trefferquote']
+        logger.info(f"Normalisierung: {quote:.0%} der Texte kamen aus dem Zwischenspeicher.")
 
         ziel = output_dir or ausgabeordner_fuer(input_filepath)
         return schreibe_ausgabedateien(gesamt, ziel)
@@ -522,7 +761,7 @@ class DataCleaner:
     # Ein Kunde, eine Entscheidung
     # ==========================================================================
 
-    def entscheide_kunde(self, kunden_nr, group) -> dict:
+    def entscheide_kunde(self, kunden_nr, group, scores: list = None) -> dict:
         """
         Entscheidet für genau einen Kunden und liefert die Ausgabezeilen.
 
@@ -530,19 +769,67 @@ class DataCleaner:
         einer ganzen Datei ebenso wie der Lauf über einen Provider. Damit trifft
         beides dieselbe Entscheidung, nicht zwei ähnliche.
 
+        Args:
+            group:  die Zeilen des Kunden, als DataFrame oder als Liste von
+                    dicts (eine Zeile je Kandidat, Spalten wie die angereicherte
+                    CSV). Entschieden wird in beiden Fällen über die Liste.
+            scores: schon berechnete Scores, einer je Zeile (s. clean_data).
+                    Fehlen sie, werden sie hier berechnet.
+
         Returns:
             {'fertig_fuer_erp': [...], 'zur_pruefung': [...],
              'nicht_moeglich': [...], 'aussortiert': [...]}
             Genau eine der ersten drei Listen ist gefüllt.
         """
+        zeilen = group.to_dict('records') if isinstance(group, pd.DataFrame) else list(group)
         ablage = leere_ablage()
-        self._process_customer(str(kunden_nr), group,
+        self._process_customer(str(kunden_nr), zeilen,
                                ablage['fertig_fuer_erp'], ablage['zur_pruefung'],
-                               ablage['nicht_moeglich'], ablage['aussortiert'])
+                               ablage['nicht_moeglich'], ablage['aussortiert'], scores)
         return ablage
 
-    def _process_customer(self, kunden_nr, group, fertig, pruefung,
-                          nicht_moeglich, aussortiert):
+    def scores_fuer(self, zeilen: list) -> list:
+        """
+        Der Score je Zeile eines Kunden, so wie `entscheide_kunde` ihn rechnet.
+
+        Der Score hängt an keiner Schwelle (s. _scores_berechnen). Wer über
+        dieselben Zeilen mehrmals entscheidet — etwa mit anderen Schwellen —,
+        rechnet ihn einmal und übergibt ihn jedes Mal als `scores`.
+        """
+        if not zeilen:
+            return []
+        return self._scores_berechnen([zeilen[0].get('SearchString', '')] * len(zeilen),
+                                      [zeile.get('title', '') for zeile in zeilen])
+
+    def entscheide_kandidaten(self, kunden_nr, stamm: dict, kandidaten: list,
+                              nummer_spalte: str = None) -> dict:
+        """
+        Wie entscheide_kunde, aber direkt aus den Candidate-Objekten eines
+        Providers (02_DATENVERTRAG.md §7) — ohne DataFrame für einen Kunden mit
+        einer Handvoll Kandidaten.
+
+        Die Zeilen entstehen wie in der angereicherten CSV: Stammdaten links
+        (`stamm`, z.B. KundenNr, SearchString, PLZ, Stadt), ein Kandidat je
+        Zeile rechts. Ohne Kandidaten entsteht eine einzige Zeile mit leeren
+        Trefferfeldern — das liest die Fachlogik als "kein Ergebnis".
+
+        `nummer_spalte`: ist sie gesetzt, trägt jede Zeile unter diesem Namen
+        die Position ihres Kandidaten in `kandidaten` (-1 für die leere Zeile).
+        So lässt sich jede Ausgabezeile ihrem Kandidaten zuordnen.
+        """
+        if not kandidaten:
+            zeilen = [{**stamm, **leere_ausgabezeile()}]
+            nummern = [-1]
+        else:
+            zeilen = [{**stamm, **kandidat.als_ausgabezeile()} for kandidat in kandidaten]
+            nummern = range(len(kandidaten))
+        if nummer_spalte:
+            for zeile, nummer in zip(zeilen, nummern):
+                zeile[nummer_spalte] = nummer
+        return self.entscheide_kunde(kunden_nr, zeilen)
+
+    def _process_customer(self, kunden_nr, zeilen, fertig, pruefung,
+                          nicht_moeglich, aussortiert, scores=None):
         """
         Entscheidet für genau einen Kunden und haengt das Ergebnis an die Listen an.
 
@@ -550,8 +837,11 @@ class DataCleaner:
         fertig / pruefung / nicht_moeglich. Eintraege in aussortiert sind reine
         Diagnose und werden nur geschrieben, wenn der Kunde anderweitig entschieden
         wurde — nie zusaetzlich zu einem Prueffall aus derselben Zeilengruppe.
+
+        `zeilen` sind die Kandidatenzeilen als dicts, `scores` (falls schon
+        berechnet) einer je Zeile.
         """
-        stamm = group.iloc[0]
+        stamm = zeilen[0]
         search_string = str(stamm.get('SearchString', '')).strip()
         input_plz = str(stamm.get('PLZ', '')).strip()
 
@@ -560,59 +850,66 @@ class DataCleaner:
         # ==================================================================
         if not search_string:
             nicht_moeglich.append(self._make_row(
-                stamm.to_dict(), 'NICHT_MOEGLICH (Eingabe unbrauchbar)', 0,
+                stamm, 'NICHT_MOEGLICH (Eingabe unbrauchbar)', 0,
                 'Im Suchbegriff steht nichts. Ohne Name und Adresse ist keine Suche möglich.'))
             return
 
         # ==================================================================
         # SCHRITT 1: Leere Ergebnisse erkennen
         # ==================================================================
-        empty_mask = group.apply(self._is_empty_result, axis=1)
-        empty_rows = group[empty_mask]
-        filled_rows = group[~empty_mask]
+        empty_mask = [self._is_empty_result(row) for row in zeilen]
+        empty_rows = [row for row, leer in zip(zeilen, empty_mask) if leer]
+        filled_rows = [row for row, leer in zip(zeilen, empty_mask) if not leer]
 
-        if filled_rows.empty:
+        if not filled_rows:
             # Die Suche hat für diesen Kunden gar nichts geliefert → ③
             logger.info(f"KundenNr {kunden_nr}: kein Ergebnis der Suche.")
             nicht_moeglich.append(self._make_row(
-                stamm.to_dict(), 'NICHT_MOEGLICH (kein Ergebnis)', 0,
+                stamm, 'NICHT_MOEGLICH (kein Ergebnis)', 0,
                 f'Die Suche nach "{search_string}" lieferte keinen einzigen Treffer.'))
             return
 
         # Einzelne leere Zeilen neben echten Treffern sind nur Rauschen → Diagnose
-        for _, row in empty_rows.iterrows():
+        for row in empty_rows:
             aussortiert.append(self._make_row(
-                row.to_dict(), 'AUSSORTIERT (leeres Ergebnis)', 0,
+                row, 'AUSSORTIERT (leeres Ergebnis)', 0,
                 'Leere Antwort der Suche; für diesen Kunden gibt es andere Treffer.'))
 
         # ==================================================================
         # SCHRITT 2: Score für jeden Kandidaten — wird nie mehr verworfen
         # ==================================================================
-        scored = self._calculate_scores(filled_rows)
+        if scores is not None:
+            filled_scores = [score for score, leer in zip(scores, empty_mask) if not leer]
+        else:
+            # Alle Zeilen tragen den Suchbegriff des Kunden aus der ersten.
+            filled_scores = self._scores_berechnen(
+                [filled_rows[0].get('SearchString', '')] * len(filled_rows),
+                [row.get('title', '') for row in filled_rows])
+        scored = [{**row, 'score': score} for row, score in zip(filled_rows, filled_scores)]
 
         # ==================================================================
         # SCHRITT 3: PLZ-Filter — Ergebnisse aus falscher Postleitzahl entfernen
         # ==================================================================
-        plz_mask = scored.apply(lambda row: self._plz_matches(row, input_plz), axis=1)
-        plz_matches = scored[plz_mask]
-        plz_mismatches = scored[~plz_mask]
+        plz_mask = [self._plz_matches(row, input_plz) for row in scored]
+        plz_matches = [row for row, passt in zip(scored, plz_mask) if passt]
+        plz_mismatches = [row for row, passt in zip(scored, plz_mask) if not passt]
 
-        if plz_matches.empty:
+        if not plz_matches:
             # Keine einzige passende PLZ → alle Kandidaten zur Prüfung.
             # Sie werden NICHT zusätzlich aussortiert (Invariante, Fehler B1).
             logger.info(f"KundenNr {kunden_nr}: keine PLZ-Treffer, zur Prüfung.")
             gefunden = self._aufzaehlung(
-                self._normalize_plz(r.get('postalCode', '')) for _, r in scored.iterrows())
+                self._normalize_plz(r.get('postalCode', '')) for r in scored)
             grund = (f'Gesucht Postleitzahl {input_plz}, '
                      f'gefunden {gefunden or "keine Angabe"}.')
-            for _, row in scored.iterrows():
+            for row in scored:
                 pruefung.append(self._make_row(
-                    row.to_dict(), 'PRUEFUNG (keine PLZ-Treffer)', row['score'], grund))
+                    row, 'PRUEFUNG (keine PLZ-Treffer)', row['score'], grund))
             return
 
-        for _, row in plz_mismatches.iterrows():
+        for row in plz_mismatches:
             aussortiert.append(self._make_row(
-                row.to_dict(), 'AUSSORTIERT (PLZ)', row['score'],
+                row, 'AUSSORTIERT (PLZ)', row['score'],
                 f'Postleitzahl {self._normalize_plz(row.get("postalCode", ""))} '
                 f'statt {input_plz}.'))
 
@@ -623,7 +920,7 @@ class DataCleaner:
         # SCHRITT 4: Einzeltreffer prüfen (03_ENTSCHEIDUNGEN.md B2)
         # ==================================================================
         if len(group) == 1:
-            self._decide_single_hit(kunden_nr, group.iloc[0], street_to_find,
+            self._decide_single_hit(kunden_nr, group[0], street_to_find,
                                     fertig, pruefung)
             return
 
@@ -636,40 +933,37 @@ class DataCleaner:
             # --- SZENARIO B: Strasse im Suchbegriff vorhanden ---
             logger.debug(f"KundenNr {kunden_nr}: Szenario B (Strasse: '{street_to_find}')")
 
-            street_spalte = group['street'] if 'street' in group.columns \
-                else pd.Series([''] * len(group), index=group.index)
-            street_mask = street_spalte.apply(
-                lambda x: self._street_matches(street_to_find, str(x)))
-            street_matches = group[street_mask]
-            street_mismatches = group[~street_mask]
+            street_mask = [self._street_matches(street_to_find, str(row.get('street', '')))
+                           for row in group]
+            street_matches = [row for row, passt in zip(group, street_mask) if passt]
+            street_mismatches = [row for row, passt in zip(group, street_mask) if not passt]
 
             if len(street_matches) == 0:
                 # Keine einzige Strasse passt → alle zur Prüfung.
                 # Sie werden NICHT zusätzlich aussortiert (Fehler B1).
                 logger.info(f"KundenNr {kunden_nr}: keine Strassentreffer, zur Prüfung.")
-                gefunden = self._aufzaehlung(str(r.get('street', ''))
-                                             for _, r in group.iterrows())
+                gefunden = self._aufzaehlung(str(r.get('street', '')) for r in group)
                 grund = (f'Gesucht {street_to_find}, '
                          f'gefunden {gefunden or "keine Strassenangabe"}.')
-                for _, row in group.iterrows():
+                for row in group:
                     pruefung.append(self._make_row(
-                        row.to_dict(), 'PRUEFUNG (keine Strassentreffer)',
+                        row, 'PRUEFUNG (keine Strassentreffer)',
                         row['score'], grund))
                 return
 
             # Ab hier gibt es mindestens einen Strassentreffer — erst jetzt
             # duerfen die Fehlschlaege in die Diagnosedatei.
-            for _, row in street_mismatches.iterrows():
+            for row in street_mismatches:
                 aussortiert.append(self._make_row(
-                    row.to_dict(), 'AUSSORTIERT (Strasse)', row['score'],
+                    row, 'AUSSORTIERT (Strasse)', row['score'],
                     f'Gesucht {street_to_find}, dieser Treffer liegt an '
                     f'{row.get("street", "") or "unbekannter Adresse"}.'))
 
             if len(street_matches) == 1:
                 # Genau 1 Strassentreffer → eindeutig
-                row = street_matches.iloc[0]
+                row = street_matches[0]
                 fertig.append(self._make_row(
-                    row.to_dict(), 'OK (Strasse)', row['score'],
+                    row, 'OK (Strasse)', row['score'],
                     f'Nur ein Treffer liegt an der gesuchten Adresse {street_to_find}: '
                     f'"{row.get("title", "")}", {row.get("street", "")}. '
                     f'Namensähnlichkeit {self._fmt_score(row["score"])} von 100.'))
@@ -710,7 +1004,7 @@ class DataCleaner:
 
         if name_reicht:
             fertig.append(self._make_row(
-                row.to_dict(), 'OK (Einzeltreffer)', score,
+                row, 'OK (Einzeltreffer)', score,
                 f'Ein einziger Treffer übrig: "{titel}", '
                 f'Namensähnlichkeit {score_text} von 100.'))
             return
@@ -718,7 +1012,7 @@ class DataCleaner:
         if adresse_exakt:
             # Rebranding: gleiche Adresse, neuer Name (Volg → Spar)
             fertig.append(self._make_row(
-                row.to_dict(), 'OK (Einzeltreffer)', score,
+                row, 'OK (Einzeltreffer)', score,
                 f'Ein einziger Treffer übrig: "{titel}" an der gesuchten Adresse '
                 f'{street_to_find}. Der Name weicht ab (Ähnlichkeit {score_text} von 100), '
                 f'Strasse und Hausnummer stimmen exakt.'))
@@ -733,7 +1027,21 @@ class DataCleaner:
             grund = (f'Nur ein Treffer: "{titel}". Der Name ist nur zu {score_text} von 100 '
                      f'ähnlich und im Suchbegriff steht keine Strasse zum Abgleich.')
         pruefung.append(self._make_row(
-            row.to_dict(), 'PRUEFUNG (Einzeltreffer unsicher)', score, grund))
+            row, 'PRUEFUNG (Einzeltreffer unsicher)', score, grund))
+
+    @staticmethod
+    def _absteigend(scores: list) -> list:
+        """
+        Die Positionen der Scores, absteigend sortiert.
+
+        Genau die Reihenfolge von DataFrame.sort_values('score',
+        ascending=False), auch bei gleich hohen Scores: numpys quicksort ist
+        nicht stabil, und welcher von zwei gleich guten Treffern zuerst steht,
+        steht im Grund ("bester ..., zweiter ...").
+        """
+        werte = np.asarray(scores, dtype=np.float64)[::-1]
+        positionen = np.arange(len(scores))[::-1]
+        return positionen[werte.argsort(kind='quicksort')][::-1].tolist()
 
     # ==========================================================================
     # SCHRITT 6: Entscheid über den Namensscore
@@ -746,20 +1054,21 @@ class DataCleaner:
         Schwellenwerte unverändert aus 03_ENTSCHEIDUNGEN.md B3:
         fester Wert 80, dynamischer Abstand 30.
         """
-        ranked = scored_group.sort_values('score', ascending=False)
-        high = ranked[ranked['score'] >= self.HIGH_SCORE_THRESHOLD]
-        low = ranked[ranked['score'] < self.HIGH_SCORE_THRESHOLD]
+        ranked = [scored_group[i] for i in self._absteigend(
+            [row['score'] for row in scored_group])]
+        high = [row for row in ranked if row['score'] >= self.HIGH_SCORE_THRESHOLD]
+        low = [row for row in ranked if row['score'] < self.HIGH_SCORE_THRESHOLD]
 
         if len(high) == 1:
             # --- GENAU 1 Treffer über 80 → eindeutig ---
-            row = high.iloc[0]
+            row = high[0]
             fertig.append(self._make_row(
-                row.to_dict(), 'OK (Score)', row['score'],
+                row, 'OK (Score)', row['score'],
                 f'Bester Treffer "{row.get("title", "")}" erreicht '
                 f'{self._fmt_score(row["score"])} von 100, alle anderen bleiben unter 80.'))
-            for _, other in low.iterrows():
+            for other in low:
                 aussortiert.append(self._make_row(
-                    other.to_dict(), 'AUSSORTIERT (Score)', other['score'],
+                    other, 'AUSSORTIERT (Score)', other['score'],
                     f'"{other.get("title", "")}" erreicht nur '
                     f'{self._fmt_score(other["score"])} von 100.'))
             return
@@ -768,7 +1077,7 @@ class DataCleaner:
             # --- MEHRERE Treffer über 80 → mehrdeutig → manuelle Prüfung ---
             # Beispiel: 2 SPAR-Filialen in derselben PLZ, beide scoren hoch.
             logger.info(f"KundenNr {kunden_nr}: {len(high)} Treffer über 80 → zur Prüfung.")
-            erster, zweiter = high.iloc[0], high.iloc[1]
+            erster, zweiter = high[0], high[1]
             grund = (f'Mehrere Treffer gleich gut: "{erster.get("title", "")}" '
                      f'({self._fmt_score(erster["score"])}) und "{zweiter.get("title", "")}" '
                      f'({self._fmt_score(zweiter["score"])}).')
@@ -777,12 +1086,12 @@ class DataCleaner:
                          f'"{erster.get("title", "")}" ({self._fmt_score(erster["score"])}) '
                          f'und "{zweiter.get("title", "")}" '
                          f'({self._fmt_score(zweiter["score"])}).')
-            for _, row in high.iterrows():
+            for row in high:
                 pruefung.append(self._make_row(
-                    row.to_dict(), 'PRUEFUNG (mehrere hohe Treffer)', row['score'], grund))
-            for _, row in low.iterrows():
+                    row, 'PRUEFUNG (mehrere hohe Treffer)', row['score'], grund))
+            for row in low:
                 aussortiert.append(self._make_row(
-                    row.to_dict(), 'AUSSORTIERT (Score)', row['score'],
+                    row, 'AUSSORTIERT (Score)', row['score'],
                     f'"{row.get("title", "")}" erreicht nur '
                     f'{self._fmt_score(row["score"])} von 100.'))
             return
@@ -790,15 +1099,15 @@ class DataCleaner:
         # --- DYNAMISCHER SCHWELLENWERT: Kein Score über 80 ---
         if len(ranked) == 1:
             # Kann über die Weiche nicht entstehen; Absicherung gegen künftige Aufrufer.
-            row = ranked.iloc[0]
+            row = ranked[0]
             pruefung.append(self._make_row(
-                row.to_dict(), 'PRUEFUNG (kein klarer Treffer)', row['score'],
+                row, 'PRUEFUNG (kein klarer Treffer)', row['score'],
                 f'Einziger Treffer "{row.get("title", "")}" erreicht nur '
                 f'{self._fmt_score(row["score"])} von 100.'))
             return
 
-        erster = ranked.iloc[0]
-        zweiter = ranked.iloc[1]
+        erster = ranked[0]
+        zweiter = ranked[1]
         score_1 = float(erster['score'])
         score_2 = float(zweiter['score'])
         abstand = score_1 - score_2
@@ -808,13 +1117,13 @@ class DataCleaner:
             logger.info(f"KundenNr {kunden_nr}: dynamischer Treffer "
                         f"(Score {score_1:.0f} vs {score_2:.0f}).")
             fertig.append(self._make_row(
-                erster.to_dict(), 'OK (Dynamisch)', score_1,
+                erster, 'OK (Dynamisch)', score_1,
                 f'"{erster.get("title", "")}" liegt mit '
                 f'{self._fmt_score(score_1)} von 100 klar vor dem nächsten Treffer '
                 f'"{zweiter.get("title", "")}" ({self._fmt_score(score_2)}).'))
-            for _, row in ranked.iloc[1:].iterrows():
+            for row in ranked[1:]:
                 aussortiert.append(self._make_row(
-                    row.to_dict(), 'AUSSORTIERT (Dynamisch)', row['score'],
+                    row, 'AUSSORTIERT (Dynamisch)', row['score'],
                     f'"{row.get("title", "")}" ({self._fmt_score(row["score"])}) liegt klar '
                     f'hinter dem besten Treffer "{erster.get("title", "")}" '
                     f'({self._fmt_score(score_1)}).'))
@@ -824,6 +1133,6 @@ class DataCleaner:
         grund = (f'Kein Treffer erreicht 80 Punkte: bester "{erster.get("title", "")}" '
                  f'({self._fmt_score(score_1)}), zweiter "{zweiter.get("title", "")}" '
                  f'({self._fmt_score(score_2)}), Abstand nur {self._fmt_score(abstand)}.')
-        for _, row in ranked.iterrows():
+        for row in ranked:
             pruefung.append(self._make_row(
-                row.to_dict(), 'PRUEFUNG (kein klarer Treffer)', row['score'], grund))
+                row, 'PRUEFUNG (kein klarer Treffer)', row['score'], grund))
@@ -6,11 +6,16 @@
 # damit ist nach einem Lauf auswertbar, warum ein Kunde zur Prüfung ging.
 
 import logging
+import os
 import sqlite3
+import threading
+import time
+import zlib
 from datetime import datetime
 from pathlib import Path
 
-from place_provider import Candidate
+import ereignisse
+from place_provider import Candidate, koordinaten
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +63,111 @@ CREATE TABLE IF NOT EXISTS kandidat (
 CREATE INDEX IF NOT EXISTS idx_kandidat_kunde ON kandidat(kunde_id);
 """
 
+# Betriebstabellen. Nicht Teil des Datenvertrags: sie halten fest, wie ein Lauf
+# gelaufen ist und welche Aufträge noch warten, nicht was ein Lauf ergeben hat,
+# und keine Ausgabedatei liest sie.
+# Ihre Indizes heissen ix_*, damit sie nicht mit den idx_* des Vertrags
+# verwechselt werden.
+BETRIEB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fenster_entscheid (
+  id INTEGER PRIMARY KEY,
+  job_id INTEGER NOT NULL REFERENCES job(id),
+  zeitpunkt TEXT NOT NULL,
+  fenster INTEGER NOT NULL,
+  grund TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_fenster_entscheid_job ON fenster_entscheid(job_id);
+-- Aufträge für den Planer (worker.py): eingereiht, aber noch nicht zu Ende.
+-- Eine Zeile verschwindet erst, wenn ihr Job FERTIG, ABGEBROCHEN oder FEHLER
+-- ist; nach einem Absturz steht sie also noch da und wird fortgesetzt.
+CREATE TABLE IF NOT EXISTS warteschlange (
+  job_id INTEGER PRIMARY KEY REFERENCES job(id),
+  eingabe_pfad TEXT NOT NULL,
+  ausgabe_ordner TEXT,
+  eingereiht_am TEXT NOT NULL
+);
+-- Für die Prüfmaske: zählen und den nächsten offenen Fall finden, ohne die
+-- Kunden des Jobs zu lesen. Ein Index ändert keine Zeile des Vertrags.
+CREATE INDEX IF NOT EXISTS ix_kunde_pruefstand ON kunde(job_id, ergebnis, qualitaet, id);
+-- Wo die Zeit eines Jobs geblieben ist (kennzahlen.py): eine Zeile je Stufe
+-- und je Zähler, am Ende jedes Durchgangs ersetzt. Zähler haben keine Zeiten.
+CREATE TABLE IF NOT EXISTS job_kennzahl (
+  job_id INTEGER NOT NULL REFERENCES job(id),
+  name TEXT NOT NULL,
+  anzahl INTEGER NOT NULL,
+  summe_sekunden REAL,
+  p50_sekunden REAL,
+  p95_sekunden REAL,
+  hoechstens_sekunden REAL,
+  PRIMARY KEY (job_id, name)
+);
+-- Der Standort eines Kandidaten als Zahlen, gelesen beim Schreiben aus
+-- `kandidat.location`. Die Distanzprüfung (modus_b.py) rechnet damit, statt
+-- den Text bei jeder Entscheidung und jeder Wiederaufnahme neu zu lesen.
+-- Wessen Standort sich nicht lesen lässt, hat hier keine Zeile.
+CREATE TABLE IF NOT EXISTS kandidat_ort (
+  kandidat_id INTEGER PRIMARY KEY REFERENCES kandidat(id),
+  lat REAL NOT NULL,
+  lng REAL NOT NULL
+);
+-- Die Stelle eines Kunden in der Eingabedatei, ohne doppelte KundenNr
+-- gezählt, ab 0. In dieser Reihenfolge schreibt der Lauf die Ausgabedateien
+-- (pipeline.Reihenfolge) — `kunde.id` ist die Reihenfolge, in der die
+-- Arbeiter fertig wurden. Die Prüfmaske setzt einen Kunden danach wieder ein.
+-- Jobs aus der Zeit vor der Tabelle haben hier keine Zeilen.
+CREATE TABLE IF NOT EXISTS kunde_position (
+  job_id INTEGER NOT NULL REFERENCES job(id),
+  kunden_nr TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  PRIMARY KEY (job_id, kunden_nr)
+);
+"""
+
+# Stand des Schemas, abgelegt in PRAGMA user_version. Gerechnet aus dem Text
+# beider Skripte: wer eine Tabelle oder einen Index ergänzt, ändert damit auch
+# den Stand, und jede Datei bekommt beim nächsten Öffnen die Ergänzung. Steht
+# der Stand schon in der Datei, entfallen beim Öffnen Skripte und WAL-Umstellung
+# — der Journal-Modus bleibt in der Datei gespeichert.
+SCHEMA_STAND = zlib.crc32((SCHEMA + BETRIEB_SCHEMA).encode()) & 0x7FFFFFFF
+
+# Kandidaten samt Standort aus `kandidat_ort`: `lat` und `lng` sind leer, wo
+# sich der Standort nicht lesen liess.
+_KANDIDAT_MIT_ORT = ('kandidat.*, kandidat_ort.lat, kandidat_ort.lng FROM kandidat '
+                     'LEFT JOIN kandidat_ort ON kandidat_ort.kandidat_id = kandidat.id')
+
+# So viele Kandidaten liest `_orte_nachtragen` auf einmal.
+_NACHTRAG_ZEILEN = 10_000
+
+# Siehe Datenbank.naechster_pruefall. `stufe` zählt die Qualitäten der offenen
+# Fälle auf, von einer zur nächsten mit je einem Sprung in den Index.
+_NAECHSTER_PRUEFALL = """
+WITH RECURSIVE stufe(qualitaet) AS (
+  SELECT MIN(qualitaet) FROM kunde
+   WHERE job_id = :job_id AND ergebnis = 'pruefung'
+  UNION ALL
+  SELECT (SELECT MIN(qualitaet) FROM kunde
+           WHERE job_id = :job_id AND ergebnis = 'pruefung'
+             AND qualitaet > stufe.qualitaet)
+    FROM stufe WHERE stufe.qualitaet IS NOT NULL
+)
+SELECT MIN(erster) FROM (
+  SELECT (SELECT MIN(id) FROM kunde
+           WHERE job_id = :job_id AND ergebnis = 'pruefung'
+             AND qualitaet = stufe.qualitaet AND id > :nach) AS erster
+    FROM stufe WHERE stufe.qualitaet IS NOT NULL
+  UNION ALL
+  SELECT MIN(id) FROM kunde
+   WHERE job_id = :job_id AND ergebnis = 'pruefung'
+     AND qualitaet IS NULL AND id > :nach
+)
+"""
+
+# Erlaubte Werte für PRAGMA synchronous. Ohne Angabe bleibt der Standard von
+# SQLite (FULL): jeder Commit wartet, bis die Platte ihn bestätigt hat. Unter
+# WAL reicht NORMAL für eine unversehrte Datei; bei einem Stromausfall können
+# dann die letzten Commits fehlen — die Wiederaufnahme holt sie neu.
+SYNCHRONOUS_STUFEN = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
 # 02_DATENVERTRAG.md §6
 ZUSTAENDE = ('NEU', 'VALIDIERT', 'LAEUFT', 'FERTIG', 'ABGEBROCHEN', 'FEHLER')
 
@@ -75,31 +185,156 @@ def _jetzt() -> str:
 class Datenbank:
     """Zugriffsschicht: Job anlegen, Kunde schreiben, Kandidaten schreiben, Fortschritt."""
 
-    def __init__(self, pfad: str = ':memory:'):
+    def __init__(self, pfad: str = ':memory:', synchronous: str = None,
+                 nur_lesen: bool = False):
+        if synchronous is not None and str(synchronous).upper() not in SYNCHRONOUS_STUFEN:
+            raise ValueError(f'Unbekannte Stufe "{synchronous}" für synchronous, erlaubt '
+                             f'sind {", ".join(SYNCHRONOUS_STUFEN)}.')
         self.pfad = str(pfad)
+        # Sammelbetrieb (s. sammeln): aus, bis ein Lauf ihn einschaltet.
+        self.sammel_kunden = 1
+        self.sammel_sekunden = 0.0
+        self._gesammelt = 0
+        self._offen_seit = None
+        # Jobs, deren Stand sich geändert hat und die nach dem nächsten Commit
+        # gemeldet werden (ereignisse.py).
+        self._zu_melden = set()
         if self.pfad != ':memory:':
             Path(self.pfad).parent.mkdir(parents=True, exist_ok=True)
+        # Eine Verbindung aus `lesend` bleibt über das `with` hinaus offen.
+        self.geliehen = False
         self.verbindung = sqlite3.connect(self.pfad, timeout=10)
         self.verbindung.row_factory = sqlite3.Row
         self.verbindung.execute('PRAGMA foreign_keys = ON')
+        if self.pfad != ':memory:':
+            self.verbindung.execute('PRAGMA busy_timeout = 10000')
+        if synchronous is not None:
+            self.verbindung.execute(f'PRAGMA synchronous = {str(synchronous).upper()}')
+        if self.verbindung.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_STAND:
+            self._schema_anlegen()
+        if nur_lesen:
+            # Wer nur liest, kann auch aus Versehen nichts schreiben.
+            self.verbindung.execute('PRAGMA query_only = ON')
+
+    def _schema_anlegen(self) -> None:
         if self.pfad != ':memory:':
             # Der Worker schreibt aus seinem Thread, die Statusanzeige liest aus
             # einem anderen. WAL erlaubt beides gleichzeitig, ohne dass eine
             # Seite blockiert.
             self.verbindung.execute('PRAGMA journal_mode = WAL')
-            self.verbindung.execute('PRAGMA busy_timeout = 10000')
         self.verbindung.executescript(SCHEMA)
+        self.verbindung.executescript(BETRIEB_SCHEMA)
+        self._orte_nachtragen()
+        self.verbindung.execute(f'PRAGMA user_version = {SCHEMA_STAND}')
         self.verbindung.commit()
 
+    def _orte_nachtragen(self) -> None:
+        """
+        Trägt `kandidat_ort` für Kandidaten nach, die vor der Tabelle
+        geschrieben wurden. Läuft mit jedem neuen Schemastand; in einer Datei,
+        in der nichts fehlt, kostet es eine Abfrage.
+        """
+        nach, anzahl = 0, 0
+        while True:
+            zeilen = self.verbindung.execute(
+                "SELECT id, location FROM kandidat WHERE id > ? AND location <> '' "
+                'AND id NOT IN (SELECT kandidat_id FROM kandidat_ort) '
+                'ORDER BY id LIMIT ?', (nach, _NACHTRAG_ZEILEN)).fetchall()
+            if not zeilen:
+                break
+            orte = [(zeile['id'], *punkt) for zeile in zeilen
+                    if (punkt := koordinaten(zeile['location'])) is not None]
+            self.verbindung.executemany(
+                'INSERT INTO kandidat_ort (kandidat_id, lat, lng) VALUES (?, ?, ?)', orte)
+            nach = zeilen[-1]['id']
+            anzahl += len(orte)
+        if anzahl:
+            logger.info(f'kandidat_ort: Standort von {anzahl} Kandidaten nachgetragen')
+
     def __enter__(self):
         return self
 
     def __exit__(self, *_):
-        self.schliessen()
+        if not self.geliehen:
+            self.schliessen()
 
     def schliessen(self) -> None:
         self.verbindung.close()
 
+    # ------------------------------------------------------------------
+    # Sammelbetrieb
+    # ------------------------------------------------------------------
+    #
+    # Ohne Sammelbetrieb endet jeder Kunde mit zwei Commits (Kunde samt
+    # Kandidaten, dann der Fortschritt) und damit zwei Schreibvorgängen bis
+    # auf die Platte. Im Sammelbetrieb teilen sich mehrere Kunden einen
+    # Commit: festgeschrieben wird nach `kunden` Kunden oder nach
+    # `millisekunden`, je nachdem, was zuerst eintritt.
+    #
+    # Die Regel der Wiederaufnahme bleibt: jeder Kunde steht in einem eigenen
+    # SAVEPOINT und ist entweder vollständig da oder gar nicht. Ein Absturz
+    # verliert höchstens die noch nicht festgeschriebenen Kunden; sie fehlen
+    # in `kunde` und werden beim Fortsetzen neu geholt. Andere Verbindungen,
+    # etwa die Statusanzeige, sehen den Fortschritt entsprechend verzögert.
+
+    def sammeln(self, kunden: int = 1, millisekunden: float = 0) -> None:
+        """
+        Schaltet den Sammelbetrieb ein. `kunden=1` und `millisekunden=0` heisst:
+        jeder Kunde wird sofort festgeschrieben, wie ohne Sammelbetrieb.
+        """
+        if kunden < 1 or millisekunden < 0:
+            raise ValueError('Gesammelt wird über mindestens einen Kunden und eine '
+                             'Zeitspanne von null oder mehr Millisekunden.')
+        self.festschreiben()
+        self.sammel_kunden = int(kunden)
+        self.sammel_sekunden = float(millisekunden) / 1000
+
+    @property
+    def sammelt(self) -> bool:
+        return self.sammel_kunden > 1 or self.sammel_sekunden > 0
+
+    def festschreiben(self) -> None:
+        """Schreibt alles Gesammelte fest."""
+        self.verbindung.commit()
+        self._gesammelt = 0
+        self._offen_seit = None
+        self._melden()
+
+    def festschreiben_wenn_faellig(self) -> bool:
+        """
+        Schreibt fest, wenn genug Kunden zusammengekommen sind oder die Zeit
+        abgelaufen ist. Der Lauf ruft das auch in seinem Takt auf, damit eine
+        langsame Quelle das Festschreiben nicht aufhält.
+        """
+        if not self.verbindung.in_transaction:
+            # Ein anderer Aufruf hat schon festgeschrieben (z.B. status_setzen).
+            self._gesammelt = 0
+            self._offen_seit = None
+            return False
+        if self._offen_seit is None:
+            self._offen_seit = time.monotonic()
+        abgelaufen = (self.sammel_sekunden > 0
+                      and time.monotonic() - self._offen_seit >= self.sammel_sekunden)
+        if self._gesammelt >= self.sammel_kunden or abgelaufen:
+            self.festschreiben()
+            return True
+        return False
+
+    def _abschliessen(self) -> None:
+        """Nach einem Schreibvorgang: sofort oder gesammelt festschreiben."""
+        if self.sammelt:
+            self.festschreiben_wenn_faellig()
+        else:
+            self.verbindung.commit()
+        self._melden()
+
+    def _melden(self) -> None:
+        """Meldet die geänderten Jobs — aber erst, wenn nichts mehr offen ist."""
+        if self._zu_melden and not self.verbindung.in_transaction:
+            for job_id in self._zu_melden:
+                ereignisse.melden(job_id)
+            self._zu_melden.clear()
+
     # ------------------------------------------------------------------
     # Job
     # ------------------------------------------------------------------
@@ -134,26 +369,57 @@ class Datenbank:
 
         self.verbindung.execute(
             f'UPDATE job SET {", ".join(felder)} WHERE id = ?', werte)
-        self.verbindung.commit()
+        self._zu_melden.add(job_id)
+        self.festschreiben()
 
     def job_lesen(self, job_id: int) -> dict:
         zeile = self.verbindung.execute(
             'SELECT * FROM job WHERE id = ?', (job_id,)).fetchone()
         return dict(zeile) if zeile else None
 
+    def letzte_jobs(self, anzahl: int, modus: str = None) -> list:
+        """Die jüngsten `anzahl` fertigen Jobs, der jüngste zuerst, auf Wunsch eines Modus."""
+        return [dict(z) for z in self.verbindung.execute(
+            "SELECT * FROM job WHERE status = 'FERTIG' AND (? IS NULL OR modus = ?) "
+            'ORDER BY id DESC LIMIT ?', (modus, modus, anzahl))]
+
     def offener_job(self) -> dict:
         """
         Der Job im Zustand LAEUFT, falls es einen gibt.
 
         Zwei Verwendungen: der zweite Start wird damit abgewiesen, und nach
         einem Absturz findet der Start so den Lauf, der fortzusetzen ist
-        (02_DATENVERTRAG.md §6).
+        (02_DATENVERTRAG.md §6). Jobs aus der Warteschlange zählen nicht —
+        sie setzt der Planer selbst fort.
         """
         zeile = self.verbindung.execute(
-            "SELECT * FROM job WHERE status = 'LAEUFT' ORDER BY id DESC LIMIT 1"
+            "SELECT * FROM job WHERE status = 'LAEUFT' "
+            "AND id NOT IN (SELECT job_id FROM warteschlange) "
+            "ORDER BY id DESC LIMIT 1"
         ).fetchone()
         return dict(zeile) if zeile else None
 
+    # ------------------------------------------------------------------
+    # Warteschlange
+    # ------------------------------------------------------------------
+
+    def einreihen(self, job_id: int, eingabe_pfad: str, ausgabe_ordner: str = None) -> None:
+        self.verbindung.execute(
+            'INSERT INTO warteschlange (job_id, eingabe_pfad, ausgabe_ordner, '
+            'eingereiht_am) VALUES (?, ?, ?, ?)',
+            (job_id, str(eingabe_pfad), ausgabe_ordner, _jetzt()))
+        self.verbindung.commit()
+
+    def warteschlange_lesen(self) -> list:
+        """Die eingereihten Aufträge mit Modus und Zustand ihres Jobs, älteste zuerst."""
+        return [dict(z) for z in self.verbindung.execute(
+            'SELECT warteschlange.*, job.modus, job.status FROM warteschlange '
+            'JOIN job ON job.id = warteschlange.job_id ORDER BY warteschlange.job_id')]
+
+    def austragen(self, job_id: int) -> None:
+        self.verbindung.execute('DELETE FROM warteschlange WHERE job_id = ?', (job_id,))
+        self.verbindung.commit()
+
     # ------------------------------------------------------------------
     # Fortschritt
     # ------------------------------------------------------------------
@@ -162,19 +428,71 @@ class Datenbank:
         """Wird nach jedem Kunden aufgerufen (02_DATENVERTRAG.md §6)."""
         self.verbindung.execute(
             'UPDATE job SET kunden_erledigt = ? WHERE id = ?', (kunden_erledigt, job_id))
-        self.verbindung.commit()
+        self._zu_melden.add(job_id)
+        self._abschliessen()
 
     def kunden_total_setzen(self, job_id: int, kunden_total: int) -> None:
         """Die Gesamtzahl steht erst fest, wenn die Eingabedatei gelesen ist."""
         self.verbindung.execute(
             'UPDATE job SET kunden_total = ? WHERE id = ?', (kunden_total, job_id))
-        self.verbindung.commit()
+        self._zu_melden.add(job_id)
+        self.festschreiben()
 
     def fortschritt_lesen(self, job_id: int) -> dict:
+        """
+        Stand des Jobs. Läuft er mit angepasster Zahl gleichzeitiger Abfragen,
+        stehen die aktuelle Zahl und die letzten Entscheidungen dabei; sonst
+        ist `gleichzeitig` None.
+        """
         zeile = self.verbindung.execute(
             'SELECT status, kunden_total, kunden_erledigt, fehlermeldung '
             'FROM job WHERE id = ?', (job_id,)).fetchone()
-        return dict(zeile) if zeile else None
+        if not zeile:
+            return None
+        stand = dict(zeile)
+        entscheide = self.fenster_entscheide_lesen(job_id, letzte=10)
+        stand['gleichzeitig'] = entscheide[-1]['fenster'] if entscheide else None
+        stand['fenster_entscheide'] = entscheide
+        return stand
+
+    def fenster_entscheid_schreiben(self, job_id: int, fenster: int, grund: str) -> None:
+        """Hält fest, warum sich die Zahl gleichzeitiger Abfragen geändert hat."""
+        self.verbindung.execute(
+            'INSERT INTO fenster_entscheid (job_id, zeitpunkt, fenster, grund) '
+            'VALUES (?, ?, ?, ?)', (job_id, _jetzt(), int(fenster), grund))
+        self.verbindung.commit()
+
+    def fenster_entscheide_lesen(self, job_id: int, letzte: int = None) -> list:
+        """Die Entscheidungen in zeitlicher Reihenfolge, auf Wunsch nur die letzten."""
+        sql = ('SELECT zeitpunkt, fenster, grund FROM fenster_entscheid '
+               'WHERE job_id = ? ORDER BY id DESC')
+        werte = [job_id]
+        if letzte is not None:
+            sql += ' LIMIT ?'
+            werte.append(int(letzte))
+        return [dict(z) for z in self.verbindung.execute(sql, werte)][::-1]
+
+    def kennzahlen_schreiben(self, job_id: int, zeilen: list) -> None:
+        """
+        Ersetzt die Kennzahlen des Jobs durch die des letzten Durchgangs
+        (`Kennzahlen.zusammenfassung`). Ein fortgesetzter Job zeigt also,
+        wie es beim Fortsetzen lief, nicht die Summe aller Versuche.
+        """
+        self.verbindung.execute('DELETE FROM job_kennzahl WHERE job_id = ?', (job_id,))
+        self.verbindung.executemany(
+            'INSERT INTO job_kennzahl (job_id, name, anzahl, summe_sekunden, '
+            'p50_sekunden, p95_sekunden, hoechstens_sekunden) '
+            'VALUES (:job_id, :name, :anzahl, :summe_sekunden, :p50_sekunden, '
+            ':p95_sekunden, :hoechstens_sekunden)',
+            [dict(zeile, job_id=job_id) for zeile in zeilen])
+        self.verbindung.commit()
+
+    def kennzahlen_lesen(self, job_id: int) -> dict:
+        """Die Kennzahlen des Jobs nach Name, leer vor dem ersten Durchgang."""
+        return {z['name']: dict(z) for z in self.verbindung.execute(
+            'SELECT name, anzahl, summe_sekunden, p50_sekunden, p95_sekunden, '
+            'hoechstens_sekunden FROM job_kennzahl WHERE job_id = ? ORDER BY name',
+            (job_id,))}
 
     # ------------------------------------------------------------------
     # Kunde
@@ -218,7 +536,14 @@ class Datenbank:
         entweder vollständig in der Datenbank oder gar nicht. Ein Kunde mit
         Eintrag, aber ohne seine Kandidaten würde beim Fortsetzen als
         "kein Ergebnis" neu entschieden — und damit falsch.
+
+        Im Sammelbetrieb steht der Kunde in einem SAVEPOINT: scheitert er,
+        wird nur er zurückgenommen, nicht die schon gesammelten davor.
         """
+        if self.sammelt:
+            if not self.verbindung.in_transaction:
+                self.verbindung.execute('BEGIN')
+            self.verbindung.execute('SAVEPOINT kunde')
         try:
             kunde_id = self._kunde_einfuegen(job_id, kunden_nr, search_string, plz,
                                              stadt, place_id, lat, lng, ergebnis,
@@ -226,15 +551,62 @@ class Datenbank:
             if eintraege:
                 self._kandidaten_einfuegen(kunde_id, eintraege)
         except Exception:
-            self.verbindung.rollback()
+            if self.sammelt:
+                self.verbindung.execute('ROLLBACK TO kunde')
+                self.verbindung.execute('RELEASE kunde')
+            else:
+                self.verbindung.rollback()
             raise
-        self.verbindung.commit()
+        if self.sammelt:
+            self.verbindung.execute('RELEASE kunde')
+            self._gesammelt += 1
+        self._abschliessen()
         return kunde_id
 
     def kunden_lesen(self, job_id: int) -> list:
         return [dict(z) for z in self.verbindung.execute(
             'SELECT * FROM kunde WHERE job_id = ? ORDER BY id', (job_id,))]
 
+    def kunde_nach_nummer(self, job_id: int, kunden_nr: str) -> dict:
+        zeile = self.verbindung.execute(
+            'SELECT * FROM kunde WHERE job_id = ? AND kunden_nr = ?',
+            (job_id, kunden_nr)).fetchone()
+        return dict(zeile) if zeile else None
+
+    def positionen_schreiben(self, job_id: int, kunden_nummern) -> None:
+        """
+        Hält die Reihenfolge der Eingabedatei fest (`kunde_position`).
+        `kunden_nummern` darf ein Generator sein; er wird nur einmal gelesen.
+        """
+        self.verbindung.executemany(
+            'INSERT OR REPLACE INTO kunde_position (job_id, kunden_nr, position) '
+            'VALUES (?, ?, ?)',
+            ((job_id, str(kunden_nr), position)
+             for position, kunden_nr in enumerate(kunden_nummern)))
+
+    def kunden_in_eingabereihenfolge(self, job_id: int) -> list:
+        """
+        Wie `kunden_lesen`, aber in der Reihenfolge der Eingabedatei — der
+        der Ausgabedateien. Ohne `kunde_position` (ältere Jobs) nach `kunde.id`.
+        """
+        return [dict(z) for z in self.verbindung.execute(
+            'SELECT kunde.* FROM kunde LEFT JOIN kunde_position AS p '
+            'ON p.job_id = kunde.job_id AND p.kunden_nr = kunde.kunden_nr '
+            'WHERE kunde.job_id = ? ORDER BY p.position, kunde.id', (job_id,))]
+
+    def kunden_reihenfolge(self, job_id: int) -> dict:
+        """
+        KundenNr → Stelle in den Ausgabedateien: die Position in der
+        Eingabedatei, ohne `kunde_position` (ältere Jobs) die `kunde.id`.
+        """
+        zeilen = self.verbindung.execute(
+            'SELECT kunden_nr, position FROM kunde_position WHERE job_id = ?',
+            (job_id,)).fetchall()
+        if not zeilen:
+            zeilen = self.verbindung.execute(
+                'SELECT kunden_nr, id FROM kunde WHERE job_id = ?', (job_id,)).fetchall()
+        return {kunden_nr: stelle for kunden_nr, stelle in zeilen}
+
     def ergebnis_zaehlen(self, job_id: int) -> dict:
         """Wie viele Kunden bisher in welcher der drei Dateien gelandet sind."""
         zeilen = self.verbindung.execute(
@@ -289,11 +661,86 @@ class Datenbank:
             'opening_hours, permanently_closed, temporarily_closed, score, '
             'entscheid, grund) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, '
             '?, ?, ?, ?)', zeilen)
+
+        orte = [(nummer, punkt) for nummer, (kandidat, *_) in enumerate(eintraege)
+                if (punkt := kandidat.standort()) is not None]
+        if orte:
+            # Die eben geschriebenen Zeilen sind die letzten des Kunden: dieselbe
+            # Verbindung, dieselbe Transaktion, die Ids aufsteigend.
+            ids = [zeile['id'] for zeile in self.verbindung.execute(
+                'SELECT id FROM kandidat WHERE kunde_id = ? ORDER BY id DESC LIMIT ?',
+                (kunde_id, len(zeilen)))][::-1]
+            self.verbindung.executemany(
+                'INSERT INTO kandidat_ort (kandidat_id, lat, lng) VALUES (?, ?, ?)',
+                [(ids[nummer], *punkt) for nummer, punkt in orte])
         return len(zeilen)
 
     def kandidaten_lesen(self, kunde_id: int) -> list:
         return [dict(z) for z in self.verbindung.execute(
-            'SELECT * FROM kandidat WHERE kunde_id = ? ORDER BY id', (kunde_id,))]
+            f'SELECT {_KANDIDAT_MIT_ORT} WHERE kandidat.kunde_id = ? '
+            'ORDER BY kandidat.id', (kunde_id,))]
+
+    def kandidaten_bloecke(self, job_id: int, zeilen_je_block: int):
+        """
+        Alle Kandidaten eines Jobs mit der KundenNr, in Blöcken zu höchstens
+        `zeilen_je_block` Zeilen — für den Spaltenexport, der nie alle auf
+        einmal im Speicher haben soll. Reihenfolge wie `kandidaten_des_jobs`.
+        """
+        zeiger = self.verbindung.execute(
+            f'SELECT kunde.kunden_nr, {_KANDIDAT_MIT_ORT} '
+            'JOIN kunde ON kunde.id = kandidat.kunde_id '
+            'WHERE kunde.job_id = ? ORDER BY kunde.id, kandidat.id', (job_id,))
+        while True:
+            block = zeiger.fetchmany(zeilen_je_block)
+            if not block:
+                return
+            yield block
+
+    def kandidaten_des_jobs(self, job_id: int) -> dict:
+        """
+        Alle Kandidaten eines Jobs in einer Abfrage, je `kunde_id` eine Liste
+        in derselben Reihenfolge wie `kandidaten_lesen`. Kunden ohne
+        Kandidaten fehlen.
+
+        Die Zeilen bleiben `sqlite3.Row` — lesbar wie ein dict, aber ohne
+        die Kopie, die bei einigen Zehntausend Kandidaten den grössten Teil
+        der Zeit kostet. Sortiert wird nach `kunde.id`: so liefert der Index
+        die Reihenfolge, und SQLite muss nicht nachsortieren.
+        """
+        je_kunde = {}
+        for zeile in self.verbindung.execute(
+                f'SELECT {_KANDIDAT_MIT_ORT} JOIN kunde ON kunde.id = kandidat.kunde_id '
+                'WHERE kunde.job_id = ? ORDER BY kunde.id, kandidat.id', (job_id,)):
+            je_kunde.setdefault(zeile['kunde_id'], []).append(zeile)
+        return je_kunde
+
+    def kunden_bloecke(self, job_id: int, kunden_je_block: int):
+        """
+        Die Kunden eines Jobs samt ihrer Kandidaten, je Block höchstens
+        `kunden_je_block` Kunden als Liste von (Kunde, [Kandidaten]) — für
+        das Neu-Entscheiden (neu_entscheiden.py), das einen Job nie ganz im
+        Speicher haben soll. Reihenfolge nach `kunde.id`, Kunden ohne
+        Kandidaten mit leerer Liste.
+
+        Je Block zwei Abfragen: die Kunden über `idx_kunde_job` ab dem letzten
+        des vorigen Blocks, ihre Kandidaten über `idx_kandidat_kunde`.
+        """
+        nach = -1
+        while True:
+            kunden = self.verbindung.execute(
+                'SELECT * FROM kunde WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?',
+                (job_id, nach, kunden_je_block)).fetchall()
+            if not kunden:
+                return
+            je_kunde = {}
+            for zeile in self.verbindung.execute(
+                    f'SELECT {_KANDIDAT_MIT_ORT} WHERE kandidat.kunde_id IN '
+                    '(SELECT id FROM kunde WHERE job_id = ? AND id BETWEEN ? AND ?) '
+                    'ORDER BY kandidat.kunde_id, kandidat.id',
+                    (job_id, kunden[0]['id'], kunden[-1]['id'])):
+                je_kunde.setdefault(zeile['kunde_id'], []).append(zeile)
+            yield [(kunde, je_kunde.get(kunde['id'], [])) for kunde in kunden]
+            nach = kunden[-1]['id']
 
     def kandidaten_zaehlen(self, job_id: int) -> int:
         zeile = self.verbindung.execute(
@@ -321,6 +768,40 @@ class Datenbank:
             "SELECT * FROM kunde WHERE job_id = ? AND ergebnis = 'pruefung' "
             "ORDER BY id", (job_id,))]
 
+    def pruefaelle_zaehlen(self, job_id: int, entschieden_qualitaeten: tuple) -> dict:
+        """
+        Wie viele Prüffälle noch offen sind und wie viele Kunden eine der
+        `entschieden_qualitaeten` tragen.
+
+        Zwei Zählungen über `ix_kunde_pruefstand` — kein Kunde wird gelesen.
+        """
+        offen = self.verbindung.execute(
+            "SELECT COUNT(*) FROM kunde WHERE job_id = ? AND ergebnis = 'pruefung'",
+            (job_id,)).fetchone()[0]
+        platzhalter = ', '.join('?' * len(entschieden_qualitaeten))
+        entschieden = self.verbindung.execute(
+            f'SELECT COUNT(*) FROM kunde WHERE job_id = ? AND ergebnis IN '
+            f'({", ".join("?" * len(ERGEBNISSE))}) AND qualitaet IN ({platzhalter})',
+            (job_id, *ERGEBNISSE, *entschieden_qualitaeten)).fetchone()[0]
+        return {'offen': offen, 'entschieden': entschieden}
+
+    def naechster_pruefall(self, job_id: int, nach_kunde_id: int = None) -> int:
+        """
+        Die kleinste `kunde.id` eines offenen Prüffalls, auf Wunsch erst
+        hinter `nach_kunde_id`. `None`, wenn keiner mehr offen ist.
+
+        Ein schlichtes MIN(id) ginge über `idx_kunde_job` und läse jeden
+        Kunden hinter `nach_kunde_id`, bis einer offen ist — am Ende einer
+        Prüfung fast den ganzen Job. In `ix_kunde_pruefstand` stehen die
+        offenen Fälle nach `qualitaet` und darin nach `id`: Hier wird für
+        jede der wenigen Qualitäten der erste Fall gesucht, jeder mit einem
+        Sprung in den Index. Fälle ohne Qualität zählen gleich mit.
+        """
+        return self.verbindung.execute(_NAECHSTER_PRUEFALL, {
+            'job_id': job_id,
+            'nach': -1 if nach_kunde_id is None else nach_kunde_id,
+        }).fetchone()[0]
+
     def kunde_entscheiden(self, kunde_id: int, ergebnis: str, qualitaet: str,
                           grund: str, gewaehlt_id: int = None) -> None:
         """
@@ -363,3 +844,41 @@ class Datenbank:
             self.verbindung.rollback()
             raise
         self.verbindung.commit()
+
+
+# ----------------------------------------------------------------------
+# Lesende Verbindungen
+# ----------------------------------------------------------------------
+#
+# Die Weboberfläche liest bei jeder Anfrage ein paar Zeilen. Dafür jedes Mal
+# eine Verbindung zu öffnen und wieder zu schliessen, kostete mehr als das
+# Lesen selbst. Jeder Thread behält deshalb eine lesende Verbindung und
+# bekommt sie beim nächsten Mal wieder. Im WAL-Modus sieht sie bei jeder
+# Abfrage den letzten Commit, solange sie selbst keine Transaktion offen hält
+# — und eine Verbindung mit query_only öffnet keine.
+
+_lesende = threading.local()
+
+
+def lesend(pfad) -> Datenbank:
+    """
+    Die lesende Verbindung dieses Threads zu `pfad`, für `with` wie ein neu
+    geöffnetes `Datenbank` — nur dass sie danach offen bleibt.
+
+    Ein Thread hält eine Verbindung; fragt er nach einer anderen Datei, wird
+    die alte geschlossen. Wurde die Datei ersetzt, öffnet sie sich neu.
+    """
+    pfad = str(pfad)
+    try:
+        kennung = os.stat(pfad).st_ino
+    except OSError:
+        kennung = None
+    datenbank, bisher = getattr(_lesende, 'eintrag', (None, None))
+    if datenbank is not None and (datenbank.pfad, bisher) == (pfad, kennung):
+        return datenbank
+    if datenbank is not None:
+        datenbank.schliessen()
+    datenbank = Datenbank(pfad, nur_lesen=True)
+    datenbank.geliehen = True
+    _lesende.eintrag = (datenbank, os.stat(pfad).st_ino)
+    return datenbank
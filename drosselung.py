@@ -0,0 +1,323 @@
+# drosselung.py
+# Unter den Grenzen der Datenquelle bleiben, statt an sie zu stossen.
+#
+# Bisher hat der Lauf so schnell gefragt, wie die Arbeiter konnten. Google
+# antwortet auf zu viele Anfragen mit 429, Apify ab dem Ausgabenlimit mit
+# `usage-limit-exceeded` — beides beendet den Lauf (QuelleNichtVerfuegbar),
+# mitten in der Datei und erst, wenn es schon zu spät ist.
+#
+# Zwei Grenzen liegen deshalb vor der Datenquelle:
+#   - ein Eimer mit Marken je Sekunde. Jeder Aufruf nimmt eine; ist keine da,
+#     wartet er, bis eine nachgetropft ist. Der Lauf wird dadurch gleichmässig
+#     statt stossweise, und 429 kommt gar nicht erst
+#   - ein Budget je Monat, in Dollar. Jeder Aufruf bucht seine geschätzten
+#     Kosten; was das Budget sprengen würde, wird nicht mehr gestellt, und der
+#     Lauf endet wie bei einem erschöpften Kontingent — fortsetzbar, sobald
+#     das Budget wieder reicht. Vor dem Start lässt sich schätzen, ob ein Job
+#     noch hineinpasst
+#
+# Beide gelten für alle Aufrufe an dieselbe Quelle: der Eimer für alle Läufe
+# im Prozess, das Budget für alle Prozesse auf derselben Laufdatenbank. Der
+# Zwischenspeicher (antwort_cache.py) liegt davor — eine Antwort aus dem
+# Speicher kostet nichts und wartet auf nichts.
+#
+# Was eine Abfrage kostet und wie viele je Sekunde gehen, weiss der Provider
+# selbst (`kosten_je_abfrage`, `anfragen_je_sekunde`). Das Budget steht in
+# config.py.
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from place_provider import QuelleNichtVerfuegbar, ist_asynchron
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verbrauch (
+  quelle TEXT NOT NULL,
+  monat TEXT NOT NULL,
+  abfragen INTEGER NOT NULL DEFAULT 0,
+  kosten REAL NOT NULL DEFAULT 0,
+  PRIMARY KEY (quelle, monat)
+);
+"""
+
+DATEINAME = 'verbrauch.sqlite'
+
+BUDGET_MELDUNG = (
+    'Das Monatsbudget für {quelle} ist aufgebraucht ({verbraucht:.2f} von '
+    '{budget:.2f} Dollar). Der Lauf wurde gestoppt, bevor die Datenquelle ihn '
+    'stoppt. Bitte das Budget in config.py anheben oder den Lauf im nächsten '
+    'Monat fortsetzen — die bereits verarbeiteten Kunden bleiben erhalten.')
+
+
+def pfad_neben(datenbank_pfad) -> Path:
+    """Die Datei mit dem Verbrauch liegt im Ordner der Laufdatenbank."""
+    return Path(datenbank_pfad).parent / DATEINAME
+
+
+def dieser_monat() -> str:
+    return time.strftime('%Y-%m')
+
+
+# ==========================================================================
+# Anfragen je Sekunde
+# ==========================================================================
+
+class Eimer:
+    """
+    Ein Eimer mit Marken: `je_sekunde` tropfen nach, höchstens `vorrat`
+    liegen bereit. Wer keine Marke findet, reserviert die nächste und wartet
+    auf sie — so bedienen sich wartende Arbeiter der Reihe nach.
+    """
+
+    def __init__(self, je_sekunde: float, vorrat: int = 1, uhr=time.monotonic):
+        if je_sekunde <= 0:
+            raise ValueError('Ein Eimer braucht mindestens eine Anfrage je Sekunde '
+                             'oder einen Bruchteil davon.')
+        self.je_sekunde = float(je_sekunde)
+        self.vorrat = max(1, int(vorrat))
+        self._uhr = uhr
+        self._sperre = threading.Lock()
+        self._marken = float(self.vorrat)
+        self._zuletzt = uhr()
+        self.gewartet = 0.0
+
+    def reservieren(self) -> float:
+        """Nimmt eine Marke. Liefert die Sekunden, bis sie da ist."""
+        with self._sperre:
+            jetzt = self._uhr()
+            self._marken = min(float(self.vorrat),
+                               self._marken + (jetzt - self._zuletzt) * self.je_sekunde)
+            self._zuletzt = jetzt
+            self._marken -= 1
+            warten = -self._marken / self.je_sekunde if self._marken < 0 else 0.0
+            self.gewartet += warten
+            return warten
+
+    def nehmen(self) -> None:
+        warten = self.reservieren()
+        if warten > 0:
+            time.sleep(warten)
+
+    async def nehmen_async(self) -> None:
+        warten = self.reservieren()
+        if warten > 0:
+            await asyncio.sleep(warten)
+
+
+# Ein Eimer je Quelle und Prozess — alle Läufe teilen ihn.
+_EIMER = {}
+_EIMER_SPERRE = threading.Lock()
+
+
+def eimer_fuer(quelle: str, je_sekunde: float) -> Eimer:
+    with _EIMER_SPERRE:
+        eimer = _EIMER.get(quelle)
+        if eimer is None or eimer.je_sekunde != je_sekunde:
+            eimer = _EIMER[quelle] = Eimer(je_sekunde)
+        return eimer
+
+
+# ==========================================================================
+# Kosten je Monat
+# ==========================================================================
+
+class Budget:
+    """
+    Was eine Quelle in diesem Monat gekostet hat, und wie viel sie darf.
+
+    Gebucht wird vor dem Aufruf: eine Abfrage, die scheitert, hat bei der
+    Datenquelle meist trotzdem gekostet, und lieber eine zu viel gezählt als
+    eine zu viel bezahlt. `monatlich` 0 heisst: kein Budget, nur zählen.
+    """
+
+    def __init__(self, pfad: str, quelle: str, monatlich: float,
+                 kosten_je_abfrage: float, monat=dieser_monat):
+        self.pfad = str(pfad)
+        self.quelle = quelle
+        self.monatlich = max(0.0, float(monatlich or 0))
+        self.kosten_je_abfrage = max(0.0, float(kosten_je_abfrage or 0))
+        self._monat = monat
+
+        if self.pfad != ':memory:':
+            Path(self.pfad).parent.mkdir(parents=True, exist_ok=True)
+        # Wie beim Zwischenspeicher: eine Verbindung mit Sperre für alle
+        # Arbeiter. Mehrere Prozesse schützt die Transaktion beim Buchen.
+        self._sperre = threading.Lock()
+        self.verbindung = sqlite3.connect(self.pfad, timeout=10,
+                                          check_same_thread=False,
+                                          isolation_level=None)
+        if self.pfad != ':memory:':
+            self.verbindung.execute('PRAGMA journal_mode = WAL')
+            self.verbindung.execute('PRAGMA busy_timeout = 10000')
+        self.verbindung.executescript(SCHEMA)
+
+    def schliessen(self) -> None:
+        with self._sperre:
+            self.verbindung.close()
+
+    def _gebucht(self) -> tuple:
+        zeile = self.verbindung.execute(
+            'SELECT abfragen, kosten FROM verbrauch WHERE quelle = ? AND monat = ?',
+            (self.quelle, self._monat())).fetchone()
+        return zeile or (0, 0.0)
+
+    def verbraucht(self) -> float:
+        with self._sperre:
+            return self._gebucht()[1]
+
+    def rest(self) -> float | None:
+        """Was in diesem Monat noch bleibt. None ohne Budget."""
+        if not self.monatlich:
+            return None
+        return max(0.0, self.monatlich - self.verbraucht())
+
+    def belasten(self, abfragen: int = 1) -> None:
+        """
+        Bucht die Kosten von `abfragen` Abfragen. Sprengen sie das Budget, wird
+        nichts gebucht und der Lauf endet (QuelleNichtVerfuegbar, endgültig).
+        """
+        kosten = abfragen * self.kosten_je_abfrage
+        with self._sperre:
+            self.verbindung.execute('BEGIN IMMEDIATE')
+            try:
+                bisher_abfragen, bisher_kosten = self._gebucht()
+                if self.monatlich and bisher_kosten + kosten > self.monatlich + 1e-9:
+                    raise QuelleNichtVerfuegbar(BUDGET_MELDUNG.format(
+                        quelle=self.quelle.capitalize(), verbraucht=bisher_kosten,
+                        budget=self.monatlich))
+                self.verbindung.execute(
+                    'INSERT OR REPLACE INTO verbrauch (quelle, monat, abfragen, kosten) '
+                    'VALUES (?, ?, ?, ?)',
+                    (self.quelle, self._monat(), bisher_abfragen + abfragen,
+                     bisher_kosten + kosten))
+                self.verbindung.execute('COMMIT')
+            except BaseException:
+                self.verbindung.execute('ROLLBACK')
+                raise
+
+    def schaetzen(self, abfragen: int) -> dict:
+        """Was `abfragen` Abfragen kosten würden, und ob sie noch hineinpassen."""
+        kosten = abfragen * self.kosten_je_abfrage
+        rest = self.rest()
+        return {'abfragen': abfragen, 'kosten': kosten, 'rest': rest,
+                'passt': rest is None or kosten <= rest + 1e-9}
+
+
+def schaetzung_als_text(quelle: str, schaetzung: dict) -> str:
+    text = (f'Geschätzte Kosten bei {quelle.capitalize()}: höchstens {schaetzung["kosten"]:.2f} '
+            f'Dollar für {schaetzung["abfragen"]} Abfragen')
+    if schaetzung['rest'] is None:
+        return text + ' (kein Monatsbudget eingestellt).'
+    text += f', im Budget bleiben {schaetzung["rest"]:.2f} Dollar.'
+    if not schaetzung['passt']:
+        text += (' Das reicht nicht. Der Lauf würde vor dem Ende gestoppt; '
+                 'bitte das Budget in config.py anheben oder eine kleinere Datei '
+                 'starten. Antworten aus dem Zwischenspeicher kosten nichts — '
+                 'die tatsächlichen Kosten können also niedriger liegen.')
+    return text
+
+
+# ==========================================================================
+# Der Provider dahinter
+# ==========================================================================
+
+class GedrosselterProvider:
+    """
+    Legt Eimer und Budget vor einen Provider. Nach aussen ein gewöhnlicher
+    Provider (02_DATENVERTRAG.md §7); `fetch_by_texts` gibt es nur, wenn der
+    Provider dahinter es hat — der Lauf entscheidet danach, ob er stapelt.
+    """
+
+    def __init__(self, provider, eimer: Eimer = None, budget: Budget = None):
+        self.provider = provider
+        self.eimer = eimer
+        self.budget = budget
+        if hasattr(provider, 'fetch_by_texts'):
+            self.fetch_by_texts = self._stapel_holen
+
+    def _vorher(self, abfragen: int = 1) -> None:
+        if self.budget is not None:
+            self.budget.belasten(abfragen)
+        if self.eimer is not None:
+            self.eimer.nehmen()
+
+    def fetch_by_text(self, search_string: str, plz: str) -> list:
+        self._vorher()
+        return self.provider.fetch_by_text(search_string, plz)
+
+    def fetch_by_id(self, place_id: str):
+        self._vorher()
+        return self.provider.fetch_by_id(place_id)
+
+    def _stapel_holen(self, anfragen: list) -> list:
+        # Ein Aufruf, aber jeder Suchbegriff kostet.
+        if self.budget is not None:
+            self.budget.belasten(len(anfragen))
+        if self.eimer is not None:
+            self.eimer.nehmen()
+        return self.provider.fetch_by_texts(anfragen)
+
+    def abbrechen(self):
+        abbrechen_beim_provider = getattr(self.provider, 'abbrechen', None)
+        if callable(abbrechen_beim_provider):
+            return abbrechen_beim_provider()
+        return 0
+
+
+class AsynchronGedrosselterProvider(GedrosselterProvider):
+    """Dasselbe vor einem Provider mit `async def`: gewartet wird ohne Thread."""
+
+    async def _vorher_async(self) -> None:
+        if self.budget is not None:
+            self.budget.belasten(1)
+        if self.eimer is not None:
+            await self.eimer.nehmen_async()
+
+    async def fetch_by_text(self, search_string: str, plz: str) -> list:
+        await self._vorher_async()
+        return await self.provider.fetch_by_text(search_string, plz)
+
+    async def fetch_by_id(self, place_id: str):
+        await self._vorher_async()
+        return await self.provider.fetch_by_id(place_id)
+
+
+def budget_von(provider) -> Budget | None:
+    """Das Budget irgendwo in der Kette der vorgelegten Provider."""
+    while provider is not None:
+        budget = getattr(provider, 'budget', None)
+        if isinstance(budget, Budget):
+            return budget
+        provider = getattr(provider, 'provider', None)
+    return None
+
+
+def davorlegen(provider, datenbank_pfad, quelle: str, monatsbudget: float = 0):
+    """
+    Der Provider mit Eimer und Budget. Die Grenzen nennt der Provider selbst;
+    nennt er keine und gibt es kein Budget, bleibt er, wie er ist.
+    """
+    je_sekunde = getattr(provider, 'anfragen_je_sekunde', 0) or 0
+    kosten = getattr(provider, 'kosten_je_abfrage', 0) or 0
+    if not je_sekunde and not kosten and not monatsbudget:
+        return provider
+    eimer = eimer_fuer(quelle, je_sekunde) if je_sekunde else None
+    budget = Budget(pfad_neben(datenbank_pfad), quelle, monatsbudget, kosten)
+    klasse = AsynchronGedrosselterProvider if ist_asynchron(provider) \
+        else GedrosselterProvider
+    return klasse(provider, eimer, budget)
+
+
+def monatsbudget_aus_konfiguration(quelle: str) -> float:
+    """`<QUELLE>_MONATSBUDGET_USD` aus config.py, 0 ohne Eintrag."""
+    try:
+        import config
+    except ImportError:
+        return 0.0
+    return float(getattr(config, f'{quelle.upper()}_MONATSBUDGET_USD', 0) or 0)
@@ -0,0 +1,77 @@
+# eingabe.py
+# Die Eingabedatei blockweise lesen statt in einem Stück.
+#
+# Lauf und Upload-Prüfung haben die Datei bisher je einmal ganz geladen, der
+# Lauf dazu noch einmal als eine Gruppe je Kunde, die Prüfung zusätzlich als
+# Text. Der Speicher wuchs damit mit der Datei — bei 10'000 Zeilen egal, bei
+# einigen Hunderttausend nicht mehr.
+#
+# Hier wird die Datei in Blöcken von `BLOCK_ZEILEN` Zeilen gelesen. Im
+# Speicher liegt jeweils ein Block und die Menge der schon gesehenen
+# Kundennummern. Es gelten dieselben Regeln wie vorher:
+#   - alles ist Text, leere Felder sind '' (dtype=str, fillna(''))
+#   - kommt eine KundenNr mehrfach vor, zählt die erste Zeile
+#     (02_DATENVERTRAG.md §1), die übrigen werden gezählt und übersprungen
+#   - die Kunden kommen in der Reihenfolge der Datei
+
+from pathlib import Path
+
+import pandas as pd
+
+# So viele Zeilen liest ein Block. Gross genug, dass pandas schnell liest;
+# klein genug, dass ein Block nur wenige Megabyte belegt.
+BLOCK_ZEILEN = 5_000
+
+
+class Eingabedatei:
+    """
+    Eine Eingabedatei, die sich Block für Block oder Kunde für Kunde lesen
+    lässt.
+
+    Die Kopfzeile wird sofort gelesen — eine Datei, die sich gar nicht lesen
+    lässt, fällt also schon beim Anlegen auf. `zeilen` und `doppelte` stehen
+    erst fest, wenn einmal bis zum Ende gelesen wurde.
+    """
+
+    def __init__(self, pfad, block_zeilen: int = None):
+        self.pfad = Path(pfad)
+        self.block_zeilen = max(1, int(block_zeilen or BLOCK_ZEILEN))
+        self.spalten = list(pd.read_csv(self.pfad, sep=';', encoding='utf-8-sig',
+                                        dtype=str, nrows=0).columns)
+        self.zeilen = 0
+        self.doppelte = 0
+
+    def bloecke(self):
+        """Die Datenzeilen in Blöcken, jeder ein DataFrame ohne fehlende Werte."""
+        self.zeilen = 0
+        with pd.read_csv(self.pfad, sep=';', encoding='utf-8-sig', dtype=str,
+                         chunksize=self.block_zeilen) as leser:
+            for block in leser:
+                self.zeilen += len(block)
+                yield block.fillna('')
+
+    def kunden(self):
+        """
+        Je Kunde ein Paar (KundenNr, Stammdaten als dict), die erste Zeile
+        einer KundenNr gewinnt.
+        """
+        gesehen = set()
+        self.doppelte = 0
+        for block in self.bloecke():
+            for zeile in block.to_dict('records'):
+                kunden_nr = str(zeile.get('KundenNr', ''))
+                if kunden_nr in gesehen:
+                    self.doppelte += 1
+                    continue
+                gesehen.add(kunden_nr)
+                yield kunden_nr, zeile
+
+
+def rohzeilen(pfad):
+    """
+    Die Textzeilen der Datei, eine nach der anderen — dieselbe Zerlegung wie
+    `read_text().splitlines()`, ohne die ganze Datei zu halten.
+    """
+    with open(pfad, encoding='utf-8-sig') as datei:
+        for zeile in datei:
+            yield from zeile.splitlines()
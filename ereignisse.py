@@ -0,0 +1,78 @@
+# ereignisse.py
+# Der Lauf meldet, dass sich sein Stand geändert hat; die Statusanzeige hört zu.
+#
+# Bisher hat jede offene Statusseite alle 5 Sekunden nachgefragt, und jede
+# Nachfrage hat die Datenbank geöffnet und drei Abfragen gestellt — auch wenn
+# sich nichts getan hatte, und für jeden offenen Tab noch einmal.
+#
+# Hier steht je Job nur eine Zahl, die bei jeder Änderung um eins wächst. Wer
+# zuhört, wartet darauf, dass sie grösser wird, und liest den Stand dann selbst
+# (webapp.py, einmal für alle Tabs). Gemeldet wird erst nach dem Commit: wer
+# nach einer Meldung liest, sieht die Änderung auch.
+#
+# Alles im selben Prozess. Läuft der Lauf anderswo (cli.py), meldet niemand —
+# dann bleibt der Statusseite das Nachfragen wie bisher.
+
+import asyncio
+import threading
+
+
+class Ereignisbus:
+    """Je Job ein Zähler der Änderungen, und wer darauf wartet."""
+
+    def __init__(self):
+        self._sperre = threading.Lock()
+        self._staende = {}
+        self._wartende = {}
+
+    def melden(self, job_id: int) -> None:
+        """Der Stand des Jobs hat sich geändert. Aus jedem Thread aufrufbar."""
+        with self._sperre:
+            self._staende[job_id] = self._staende.get(job_id, 0) + 1
+            wartende = list(self._wartende.get(job_id, ()))
+        for schleife, ereignis in wartende:
+            try:
+                schleife.call_soon_threadsafe(ereignis.set)
+            except RuntimeError:
+                # Die Ereignisschleife ist schon zu; da wartet niemand mehr.
+                pass
+
+    def stand(self, job_id: int) -> int:
+        """Wie oft sich der Job bisher geändert hat, seit der Prozess läuft."""
+        with self._sperre:
+            return self._staende.get(job_id, 0)
+
+    async def abwarten(self, job_id: int, gesehen: int, timeout: float) -> int:
+        """
+        Wartet, bis der Stand grösser als `gesehen` ist, höchstens `timeout`
+        Sekunden. Liefert den Stand — nach Ablauf der Frist denselben wie vorher.
+        """
+        eintrag = (asyncio.get_running_loop(), asyncio.Event())
+        with self._sperre:
+            if self._staende.get(job_id, 0) > gesehen:
+                return self._staende[job_id]
+            self._wartende.setdefault(job_id, set()).add(eintrag)
+        try:
+            await asyncio.wait_for(eintrag[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._sperre:
+                wartende = self._wartende.get(job_id)
+                wartende.discard(eintrag)
+                if not wartende:
+                    del self._wartende[job_id]
+        return self.stand(job_id)
+
+    def zuhoerer(self, job_id: int) -> int:
+        """Wie viele gerade auf diesen Job warten."""
+        with self._sperre:
+            return len(self._wartende.get(job_id, ()))
+
+
+# Der eine Bus des Prozesses.
+BUS = Ereignisbus()
+
+
+def melden(job_id: int) -> None:
+    BUS.melden(job_id)
@@ -0,0 +1,101 @@
+# fenstersteuerung.py
+# Wie viele Abfragen gleichzeitig unterwegs sind — angepasst statt geraten.
+#
+# STANDARD_ARBEITER = 6 ist eine feste Schätzung. Apify nimmt manchmal mehr
+# parallele Läufe an, manchmal drosselt es; die Drosselung kommt als Fehler
+# zurück und zählt zu den zehn Fehlschlägen hintereinander. Die Steuerung
+# folgt dem bekannten Muster «additiv wachsen, multiplikativ schrumpfen»:
+#
+#   - kommt ein ganzes Fenster voll Antworten ohne Fehler zurück und ist die
+#     Antwortzeit nicht aus dem Ruder gelaufen, darf eine Abfrage mehr
+#     gleichzeitig laufen
+#   - scheitert eine Abfrage oder läuft in die Frist, wird das Fenster
+#     halbiert. Die Abfragen, die zu diesem Zeitpunkt schon unterwegs waren,
+#     halbieren es nicht noch einmal — sie wurden unter dem alten Fenster
+#     gestellt
+#
+# Jede Änderung wird mit Grund festgehalten, damit nach einem Lauf ablesbar
+# ist, warum er langsamer wurde.
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Geschätzt, nicht gemessen: so viel langsamer als die beste bisher gesehene
+# Antwortzeit darf es werden, bevor das Fenster nicht mehr wächst.
+LATENZ_TOLERANZ = 2.0
+
+# Gewicht der neuesten Antwortzeit im gleitenden Mittel.
+GLAETTUNG = 0.2
+
+
+class Fenstersteuerung:
+    """Hält die Fenstergrösse und entscheidet nach jeder Antwort über sie."""
+
+    def __init__(self, start: int, minimum: int = 1, maximum: int = None):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum if maximum is not None
+                                             else start * 4))
+        self.fenster = min(self.maximum, max(self.minimum, int(start)))
+        self.mittel = None
+        self.bestwert = None
+        self._erfolge = 0
+        self._ruhe = 0
+        self._gebremst = False
+        self.entscheide = [(self.fenster, f'Start mit {self.fenster} gleichzeitig')]
+
+    def erfolg(self, dauer_sekunden: float) -> str | None:
+        """
+        Eine Antwort ist zurückgekommen. Liefert den Grund, wenn eine
+        Entscheidung fällt (erhöht oder gehalten), sonst None.
+        """
+        self.mittel = (dauer_sekunden if self.mittel is None
+                       else GLAETTUNG * dauer_sekunden + (1 - GLAETTUNG) * self.mittel)
+        if self._ruhe:
+            self._ruhe -= 1
+            return None
+
+        self._erfolge += 1
+        if self._erfolge < self.fenster:
+            return None
+        self._erfolge = 0
+
+        if self.bestwert is None or self.mittel < self.bestwert:
+            self.bestwert = self.mittel
+        if self.mittel > self.bestwert * LATENZ_TOLERANZ:
+            if self._gebremst:
+                return None
+            self._gebremst = True
+            return self._festhalten(
+                self.fenster, f'gehalten: Antwortzeit {self.mittel:.1f} s statt '
+                              f'{self.bestwert:.1f} s')
+        self._gebremst = False
+
+        if self.fenster >= self.maximum:
+            return None
+        return self._festhalten(
+            self.fenster + 1, f'erhöht: {self.fenster} Antworten ohne Fehler, '
+                              f'Antwortzeit {self.mittel:.1f} s')
+
+    def fehlschlag(self) -> str | None:
+        """
+        Eine Abfrage ist gescheitert oder in die Frist gelaufen. Liefert den
+        Grund, wenn sich das Fenster dadurch ändert, sonst None.
+        """
+        self._erfolge = 0
+        if self._ruhe:
+            self._ruhe -= 1
+            return None
+        neu = max(self.minimum, self.fenster // 2)
+        # Was jetzt noch unterwegs ist, wurde unter dem alten Fenster gestellt.
+        self._ruhe = self.fenster - 1
+        if neu == self.fenster:
+            return None
+        return self._festhalten(neu, 'halbiert: Abfrage gescheitert oder '
+                                     'Frist überschritten')
+
+    def _festhalten(self, neu: int, grund: str) -> str:
+        self.fenster = neu
+        self.entscheide.append((neu, grund))
+        logger.info(f'Gleichzeitige Abfragen: {neu} ({grund}).')
+        return grund
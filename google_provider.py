@@ -13,10 +13,22 @@
 # andere Fehlschlag ist keine Aussage über den Kunden und wird als
 # `QuelleNichtVerfuegbar` weitergereicht — sonst würde ein Netzausfall dem
 # Sachbearbeiter melden, sein Kunde sei bei Google gelöscht worden.
+#
+# Alle Arbeiter eines Laufs teilen eine Sitzung. Ihr Verbindungsvorrat ist so
+# gross wie die Zahl der Arbeiter: jeder behält seine Verbindung offen und
+# fragt über sie weiter, statt für jeden Abruf neu zu verbinden und TLS neu
+# auszuhandeln. Wo die Zeit eines Abrufs bleibt — Verbinden, TLS, Server,
+# Lesen — hält die `Zeitmessung` fest.
 
 import logging
+import threading
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
 
 from place_provider import Candidate, QuelleNichtVerfuegbar
 
@@ -28,6 +40,21 @@ BASIS_URL = 'https://places.googleapis.com/v1/places'
 # antwortet in Sekundenbruchteilen; die Frist ist eine Notbremse, kein Richtwert.
 STANDARD_TIMEOUT_SEKUNDEN = 30
 
+# So viele offene Verbindungen wie der Lauf standardmässig Arbeiter hat
+# (pipeline.STANDARD_ARBEITER). Wer mehr Arbeiter startet, gibt mehr an.
+STANDARD_VERBINDUNGEN = 6
+
+# Ein Verbindungsaufbau, der scheitert, hat Google nie erreicht und wird einmal
+# wiederholt. Alles nach dem Absenden nicht: das zählt die Pipeline.
+WIEDERHOLUNGEN = Retry(total=1, connect=1, read=0, redirect=0, status=0,
+                       other=0, raise_on_status=False)
+
+# Für die Drosselung (drosselung.py). Place Details mit Kontaktfeldern, nach
+# der Preisliste von Google; massgebend ist die Rechnung. Die Places API lässt
+# 600 Anfragen je Minute zu — gefragt wird mit etwas Abstand darunter.
+KOSTEN_JE_ABRUF_USD = 0.02
+ANFRAGEN_JE_SEKUNDE = 8
+
 # Nur diese Felder werden geholt. Die Reihenfolge folgt Candidate.
 FELDMASKE = ','.join([
     'id',
@@ -83,13 +110,20 @@ ORT = 'locality'
 class GoogleProvider:
     """Holt einen Betrieb über seine gespeicherte Google-ID (Modus B)."""
 
+    anfragen_je_sekunde = ANFRAGEN_JE_SEKUNDE
+    kosten_je_abfrage = KOSTEN_JE_ABRUF_USD
+
     def __init__(self, api_key: str,
                  timeout_sekunden: float = STANDARD_TIMEOUT_SEKUNDEN,
-                 sprache: str = 'de'):
+                 sprache: str = 'de', verbindungen: int = STANDARD_VERBINDUNGEN,
+                 basis_url: str = BASIS_URL):
         self.api_key = api_key
         self.timeout_sekunden = timeout_sekunden
         self.sprache = sprache
-        self._sitzung = requests.Session()
+        self.verbindungen = max(1, int(verbindungen))
+        self.basis_url = basis_url.rstrip('/')
+        self.zeitmessung = Zeitmessung()
+        self._sitzung = sitzung_bauen(self.verbindungen)
 
     # ------------------------------------------------------------------
     # Schnittstelle
@@ -114,9 +148,11 @@ class GoogleProvider:
         if not kennung:
             return None
 
+        _abruf.phasen = {'verbinden': 0.0, 'tls': 0.0, 'neu': 0}
+        beginn = time.perf_counter()
         try:
             antwort = self._sitzung.get(
-                f'{BASIS_URL}/{kennung}',
+                f'{self.basis_url}/{kennung}',
                 headers={'X-Goog-Api-Key': self.api_key,
                          'X-Goog-FieldMask': FELDMASKE},
                 params={'languageCode': self.sprache},
@@ -124,6 +160,10 @@ class GoogleProvider:
         except requests.RequestException as fehler:
             logger.error(f'Google nicht erreichbar für "{kennung}": {fehler}')
             raise QuelleNichtVerfuegbar(NETZ_MELDUNG, endgueltig=False) from fehler
+        finally:
+            phasen, _abruf.phasen = _abruf.phasen, None
+        self.zeitmessung.erfassen(phasen, time.perf_counter() - beginn,
+                                  getattr(antwort, 'elapsed', None))
 
         if antwort.status_code == 404 or _meldet_nicht_gefunden(antwort):
             logger.info(f'Google kennt die Id "{kennung}" nicht mehr.')
@@ -184,6 +224,118 @@ class GoogleProvider:
         )
 
 
+class Zeitmessung:
+    """
+    Wo die Zeit der Abrufe bleibt, aufsummiert über alle Arbeiter.
+
+    Je Abruf vier Abschnitte: `verbinden` (TCP) und `tls` fallen nur an, wenn
+    eine neue Verbindung nötig war; `server` ist die Zeit vom Absenden bis
+    zum Kopf der Antwort, `lesen` der Rest bis zum gelesenen Rumpf.
+    """
+
+    PHASEN = ('verbinden', 'tls', 'server', 'lesen')
+
+    def __init__(self):
+        self._sperre = threading.Lock()
+        self.abrufe = 0
+        self.neue_verbindungen = 0
+        self._summen = dict.fromkeys(self.PHASEN + ('gesamt',), 0.0)
+
+    def erfassen(self, phasen: dict, gesamt: float, bis_kopf=None) -> None:
+        """
+        Ein Abruf. `bis_kopf` ist `Response.elapsed` — requests misst es vom
+        Absenden bis zum Kopf, den Verbindungsaufbau eingeschlossen. Ohne es
+        zählt alles ausser Verbinden und TLS als Server.
+        """
+        aufbau = phasen['verbinden'] + phasen['tls']
+        kopf = bis_kopf.total_seconds() if bis_kopf is not None else gesamt
+        kopf = min(max(kopf, aufbau), gesamt)
+        with self._sperre:
+            self.abrufe += 1
+            self.neue_verbindungen += phasen['neu']
+            self._summen['verbinden'] += phasen['verbinden']
+            self._summen['tls'] += phasen['tls']
+            self._summen['server'] += kopf - aufbau
+            self._summen['lesen'] += gesamt - kopf
+            self._summen['gesamt'] += gesamt
+
+    def zusammenfassung(self) -> dict:
+        """Mittlere Millisekunden je Abschnitt, dazu Abrufe und neue Verbindungen."""
+        with self._sperre:
+            anzahl = self.abrufe
+            mittel = {f'{phase}_ms': (round(summe / anzahl * 1000, 1) if anzahl else 0.0)
+                      for phase, summe in self._summen.items()}
+            return {'abrufe': anzahl, 'neue_verbindungen': self.neue_verbindungen,
+                    **mittel}
+
+
+# Die Abschnitte des Abrufs, der im jeweiligen Thread gerade läuft. urllib3
+# baut eine Verbindung im Thread auf, der sie braucht — dort landet die Zeit.
+_abruf = threading.local()
+
+
+class _Stoppuhr:
+    """Misst Verbindungsaufbau und TLS einer urllib3-Verbindung."""
+
+    _tcp = 0.0
+
+    def _new_conn(self):
+        beginn = time.perf_counter()
+        sock = super()._new_conn()
+        self._tcp = time.perf_counter() - beginn
+        return sock
+
+    def connect(self):
+        self._tcp = 0.0
+        beginn = time.perf_counter()
+        super().connect()
+        dauer = time.perf_counter() - beginn
+        phasen = getattr(_abruf, 'phasen', None)
+        if phasen is not None:
+            phasen['verbinden'] += self._tcp
+            phasen['tls'] += max(0.0, dauer - self._tcp)
+            phasen['neu'] += 1
+
+
+class _HTTPVerbindung(_Stoppuhr, HTTPConnection):
+    pass
+
+
+class _HTTPSVerbindung(_Stoppuhr, HTTPSConnection):
+    pass
+
+
+class _HTTPVorrat(HTTPConnectionPool):
+    ConnectionCls = _HTTPVerbindung
+
+
+class _HTTPSVorrat(HTTPSConnectionPool):
+    ConnectionCls = _HTTPSVerbindung
+
+
+class _GemessenerAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _HTTPVorrat,
+                                                   'https': _HTTPSVorrat}
+
+
+def sitzung_bauen(verbindungen: int = STANDARD_VERBINDUNGEN) -> requests.Session:
+    """
+    Eine Sitzung, die `verbindungen` Verbindungen offen hält.
+
+    Der Vorrat von requests fasst sonst zehn; was darüber hinaus gleichzeitig
+    fragt, bekommt eine Verbindung, die danach weggeworfen wird — bei mehr
+    Arbeitern als zehn wird so jeder Abruf ein neuer Verbindungsaufbau.
+    """
+    sitzung = requests.Session()
+    adapter = _GemessenerAdapter(pool_connections=1, pool_maxsize=verbindungen,
+                                 max_retries=WIEDERHOLUNGEN)
+    sitzung.mount('https://', adapter)
+    sitzung.mount('http://', adapter)
+    return sitzung
+
+
 def _meldet_nicht_gefunden(antwort) -> bool:
     """
     Sagt Google im Text der Antwort, dass es die Id nicht kennt?
@@ -242,9 +394,11 @@ def _oeffnungszeiten(rohdaten: dict) -> str:
     return str(zeiten) if zeiten else ''
 
 
-def aus_konfiguration(timeout_sekunden: float = STANDARD_TIMEOUT_SEKUNDEN):
+def aus_konfiguration(timeout_sekunden: float = STANDARD_TIMEOUT_SEKUNDEN,
+                      verbindungen: int = STANDARD_VERBINDUNGEN):
     """
-    Baut den Provider aus dem Schlüssel in der Konfiguration.
+    Baut den Provider aus dem Schlüssel in der Konfiguration. `verbindungen`
+    ist die Zahl der Arbeiter, die höchstens gleichzeitig fragen.
 
     Fehlt er, ist das ein Fehler mit einer Meldung, die sagt, was zu tun ist —
     kein Stacktrace.
@@ -256,4 +410,5 @@ def aus_konfiguration(timeout_sekunden: float = STANDARD_TIMEOUT_SEKUNDEN):
         raise ValueError(
             'In der Datei .env fehlt der Eintrag GOOGLE_API_KEY. '
             'Ohne ihn ist das Auffrischen über die Google-ID nicht möglich.')
-    return GoogleProvider(schluessel, timeout_sekunden=timeout_sekunden)
+    return GoogleProvider(schluessel, timeout_sekunden=timeout_sekunden,
+                          verbindungen=verbindungen)
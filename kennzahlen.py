@@ -0,0 +1,176 @@
+# kennzahlen.py
+# Wo die Zeit eines Laufs bleibt — gemessen im Lauf selbst, nicht nur im
+# Messlauf.
+#
+# Ist ein Lauf langsam, kann es an vielem liegen: an der Datenquelle, an der
+# Übergabe in den Thread, der die Frist überwacht (`Lauf._mit_frist`), am
+# Scoring oder an den Commits in SQLite. Der Lauf misst deshalb jede dieser
+# Stufen und zählt Zeitüberschreitungen, Fehlschläge und Antworten aus dem
+# Zwischenspeicher.
+#
+# Gesammelt wird in Histogrammen mit festen Grenzen: die Messung kostet je
+# Kunde eine Handvoll Additionen, und der Speicher wächst nicht mit dem Lauf.
+# Zwei Stellen lesen sie:
+#   - am Ende jedes Durchgangs eine Zusammenfassung je Job in der Tabelle
+#     `job_kennzahl` (db.py)
+#   - fortlaufend über alle Läufe des Prozesses der Endpunkt /metrics der
+#     Weboberfläche, im Textformat von Prometheus
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Obere Grenzen der Histogramm-Fächer in Sekunden, von einer halben
+# Millisekunde (ein Kunde in die Datenbank) bis zur Frist einer Abfrage.
+GRENZEN = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Die gemessenen Stufen, mit dem Text, den /metrics dazu ausgibt.
+STUFEN = {
+    'abfrage': 'Eine Abfrage an die Datenquelle, mit Frist und Übergabe',
+    'uebergabe': 'Vom Einreichen bis zum Beginn des Aufrufs im Frist-Thread',
+    'quelle': 'Der Aufruf des Providers selbst',
+    'entscheidung': 'Die Entscheidung über einen Kunden (Scoring oder Prüfung)',
+    'datenbank': 'Einen Kunden samt Kandidaten schreiben, Commit eingeschlossen',
+    'festschreiben': 'Gesammelte Kunden festschreiben (Sammelbetrieb)',
+    'ausgabe': 'Einen Kunden an die Ausgabedateien übergeben',
+    'abschluss': 'Die Ausgabedateien abschliessen und ans Ziel legen',
+}
+
+ZAEHLER = {
+    'kunden': 'Entschiedene Kunden',
+    'zeitueberschreitungen': 'Abfragen ohne Antwort innerhalb der Frist',
+    'fehlschlaege': 'Gescheiterte Abfragen, die der Lauf übergangen hat',
+    'zwischenspeicher_treffer': 'Abfragen, die der Zwischenspeicher beantwortet hat',
+    'zwischenspeicher_fehlgriffe': 'Abfragen, die an der Datenquelle gestellt wurden',
+}
+
+PRAEFIX = 'anreicherung'
+
+
+class Histogramm:
+    """Anzahl, Summe, Höchstwert und Fächer nach `GRENZEN`. Ohne eigene Sperre."""
+
+    def __init__(self):
+        self.faecher = [0] * (len(GRENZEN) + 1)
+        self.anzahl = 0
+        self.summe = 0.0
+        self.hoechstens = 0.0
+
+    def beobachten(self, sekunden: float) -> None:
+        self.faecher[bisect.bisect_left(GRENZEN, sekunden)] += 1
+        self.anzahl += 1
+        self.summe += sekunden
+        if sekunden > self.hoechstens:
+            self.hoechstens = sekunden
+
+    def quantil(self, anteil: float) -> float:
+        """
+        Die obere Grenze des Fachs, in dem das Quantil liegt — auf eine Stufe
+        von `GRENZEN` genau. Über der letzten Grenze zählt der Höchstwert.
+        """
+        if not self.anzahl:
+            return 0.0
+        rang = anteil * self.anzahl
+        gezaehlt = 0
+        for grenze, anzahl in zip(GRENZEN, self.faecher):
+            gezaehlt += anzahl
+            if gezaehlt >= rang:
+                return min(grenze, self.hoechstens)
+        return self.hoechstens
+
+
+class Kennzahlen:
+    """
+    Histogramme je Stufe und Zähler, sicher aus mehreren Threads.
+
+    Mit `uebergeordnet` geht jede Messung zusätzlich dorthin — so sammelt
+    jeder Lauf für seinen Job und `PROZESS` für /metrics.
+    """
+
+    def __init__(self, uebergeordnet: 'Kennzahlen' = None):
+        self.uebergeordnet = uebergeordnet
+        self._sperre = threading.Lock()
+        self._stufen = {stufe: Histogramm() for stufe in STUFEN}
+        self._zaehler = dict.fromkeys(ZAEHLER, 0)
+
+    def beobachten(self, stufe: str, sekunden: float) -> None:
+        with self._sperre:
+            self._stufen[stufe].beobachten(sekunden)
+        if self.uebergeordnet is not None:
+            self.uebergeordnet.beobachten(stufe, sekunden)
+
+    @contextmanager
+    def messen(self, stufe: str):
+        beginn = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.beobachten(stufe, time.perf_counter() - beginn)
+
+    def zaehlen(self, name: str, anzahl: int = 1) -> None:
+        if not anzahl:
+            return
+        with self._sperre:
+            self._zaehler[name] += anzahl
+        if self.uebergeordnet is not None:
+            self.uebergeordnet.zaehlen(name, anzahl)
+
+    def zaehler(self, name: str) -> int:
+        with self._sperre:
+            return self._zaehler[name]
+
+    def zusammenfassung(self) -> list:
+        """
+        Eine Zeile je Stufe mit Messungen und je Zähler über null — so, wie
+        sie in `job_kennzahl` stehen. Zähler haben keine Zeiten.
+        """
+        with self._sperre:
+            zeilen = [{'name': stufe, 'anzahl': werte.anzahl,
+                       'summe_sekunden': round(werte.summe, 6),
+                       'p50_sekunden': werte.quantil(0.50),
+                       'p95_sekunden': werte.quantil(0.95),
+                       'hoechstens_sekunden': round(werte.hoechstens, 6)}
+                      for stufe, werte in self._stufen.items() if werte.anzahl]
+            zeilen += [{'name': name, 'anzahl': anzahl, 'summe_sekunden': None,
+                        'p50_sekunden': None, 'p95_sekunden': None,
+                        'hoechstens_sekunden': None}
+                       for name, anzahl in self._zaehler.items() if anzahl]
+        return zeilen
+
+    def als_prometheus(self) -> str:
+        """Alles im Textformat von Prometheus (Fassung 0.0.4)."""
+        name = f'{PRAEFIX}_stufe_sekunden'
+        zeilen = [f'# HELP {name} Dauer je Stufe eines Laufs. '
+                  + ' '.join(f'{stufe}: {text}.' for stufe, text in STUFEN.items()),
+                  f'# TYPE {name} histogram']
+        with self._sperre:
+            for stufe, werte in self._stufen.items():
+                kumuliert = 0
+                for grenze, anzahl in zip(GRENZEN, werte.faecher):
+                    kumuliert += anzahl
+                    zeilen.append(f'{name}_bucket{{stufe="{stufe}",le="{grenze:g}"}} '
+                                  f'{kumuliert}')
+                zeilen.append(f'{name}_bucket{{stufe="{stufe}",le="+Inf"}} {werte.anzahl}')
+                zeilen.append(f'{name}_sum{{stufe="{stufe}"}} {werte.summe:.6f}')
+                zeilen.append(f'{name}_count{{stufe="{stufe}"}} {werte.anzahl}')
+            for zaehler, text in ZAEHLER.items():
+                zeilen += [f'# HELP {PRAEFIX}_{zaehler}_total {text}.',
+                           f'# TYPE {PRAEFIX}_{zaehler}_total counter',
+                           f'{PRAEFIX}_{zaehler}_total {self._zaehler[zaehler]}']
+        return '\n'.join(zeilen) + '\n'
+
+
+# Alle Läufe dieses Prozesses zusammen, für /metrics.
+PROZESS = Kennzahlen()
+
+
+def zwischenspeicher_von(provider) -> dict | None:
+    """Treffer und Fehlgriffe des Zwischenspeichers irgendwo in der Kette, oder None."""
+    while provider is not None:
+        statistik = getattr(provider, 'statistik', None)
+        if callable(statistik):
+            return statistik()
+        provider = getattr(provider, 'provider', None)
+    return None
@@ -0,0 +1,509 @@
+# messlauf.py
+# Wie schnell ist der Lauf? Ein Messlauf gegen erfundene Kunden.
+#
+# Die Tests prüfen, ob der Lauf richtig entscheidet, nicht wie schnell. Der
+# Messlauf erfindet eine Eingabedatei in der gewünschten Grösse samt
+# passender Antworten, lässt einen FakeProvider mit künstlicher Wartezeit und
+# eingestreuten Ausfällen antworten und führt den Lauf von vorn bis hinten
+# aus — mit Datenbank und Ausgabedateien, wie im Betrieb.
+#
+# Gemessen wird je Kunde, wo die Zeit bleibt: Abfrage, Entscheidung,
+# Schreiben in die Datenbank, Schreiben der Ausgabe. Dazu Kunden je Sekunde,
+# der höchste Speicherbedarf und die höchste Zahl Threads. Mit `spalten`
+# schreibt der Lauf auch Parquet (spaltenexport.py), und der Messlauf stellt
+# Schreibzeit und Grösse beider Formate nebeneinander. Das Ergebnis geht
+# als JSON in eine Datei, damit sich Messläufe über die Zeit vergleichen
+# lassen.
+#
+# Alle Kunden sind erfunden: KundenNr ab 9000000, «Muster Laden» als Name.
+# Kein Netz, keine echten Daten.
+
+import functools
+import math
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from data_cleaner import Ausgabeschreiber
+from db import Datenbank
+from fake_provider import FakeProvider
+from pipeline import STANDARD_ARBEITER, Lauf
+from place_provider import Candidate, QuelleNichtVerfuegbar
+from spaltenexport import SpaltenAusgabeschreiber
+
+STANDARD_GROESSEN = (1_000, 10_000, 100_000)
+STANDARD_WARTEZEIT = 'lognormal:5,0.5'
+
+# Die Abschnitte je Kunde, in der Reihenfolge, in der ein Kunde sie durchläuft.
+STUFEN = ('abfrage', 'entscheidung', 'datenbank', 'ausgabe')
+
+AUSFALL_MELDUNG = 'Eingestreuter Ausfall (Messlauf).'
+
+WARTEZEIT_HILFE = ('fest:MS, gleich:VON-BIS oder lognormal:MEDIAN,STREUUNG, '
+                   'alles in Millisekunden')
+
+STRASSEN = ('Hauptstrasse', 'Bahnhofstrasse', 'Dorfstrasse', 'Kirchweg',
+            'Industriestrasse', 'Seestrasse', 'Gartenweg', 'Schulstrasse')
+
+
+# ==========================================================================
+# Wartezeit und Ausfälle
+# ==========================================================================
+
+def verteilung_lesen(text: str):
+    """
+    Aus «fest:20», «gleich:5-50» oder «lognormal:20,0.5» wird eine Funktion,
+    die mit einem `random.Random` eine Wartezeit in Sekunden zieht.
+
+    Lognormal ist die übliche Form echter Antwortzeiten: die meisten nahe am
+    Median, wenige weit darüber.
+    """
+    art, _, werte = str(text).strip().partition(':')
+    try:
+        if art == 'fest':
+            ms = float(werte)
+            if ms >= 0:
+                return lambda zufall: ms / 1000
+        elif art == 'gleich':
+            von, bis = (float(wert) for wert in werte.split('-'))
+            if 0 <= von <= bis:
+                return lambda zufall: zufall.uniform(von, bis) / 1000
+        elif art == 'lognormal':
+            median, streuung = (float(wert) for wert in werte.split(','))
+            if median > 0 and streuung >= 0:
+                mu = math.log(median)
+                return lambda zufall: zufall.lognormvariate(mu, streuung) / 1000
+    except ValueError:
+        pass
+    raise ValueError(f'Die Wartezeit "{text}" ist nicht lesbar. Erlaubt sind '
+                     f'{WARTEZEIT_HILFE}.')
+
+
+class LangsamerProvider:
+    """
+    Ein Provider, der vor jeder Antwort wartet und manchmal ausfällt.
+
+    Ein Ausfall ist ein `QuelleNichtVerfuegbar` zum Weitermachen — der Lauf
+    behandelt ihn wie einen Netzfehler, samt der Grenze von zehn in Folge.
+    """
+
+    def __init__(self, provider, wartezeit, fehlerquote: float = 0.0,
+                 zufall: random.Random = None):
+        if not 0 <= fehlerquote < 1:
+            raise ValueError('Die Fehlerquote liegt zwischen 0 und 1, '
+                             'zum Beispiel 0.02 für zwei Prozent.')
+        self.provider = provider
+        self.wartezeit = wartezeit
+        self.fehlerquote = fehlerquote
+        self.ausfaelle = 0
+        self._zufall = zufall or random.Random()
+        self._sperre = threading.Lock()
+
+    def _warten(self) -> None:
+        with self._sperre:
+            pause = self.wartezeit(self._zufall)
+            faellt_aus = self._zufall.random() < self.fehlerquote
+            self.ausfaelle += faellt_aus
+        time.sleep(pause)
+        if faellt_aus:
+            raise QuelleNichtVerfuegbar(AUSFALL_MELDUNG, endgueltig=False)
+
+    def fetch_by_text(self, search_string: str, plz: str) -> list:
+        self._warten()
+        return self.provider.fetch_by_text(search_string, plz)
+
+    def fetch_by_id(self, place_id: str):
+        self._warten()
+        return self.provider.fetch_by_id(place_id)
+
+
+# ==========================================================================
+# Erfundene Kunden
+# ==========================================================================
+
+def kunden_erfinden(anzahl: int, ordner: Path, modus: str = 'A',
+                    zufall: random.Random = None) -> tuple:
+    """
+    Schreibt eine Eingabedatei mit `anzahl` erfundenen Kunden nach `ordner`
+    und gibt (Pfad, FakeProvider mit den Antworten) zurück.
+
+    Die Antworten sind gemischt wie im Betrieb: die meisten Kunden werden
+    gefunden, manche an anderer Adresse oder doppelt, manche gar nicht — so
+    landen Kunden in allen drei Ausgabedateien.
+    """
+    zufall = zufall or random.Random(0)
+    ordner = Path(ordner)
+    ordner.mkdir(parents=True, exist_ok=True)
+    erfinden = _modus_a if modus == 'A' else _modus_b
+    zeilen, antworten = erfinden(anzahl, zufall)
+    ziel = ordner / f'messlauf_{modus}_{anzahl}.csv'
+    pd.DataFrame(zeilen).to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel, FakeProvider(antworten)
+
+
+def _kunden_nr(n: int) -> str:
+    return str(9_000_000 + n)
+
+
+def _standort(breite: float, laenge: float) -> str:
+    return str({'lat': round(breite, 6), 'lng': round(laenge, 6)})
+
+
+def _modus_a(anzahl: int, zufall: random.Random) -> tuple:
+    zeilen, antworten = [], {}
+    for n in range(anzahl):
+        plz = str(1000 + zufall.randrange(900) * 10)
+        ort = f'Musterdorf {plz[:2]}'
+        name = f'Muster Laden {n}'
+        strasse = f'{zufall.choice(STRASSEN)} {zufall.randint(1, 120)}'
+        suche = f'{name}, {strasse}, {plz} {ort}'
+        zeilen.append({'SearchString': suche, 'PLZ': plz, 'Stadt': ort,
+                       'KundenNr': _kunden_nr(n)})
+
+        def kandidat(titel: str, adresse: str, nummer: int) -> Candidate:
+            return Candidate(title=titel, street=adresse, postal_code=plz, city=ort,
+                             address=f'{adresse}, {plz} {ort}',
+                             place_id=f'PLACE_{n}_{nummer}',
+                             location=_standort(46 + zufall.random() * 1.5,
+                                                6 + zufall.random() * 4))
+
+        wurf = zufall.random()
+        if wurf < 0.60:
+            treffer = [kandidat(name, strasse, 1)]
+        elif wurf < 0.70:
+            # Ein anderer Betrieb an anderer Adresse: unsicher, zur Prüfung.
+            treffer = [kandidat('Kiosk am Platz', f'{zufall.choice(STRASSEN)} 200', 1)]
+        elif wurf < 0.78:
+            # Zwei Filialen, keine an der gesuchten Adresse: zur Prüfung.
+            treffer = [kandidat(name, f'{zufall.choice(STRASSEN)} 201', 1),
+                       kandidat(name, f'{zufall.choice(STRASSEN)} 202', 2)]
+        elif wurf < 0.85:
+            treffer = [kandidat(name, strasse, 1),
+                       kandidat(f'{name} Filiale', f'{zufall.choice(STRASSEN)} 203', 2)]
+        else:
+            treffer = []
+        antworten[(suche, plz)] = treffer
+    return zeilen, antworten
+
+
+def _modus_b(anzahl: int, zufall: random.Random) -> tuple:
+    zeilen, kandidaten = [], []
+    for n in range(anzahl):
+        place_id = f'PLACE_{n}'
+        breite, laenge = 46 + zufall.random() * 1.5, 6 + zufall.random() * 4
+        zeilen.append({'placeId': place_id, 'lat': f'{breite:.6f}',
+                       'lng': f'{laenge:.6f}', 'KundenNr': _kunden_nr(n)})
+        wurf = zufall.random()
+        if wurf >= 0.90:
+            continue  # Die Id kennt Google nicht mehr.
+        if 0.80 <= wurf < 0.85:
+            breite += 0.02  # gut zwei Kilometer daneben
+        kandidaten.append(Candidate(
+            title=f'Muster Laden {n}', street='Hauptstrasse 1', postal_code='5620',
+            city='Musterdorf', place_id=place_id, location=_standort(breite, laenge),
+            permanently_closed=str(0.85 <= wurf < 0.90)))
+    # Der FakeProvider findet Kandidaten über ihre Id, gleich unter welchem
+    # Suchbegriff sie stehen.
+    return zeilen, {('', ''): kandidaten}
+
+
+# ==========================================================================
+# Messen
+# ==========================================================================
+
+class Messwerte:
+    """Die Zeiten je Kunde und Abschnitt, gesammelt aus allen Threads."""
+
+    def __init__(self):
+        self._sperre = threading.Lock()
+        self._werte = {stufe: [] for stufe in STUFEN}
+        self.abschliessen_sekunden = 0.0
+        self.formate = None
+
+    def erfassen(self, stufe: str, sekunden: float) -> None:
+        with self._sperre:
+            self._werte[stufe].append(sekunden)
+
+    def zusammenfassung(self) -> dict:
+        """Je Abschnitt: Anzahl, Median, 95. und 99. Perzentil, Summe."""
+        with self._sperre:
+            werte = {stufe: sorted(liste) for stufe, liste in self._werte.items()}
+        return {stufe: {'anzahl': len(liste),
+                        'p50_ms': _ms(perzentil(liste, 0.50)),
+                        'p95_ms': _ms(perzentil(liste, 0.95)),
+                        'p99_ms': _ms(perzentil(liste, 0.99)),
+                        'summe_s': round(sum(liste), 3)}
+                for stufe, liste in werte.items()}
+
+
+def perzentil(sortiert: list, anteil: float) -> float:
+    """Der Wert, unter oder auf dem `anteil` der Messungen liegen (nächster Rang)."""
+    if not sortiert:
+        return 0.0
+    return sortiert[max(0, math.ceil(anteil * len(sortiert)) - 1)]
+
+
+def _ms(sekunden: float) -> float:
+    return round(sekunden * 1000, 3)
+
+
+# Wie lange der Kunde, den dieser Thread gerade entscheidet, in der Datenbank
+# stand — die Entscheidung ist der Rest.
+_kunde = threading.local()
+
+
+class GemesseneDatenbank(Datenbank):
+    """
+    Misst das Schreiben eines Kunden samt Kandidaten, den Commit eingeschlossen.
+
+    Mit `sammel_kunden` über 1 fällt der Commit seltener und ausserhalb des
+    einzelnen Kunden; er steckt dann nur in den Kunden je Sekunde.
+    """
+
+    def __init__(self, *args, messwerte: Messwerte, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messwerte = messwerte
+
+    def kunde_mit_kandidaten_schreiben(self, *args, **kwargs):
+        beginn = time.perf_counter()
+        try:
+            return super().kunde_mit_kandidaten_schreiben(*args, **kwargs)
+        finally:
+            dauer = time.perf_counter() - beginn
+            _kunde.datenbank = getattr(_kunde, 'datenbank', 0.0) + dauer
+            self.messwerte.erfassen('datenbank', dauer)
+
+
+class GemessenerAusgabeschreiber(Ausgabeschreiber):
+    def __init__(self, ziel_ordner: str, messwerte: Messwerte, **kwargs):
+        super().__init__(ziel_ordner, **kwargs)
+        self.messwerte = messwerte
+
+    def anhaengen(self, ablage: dict) -> None:
+        beginn = time.perf_counter()
+        super().anhaengen(ablage)
+        self.messwerte.erfassen('ausgabe', time.perf_counter() - beginn)
+
+    def abschliessen(self) -> dict:
+        beginn = time.perf_counter()
+        dateien = super().abschliessen()
+        self.messwerte.abschliessen_sekunden = time.perf_counter() - beginn
+        return dateien
+
+
+class GemessenerSpaltenschreiber(GemessenerAusgabeschreiber, SpaltenAusgabeschreiber):
+    """Dazu die Parquet-Dateien, und am Ende beide Formate im Vergleich."""
+
+    def abschliessen(self) -> dict:
+        dateien = super().abschliessen()
+        self.messwerte.formate = formate_vergleichen(self.schreibzeit, dateien,
+                                                     self.spaltendateien)
+        return dateien
+
+
+def formate_vergleichen(schreibzeit: dict, csv: dict, parquet: dict) -> dict:
+    """Schreibzeit und Grösse der vier Ausgabedateien, je Format."""
+    return {format_: {'schreiben_ms': _ms(schreibzeit[format_]),
+                      'kb': round(sum(Path(pfad).stat().st_size
+                                      for pfad in pfade.values()) / 1024, 1)}
+            for format_, pfade in (('csv', csv), ('parquet', parquet))}
+
+
+class GemessenerLauf(Lauf):
+    """Der Lauf, wie er ist — mit einer Stoppuhr an jedem Abschnitt."""
+
+    def __init__(self, provider, datenbank: GemesseneDatenbank, **optionen):
+        super().__init__(provider, datenbank, **optionen)
+        self.messwerte = datenbank.messwerte
+        schreiber = GemessenerSpaltenschreiber if self.spalten \
+            else GemessenerAusgabeschreiber
+        self.ausgabeschreiber = functools.partial(schreiber, messwerte=self.messwerte)
+
+    def _abfrage_messen(self, holen, *args):
+        beginn = time.perf_counter()
+        try:
+            return holen(*args)
+        finally:
+            self.messwerte.erfassen('abfrage', time.perf_counter() - beginn)
+
+    def _kandidaten_holen(self, search_string: str, plz: str) -> list:
+        return self._abfrage_messen(super()._kandidaten_holen, search_string, plz)
+
+    def _kandidat_ueber_id(self, place_id: str) -> list:
+        return self._abfrage_messen(super()._kandidat_ueber_id, place_id)
+
+    def _stapel_holen(self, anfragen: list) -> list:
+        return self._abfrage_messen(super()._stapel_holen, anfragen)
+
+    def _einen_kunden(self, *args) -> dict:
+        _kunde.datenbank = 0.0
+        beginn = time.perf_counter()
+        ablage = super()._einen_kunden(*args)
+        self.messwerte.erfassen(
+            'entscheidung', time.perf_counter() - beginn - _kunde.datenbank)
+        return ablage
+
+
+# ==========================================================================
+# Speicher und Threads
+# ==========================================================================
+
+def speicher_mb():
+    """Der Arbeitsspeicher des Prozesses gerade jetzt (RSS), in MB, oder None."""
+    try:
+        with open('/proc/self/statm') as datei:
+            return int(datei.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    if sys.platform == 'win32':
+        return _speicher_windows()
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Ohne /proc nur der Höchststand seit Prozessbeginn; macOS zählt in Bytes.
+    hoechst = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return hoechst / 2 ** 20 if sys.platform == 'darwin' else hoechst / 2 ** 10
+
+
+def _speicher_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class Zaehler(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.c_void_p,
+                                           wintypes.DWORD]
+    zaehler = Zaehler()
+    zaehler.cb = ctypes.sizeof(Zaehler)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(),
+                                      ctypes.byref(zaehler), zaehler.cb):
+        return None
+    return zaehler.WorkingSetSize / 2 ** 20
+
+
+class Beobachter:
+    """Schaut im Takt nach Speicher und Threads, solange der Block läuft."""
+
+    def __init__(self, takt_sekunden: float = 0.05):
+        self.takt_sekunden = takt_sekunden
+        self.spitze_speicher_mb = None
+        self.spitze_threads = 0
+        self._fertig = threading.Event()
+        self._thread = None
+
+    def _nachsehen(self) -> None:
+        speicher = speicher_mb()
+        if speicher is not None:
+            self.spitze_speicher_mb = max(self.spitze_speicher_mb or 0.0, speicher)
+        self.spitze_threads = max(self.spitze_threads, threading.active_count())
+
+    def _beobachten(self) -> None:
+        while not self._fertig.wait(self.takt_sekunden):
+            self._nachsehen()
+
+    def __enter__(self):
+        self._nachsehen()
+        self._thread = threading.Thread(target=self._beobachten, name='messlauf',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._fertig.set()
+        self._thread.join()
+        self._nachsehen()
+
+
+# ==========================================================================
+# Der Messlauf
+# ==========================================================================
+
+def messen(anzahl: int, ordner, modus: str = 'A',
+           wartezeit: str = STANDARD_WARTEZEIT, fehlerquote: float = 0.0,
+           arbeiter: int = STANDARD_ARBEITER, sammel_kunden: int = 1,
+           synchronous: str = None, zufall: int = 1, spalten: bool = False) -> dict:
+    """
+    Ein Lauf über `anzahl` erfundene Kunden in `ordner`, von der Eingabedatei
+    bis zu den Ausgabedateien. Gibt die Messwerte als dict zurück.
+
+    Mit `spalten` steht unter `ausgabeformate`, wie lange CSV und Parquet
+    zum Schreiben gebraucht haben und wie gross sie geworden sind.
+    """
+    ordner = Path(ordner) / f'{modus}_{anzahl}'
+    wuerfel = random.Random(f'{zufall}-{modus}-{anzahl}')
+    eingabe, antworten = kunden_erfinden(anzahl, ordner, modus, wuerfel)
+    provider = LangsamerProvider(antworten, verteilung_lesen(wartezeit), fehlerquote,
+                                 wuerfel)
+    messwerte = Messwerte()
+
+    with Beobachter() as beobachter:
+        with GemesseneDatenbank(ordner / 'lauf.sqlite', synchronous=synchronous,
+                                messwerte=messwerte) as datenbank:
+            beginn = time.perf_counter()
+            ergebnis = GemessenerLauf(provider, datenbank, arbeiter=arbeiter,
+                                      modus=modus, sammel_kunden=sammel_kunden,
+                                      spalten=spalten).ausfuehren(eingabe, str(ordner / 'ausgabe'))
+            sekunden = time.perf_counter() - beginn
+
+    return {
+        'kunden': anzahl,
+        'status': ergebnis['status'],
+        'kunden_erledigt': ergebnis['kunden_erledigt'],
+        'sekunden': round(sekunden, 3),
+        'kunden_je_sekunde': round(ergebnis['kunden_erledigt'] / sekunden, 1),
+        'stufen': messwerte.zusammenfassung(),
+        'ausgabe_abschliessen_ms': _ms(messwerte.abschliessen_sekunden),
+        'ausgabeformate': messwerte.formate,
+        'eingestreute_ausfaelle': provider.ausfaelle,
+        'spitze_speicher_mb': (round(beobachter.spitze_speicher_mb, 1)
+                               if beobachter.spitze_speicher_mb is not None else None),
+        'spitze_threads': beobachter.spitze_threads,
+    }
+
+
+def bericht(einstellungen: dict, laeufe: list) -> dict:
+    """Alles, was in die JSON-Datei gehört — mit Rechner und Fassung dazu."""
+    return {
+        'zeitpunkt': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plattform': platform.platform(),
+        'prozessoren': os.cpu_count(),
+        'einstellungen': einstellungen,
+        'laeufe': laeufe,
+    }
+
+
+def als_text(lauf: dict) -> str:
+    """Die Zeilen, die der Befehl `messlauf` je Grösse ausgibt."""
+    zeilen = [f'{lauf["kunden"]:>7} Kunden: {lauf["kunden_je_sekunde"]:.1f} je Sekunde, '
+              f'{lauf["sekunden"]:.1f} s, {lauf["status"]}, '
+              f'höchstens {lauf["spitze_threads"]} Threads'
+              + (f' und {lauf["spitze_speicher_mb"]:.0f} MB'
+                 if lauf['spitze_speicher_mb'] is not None else '')]
+    for stufe in STUFEN:
+        werte = lauf['stufen'][stufe]
+        zeilen.append(f'    {stufe:<13} p50 {werte["p50_ms"]:>9.3f} ms   '
+                      f'p95 {werte["p95_ms"]:>9.3f} ms   p99 {werte["p99_ms"]:>9.3f} ms')
+    for format_, werte in (lauf.get('ausgabeformate') or {}).items():
+        zeilen.append(f'    {format_:<13} {werte["schreiben_ms"]:>9.1f} ms geschrieben, '
+                      f'{werte["kb"]:>9.1f} KB')
+    return '\n'.join(zeilen)
@@ -8,13 +8,19 @@
 #
 # Ausdrücklich **kein** Prüffall ist eine Namensänderung: aus Volg wird Spar,
 # der Betrieb bleibt derselbe. Rebranding ist normal.
+#
+# Für viele Kunden auf einmal — etwa alle gespeicherten IDs neu prüfen, ohne
+# Google zu fragen — gibt es `entscheide_kunden`: dieselbe Entscheidung, aber
+# die Entfernungen in einem Zug über Arrays statt Kunde für Kunde.
 
-import ast
 import logging
 import math
-import re
 
-from place_provider import leere_ausgabezeile
+import numpy as np
+
+# `koordinaten` wohnt bei Candidate (place_provider.py) und bleibt hier
+# erreichbar, wo es früher stand.
+from place_provider import koordinaten, leere_ausgabezeile  # noqa: F401
 
 logger = logging.getLogger(__name__)
 
@@ -41,32 +47,6 @@ def ist_wahr(wert) -> bool:
     return str(wert).strip().lower() in WAHR
 
 
-def koordinaten(text) -> tuple:
-    """
-    Holt Breite und Länge aus dem gespeicherten Standort.
-
-    Der Standort steht als Text in der Datenbank (`kandidat.location` ist TEXT),
-    in der Schreibweise `{'lat': 47.35, 'lng': 8.24}`. Was sich nicht lesen
-    lässt, gilt als nicht vorhanden — dann findet keine Distanzprüfung statt.
-    """
-    if text in (None, ''):
-        return None
-    if isinstance(text, dict):
-        werte = text
-    else:
-        try:
-            werte = ast.literal_eval(str(text))
-        except (ValueError, SyntaxError):
-            zahlen = re.findall(r'-?\d+\.?\d*', str(text))
-            return (float(zahlen[0]), float(zahlen[1])) if len(zahlen) >= 2 else None
-    if not isinstance(werte, dict):
-        return None
-    try:
-        return float(werte['lat']), float(werte['lng'])
-    except (KeyError, TypeError, ValueError):
-        return None
-
-
 def als_zahl(wert):
     """Wandelt eine Eingabespalte in eine Zahl. Leer bleibt leer."""
     text = str(wert).strip().replace(',', '.')
@@ -90,6 +70,20 @@ def entfernung_meter(punkt_a: tuple, punkt_b: tuple) -> float:
     return 2 * ERDRADIUS_METER * math.asin(min(1.0, math.sqrt(a)))
 
 
+def entfernungen_meter(punkte_a: np.ndarray, punkte_b: np.ndarray) -> np.ndarray:
+    """
+    `entfernung_meter` für viele Paare auf einmal. Beide Arrays haben je Zeile
+    Breite und Länge; wo eine Koordinate NaN ist, ist es auch die Entfernung.
+    """
+    a_rad = np.radians(punkte_a)
+    b_rad = np.radians(punkte_b)
+    d_breite = b_rad[:, 0] - a_rad[:, 0]
+    d_laenge = b_rad[:, 1] - a_rad[:, 1]
+    a = (np.sin(d_breite / 2) ** 2
+         + np.cos(a_rad[:, 0]) * np.cos(b_rad[:, 0]) * np.sin(d_laenge / 2) ** 2)
+    return 2 * ERDRADIUS_METER * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
 def entfernung_in_worten(meter: float) -> str:
     """850.3 → «850 m», 1432 → «1.4 km». Schreibweise wie im Datenvertrag §4."""
     if meter < 1000:
@@ -122,6 +116,56 @@ def entscheide_kunde(kunden_nr: str, stamm: dict, kandidat,
     Returns dasselbe wie `DataCleaner.entscheide_kunde`: vier Listen, von denen
     genau eine der ersten drei gefüllt ist.
     """
+    abweichung = _abweichung(stamm, kandidat) if kandidat is not None else None
+    return _entscheiden(kunden_nr, stamm, kandidat, erreichbar, abweichung)
+
+
+def entscheide_kunden(kunden: list, erreichbar: list = None) -> list:
+    """
+    `entscheide_kunde` für viele Kunden: `kunden` ist eine Liste von
+    (KundenNr, Stammzeile, Kandidat oder None), `erreichbar` auf Wunsch eine
+    gleich lange Liste. Liefert je Kunde die Ablage, in derselben Reihenfolge
+    und mit denselben Zeilen wie einzeln entschieden.
+
+    Die Koordinaten werden einmal in Arrays gelesen, und alle Entfernungen
+    gegen `MAX_ABWEICHUNG_METER` in einem Zug gerechnet.
+    """
+    abweichungen = abweichungen_meter([stamm for _, stamm, _ in kunden],
+                                      [kandidat for _, _, kandidat in kunden])
+    if erreichbar is None:
+        erreichbar = [True] * len(kunden)
+    return [_entscheiden(kunden_nr, stamm, kandidat, ist_erreichbar,
+                         None if math.isnan(meter) else meter)
+            for (kunden_nr, stamm, kandidat), ist_erreichbar, meter
+            in zip(kunden, erreichbar, abweichungen.tolist())]
+
+
+def abweichungen_meter(staemme: list, kandidaten: list) -> np.ndarray:
+    """
+    `_abweichung` für viele Kunden: je Kunde die Entfernung in Metern, NaN
+    wo nicht vergleichbar (keine Position in der Eingabe, kein Kandidat, kein
+    Standort bei Google).
+    """
+    gespeichert = np.full((len(staemme), 2), np.nan)
+    gefunden = np.full((len(staemme), 2), np.nan)
+    for nummer, (stamm, kandidat) in enumerate(zip(staemme, kandidaten)):
+        if kandidat is None:
+            continue
+        breite = als_zahl(stamm.get('lat', ''))
+        laenge = als_zahl(stamm.get('lng', ''))
+        if breite is None or laenge is None:
+            continue
+        punkt = kandidat.standort()
+        if punkt is None:
+            continue
+        gespeichert[nummer] = breite, laenge
+        gefunden[nummer] = punkt
+    return entfernungen_meter(gespeichert, gefunden)
+
+
+def _entscheiden(kunden_nr: str, stamm: dict, kandidat, erreichbar: bool,
+                 abweichung) -> dict:
+    """Die Entscheidung aus `entscheide_kunde`, mit schon gerechneter Abweichung."""
     place_id = str(stamm.get('placeId', '')).strip()
     ablage = {'fertig_fuer_erp': [], 'zur_pruefung': [],
               'nicht_moeglich': [], 'aussortiert': []}
@@ -159,8 +203,6 @@ def entscheide_kunde(kunden_nr: str, stamm: dict, kandidat,
             f'Google meldet den Betrieb als dauerhaft geschlossen: "{titel}".'))
         return ablage
 
-    abweichung = _abweichung(stamm, kandidat)
-
     if abweichung is not None and abweichung > MAX_ABWEICHUNG_METER:
         ablage['zur_pruefung'].append(_zeile(
             kunden_nr, stamm, kandidat, 'PRUEFUNG (Standort abweichend)',
@@ -197,7 +239,7 @@ def _abweichung(stamm: dict, kandidat):
     if breite is None or laenge is None:
         return None
 
-    gefunden = koordinaten(kandidat.location)
+    gefunden = kandidat.standort()
     if gefunden is None:
         return None
 
@@ -0,0 +1,204 @@
+# neu_entscheiden.py
+# Wie wären gespeicherte Jobs mit anderen Schwellen ausgegangen?
+#
+# Bevor eine Schwelle aus 03_ENTSCHEIDUNGEN.md B1–B3 geändert wird — der hohe
+# Score, der Abstand für «dynamisch eindeutig», die Namensschwelle für
+# Einzeltreffer, die Strassenschwelle —, soll klar sein, was sie bewirkt. Die
+# Kandidaten jedes Kunden stehen in der Datenbank (02_DATENVERTRAG.md §5);
+# neu entscheiden kostet also keine einzige Abfrage bei Apify oder Google.
+#
+# Jeder Kunde wird zweimal entschieden: mit den Schwellen, wie sie heute im
+# Code stehen, und mit den vorgeschlagenen. Verglichen wird das, nicht das
+# gespeicherte `kunde.ergebnis` — das hat die Prüfmaske womöglich schon
+# überschrieben, und die Fachlogik kann sich seit dem Lauf geändert haben.
+# Der Score hängt an keiner Schwelle und wird je Kunde nur einmal gerechnet.
+#
+# Gelesen wird blockweise (Datenbank.kunden_bloecke), entschieden in einem
+# Pool von Prozessen: die Entscheidung ist reines Python und hält den GIL,
+# Threads brächten nichts. In die Datenbank wird nichts geschrieben.
+#
+# Ergebnis: je Job, wie viele Kunden vorher und nachher in ①/②/③ landen,
+# und als CSV jeder Kunde, der die Datei wechseln würde.
+
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from data_cleaner import DataCleaner
+from place_provider import CSV_FELDER
+
+logger = logging.getLogger(__name__)
+
+# Die Schwellen, die sich neu setzen lassen: Name auf der Kommandozeile →
+# Attribut des DataCleaners.
+SCHWELLEN = {
+    'hoch': 'HIGH_SCORE_THRESHOLD',
+    'abstand': 'dynamic_gap_threshold',
+    'einzeltreffer': 'SINGLE_HIT_NAME_THRESHOLD',
+    'strasse': 'STREET_NAME_THRESHOLD',
+}
+
+HAUPTDATEIEN = ('fertig_fuer_erp', 'zur_pruefung', 'nicht_moeglich')
+
+# So viele Kunden gehen auf einmal an einen Prozess. Grösser heisst: weniger
+# Übergaben zwischen den Prozessen, aber mehr im Speicher.
+KUNDEN_JE_BLOCK = 2_000
+
+# So viele Blöcke je Prozess sind höchstens unterwegs; das Lesen aus SQLite
+# läuft den Prozessen damit nie weit voraus.
+BLOECKE_JE_PROZESS = 2
+
+BERICHT_SPALTEN = ['job_id', 'KundenNr', 'SearchString', 'PLZ', 'vorher',
+                   'qualitaet_vorher', 'nachher', 'qualitaet_nachher', 'grund_nachher']
+
+
+def heutige_schwellen() -> dict:
+    """Die Schwellen, wie sie im DataCleaner stehen."""
+    cleaner = DataCleaner()
+    return {name: getattr(cleaner, attribut) for name, attribut in SCHWELLEN.items()}
+
+
+def cleaner_mit(schwellen: dict) -> DataCleaner:
+    """Ein DataCleaner mit diesen Schwellen; was fehlt, bleibt wie im Code."""
+    cleaner = DataCleaner()
+    for name, wert in schwellen.items():
+        setattr(cleaner, SCHWELLEN[name], wert)
+    return cleaner
+
+
+def _fall(job_id: int, kunde, kandidaten: list) -> tuple:
+    """
+    Ein Kunde so, wie er an einen Prozess geht: nur Text in Tupeln, ohne
+    `sqlite3.Row` und ohne Candidate — das spart beim Übergeben das meiste.
+    Die Spalten von `kandidat` sind TEXT; leer ist höchstens NULL.
+    """
+    return (job_id, kunde['kunden_nr'], kunde['search_string'] or '',
+            kunde['plz'] or '', kunde['stadt'] or '',
+            [tuple([zeile[feld] or '' for feld in CSV_FELDER]) for zeile in kandidaten])
+
+
+@contextmanager
+def _ohne_kundenprotokoll():
+    # Die Fachlogik schreibt je Kunde eine Zeile ins Protokoll. Bei
+    # Hunderttausend Kunden wäre das Protokoll voll und die Zeit beim Schreiben;
+    # die Gründe stehen ohnehin im Bericht.
+    protokoll = logging.getLogger('data_cleaner')
+    bisher = protokoll.level
+    protokoll.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        protokoll.setLevel(bisher)
+
+
+def _datei_und_zeile(ablage: dict) -> tuple:
+    for datei in HAUPTDATEIEN:
+        if ablage[datei]:
+            return datei, ablage[datei][0]
+    raise RuntimeError('Der Kunde landete in keiner der drei Ausgabedateien.')
+
+
+def faelle_entscheiden(faelle: list, vorher: dict, nachher: dict) -> tuple:
+    """
+    Entscheidet einen Block zweimal. Läuft in einem eigenen Prozess.
+
+    Liefert die Zählung {(job_id, vorher, nachher): Kunden} und die Kunden,
+    die die Datei wechseln, als Zeilen des Berichts.
+    """
+    alt, neu = cleaner_mit(vorher), cleaner_mit(nachher)
+    spalten = list(CSV_FELDER.values())
+    leer = [dict.fromkeys(spalten, '')]
+    zaehlung, wechsel = {}, []
+    with _ohne_kundenprotokoll():
+        for job_id, kunden_nr, search_string, plz, stadt, kandidaten in faelle:
+            stamm = {'KundenNr': kunden_nr, 'SearchString': search_string,
+                     'PLZ': plz, 'Stadt': stadt}
+            zeilen = [{**stamm, **treffer} for treffer in
+                      ([dict(zip(spalten, werte)) for werte in kandidaten] or leer)]
+            scores = alt.scores_fuer(zeilen)
+            datei_alt, zeile_alt = _datei_und_zeile(
+                alt.entscheide_kunde(kunden_nr, zeilen, scores))
+            datei_neu, zeile_neu = _datei_und_zeile(
+                neu.entscheide_kunde(kunden_nr, zeilen, scores))
+            schluessel = (job_id, datei_alt, datei_neu)
+            zaehlung[schluessel] = zaehlung.get(schluessel, 0) + 1
+            if datei_alt != datei_neu:
+                wechsel.append({
+                    'job_id': job_id, 'KundenNr': kunden_nr,
+                    'SearchString': search_string, 'PLZ': plz,
+                    'vorher': datei_alt, 'qualitaet_vorher': zeile_alt['qualitaet'],
+                    'nachher': datei_neu, 'qualitaet_nachher': zeile_neu['qualitaet'],
+                    'grund_nachher': zeile_neu['grund']})
+    return zaehlung, wechsel
+
+
+def neu_entscheiden(datenbank, job_ids: list, schwellen: dict, prozesse: int = None,
+                    kunden_je_block: int = KUNDEN_JE_BLOCK) -> dict:
+    """
+    Entscheidet alle Kunden der Jobs neu, einmal mit den heutigen und einmal
+    mit `schwellen` (nur die, die sich ändern sollen).
+
+    `prozesse`: so viele Prozesse entscheiden gleichzeitig (Standard: einer
+    je Kern). Mit einem einzigen bleibt alles in diesem Prozess.
+    """
+    vorher = heutige_schwellen()
+    nachher = {**vorher, **schwellen}
+    prozesse = max(1, int(prozesse or os.cpu_count() or 1))
+    beginn = time.perf_counter()
+
+    def bloecke():
+        for job_id in job_ids:
+            for block in datenbank.kunden_bloecke(job_id, kunden_je_block):
+                yield [_fall(job_id, kunde, kandidaten) for kunde, kandidaten in block]
+
+    zaehlung, wechsel = {}, []
+
+    def uebernehmen(ergebnis: tuple) -> None:
+        teil, teil_wechsel = ergebnis
+        for schluessel, anzahl in teil.items():
+            zaehlung[schluessel] = zaehlung.get(schluessel, 0) + anzahl
+        wechsel.extend(teil_wechsel)
+
+    if prozesse == 1:
+        for faelle in bloecke():
+            uebernehmen(faelle_entscheiden(faelle, vorher, nachher))
+    else:
+        # Die Ergebnisse in der Reihenfolge der Blöcke, damit der Bericht
+        # dieselbe Reihenfolge hat wie die Jobs.
+        unterwegs = deque()
+        with ProcessPoolExecutor(max_workers=prozesse) as pool:
+            for faelle in bloecke():
+                if len(unterwegs) >= prozesse * BLOECKE_JE_PROZESS:
+                    uebernehmen(unterwegs.popleft().result())
+                unterwegs.append(pool.submit(faelle_entscheiden, faelle, vorher, nachher))
+            while unterwegs:
+                uebernehmen(unterwegs.popleft().result())
+
+    jobs = {job_id: {'kunden': 0, 'vorher': dict.fromkeys(HAUPTDATEIEN, 0),
+                     'nachher': dict.fromkeys(HAUPTDATEIEN, 0)} for job_id in job_ids}
+    for (job_id, datei_alt, datei_neu), anzahl in zaehlung.items():
+        jobs[job_id]['kunden'] += anzahl
+        jobs[job_id]['vorher'][datei_alt] += anzahl
+        jobs[job_id]['nachher'][datei_neu] += anzahl
+    kunden = sum(job['kunden'] for job in jobs.values())
+    sekunden = time.perf_counter() - beginn
+    logger.info(f'neu entschieden: {kunden} Kunden aus {len(job_ids)} Jobs in '
+                f'{sekunden:.2f} s mit {prozesse} Prozessen, {len(wechsel)} wechseln')
+    return {'vorher': vorher, 'nachher': nachher, 'prozesse': prozesse,
+            'kunden': kunden, 'sekunden': round(sekunden, 3), 'jobs': jobs,
+            'wechsel': wechsel}
+
+
+def bericht_schreiben(auswertung: dict, pfad) -> str:
+    """Die wechselnden Kunden als CSV, wie die Ausgabedateien: Semikolon, utf-8-sig."""
+    pfad = Path(pfad)
+    pfad.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(auswertung['wechsel'], columns=BERICHT_SPALTEN).to_csv(
+        pfad, sep=';', index=False, encoding='utf-8-sig')
+    return str(pfad)
@@ -13,21 +13,37 @@
 #     landet dann in Datei ③ (03_ENTSCHEIDUNGEN.md C)
 #   - ein abgestürzter Lauf kann fortgesetzt werden, ohne einen Kunden doppelt
 #     abzufragen oder auszulassen
+#
+# Bietet der Provider `async def` an, wartet der Lauf in einer Ereignisschleife
+# statt in Threads. Dann sind so viele Abfragen gleichzeitig offen, wie es
+# Arbeiter gibt — auch Hunderte —, ohne einen Thread je Abfrage. Entscheidung
+# und Datenbank bleiben wie oben im sammelnden Thread.
+#
+# Jede Stufe wird gemessen (kennzahlen.py): Abfrage, Übergabe, Entscheidung,
+# Datenbank, Ausgabe. Am Ende des Durchgangs steht die Zusammenfassung in
+# `job_kennzahl`.
 
+import asyncio
+import inspect
+import itertools
 import logging
+import random
 import threading
 import time
 from concurrent.futures import (FIRST_COMPLETED, ThreadPoolExecutor,
                                 TimeoutError as FutureTimeout, wait)
 from pathlib import Path
 
-import pandas as pd
-
-from data_cleaner import (DataCleaner, ausgabeordner_fuer, leere_ablage,
-                          schreibe_ausgabedateien)
+from data_cleaner import (OUTPUT_COLUMNS, Ausgabeschreiber, DataCleaner,
+                          ausgabeordner_fuer, leere_ablage)
+from eingabe import Eingabedatei
+from fenstersteuerung import Fenstersteuerung
+import kennzahlen
 import modus_b
-from place_provider import (QuelleNichtVerfuegbar, candidate_aus_zeile,
-                            leere_ausgabezeile)
+import spaltenexport
+from place_provider import (ABBRUCH, CSV_FELDER, QuelleNichtVerfuegbar,
+                            candidate_aus_zeile, ist_asynchron,
+                            leere_ausgabezeile, stapel_frist)
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +51,15 @@ logger = logging.getLogger(__name__)
 STANDARD_TIMEOUT_SEKUNDEN = 180
 STANDARD_ARBEITER = 6
 
+# Wie viele Kunden sich eine Abfrage teilen (Modus A, nur bei Providern, die
+# `fetch_by_texts` anbieten). 1 heisst: jeder Kunde einzeln, wie bisher.
+STANDARD_STAPELGROESSE = 1
+
+# So weit schaut die Stapelbildung voraus, in Stapeln gemessen. Ein Stapel
+# braucht eine einzige PLZ; wer weiter vorausschaut, findet mehr Kunden mit
+# derselben PLZ, hält aber auch mehr Kunden zurück, die schon fragen könnten.
+VORSCHAU_STAPEL = 4
+
 # Wie oft der Lauf beim Warten nachsieht, ob abgebrochen wurde. Bestimmt, wie
 # schnell der Abbruch greift (Abnahmekriterium: unter 5 Sekunden).
 TAKT_SEKUNDEN = 0.2
@@ -89,12 +114,73 @@ ENTSCHEID_JE_DATEI = {
     'aussortiert': 'abgelehnt',
 }
 
+DATEI_JE_ERGEBNIS = {ergebnis: datei for datei, ergebnis in ERGEBNIS_JE_DATEI.items()}
+
+# Wie ein Lauf beim Fortsetzen die schon verarbeiteten Kunden in die Ausgabe
+# bringt:
+#   - herleiten:   die Fachlogik entscheidet noch einmal, aus den
+#                  gespeicherten Kandidaten. Dasselbe Ergebnis, alle vier
+#                  Dateien vollständig.
+#   - uebernehmen: die Zeilen entstehen direkt aus `kunde` und `kandidat`, wie
+#                  in der Prüfmaske (`ablage_aus_gespeichertem`). Schneller;
+#                  die Diagnosedatei enthält für diese Kunden aber nichts,
+#                  weil `kandidat` ihre `AUSSORTIERT (…)`-Werte nicht kennt.
+#                  Nur Modus A — im Modus B gibt es nichts zu sparen.
+WIEDERAUFNAHME_ARTEN = ('herleiten', 'uebernehmen')
+
+# So viele übernommene Kunden werden zur Kontrolle trotzdem hergeleitet.
+# Geschätzt: genug, um einen systematischen Unterschied zu sehen, zu wenig,
+# um beim Fortsetzen aufzufallen.
+STANDARD_STICHPROBE = 20
+
 # Interne Spalte: verbindet eine Ausgabezeile mit dem Candidate, aus dem sie
 # stammt. Steht nicht im Datenvertrag und landet nicht in der CSV, weil beim
 # Schreiben nur die Vertragsspalten ausgewählt werden.
 KANDIDAT_NR = '_kandidat_nr'
 
 
+def ablage_aus_gespeichertem(kunde: dict, kandidaten: list) -> dict:
+    """
+    Die Ausgabezeilen eines Kunden, gebaut aus seiner Zeile in `kunde` und
+    seinen Zeilen in `kandidat` — ohne die Fachlogik noch einmal zu fragen.
+
+    Der Kunde gehört in die Datei, die sein `ergebnis` nennt, und dort steht
+    je ein Kandidat, dessen `entscheid` zu dieser Datei gehört. Hat er dort
+    keinen, steht er mit leeren Trefferfeldern da. Die Diagnosedatei bleibt
+    leer (pruefmaske.py, `_aussortiert_uebernehmen`).
+    """
+    ablage = leere_ablage()
+    ziel = DATEI_JE_ERGEBNIS.get(kunde['ergebnis'])
+    if ziel is None:
+        logger.warning(f'Kunde {kunde["kunden_nr"]} hat kein Ergebnis und '
+                       f'wird beim Schreiben übergangen.')
+        return ablage
+
+    stamm = {'KundenNr': kunde['kunden_nr'],
+             'SearchString': kunde['search_string'] or '',
+             'PLZ': kunde['plz'] or '',
+             'Stadt': kunde['stadt'] or ''}
+    qualitaet = kunde['qualitaet'] or ''
+
+    for kandidat in kandidaten:
+        if kandidat['entscheid'] != ENTSCHEID_JE_DATEI[ziel]:
+            continue
+        ablage[ziel].append({
+            **stamm,
+            **{spalte: (kandidat[feld] if kandidat[feld] is not None else '')
+               for feld, spalte in CSV_FELDER.items()},
+            'qualitaet': qualitaet,
+            'score': round(float(kandidat['score'] or 0), 2),
+            'grund': kandidat['grund'] or '',
+        })
+    if not ablage[ziel]:
+        # Kein Treffer in dieser Datei: eine Zeile aus Stammdaten allein.
+        ablage[ziel].append({**stamm, **leere_ausgabezeile(),
+                             'qualitaet': qualitaet, 'score': 0.0,
+                             'grund': kunde['grund'] or ''})
+    return ablage
+
+
 class Abgebrochen(Exception):
     """Der Lauf wurde vom Nutzer gestoppt."""
 
@@ -110,13 +196,90 @@ class Ausgefallen(list):
     """
 
 
+class Reihenfolge:
+    """
+    Gibt die Kunden in der Reihenfolge der Eingabedatei aus, sobald sie an der
+    Reihe sind.
+
+    Die Arbeiter werden in beliebiger Reihenfolge fertig. Ein fertiger Kunde,
+    vor dem noch einer unterwegs ist, wartet hier; alle anderen gehen sofort
+    an den `Ausgabeschreiber`. Im Speicher liegt damit nur, was hinter einer
+    noch offenen Abfrage aufgelaufen ist — nicht der ganze Lauf.
+
+    `kunden` wird nur einmal gelesen und darf ein Generator sein: `offene`
+    liest voraus, die Ausgabe folgt. Dazwischen hält `itertools.tee` die
+    Kunden, die schon gefragt, aber noch nicht geschrieben sind.
+
+    Kunden, die beim Fortsetzen schon in der Datenbank stehen, werden erst
+    hergeleitet, wenn sie an der Reihe sind.
+    """
+
+    def __init__(self, kunden, bereits: dict, aus_datenbank, schreiber):
+        self._reihe, self._eingabe = itertools.tee(kunden)
+        self._bereits = bereits
+        # `_bereits` leert sich beim Schreiben, das auch vor `offene` liegen kann.
+        self._vorhanden = set(bereits)
+        self._aus_datenbank = aus_datenbank
+        self._schreiber = schreiber
+        self._wartend = {}
+        self._naechster = None
+
+    def offene(self):
+        """Die Kunden, die noch nicht in der Datenbank stehen, in ihrer Reihenfolge."""
+        for kunden_nr, stamm in self._eingabe:
+            if kunden_nr in self._vorhanden:
+                self._weitergeben()
+                continue
+            yield kunden_nr, stamm
+
+    def ablegen(self, kunden_nr: str, ablage: dict) -> None:
+        self._wartend[kunden_nr] = ablage
+        self._weitergeben()
+
+    def abschliessen(self) -> dict:
+        for kunden_nr, _ in self.offene():
+            raise RuntimeError(f'Kunde {kunden_nr} fehlt in der Ausgabe.')
+        self._weitergeben()
+        if self._naechster is not None:
+            raise RuntimeError(f'Kunde {self._naechster} fehlt in der Ausgabe.')
+        return self._schreiber.abschliessen()
+
+    def verwerfen(self) -> None:
+        self._schreiber.verwerfen()
+
+    def _weitergeben(self) -> None:
+        while True:
+            if self._naechster is None:
+                kunde = next(self._reihe, None)
+                if kunde is None:
+                    return
+                self._naechster = kunde[0]
+            kunden_nr = self._naechster
+            if kunden_nr in self._wartend:
+                ablage = self._wartend.pop(kunden_nr)
+            elif kunden_nr in self._bereits:
+                ablage = self._aus_datenbank(self._bereits.pop(kunden_nr))
+            else:
+                return
+            self._schreiber.anhaengen(ablage)
+            self._naechster = None
+
+
 class Lauf:
     """Führt einen kompletten Durchgang aus: anreichern, entscheiden, schreiben."""
 
+    # Schreibt die Ausgabedateien. Der Messlauf (messlauf.py) setzt einen
+    # Schreiber ein, der die Zeit je Kunde misst.
+    ausgabeschreiber = Ausgabeschreiber
+
     def __init__(self, provider, datenbank, cleaner: DataCleaner = None,
                  timeout_sekunden: float = STANDARD_TIMEOUT_SEKUNDEN,
                  arbeiter: int = STANDARD_ARBEITER, abbruch: threading.Event = None,
-                 modus: str = 'A'):
+                 modus: str = 'A', stapelgroesse: int = STANDARD_STAPELGROESSE,
+                 anpassend: bool = False, sammel_kunden: int = 1,
+                 sammel_ms: float = 0, wiederaufnahme: str = 'herleiten',
+                 stichprobe: int = STANDARD_STICHPROBE, kontingent=None,
+                 zusammenlegen: bool = True, spalten: bool = False):
         self.provider = provider
         self.datenbank = datenbank
         self.cleaner = cleaner or DataCleaner()
@@ -126,7 +289,44 @@ class Lauf:
         if modus not in PFLICHTSPALTEN_JE_MODUS:
             raise ValueError(f'Unbekannter Modus "{modus}", erlaubt sind A und B.')
         self.modus = modus
+        self.stapelgroesse = max(1, int(stapelgroesse))
+        # Mit `anpassend` ist `arbeiter` nur der Anfang: die Steuerung passt
+        # die Zahl gleichzeitiger Abfragen an Antwortzeit und Fehler an
+        # (fenstersteuerung.py).
+        self.steuerung = Fenstersteuerung(self.arbeiter) if anpassend else None
+        # Mehrere Kunden je Commit (db.py, Sammelbetrieb). 1 und 0: jeder
+        # Kunde wird sofort festgeschrieben.
+        self.sammel_kunden = max(1, int(sammel_kunden))
+        self.sammel_ms = max(0.0, float(sammel_ms))
+        if wiederaufnahme not in WIEDERAUFNAHME_ARTEN:
+            raise ValueError(f'Unbekannte Art der Wiederaufnahme "{wiederaufnahme}", '
+                             f'erlaubt sind: {", ".join(WIEDERAUFNAHME_ARTEN)}.')
+        self.wiederaufnahme = wiederaufnahme
+        self.stichprobe = max(0, int(stichprobe))
+        # Teilen sich mehrere Jobs eine Datenquelle (worker.Planer), sagt das
+        # Kontingent, wie viele Abfragen dieser Job gerade offen haben darf.
+        # Gefragt wird bei jedem Nachfüllen: kommt ein Job dazu, geben die
+        # anderen ab, sobald ihre offenen Abfragen zurück sind.
+        self.kontingent = kontingent
+        # Kunden mit derselben Abfrage wie ein früherer offener Kunde warten
+        # auf dessen Antwort statt selbst zu fragen (`_gleiche_zusammenlegen`).
+        # Ohne `zusammenlegen` fragt jeder Kunde selbst, wie bisher.
+        self.zusammenlegen = zusammenlegen
+        # Neben den CSV-Dateien dieselben Zeilen und alle Kandidaten des Jobs
+        # als Parquet (spaltenexport.py). Braucht pyarrow.
+        if spalten and not spaltenexport.verfuegbar():
+            raise ValueError(spaltenexport.FEHLT_MELDUNG)
+        self.spalten = spalten
+        if spalten:
+            self.ausgabeschreiber = spaltenexport.SpaltenAusgabeschreiber
+        self._mitfahrer = {}
+        self._nachzuegler = {}
+        self.gesparte_abfragen = 0
         self._fehlschlaege = 0
+        self._ausfuehrer = None
+        # Je Durchgang neu (`_abarbeiten`); alles geht auch an kennzahlen.PROZESS.
+        self.kennzahlen = kennzahlen.Kennzahlen(kennzahlen.PROZESS)
+        self._zwischenspeicher_vorher = None
 
     # ------------------------------------------------------------------
     # Der Lauf
@@ -136,14 +336,11 @@ class Lauf:
                    email: str = None) -> dict:
         """Arbeitet eine Eingabedatei ab und legt einen neuen Job an."""
         eingabe = Path(eingabe_pfad)
-        kunden = self._kunden_lesen(eingabe)
+        datei = self._eingabe_oeffnen(eingabe)
 
-        job_id = self.datenbank.job_anlegen(self.modus, eingabe.name,
-                                            kunden_total=len(kunden), email=email)
+        job_id = self.datenbank.job_anlegen(self.modus, eingabe.name, email=email)
         self.datenbank.status_setzen(job_id, 'LAEUFT')
-        logger.info(f'Job {job_id}: {len(kunden)} Kunden aus {eingabe.name}, '
-                    f'{self.arbeiter} parallel.')
-        return self._abarbeiten(job_id, eingabe, kunden, ausgabe_ordner)
+        return self._abarbeiten(job_id, eingabe, datei, ausgabe_ordner)
 
     def fortsetzen(self, job_id: int, eingabe_pfad: str,
                    ausgabe_ordner: str = None) -> dict:
@@ -164,98 +361,154 @@ class Lauf:
         self.modus = job['modus']
 
         eingabe = Path(eingabe_pfad)
-        kunden = self._kunden_lesen(eingabe)
+        datei = self._eingabe_oeffnen(eingabe)
         if job['status'] != 'LAEUFT':
             self.datenbank.status_setzen(job_id, 'LAEUFT')
 
         logger.info(f'Job {job_id} wird fortgesetzt.')
-        return self._abarbeiten(job_id, eingabe, kunden, ausgabe_ordner)
+        return self._abarbeiten(job_id, eingabe, datei, ausgabe_ordner)
 
     # ------------------------------------------------------------------
 
-    def _kunden_lesen(self, eingabe: Path) -> list:
-        df = pd.read_csv(eingabe, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    def _eingabe_oeffnen(self, eingabe: Path) -> Eingabedatei:
+        datei = Eingabedatei(eingabe)
 
         fehlend = [s for s in PFLICHTSPALTEN_JE_MODUS[self.modus]
-                   if s not in df.columns]
+                   if s not in datei.spalten]
         if fehlend:
             raise ValueError('In der Eingabedatei fehlen die Spalten: '
                              + ', '.join(fehlend))
+        return datei
+
+    def _abarbeiten(self, job_id: int, eingabe: Path, datei: Eingabedatei,
+                    ausgabe_ordner: str) -> dict:
+        # Was schon in der Datenbank steht, wird nicht noch einmal geholt.
+        bereits = {k['kunden_nr']: k for k in self.datenbank.kunden_lesen(job_id)}
 
+        # Die Datei wird zweimal gelesen, Block für Block (eingabe.py), und
+        # nie als Ganzes gehalten. Der erste Durchgang zählt die Kunden und
+        # hält ihre Reihenfolge fest — die der Ausgabedateien, für die
+        # Prüfmaske (db.py, `kunde_position`). Der zweite ist der Lauf.
+        #
         # Ein Kunde, eine Zeile. Kommt eine KundenNr mehrfach vor, zählt die
         # erste Zeile; sonst würde idx_kunde_nr den Lauf abbrechen.
-        gruppen = list(df.groupby('KundenNr', sort=False))
-        self._doppelte = len(df) - len(gruppen)
+        kunden_total = erledigt = 0
+
+        def nummern():
+            nonlocal kunden_total, erledigt
+            for kunden_nr, _ in datei.kunden():
+                kunden_total += 1
+                erledigt += kunden_nr in bereits
+                yield kunden_nr
+
+        # Die Gesamtzahl steht erst jetzt fest — beim Fortsetzen genauso wie
+        # beim ersten Lauf. Festgeschrieben mit den Positionen.
+        self.datenbank.positionen_schreiben(job_id, nummern())
+        self.datenbank.kunden_total_setzen(job_id, kunden_total)
+        self.datenbank.sammeln(self.sammel_kunden, self.sammel_ms)
+        self.kennzahlen = kennzahlen.Kennzahlen(kennzahlen.PROZESS)
+        self._zwischenspeicher_vorher = kennzahlen.zwischenspeicher_von(self.provider)
+
+        self._doppelte = datei.doppelte
         if self._doppelte:
             logger.warning(f'{self._doppelte} Zeilen mit bereits vorhandener '
                            f'KundenNr übersprungen.')
-        return [(str(nr), gruppe.iloc[0]) for nr, gruppe in gruppen]
-
-    def _abarbeiten(self, job_id: int, eingabe: Path, kunden: list,
-                    ausgabe_ordner: str) -> dict:
-        # Die Gesamtzahl steht erst jetzt fest — beim Fortsetzen genauso wie
-        # beim ersten Lauf.
-        self.datenbank.kunden_total_setzen(job_id, len(kunden))
-
-        # Was schon in der Datenbank steht, wird nicht noch einmal geholt.
-        bereits = {k['kunden_nr']: k for k in self.datenbank.kunden_lesen(job_id)}
-        entscheidungen = {}
-
-        for kunden_nr, _ in kunden:
-            if kunden_nr in bereits:
-                entscheidungen[kunden_nr] = self._aus_datenbank(bereits[kunden_nr])
+        logger.info(f'Job {job_id}: {kunden_total} Kunden aus {eingabe.name}, '
+                    f'{self.arbeiter} parallel.')
 
-        erledigt = len(entscheidungen)
         self.datenbank.fortschritt_setzen(job_id, erledigt)
         if erledigt:
             logger.info(f'Job {job_id}: {erledigt} Kunden lagen bereits vor.')
 
-        offen = [(nr, stamm) for nr, stamm in kunden if nr not in bereits]
+        schreiber = self.ausgabeschreiber(ausgabe_ordner or ausgabeordner_fuer(eingabe))
+        ausgabe = Reihenfolge(datei.kunden(), bereits,
+                              self._wiederherstellung(job_id, bereits), schreiber)
+        offen = self._gleiche_zusammenlegen(ausgabe.offene())
 
         try:
-            erledigt = self._offene_abarbeiten(job_id, offen, entscheidungen, erledigt)
+            if erledigt < kunden_total:
+                erledigt = self._offene_abarbeiten(job_id, offen, ausgabe, erledigt)
+            if self.gesparte_abfragen:
+                logger.info(f'Job {job_id}: {self.gesparte_abfragen} Kunden teilten '
+                            f'sich die Abfrage mit einem anderen Kunden.')
+            with self.kennzahlen.messen('festschreiben'):
+                self.datenbank.festschreiben()
+            with self.kennzahlen.messen('abschluss'):
+                dateien = ausgabe.abschliessen()
+                spaltendateien = self._spalten_abschliessen(job_id, schreiber, dateien)
         except Abgebrochen:
+            ausgabe.verwerfen()
+            self._kennzahlen_ablegen(job_id)
             self.datenbank.status_setzen(job_id, 'ABGEBROCHEN')
             logger.info(f'Job {job_id} abgebrochen nach {erledigt} Kunden.')
             return {
                 'job_id': job_id, 'status': 'ABGEBROCHEN',
-                'kunden_total': len(kunden), 'kunden_erledigt': erledigt,
+                'kunden_total': kunden_total, 'kunden_erledigt': erledigt,
                 'dateien': None, 'doppelte_kundennummern': self._doppelte,
+                'gesparte_abfragen': self.gesparte_abfragen,
             }
         except QuelleNichtVerfuegbar as fehler:
             # Kein Absturz: der Lauf endet mit einer Erklärung, die der
             # Sachbearbeiter lesen und befolgen kann.
+            ausgabe.verwerfen()
             logger.error(f'Job {job_id} gestoppt: {fehler.meldung}')
+            self._kennzahlen_ablegen(job_id)
             self.datenbank.status_setzen(job_id, 'FEHLER', fehler.meldung)
             return {
                 'job_id': job_id, 'status': 'FEHLER',
-                'kunden_total': len(kunden), 'kunden_erledigt': erledigt,
+                'kunden_total': kunden_total, 'kunden_erledigt': erledigt,
                 'dateien': None, 'doppelte_kundennummern': self._doppelte,
+                'gesparte_abfragen': self.gesparte_abfragen,
                 'fehlermeldung': fehler.meldung,
             }
         except Exception as fehler:
+            ausgabe.verwerfen()
             logger.exception('Lauf abgebrochen')
             self.datenbank.status_setzen(job_id, 'FEHLER', str(fehler))
             raise
 
-        # Die Ausgabe folgt der Reihenfolge der Eingabedatei, nicht der
-        # Reihenfolge, in der die Arbeiter fertig geworden sind.
-        gesamt = leere_ablage()
-        for kunden_nr, _ in kunden:
-            for datei, zeilen in entscheidungen[kunden_nr].items():
-                gesamt[datei].extend(zeilen)
-
-        ziel = ausgabe_ordner or ausgabeordner_fuer(eingabe)
-        dateien = schreibe_ausgabedateien(gesamt, ziel)
+        self._kennzahlen_ablegen(job_id)
         self.datenbank.status_setzen(job_id, 'FERTIG')
 
         return {
             'job_id': job_id, 'status': 'FERTIG',
-            'kunden_total': len(kunden), 'kunden_erledigt': erledigt,
+            'kunden_total': kunden_total, 'kunden_erledigt': erledigt,
             'dateien': dateien, 'doppelte_kundennummern': self._doppelte,
+            'gesparte_abfragen': self.gesparte_abfragen,
+            'spaltendateien': spaltendateien,
         }
 
-    def _offene_abarbeiten(self, job_id: int, offen: list, entscheidungen: dict,
+    def _spalten_abschliessen(self, job_id: int, schreiber, dateien: dict):
+        """
+        Die Parquet-Dateien des Laufs, dazu alle Kandidaten des Jobs — oder
+        None ohne `spalten`. Die Kandidaten stehen zu diesem Zeitpunkt
+        vollständig in der Datenbank, auch die aus einem früheren Versuch.
+        """
+        if not self.spalten:
+            return None
+        pfade = dict(schreiber.spaltendateien)
+        pfade['kandidaten'] = spaltenexport.kandidaten_schreiben(
+            self.datenbank, job_id,
+            Path(dateien['fertig_fuer_erp']).parent / spaltenexport.KANDIDATEN_DATEI)
+        return pfade
+
+    def _kennzahlen_ablegen(self, job_id: int) -> None:
+        """
+        Legt die Messungen des Durchgangs in `job_kennzahl` ab, dazu, was der
+        Zwischenspeicher in dieser Zeit beantwortet hat.
+
+        Nur auf den geordneten Wegen aus dem Lauf: nach einem Absturz gibt es
+        keine Zusammenfassung, und ein Commit an dieser Stelle würde gesammelte
+        Kunden festschreiben, die der Absturz verwerfen soll.
+        """
+        nachher = kennzahlen.zwischenspeicher_von(self.provider)
+        if nachher is not None and self._zwischenspeicher_vorher is not None:
+            for name in ('treffer', 'fehlgriffe'):
+                self.kennzahlen.zaehlen(f'zwischenspeicher_{name}',
+                                        nachher[name] - self._zwischenspeicher_vorher[name])
+        self.datenbank.kennzahlen_schreiben(job_id, self.kennzahlen.zusammenfassung())
+
+    def _offene_abarbeiten(self, job_id: int, offen, ausgabe: 'Reihenfolge',
                            erledigt: int) -> int:
         """
         Holt die offenen Kunden mit mehreren Arbeitern gleichzeitig.
@@ -264,27 +517,60 @@ class Lauf:
         Datenquelle. Entscheidung, Datenbank und Fortschritt bleiben in diesem
         Thread — deshalb stimmt die Fortschrittszahl jederzeit, und deshalb
         braucht die SQLite-Verbindung keine Sperre.
+
+        Abgefragt wird in Stapeln (`_stapel_bilden`), geschrieben wird je
+        Kunde: auch ein Stapel landet Kunde für Kunde in der Datenbank, mit
+        Fortschritt nach jedem. Ein Absturz mitten im Stapel verliert also
+        nur, was noch nicht geschrieben war — beim Fortsetzen wird genau das
+        noch einmal gefragt.
         """
-        if not offen:
-            return erledigt
+        if self.steuerung is not None:
+            fenster, grund = self.steuerung.entscheide[-1]
+            self.datenbank.fenster_entscheid_schreiben(job_id, fenster, grund)
+        if ist_asynchron(self.provider):
+            return asyncio.run(self._offene_abarbeiten_async(
+                job_id, offen, ausgabe, erledigt))
 
         # Es sind nie mehr Abfragen unterwegs als das Doppelte der Arbeiterzahl.
         # Ohne diese Grenze würden bei 2'500 Kunden alle Abfragen sofort in die
         # Warteschlange gelegt; fertige Ergebnisse lägen dann unter Umständen
         # lange herum, bevor sie in der Datenbank landen — und ein Absturz
         # würde sie mitnehmen.
-        fenster = self.arbeiter * 2
-        nachschub = iter(offen)
-        arbeiter = ThreadPoolExecutor(max_workers=self.arbeiter)
+        #
+        # Mit Steuerung ist das Fenster ihre Zahl, und der Vorrat an Threads
+        # reicht für ihr Maximum — es wartet also nie eine Abfrage auf einen
+        # Thread, und die gemessene Zeit ist die der Datenquelle.
+        arbeiter = ThreadPoolExecutor(
+            max_workers=self.steuerung.maximum if self.steuerung else self.arbeiter)
+        nachschub = self._stapel_bilden(offen)
         auftraege = {}
+        gestellt_um = {}
         unerledigt = set()
 
         def nachfuellen():
-            while len(unerledigt) < fenster:
-                naechster = next(nachschub, None)
-                if naechster is None:
+            nonlocal erledigt
+            grenze = self.steuerung.fenster if self.steuerung else self.arbeiter * 2
+            if self.kontingent is not None:
+                grenze = min(grenze, self.kontingent.anteil(job_id))
+            while len(unerledigt) < grenze:
+                stapel = next(nachschub, None)
+                if stapel is None:
                     return
-                kunden_nr, stamm = naechster
+                antwort = self._antwort_des_ersten(job_id, stapel)
+                if antwort is not None:
+                    erledigt = self._stapel_verbuchen(job_id, stapel, antwort,
+                                                      ausgabe, erledigt)
+                    continue
+                if len(stapel) > 1:
+                    auftrag = arbeiter.submit(self._stapel_holen, [
+                        (str(stamm.get('SearchString', '')).strip(),
+                         str(stamm.get('PLZ', '')).strip())
+                        for _, stamm in stapel])
+                    auftraege[auftrag] = stapel
+                    gestellt_um[auftrag] = time.monotonic()
+                    unerledigt.add(auftrag)
+                    continue
+                kunden_nr, stamm = stapel[0]
                 if self.modus == 'B':
                     auftrag = arbeiter.submit(
                         self._kandidat_ueber_id,
@@ -294,7 +580,8 @@ class Lauf:
                         self._kandidaten_holen,
                         str(stamm.get('SearchString', '')).strip(),
                         str(stamm.get('PLZ', '')).strip())
-                auftraege[auftrag] = (kunden_nr, stamm)
+                auftraege[auftrag] = stapel
+                gestellt_um[auftrag] = time.monotonic()
                 unerledigt.add(auftrag)
 
         try:
@@ -305,15 +592,16 @@ class Lauf:
                 fertig, rest = wait(unerledigt, timeout=TAKT_SEKUNDEN,
                                     return_when=FIRST_COMPLETED)
                 unerledigt = set(rest)
+                self._festschreiben_wenn_faellig()
                 for auftrag in fertig:
                     if self.abbruch.is_set():
                         raise Abgebrochen()
-                    kunden_nr, stamm = auftraege.pop(auftrag)
-                    entscheidungen[kunden_nr] = self._einen_kunden(
-                        job_id, kunden_nr, stamm, self._ergebnis_von(auftrag))
-                    erledigt += 1
-                    # Nach jedem Kunden, nicht am Ende (02_DATENVERTRAG.md §6).
-                    self.datenbank.fortschritt_setzen(job_id, erledigt)
+                    ergebnis = self._ergebnis_von(auftrag)
+                    self._steuern(job_id, ergebnis,
+                                  time.monotonic() - gestellt_um.pop(auftrag))
+                    erledigt = self._stapel_verbuchen(
+                        job_id, auftraege.pop(auftrag), ergebnis,
+                        ausgabe, erledigt)
                 nachfuellen()
         finally:
             # Nicht warten: ein hängender Aufruf darf den Abbruch nicht aufhalten.
@@ -321,6 +609,233 @@ class Lauf:
 
         return erledigt
 
+    async def _offene_abarbeiten_async(self, job_id: int, offen,
+                                       ausgabe: 'Reihenfolge', erledigt: int) -> int:
+        """
+        Wie `_offene_abarbeiten`, aber für einen Provider mit `async def`.
+
+        Gleichzeitig offen sind so viele Abfragen, wie es Arbeiter gibt. Jede
+        hat ihre eigene Frist über `asyncio.wait_for`; kein Aufruf belegt einen
+        Thread. Der Abbruch wird im selben Takt geprüft wie beim Thread-Lauf,
+        offene Abfragen werden dann abgebrochen statt abgewartet.
+
+        Fertige Abfragen werden in der Reihenfolge verbucht, in der sie
+        gestellt wurden, wenn mehrere im selben Takt fertig werden.
+        """
+        nachschub = self._stapel_bilden(offen)
+        auftraege = {}
+        gestellt = 0
+        self._ausfuehrer = None
+
+        def nachfuellen():
+            nonlocal gestellt, erledigt
+            grenze = self.steuerung.fenster if self.steuerung else self.arbeiter
+            if self.kontingent is not None:
+                grenze = min(grenze, self.kontingent.anteil(job_id))
+            while len(auftraege) < grenze:
+                stapel = next(nachschub, None)
+                if stapel is None:
+                    return
+                antwort = self._antwort_des_ersten(job_id, stapel)
+                if antwort is not None:
+                    erledigt = self._stapel_verbuchen(job_id, stapel, antwort,
+                                                      ausgabe, erledigt)
+                    continue
+                auftrag = asyncio.ensure_future(self._stapel_fragen_async(stapel))
+                auftraege[auftrag] = (gestellt, stapel, time.monotonic())
+                gestellt += 1
+
+        try:
+            nachfuellen()
+            while auftraege:
+                if self.abbruch.is_set():
+                    raise Abgebrochen()
+                fertig, _ = await asyncio.wait(auftraege, timeout=TAKT_SEKUNDEN,
+                                               return_when=asyncio.FIRST_COMPLETED)
+                self._festschreiben_wenn_faellig()
+                for auftrag in sorted(fertig, key=lambda a: auftraege[a][0]):
+                    if self.abbruch.is_set():
+                        raise Abgebrochen()
+                    _, stapel, gestellt_um = auftraege.pop(auftrag)
+                    ergebnis = self._ergebnis_von(auftrag)
+                    self._steuern(job_id, ergebnis, time.monotonic() - gestellt_um)
+                    erledigt = self._stapel_verbuchen(
+                        job_id, stapel, ergebnis, ausgabe, erledigt)
+                nachfuellen()
+        finally:
+            for auftrag in auftraege:
+                auftrag.cancel()
+            await asyncio.gather(*auftraege, return_exceptions=True)
+            if self._ausfuehrer is not None:
+                self._ausfuehrer.shutdown(wait=False, cancel_futures=True)
+
+        return erledigt
+
+    def _festschreiben_wenn_faellig(self) -> None:
+        beginn = time.perf_counter()
+        if self.datenbank.festschreiben_wenn_faellig():
+            self.kennzahlen.beobachten('festschreiben', time.perf_counter() - beginn)
+
+    def _steuern(self, job_id: int, ergebnis: list, dauer: float) -> None:
+        """Meldet eine fertige Abfrage an die Steuerung und hält deren Entscheid fest."""
+        if self.steuerung is None:
+            return
+        if isinstance(ergebnis, Ausgefallen):
+            grund = self.steuerung.fehlschlag()
+        else:
+            grund = self.steuerung.erfolg(dauer)
+        if grund:
+            self.datenbank.fenster_entscheid_schreiben(
+                job_id, self.steuerung.fenster, grund)
+
+    def _stapel_verbuchen(self, job_id: int, stapel: list, ergebnis: list,
+                          ausgabe: 'Reihenfolge', erledigt: int) -> int:
+        """
+        Entscheidet und schreibt die Kunden einer fertigen Abfrage, einen nach
+        dem anderen. Liefert die neue Zahl der erledigten Kunden.
+        """
+        if len(stapel) == 1:
+            ergebnisse = [ergebnis]
+        elif isinstance(ergebnis, Ausgefallen):
+            # Ein ausgefallener Stapel ist für jeden Kunden darin
+            # ausgefallen — gezählt wird er einmal.
+            ergebnisse = [Ausgefallen() for _ in stapel]
+        else:
+            ergebnisse = ergebnis
+
+        for (kunden_nr, stamm), kandidaten in zip(stapel, ergebnisse):
+            # Wer dieselbe Abfrage hat, bekommt dieselbe Antwort — aber seine
+            # eigene Entscheidung und seine eigenen Zeilen in der Datenbank.
+            for mit_nr, mit_stamm in [(kunden_nr, stamm)] + self._mitfahrer.pop(kunden_nr, []):
+                if self.abbruch.is_set():
+                    raise Abgebrochen()
+                eigene = Ausgefallen() if isinstance(kandidaten, Ausgefallen) \
+                    else list(kandidaten)
+                ablage = self._einen_kunden(job_id, mit_nr, mit_stamm, eigene)
+                with self.kennzahlen.messen('ausgabe'):
+                    ausgabe.ablegen(mit_nr, ablage)
+                self.kennzahlen.zaehlen('kunden')
+                erledigt += 1
+                # Nach jedem Kunden, nicht am Ende (02_DATENVERTRAG.md §6).
+                self.datenbank.fortschritt_setzen(job_id, erledigt)
+        return erledigt
+
+    def _gleiche_zusammenlegen(self, offen):
+        """
+        Legt Kunden mit derselben Abfrage zusammen — etwa Filialen, die unter
+        eigener KundenNr abgerechnet werden, aber denselben Suchbegriff und
+        dieselbe PLZ tragen (im Modus B: dieselbe Google-Id).
+
+        Gefragt wird nur für den ersten. Ist seine Antwort noch unterwegs,
+        hängen die übrigen als Mitfahrer an ihm und werden mit ihm verbucht.
+        Ist sie schon verbucht, kommt sie für den späteren Kunden aus der
+        Datenbank (`_antwort_des_ersten`). Liefert die Kunden in ihrer
+        Reihenfolge, ohne die Mitfahrer — und liest `offen` erst, wenn der
+        Lauf den nächsten Kunden braucht. Behalten wird je Abfrage nur die
+        KundenNr ihres ersten Kunden.
+
+        Stürzt der Lauf ab, bevor ein Mitfahrer verbucht ist, fragt das
+        Fortsetzen für ihn wie für jeden offenen Kunden.
+        """
+        self._mitfahrer = {}
+        self._nachzuegler = {}
+        self.gesparte_abfragen = 0
+        if not self.zusammenlegen:
+            return offen
+
+        def fragen():
+            erster_je_abfrage = {}
+            for kunden_nr, stamm in offen:
+                abfrage = self._abfrage_von(stamm)
+                erster = erster_je_abfrage.get(abfrage) if abfrage else None
+                if erster is None:
+                    if abfrage:
+                        erster_je_abfrage[abfrage] = kunden_nr
+                        self._mitfahrer[kunden_nr] = []
+                    yield kunden_nr, stamm
+                    continue
+                self.gesparte_abfragen += 1
+                if erster in self._mitfahrer:
+                    self._mitfahrer[erster].append((kunden_nr, stamm))
+                else:
+                    self._nachzuegler[kunden_nr] = erster
+                    yield kunden_nr, stamm
+
+        return fragen()
+
+    def _antwort_des_ersten(self, job_id: int, stapel: list):
+        """
+        Die Antwort für einen Kunden, dessen erster Kunde mit derselben
+        Abfrage schon verbucht ist: dessen Kandidaten aus der Datenbank, wie
+        beim Fortsetzen — oder ausgefallen, wenn seine Abfrage ausfiel.
+        None für jeden anderen Stapel; für ihn wird gefragt.
+        """
+        if len(stapel) != 1 or stapel[0][0] not in self._nachzuegler:
+            return None
+        erster = self.datenbank.kunde_nach_nummer(
+            job_id, self._nachzuegler.pop(stapel[0][0]))
+        if self.modus == 'B':
+            ausgefallen = erster['qualitaet'] == 'NICHT_MOEGLICH (kein Ergebnis)'
+        else:
+            ausgefallen = (erster['grund'] or '') == AUSGEFALLENE_ABFRAGE_GRUND
+        if ausgefallen:
+            return Ausgefallen()
+        return [candidate_aus_zeile(z)
+                for z in self.datenbank.kandidaten_lesen(erster['id'])]
+
+    def _abfrage_von(self, stamm) -> tuple:
+        """Was beim Provider gefragt wird. Leer, wenn es nichts zu fragen gibt."""
+        if self.modus == 'B':
+            place_id = str(stamm.get('placeId', '')).strip()
+            return (place_id,) if place_id else ()
+        search_string = str(stamm.get('SearchString', '')).strip()
+        if not search_string:
+            return ()
+        return (search_string, str(stamm.get('PLZ', '')).strip())
+
+    def _stapel_bilden(self, offen: list):
+        """
+        Teilt die offenen Kunden in Stapel, die sich eine Abfrage teilen.
+
+        Ein Stapel trägt eine einzige PLZ. Gesucht wird nur in einem Fenster
+        von `VORSCHAU_STAPEL` Stapeln voraus: ist ein Stapel voll, geht er
+        sofort hinaus; ist das Fenster voll, geht der grösste hinaus. So muss
+        die Eingabe nicht nach PLZ sortiert sein, und der erste Kunde wartet
+        nicht auf den letzten.
+
+        Einzeln bleibt es im Modus B, bei Stapelgrösse 1 und bei Providern
+        ohne `fetch_by_texts` — dort ändert sich nichts.
+        """
+        if (self.stapelgroesse <= 1 or self.modus == 'B'
+                or not hasattr(self.provider, 'fetch_by_texts')):
+            for kunde in offen:
+                yield [kunde]
+            return
+
+        vorschau = self.stapelgroesse * VORSCHAU_STAPEL
+        je_plz = {}
+        zurueckgehalten = 0
+        for kunde in offen:
+            if kunde[0] in self._nachzuegler:
+                yield [kunde]  # wird nicht gefragt (`_antwort_des_ersten`)
+                continue
+            plz = str(kunde[1].get('PLZ', '')).strip()
+            stapel = je_plz.setdefault(plz, [])
+            stapel.append(kunde)
+            zurueckgehalten += 1
+            if len(stapel) >= self.stapelgroesse:
+                del je_plz[plz]
+                zurueckgehalten -= len(stapel)
+                yield stapel
+            elif zurueckgehalten >= vorschau:
+                groesster = max(je_plz, key=lambda p: len(je_plz[p]))
+                stapel = je_plz.pop(groesster)
+                zurueckgehalten -= len(stapel)
+                yield stapel
+
+        # Der Rest in der Reihenfolge, in der die PLZ zuerst auftauchte.
+        yield from je_plz.values()
+
     def _ergebnis_von(self, auftrag) -> list:
         """
         Holt das Ergebnis einer Abfrage und wacht über die Fehlschläge.
@@ -336,6 +851,7 @@ class Lauf:
             if fehler.endgueltig:
                 raise
             self._fehlschlaege += 1
+            self.kennzahlen.zaehlen('fehlschlaege')
             if self._fehlschlaege >= MAX_FEHLSCHLAEGE_HINTEREINANDER:
                 raise QuelleNichtVerfuegbar(fehler.meldung) from fehler
             # Nur die Tatsache ins Protokoll — die Meldung für den Nutzer
@@ -363,8 +879,8 @@ class Lauf:
         plz = str(stamm.get('PLZ', '')).strip()
         stadt = str(stamm.get('Stadt', '')).strip()
 
-        gruppe = self._als_gruppe(kunden_nr, search_string, plz, stadt, kandidaten)
-        ablage = self.cleaner.entscheide_kunde(kunden_nr, gruppe)
+        with self.kennzahlen.messen('entscheidung'):
+            ablage = self._entscheiden(kunden_nr, search_string, plz, stadt, kandidaten)
 
         # Eine ausgefallene Abfrage ist kein leeres Ergebnis. Die Fachlogik
         # kann das nicht unterscheiden — sie bekommt beides Mal eine Gruppe
@@ -375,13 +891,14 @@ class Lauf:
         datei = self._gewaehlte_datei(ablage)
         kopfzeile = ablage[datei][0]
 
-        self.datenbank.kunde_mit_kandidaten_schreiben(
-            job_id, kunden_nr,
-            self._kandidaten_eintraege(kandidaten, ablage),
-            search_string=search_string, plz=plz, stadt=stadt,
-            ergebnis=ERGEBNIS_JE_DATEI[datei],
-            qualitaet=kopfzeile['qualitaet'],
-            grund=kopfzeile['grund'])
+        eintraege = self._kandidaten_eintraege(kandidaten, ablage)
+        with self.kennzahlen.messen('datenbank'):
+            self.datenbank.kunde_mit_kandidaten_schreiben(
+                job_id, kunden_nr, eintraege,
+                search_string=search_string, plz=plz, stadt=stadt,
+                ergebnis=ERGEBNIS_JE_DATEI[datei],
+                qualitaet=kopfzeile['qualitaet'],
+                grund=kopfzeile['grund'])
 
         return ablage
 
@@ -419,9 +936,10 @@ class Lauf:
         kandidat = kandidaten[0] if kandidaten else None
 
         # Eine ausgefallene Abfrage ist kein gelöschter Eintrag.
-        ablage = modus_b.entscheide_kunde(
-            kunden_nr, stamm, kandidat,
-            erreichbar=not isinstance(kandidaten, Ausgefallen))
+        with self.kennzahlen.messen('entscheidung'):
+            ablage = modus_b.entscheide_kunde(
+                kunden_nr, stamm, kandidat,
+                erreichbar=not isinstance(kandidaten, Ausgefallen))
         datei = self._gewaehlte_datei(ablage)
         kopfzeile = ablage[datei][0]
 
@@ -430,25 +948,74 @@ class Lauf:
             eintraege = [(kandidat, kopfzeile['score'],
                           ENTSCHEID_JE_DATEI[datei], kopfzeile['grund'])]
 
-        self.datenbank.kunde_mit_kandidaten_schreiben(
-            job_id, kunden_nr, eintraege,
-            place_id=place_id, lat=breite, lng=laenge,
-            ergebnis=ERGEBNIS_JE_DATEI[datei],
-            qualitaet=kopfzeile['qualitaet'],
-            grund=kopfzeile['grund'])
+        with self.kennzahlen.messen('datenbank'):
+            self.datenbank.kunde_mit_kandidaten_schreiben(
+                job_id, kunden_nr, eintraege,
+                place_id=place_id, lat=breite, lng=laenge,
+                ergebnis=ERGEBNIS_JE_DATEI[datei],
+                qualitaet=kopfzeile['qualitaet'],
+                grund=kopfzeile['grund'])
 
         return ablage
 
-    def _aus_datenbank(self, kunde: dict) -> dict:
+    def _wiederherstellung(self, job_id: int, bereits: dict):
+        """
+        Wie die bereits verarbeiteten Kunden in die Ausgabe kommen
+        (WIEDERAUFNAHME_ARTEN). Liefert eine Funktion: Zeile aus `kunde` →
+        Ablage.
+
+        Die Kandidaten aller dieser Kunden kommen mit einer einzigen Abfrage,
+        nicht mit einer je Kunde. Beim Übernehmen wird zuerst eine Stichprobe
+        hergeleitet; weicht sie ab, wird für alle hergeleitet.
+        """
+        gespeichert = self.datenbank.kandidaten_des_jobs(job_id) if bereits else {}
+
+        def herleiten(kunde: dict) -> dict:
+            return self._aus_datenbank(kunde, gespeichert.pop(kunde['id'], []))
+
+        def uebernehmen(kunde: dict) -> dict:
+            return ablage_aus_gespeichertem(kunde, gespeichert.pop(kunde['id'], []))
+
+        if self.wiederaufnahme == 'herleiten' or self.modus == 'B' or not bereits:
+            return herleiten
+        if not self._stichprobe_stimmt(job_id, bereits, gespeichert):
+            return herleiten
+        return uebernehmen
+
+    def _stichprobe_stimmt(self, job_id: int, bereits: dict, gespeichert: dict) -> bool:
+        """Ergeben Herleiten und Übernehmen für eine Stichprobe dieselben Zeilen?"""
+        auswahl = random.Random(job_id).sample(
+            list(bereits.values()), min(self.stichprobe, len(bereits)))
+
+        def vergleichbar(ablage: dict) -> dict:
+            return {datei: [[zeile.get(spalte, '') for spalte in OUTPUT_COLUMNS]
+                            for zeile in zeilen]
+                    for datei, zeilen in ablage.items() if datei != 'aussortiert'}
+
+        for kunde in auswahl:
+            kandidaten = gespeichert.get(kunde['id'], [])
+            if (vergleichbar(self._aus_datenbank(kunde, kandidaten))
+                    != vergleichbar(ablage_aus_gespeichertem(kunde, kandidaten))):
+                logger.warning(f'Job {job_id}: Kunde {kunde["kunden_nr"]} ergibt '
+                               f'übernommen andere Zeilen als hergeleitet. Alle '
+                               f'Kunden werden hergeleitet.')
+                return False
+        if auswahl:
+            logger.info(f'Job {job_id}: Stichprobe von {len(auswahl)} Kunden stimmt.')
+        return True
+
+    def _aus_datenbank(self, kunde: dict, kandidaten_zeilen: list = None) -> dict:
         """
         Stellt die Entscheidung eines bereits verarbeiteten Kunden wieder her.
 
         Kein Netzzugriff: die Kandidaten liegen in der Datenbank. Die
         Fachlogik ist dieselbe wie beim ersten Mal, also fällt dieselbe
-        Entscheidung — Zeile für Zeile.
+        Entscheidung — Zeile für Zeile. Sind die Zeilen aus `kandidat` schon
+        gelesen, werden sie übergeben.
         """
-        kandidaten = [candidate_aus_zeile(z)
-                      for z in self.datenbank.kandidaten_lesen(kunde['id'])]
+        if kandidaten_zeilen is None:
+            kandidaten_zeilen = self.datenbank.kandidaten_lesen(kunde['id'])
+        kandidaten = [candidate_aus_zeile(z) for z in kandidaten_zeilen]
 
         if self.modus == 'B':
             stamm = {'placeId': kunde['place_id'] or '',
@@ -460,9 +1027,8 @@ class Lauf:
                 kunde['kunden_nr'], stamm,
                 kandidaten[0] if kandidaten else None, erreichbar=erreichbar)
 
-        gruppe = self._als_gruppe(kunde['kunden_nr'], kunde['search_string'] or '',
-                                  kunde['plz'] or '', kunde['stadt'] or '', kandidaten)
-        ablage = self.cleaner.entscheide_kunde(kunde['kunden_nr'], gruppe)
+        ablage = self._entscheiden(kunde['kunden_nr'], kunde['search_string'] or '',
+                                   kunde['plz'] or '', kunde['stadt'] or '', kandidaten)
 
         # Im Modus A tragen beide Fälle dieselbe `qualitaet` — die damalige
         # Entscheidung steht deshalb im Grund. Ohne diese Zeile fiele der
@@ -492,7 +1058,24 @@ class Lauf:
             lambda: self.provider.fetch_by_text(search_string, plz), search_string)
         return list(treffer) if treffer else []
 
-    def _mit_frist(self, aufruf, bezeichnung: str):
+    def _stapel_holen(self, anfragen: list) -> list:
+        """
+        Fragt den Provider nach Treffern zu mehreren Texten in einem Zug.
+
+        Die Frist wächst mit der Zahl der Suchbegriffe (`stapel_frist`). Kommt
+        kein Ergebnis, bekommt jeder Kunde im Stapel eine leere Liste — wie
+        beim Einzelaufruf.
+        """
+        anzahl = len({text for text, _ in anfragen})
+        treffer = self._mit_frist(
+            lambda: self.provider.fetch_by_texts(anfragen),
+            f'Stapel mit {len(anfragen)} Kunden (PLZ {anfragen[0][1]})',
+            frist=stapel_frist(self.timeout_sekunden, anzahl))
+        if not treffer:
+            return [[] for _ in anfragen]
+        return [list(t) if t else [] for t in treffer]
+
+    def _mit_frist(self, aufruf, bezeichnung: str, frist: float = None):
         """
         Führt einen Aufruf an die Datenquelle aus, aber nicht länger als erlaubt.
 
@@ -508,10 +1091,27 @@ class Lauf:
 
         Der Abbruch durch den Nutzer bleibt davon unberührt: er liefert `None`
         und ist keine Zeitüberschreitung.
+
+        `frist` ersetzt den Timeout je Kunde, wenn ein Aufruf mehrere Kunden
+        trägt.
+
+        Gemessen wird dreifach: die ganze Abfrage, die Übergabe bis zum
+        Beginn im Thread und der Aufruf selbst.
         """
+        frist = self.timeout_sekunden if frist is None else frist
+        eingereicht = time.perf_counter()
+
+        def gemessen():
+            beginn = time.perf_counter()
+            self.kennzahlen.beobachten('uebergabe', beginn - eingereicht)
+            try:
+                return self._im_auftrag(aufruf)
+            finally:
+                self.kennzahlen.beobachten('quelle', time.perf_counter() - beginn)
+
         ausfuehrer = ThreadPoolExecutor(max_workers=1)
-        auftrag = ausfuehrer.submit(aufruf)
-        ende = time.monotonic() + self.timeout_sekunden
+        auftrag = ausfuehrer.submit(gemessen)
+        ende = time.monotonic() + frist
         try:
             while True:
                 if self.abbruch.is_set():
@@ -519,10 +1119,11 @@ class Lauf:
                 rest = ende - time.monotonic()
                 if rest <= 0:
                     logger.warning(f'Keine Antwort innerhalb von '
-                                   f'{self.timeout_sekunden} Sekunden für '
+                                   f'{frist} Sekunden für '
                                    f'"{bezeichnung}". Zählt als Fehlschlag, '
                                    f'nicht als leeres Ergebnis.')
                     auftrag.cancel()
+                    self.kennzahlen.zaehlen('zeitueberschreitungen')
                     raise QuelleNichtVerfuegbar(ZEITUEBERSCHREITUNG_MELDUNG,
                                                 endgueltig=False)
                 try:
@@ -538,28 +1139,114 @@ class Lauf:
         finally:
             # Nicht warten: ein hängender Aufruf soll den Lauf nicht festhalten.
             ausfuehrer.shutdown(wait=False)
+            self.kennzahlen.beobachten('abfrage', time.perf_counter() - eingereicht)
 
-    @staticmethod
-    def _als_gruppe(kunden_nr: str, search_string: str, plz: str, stadt: str,
-                    kandidaten: list) -> pd.DataFrame:
-        """
-        Baut die Kundengruppe, die die Fachlogik erwartet.
+    # ------------------------------------------------------------------
+    # Abfragen mit async def
+    # ------------------------------------------------------------------
+
+    async def _stapel_fragen_async(self, stapel: list) -> list:
+        """Dasselbe wie `_kandidaten_holen`, `_kandidat_ueber_id` und `_stapel_holen`."""
+        if len(stapel) > 1:
+            anfragen = [(str(stamm.get('SearchString', '')).strip(),
+                         str(stamm.get('PLZ', '')).strip()) for _, stamm in stapel]
+            treffer = await self._mit_frist_async(
+                self.provider.fetch_by_texts, (anfragen,),
+                f'Stapel mit {len(anfragen)} Kunden (PLZ {anfragen[0][1]})',
+                frist=stapel_frist(self.timeout_sekunden,
+                                   len({text for text, _ in anfragen})))
+            if not treffer:
+                return [[] for _ in anfragen]
+            return [list(t) if t else [] for t in treffer]
+
+        _, stamm = stapel[0]
+        if self.modus == 'B':
+            place_id = str(stamm.get('placeId', '')).strip()
+            if not place_id:
+                return []
+            kandidat = await self._mit_frist_async(
+                self.provider.fetch_by_id, (place_id,), place_id)
+            return [kandidat] if kandidat else []
 
-        Aufbau wie die bisherige angereicherte CSV: Stammdaten links, ein
-        Kandidat je Zeile rechts. Ohne Kandidaten entsteht eine einzige Zeile mit
-        leeren Trefferfeldern — genau das, was die Fachlogik als "kein Ergebnis"
-        liest.
+        search_string = str(stamm.get('SearchString', '')).strip()
+        plz = str(stamm.get('PLZ', '')).strip()
+        treffer = await self._mit_frist_async(
+            self.provider.fetch_by_text, (search_string, plz), search_string)
+        return list(treffer) if treffer else []
+
+    async def _mit_frist_async(self, funktion, argumente: tuple, bezeichnung: str,
+                               frist: float = None):
         """
-        stamm = {'KundenNr': kunden_nr, 'SearchString': search_string,
-                 'PLZ': plz, 'Stadt': stadt}
+        Gegenstück zu `_mit_frist`: dieselbe Frist, dieselben Folgen.
 
-        if not kandidaten:
-            zeilen = [{**stamm, **leere_ausgabezeile(), KANDIDAT_NR: -1}]
+        Eine Zeitüberschreitung ist ein Fehlschlag, kein leeres Ergebnis; ein
+        anderer Fehler liefert `None`. Eine Methode ohne `async def` — etwa
+        `fetch_by_texts` eines sonst asynchronen Providers — läuft in einem
+        festen Vorrat von Threads, nicht in einem neuen je Aufruf; einem
+        Thread je Abfrage, die gleichzeitig offen sein darf.
+
+        Gemessen wird nur die ganze Abfrage; eine Übergabe an einen Thread
+        gibt es hier nicht.
+        """
+        frist = self.timeout_sekunden if frist is None else frist
+        beginn = time.perf_counter()
+        # Die Aufgabe, die `wait_for` anlegt, übernimmt den Kontext von hier;
+        # ein Thread des Vorrats nicht, dort setzt ihn `_im_auftrag`.
+        marke = ABBRUCH.set(self.abbruch)
+        if inspect.iscoroutinefunction(funktion):
+            aufruf = funktion(*argumente)
         else:
-            zeilen = [{**stamm, **kandidat.als_ausgabezeile(), KANDIDAT_NR: nummer}
-                      for nummer, kandidat in enumerate(kandidaten)]
+            if self._ausfuehrer is None:
+                # So viele Threads, wie Abfragen offen sein dürfen: die Frist
+                # läuft ab hier, eine Abfrage darf nicht auf einen Thread warten.
+                self._ausfuehrer = ThreadPoolExecutor(
+                    max_workers=self.steuerung.maximum if self.steuerung else self.arbeiter)
+            aufruf = asyncio.get_running_loop().run_in_executor(
+                self._ausfuehrer, self._im_auftrag, funktion, *argumente)
+        try:
+            return await asyncio.wait_for(aufruf, frist)
+        except asyncio.TimeoutError:
+            logger.warning(f'Keine Antwort innerhalb von {frist} Sekunden für '
+                           f'"{bezeichnung}". Zählt als Fehlschlag, nicht als '
+                           f'leeres Ergebnis.')
+            self.kennzahlen.zaehlen('zeitueberschreitungen')
+            raise QuelleNichtVerfuegbar(ZEITUEBERSCHREITUNG_MELDUNG,
+                                        endgueltig=False)
+        except QuelleNichtVerfuegbar:
+            raise
+        except Exception as fehler:
+            logger.error(f'Datenquelle meldet einen Fehler für "{bezeichnung}": '
+                         f'{fehler}')
+            return None
+        finally:
+            ABBRUCH.reset(marke)
+            self.kennzahlen.beobachten('abfrage', time.perf_counter() - beginn)
+
+    def _im_auftrag(self, aufruf, *argumente):
+        """
+        Fragt die Datenquelle im Namen dieses Laufs: mit seinem Abbruch-Signal
+        in `place_provider.ABBRUCH`, damit ein geteilter Provider beim Abbruch
+        nur die Abfragen dieses Laufs stoppt.
+        """
+        marke = ABBRUCH.set(self.abbruch)
+        try:
+            return aufruf(*argumente)
+        finally:
+            ABBRUCH.reset(marke)
 
-        return pd.DataFrame(zeilen)
+    def _entscheiden(self, kunden_nr: str, search_string: str, plz: str, stadt: str,
+                     kandidaten: list) -> dict:
+        """
+        Die Fachlogik für einen Kunden, direkt aus den Kandidaten.
+
+        Kein DataFrame je Kunde: bei einer Handvoll Kandidaten kostet sein
+        Aufbau mehr als die Entscheidung selbst. Jede Ausgabezeile trägt unter
+        KANDIDAT_NR die Position ihres Kandidaten (s. _kandidaten_eintraege).
+        """
+        stamm = {'KundenNr': kunden_nr, 'SearchString': search_string,
+                 'PLZ': plz, 'Stadt': stadt}
+        return self.cleaner.entscheide_kandidaten(kunden_nr, stamm, kandidaten,
+                                                  nummer_spalte=KANDIDAT_NR)
 
     @staticmethod
     def _gewaehlte_datei(ablage: dict) -> str:
@@ -5,6 +5,10 @@
 # Google Place Details, eine Datei mit festen Antworten — bleibt in ihm.
 # Ausserhalb eines Providers kennt kein Modul die Feldnamen einer Datenquelle.
 
+import ast
+import contextvars
+import inspect
+import re
 from dataclasses import dataclass, fields
 from typing import Protocol
 
@@ -28,6 +32,12 @@ CSV_FELDER = {
     'location': 'location',
 }
 
+# Die Schreibweise, in der Apify und Google den Standort liefern. Passt der
+# Text genau darauf, reicht ein regulärer Ausdruck statt `ast.literal_eval` —
+# mit denselben Zahlen, nur ohne den Python-Parser je Kunde.
+_ZAHL = r'(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)'
+_STANDORT = re.compile(rf"\{{'lat': {_ZAHL}, 'lng': {_ZAHL}\}}")
+
 
 def als_text(wert) -> str:
     """
@@ -45,6 +55,35 @@ def als_text(wert) -> str:
     return str(wert)
 
 
+def koordinaten(text) -> tuple:
+    """
+    Holt Breite und Länge aus dem Standort eines Kandidaten.
+
+    Der Standort steht als Text im Candidate (`kandidat.location` ist TEXT),
+    in der Schreibweise `{'lat': 47.35, 'lng': 8.24}`. Was sich nicht lesen
+    lässt, gilt als nicht vorhanden — dann findet keine Distanzprüfung statt.
+    """
+    if text in (None, ''):
+        return None
+    if isinstance(text, dict):
+        werte = text
+    else:
+        treffer = _STANDORT.fullmatch(str(text))
+        if treffer:
+            return float(treffer[1]), float(treffer[2])
+        try:
+            werte = ast.literal_eval(str(text))
+        except (ValueError, SyntaxError):
+            zahlen = re.findall(r'-?\d+\.?\d*', str(text))
+            return (float(zahlen[0]), float(zahlen[1])) if len(zahlen) >= 2 else None
+    if not isinstance(werte, dict):
+        return None
+    try:
+        return float(werte['lat']), float(werte['lng'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
 @dataclass
 class Candidate:
     """
@@ -85,6 +124,16 @@ class Candidate:
         return not any(str(wert).strip() for wert in
                        (self.title, self.address, self.street, self.place_id))
 
+    def standort(self) -> tuple:
+        """
+        Breite und Länge als Zahlen, oder None. Gelesen wird `location` nur
+        einmal; ein Kandidat aus der Datenbank bringt die Zahlen schon mit
+        (Tabelle `kandidat_ort`, s. `candidate_aus_zeile`).
+        """
+        if not hasattr(self, '_standort'):
+            self._standort = koordinaten(self.location)
+        return self._standort
+
 
 def leere_ausgabezeile() -> dict:
     """Die vierzehn Kandidatenspalten, alle leer — für Kunden ohne jeden Treffer."""
@@ -97,8 +146,41 @@ def candidate_aus_zeile(zeile) -> Candidate:
 
     Gebraucht bei der Wiederaufnahme: die Treffer eines bereits verarbeiteten
     Kunden stehen in der Datenbank und müssen nicht erneut geholt werden.
+    Liest die Zeile `kandidat_ort` mit (Spalten `lat` und `lng`), übernimmt
+    der Candidate den Standort von dort, statt `location` erneut zu lesen.
+    """
+    kandidat = Candidate(**{feld.name: zeile[feld.name] for feld in fields(Candidate)})
+    if 'lat' in zeile.keys():
+        kandidat._standort = (None if zeile['lat'] is None
+                              else (zeile['lat'], zeile['lng']))
+    return kandidat
+
+
+class OhneAntwort(list):
+    """
+    Eine leere Trefferliste, hinter der keine Antwort steht.
+
+    Für den Lauf ist sie dasselbe wie «nichts gefunden» (03_ENTSCHEIDUNGEN.md
+    C) — etwa wenn der Apify-Lauf nicht erfolgreich endete. Wer Antworten
+    aufbewahrt, muss sie aber unterscheiden können: eine solche Liste darf
+    nicht für einen ganzen Monat als Antwort gelten.
+    """
+
+
+# Zuschlag je weiterem Suchbegriff in einem Stapel. Geschätzt, nicht gemessen:
+# der Kaltstart fällt einmal an, jeder zusätzliche Begriff kostet nur noch
+# seine eigene Suche. Wer es genauer weiss, ändert es hier.
+STAPEL_ZUSCHLAG_SEKUNDEN = 20
+
+
+def stapel_frist(timeout_sekunden: float, anzahl: int) -> float:
+    """
+    Frist für eine Abfrage mit `anzahl` Suchbegriffen in einem Zug.
+
+    Ein einzelner Begriff bekommt genau den Timeout je Kunde — dort ändert
+    sich nichts. Jeder weitere verlängert die Frist um den Zuschlag.
     """
-    return Candidate(**{feld.name: zeile[feld.name] for feld in fields(Candidate)})
+    return timeout_sekunden + max(0, anzahl - 1) * STAPEL_ZUSCHLAG_SEKUNDEN
 
 
 class QuelleNichtVerfuegbar(Exception):
@@ -130,3 +212,46 @@ class PlaceProvider(Protocol):
 
     def fetch_by_id(self, place_id: str) -> Candidate | None:
         ...
+
+
+class AsyncPlaceProvider(Protocol):
+    """
+    Dieselbe Schnittstelle für Datenquellen, die ohne Thread warten können.
+
+    Gleiche Namen, gleiche Bedeutung, gleiche Fehler — nur mit `async def`.
+    Der Lauf erkennt sie an `ist_asynchron` und hält dann viele Abfragen
+    gleichzeitig offen, ohne je Abfrage einen Thread zu belegen.
+    """
+
+    async def fetch_by_text(self, search_string: str, plz: str) -> list[Candidate]:
+        ...
+
+    async def fetch_by_id(self, place_id: str) -> Candidate | None:
+        ...
+
+
+def ist_asynchron(provider) -> bool:
+    """Bietet der Provider die Schnittstelle mit `async def` an?"""
+    return any(inspect.iscoroutinefunction(getattr(provider, name, None))
+               for name in ('fetch_by_text', 'fetch_by_id'))
+
+
+# Freiwillig, nicht Teil des Vertrags: ein Provider, der mehrere Textsuchen in
+# einem Zug beantworten kann, bietet zusätzlich
+#
+#     fetch_by_texts(anfragen: list[tuple[str, str]]) -> list[list[Candidate]]
+#
+# an — je Anfrage (Suchbegriff, PLZ) eine Trefferliste, in derselben
+# Reihenfolge, alle Anfragen mit derselben PLZ. Die Pipeline nutzt es, wenn es
+# da ist, und fragt sonst einzeln. Ein asynchroner Provider darf es ebenfalls
+# mit `async def` anbieten.
+
+
+# Ebenfalls freiwillig: `abbrechen()` stoppt, was gerade bei der Datenquelle
+# rechnet. Mehrere Läufe können sich einen Provider teilen (worker.Planer) —
+# für wen gefragt und für wen abgebrochen wird, steht deshalb hier: das
+# Abbruch-Signal des Laufs, gesetzt für die Dauer jeder Abfrage und jedes
+# Abbruchs. Ein Provider mit `abbrechen` hält damit fest, welche Abfrage zu
+# welchem Lauf gehört, und stoppt nur die des abbrechenden. Ist nichts
+# gesetzt, gilt der Abbruch allen.
+ABBRUCH = contextvars.ContextVar('abbruch', default=None)
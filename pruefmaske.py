@@ -11,15 +11,16 @@
 # ausdrücklich als Grundlage für diese Maske. Entschieden wird, was schon da
 # ist.
 
+import csv
 import logging
 from pathlib import Path
 
 import pandas as pd
 
-from data_cleaner import (OUTPUT_COLUMNS, OUTPUT_FILES, ausgabeordner_fuer,
-                          leere_ablage, schreibe_ausgabedateien)
-from place_provider import CSV_FELDER, leere_ausgabezeile
-from pipeline import ENTSCHEID_JE_DATEI, ERGEBNIS_JE_DATEI
+from data_cleaner import (OUTPUT_COLUMNS, OUTPUT_FILES, TEIL_ENDUNG,
+                          ausgabeordner_fuer, leere_ablage,
+                          schreibe_ausgabedateien)
+from pipeline import ablage_aus_gespeichertem
 
 logger = logging.getLogger(__name__)
 
@@ -60,10 +61,9 @@ GRUND_KEINER = ('Von Hand geprüft: keiner der gefundenen Treffer gehört zu '
 
 def fortschritt(datenbank, job_id: int) -> dict:
     """Wie viele Prüffälle es gab, wie viele davon noch offen sind."""
-    offen = len(datenbank.pruefaelle_lesen(job_id))
-    entschieden = sum(
-        1 for kunde in datenbank.kunden_lesen(job_id)
-        if kunde['qualitaet'] in (GEWAEHLT_QUALITAET, KEINER_QUALITAET))
+    gezaehlt = datenbank.pruefaelle_zaehlen(
+        job_id, (GEWAEHLT_QUALITAET, KEINER_QUALITAET))
+    offen, entschieden = gezaehlt['offen'], gezaehlt['entschieden']
     gesamt = offen + entschieden
     return {
         'offen': offen,
@@ -80,16 +80,14 @@ def naechster_offener(datenbank, job_id: int, nach_kunde_id: int = None) -> int:
 
     Nach einer Entscheidung springt die Maske dorthin. Das ist die Grundlage
     dafür, dass fünfzig Fälle hintereinander ohne Mausgriff gehen: entscheiden,
-    und der nächste Fall steht schon da.
+    und der nächste Fall steht schon da. Hinter dem letzten geht es vorne
+    weiter.
     """
-    offen = datenbank.pruefaelle_lesen(job_id)
-    if not offen:
-        return None
     if nach_kunde_id is not None:
-        dahinter = [k for k in offen if k['id'] > nach_kunde_id]
-        if dahinter:
-            return dahinter[0]['id']
-    return offen[0]['id']
+        dahinter = datenbank.naechster_pruefall(job_id, nach_kunde_id)
+        if dahinter is not None:
+            return dahinter
+    return datenbank.naechster_pruefall(job_id)
 
 
 def entscheiden(datenbank, kunde_id: int, kandidat_id: int = None) -> dict:
@@ -128,19 +126,6 @@ def entscheiden(datenbank, kunde_id: int, kandidat_id: int = None) -> dict:
 # Die Dateien neu schreiben
 # ==========================================================================
 
-def _stammspalten(kunde: dict) -> dict:
-    return {'KundenNr': kunde['kunden_nr'],
-            'SearchString': kunde['search_string'] or '',
-            'PLZ': kunde['plz'] or '',
-            'Stadt': kunde['stadt'] or ''}
-
-
-def _kandidatspalten(kandidat: dict) -> dict:
-    """Die vierzehn Trefferspalten aus einer Zeile der Tabelle `kandidat`."""
-    return {spalte: (kandidat[feld] if kandidat[feld] is not None else '')
-            for feld, spalte in CSV_FELDER.items()}
-
-
 def _aussortiert_uebernehmen(ordner: Path) -> list:
     """
     Die Diagnosedatei bleibt, wie der Lauf sie geschrieben hat.
@@ -179,43 +164,18 @@ def ablage_aus_datenbank(datenbank, job_id: int, ordner=None) -> dict:
     sondern geprüft: `test_neu_schreiben_ohne_entscheidung_aendert_nichts`
     vergleicht die vier Dateien Zeichen für Zeichen.
 
-    Reihenfolge: nach `kunde.id`, also so, wie die Kunden verarbeitet wurden.
-    Bei einem Lauf mit mehreren Arbeitern ist das nicht die Reihenfolge der
-    Eingabedatei — die Ausgabe ist danach nach Verarbeitung sortiert. Für den
-    ERP-Import spielt die Reihenfolge keine Rolle; die Invariante aus §2 hängt
-    nicht daran.
+    Reihenfolge: die der Eingabedatei, wie beim Lauf selbst — auch bei
+    mehreren Arbeitern, die in beliebiger Reihenfolge fertig werden. Bei
+    Jobs, deren Reihenfolge nicht festgehalten ist (vor `kunde_position`),
+    nach `kunde.id`, also so, wie die Kunden verarbeitet wurden.
     """
     ablage = leere_ablage()
-    entscheid_je_datei = dict(ENTSCHEID_JE_DATEI)
-    datei_je_ergebnis = {ergebnis: datei
-                         for datei, ergebnis in ERGEBNIS_JE_DATEI.items()}
-
-    for kunde in datenbank.kunden_lesen(job_id):
-        ziel = datei_je_ergebnis.get(kunde['ergebnis'])
-        if ziel is None:
-            logger.warning(f'Kunde {kunde["kunden_nr"]} hat kein Ergebnis und '
-                           f'wird beim Schreiben übergangen.')
-            continue
-
-        stamm = _stammspalten(kunde)
-        kopf = {'qualitaet': kunde['qualitaet'] or '',
-                'grund': kunde['grund'] or ''}
-        kandidaten = datenbank.kandidaten_lesen(kunde['id'])
-
-        eigene = [k for k in kandidaten
-                  if k['entscheid'] == entscheid_je_datei[ziel]]
-        if eigene:
-            for kandidat in eigene:
-                ablage[ziel].append({
-                    **stamm, **_kandidatspalten(kandidat),
-                    'qualitaet': kunde['qualitaet'] or '',
-                    'score': round(float(kandidat['score'] or 0), 2),
-                    'grund': kandidat['grund'] or '',
-                })
-        else:
-            # Kein Treffer in dieser Datei: eine Zeile aus Stammdaten allein.
-            ablage[ziel].append({**stamm, **leere_ausgabezeile(), **kopf,
-                                 'score': 0.0})
+    # Zwei Abfragen für den ganzen Job, nicht eine je Kunde.
+    kandidaten = datenbank.kandidaten_des_jobs(job_id)
+    for kunde in datenbank.kunden_in_eingabereihenfolge(job_id):
+        eigene = ablage_aus_gespeichertem(kunde, kandidaten.get(kunde['id'], []))
+        for datei, zeilen in eigene.items():
+            ablage[datei].extend(zeilen)
 
     if ordner is not None:
         ablage['aussortiert'] = _aussortiert_uebernehmen(ordner)
@@ -226,10 +186,9 @@ def dateien_neu_schreiben(datenbank, job_id: int, ordner: str = None) -> dict:
     """
     Schreibt die vier Ausgabedateien aus dem Stand der Datenbank.
 
-    Wird nach jeder einzelnen Entscheidung aufgerufen. Das klingt nach viel,
-    ist aber der Preis dafür, dass die Dateien in jedem Augenblick stimmen —
-    und dass niemand am Ende einen Knopf «jetzt wirklich speichern» vergessen
-    kann. Was der Sachbearbeiter entschieden hat, steht danach in der Datei.
+    Nach einer einzelnen Entscheidung genügt `kunde_in_dateien_anpassen`.
+    Dass die Dateien nach jeder Entscheidung stimmen, ist der Grund, warum
+    niemand am Ende einen Knopf «jetzt wirklich speichern» vergessen kann.
     """
     job = datenbank.job_lesen(job_id)
     if not job:
@@ -238,3 +197,103 @@ def dateien_neu_schreiben(datenbank, job_id: int, ordner: str = None) -> dict:
     ziel = ordner or ausgabeordner_fuer(job['dateiname'])
     ablage = ablage_aus_datenbank(datenbank, job_id, ordner=ziel)
     return schreibe_ausgabedateien(ablage, str(ziel))
+
+
+def kunde_in_dateien_anpassen(datenbank, kunde_id: int, ordner: str = None) -> dict:
+    """
+    Bringt die Zeilen eines einzigen Kunden in den drei Hauptdateien auf den
+    Stand der Datenbank — nach einer Entscheidung in der Maske.
+
+    `dateien_neu_schreiben` liest dafür jeden Kunden und jeden Kandidaten des
+    Jobs und schreibt alle vier Dateien neu. Hier werden nur die Zeilen dieses
+    Kunden entfernt und seine neuen an der Stelle eingefügt, an der
+    `dateien_neu_schreiben` sie hinschreiben würde: vor dem ersten Kunden,
+    der in der Eingabedatei nach ihm kommt (`Datenbank.kunden_reihenfolge`).
+    Alle anderen Zeilen bleiben Byte für Byte, wie sie sind; die
+    Diagnosedatei bleibt ohnehin unberührt.
+
+    Fehlt eine der Dateien, wird alles neu geschrieben.
+    """
+    kunde = datenbank.kunde_lesen(kunde_id)
+    if not kunde:
+        raise ValueError(f'Einen Kunden mit der Nummer {kunde_id} gibt es nicht.')
+    job = datenbank.job_lesen(kunde['job_id'])
+    ziel = Path(ordner or ausgabeordner_fuer(job['dateiname']))
+    if not all((ziel / name).exists() for name in OUTPUT_FILES.values()):
+        return dateien_neu_schreiben(datenbank, job['id'], str(ziel))
+
+    ablage = ablage_aus_gespeichertem(kunde, datenbank.kandidaten_lesen(kunde_id))
+    reihenfolge = datenbank.kunden_reihenfolge(job['id'])
+
+    pfade = {}
+    for schluessel, dateiname in OUTPUT_FILES.items():
+        pfad = ziel / dateiname
+        pfade[schluessel] = str(pfad)
+        if schluessel == 'aussortiert':
+            continue
+        _zeilen_ersetzen(pfad, kunde['kunden_nr'], ablage[schluessel], reihenfolge)
+    logger.info(f'Kunde {kunde["kunden_nr"]}: Dateien angepasst.')
+    return pfade
+
+
+def _zeilen_ersetzen(pfad: Path, kunden_nr: str, zeilen: list, reihenfolge: dict) -> None:
+    """
+    Ersetzt die Zeilen eines Kunden in einer Ausgabedatei. `reihenfolge`:
+    KundenNr → Stelle, wie `Datenbank.kunden_reihenfolge`.
+
+    Die übrigen Zeilen werden als Text durchgereicht, nicht zerlegt und neu
+    zusammengesetzt; die neuen schreibt pandas wie in `schreibe_ausgabedateien`.
+    """
+    neu = ''
+    if zeilen:
+        neu = pd.DataFrame(zeilen, columns=OUTPUT_COLUMNS).fillna('').to_csv(
+            sep=';', index=False, header=False)
+
+    eigene = reihenfolge[kunden_nr]
+    teil = pfad.with_name(pfad.name + TEIL_ENDUNG)
+    geaendert = False
+    with open(pfad, encoding='utf-8-sig', newline='') as quelle, \
+            open(teil, 'w', encoding='utf-8-sig', newline='') as ausgabe:
+        ausgabe.write(next(_datensaetze(quelle)))
+        for satz in _datensaetze(quelle):
+            nummer = _erstes_feld(satz)
+            if nummer == kunden_nr:
+                geaendert = True
+                continue
+            if neu and reihenfolge.get(nummer, eigene) > eigene:
+                ausgabe.write(neu)
+                neu = ''
+                geaendert = True
+            ausgabe.write(satz)
+        if neu:
+            ausgabe.write(neu)
+            geaendert = True
+
+    if geaendert:
+        teil.replace(pfad)
+    else:
+        teil.unlink()
+
+
+def _datensaetze(quelle):
+    """
+    Die Datensätze einer Ausgabedatei als Text, Zeilenende inbegriffen.
+
+    Ein Feld in Anführungszeichen darf einen Zeilenumbruch enthalten; ein
+    Datensatz ist erst zu Ende, wenn die Anführungszeichen aufgehen.
+    """
+    satz = ''
+    for zeile in quelle:
+        satz += zeile
+        if satz.count('"') % 2 == 0:
+            yield satz
+            satz = ''
+    if satz:
+        yield satz
+
+
+def _erstes_feld(satz: str) -> str:
+    """Die KundenNr eines Datensatzes; nur in Anführungszeichen braucht es das csv-Modul."""
+    if satz.startswith('"'):
+        return next(csv.reader([satz], delimiter=';'))[0]
+    return satz.split(';', 1)[0]
@@ -0,0 +1,199 @@
+# spaltenexport.py
+# Das Ergebnis eines Laufs zusätzlich als Parquet, für die Auswertungen.
+#
+# Die vier CSV-Dateien sind für das ERP und für Menschen in Excel gemacht:
+# Semikolon, utf-8-sig, alles Text. Die Auswertungen lesen sie trotzdem, und
+# jede liest sie neu ein. Mit `--spalten` schreibt der Lauf daneben:
+#   - je Ausgabedatei dieselben Zeilen in `<name>.parquet`, Spalten wie
+#     `OUTPUT_COLUMNS`, `score` als Zahl
+#   - `kandidaten.parquet`: jeder Kandidat des Jobs mit Score, Entscheid und
+#     Grund, so wie er in der Tabelle `kandidat` steht (02_DATENVERTRAG.md §5),
+#     dazu Breite und Länge als Zahlen
+#
+# Geschrieben wird in Zeilengruppen, wie die CSV-Dateien in Blöcken: im
+# Speicher liegt nie mehr als eine Gruppe je Datei. Die CSV-Dateien bleiben,
+# wie sie sind — das ERP merkt vom Spaltenexport nichts.
+#
+# pyarrow ist keine feste Abhängigkeit. Ohne pyarrow läuft alles wie bisher;
+# nur `--spalten` meldet dann, was fehlt.
+
+import logging
+import time
+from pathlib import Path
+
+from data_cleaner import (OUTPUT_COLUMNS, OUTPUT_FILES, SCHREIB_ZEILEN,
+                          Ausgabeschreiber, leere_ablage)
+
+logger = logging.getLogger(__name__)
+
+# So viele Zeilen fasst eine Zeilengruppe. Grösser heisst: besser gepackt,
+# aber mehr im Speicher, bevor geschrieben wird.
+GRUPPEN_ZEILEN = 50_000
+
+KANDIDATEN_DATEI = 'kandidaten.parquet'
+
+# zstd packt die vielen gleichen Texte (Qualität, Grund, Ort) deutlich
+# dichter als snappy, den Standard von pyarrow, und liest sich kaum langsamer.
+KOMPRESSION = 'zstd'
+
+FEHLT_MELDUNG = ('Für den Spaltenexport (--spalten) fehlt pyarrow. '
+                 'Installieren mit: pip install pyarrow')
+
+# Spalten der Tabelle `kandidat`, dazu die KundenNr aus `kunde` und der
+# Standort als Zahlen aus `kandidat_ort`.
+KANDIDATEN_SPALTEN = (
+    'kunden_nr', 'kunde_id', 'id', 'title', 'street', 'postal_code', 'city',
+    'address', 'place_id', 'cid', 'location', 'phone', 'phone_unformatted',
+    'website', 'opening_hours', 'permanently_closed', 'temporarily_closed',
+    'score', 'entscheid', 'grund', 'lat', 'lng',
+)
+_GANZZAHLEN = ('kunde_id', 'id')
+_KOMMAZAHLEN = ('score', 'lat', 'lng')
+
+
+def verfuegbar() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as fehler:
+        raise RuntimeError(FEHLT_MELDUNG) from fehler
+    return pyarrow, pyarrow.parquet
+
+
+def spaltendatei(dateiname: str) -> str:
+    """`fertig_fuer_erp.csv` → `fertig_fuer_erp.parquet`"""
+    return Path(dateiname).with_suffix('.parquet').name
+
+
+def _schema(spalten, ganzzahlen=(), kommazahlen=()):
+    pa, _ = _arrow()
+    return pa.schema([(spalte, pa.int64() if spalte in ganzzahlen
+                       else pa.float64() if spalte in kommazahlen
+                       else pa.string()) for spalte in spalten])
+
+
+def ausgabe_schema():
+    """Die Spalten der Ausgabedateien: Text wie in der CSV, `score` als Zahl."""
+    return _schema(OUTPUT_COLUMNS, kommazahlen=('score',))
+
+
+def kandidaten_schema():
+    return _schema(KANDIDATEN_SPALTEN, _GANZZAHLEN, _KOMMAZAHLEN)
+
+
+def _text(wert) -> str:
+    # Wie fillna('') und to_csv: was fehlt, ist leer, alles andere Text.
+    return '' if wert is None or wert != wert else str(wert)
+
+
+def _zahl(wert):
+    return None if wert in (None, '') else float(wert)
+
+
+def _roh(spalte: str, wert):
+    # Die Tabelle `kandidat` so, wie sie ist: was fehlt, bleibt leer (null).
+    if wert is None or spalte in _GANZZAHLEN or spalte in _KOMMAZAHLEN:
+        return wert
+    return str(wert)
+
+
+def _ausgabezeilen_als_tabelle(zeilen: list):
+    pa, _ = _arrow()
+    spalten = {spalte: [_zahl(z.get(spalte)) if spalte == 'score' else _text(z.get(spalte))
+                        for z in zeilen]
+               for spalte in OUTPUT_COLUMNS}
+    return pa.Table.from_pydict(spalten, schema=ausgabe_schema())
+
+
+class SpaltenAusgabeschreiber(Ausgabeschreiber):
+    """
+    Der Ausgabeschreiber mit je einer Parquet-Datei neben jeder CSV-Datei.
+
+    Dieselben Zeilen in derselben Reihenfolge, im selben Ordner `<ziel>.teil`
+    und erst mit `abschliessen` am Ziel. `schreibzeit` hält fest, wie lange
+    jedes Format gebraucht hat — für den Vergleich im Messlauf.
+    """
+
+    def __init__(self, ziel_ordner: str, zeilen_je_block: int = SCHREIB_ZEILEN,
+                 zeilen_je_gruppe: int = GRUPPEN_ZEILEN):
+        _, pq = _arrow()  # vor dem Ordner: ohne pyarrow entsteht nichts
+        super().__init__(ziel_ordner, zeilen_je_block)
+        self.zeilen_je_gruppe = max(1, int(zeilen_je_gruppe))
+        self.schreibzeit = {'csv': 0.0, 'parquet': 0.0}
+        self.spaltendateien = {}
+        self._gruppen = leere_ablage()
+        schema = ausgabe_schema()
+        self._spalten = {
+            schluessel: pq.ParquetWriter(self._teil / spaltendatei(dateiname), schema,
+                                         compression=KOMPRESSION)
+            for schluessel, dateiname in OUTPUT_FILES.items()}
+
+    def anhaengen(self, ablage: dict) -> None:
+        super().anhaengen(ablage)
+        for schluessel, zeilen in ablage.items():
+            if not zeilen:
+                continue
+            self._gruppen[schluessel].extend(zeilen)
+            if len(self._gruppen[schluessel]) >= self.zeilen_je_gruppe:
+                self._gruppe_schreiben(schluessel)
+
+    def abschliessen(self) -> dict:
+        self.ziel.mkdir(parents=True, exist_ok=True)
+        for schluessel, dateiname in OUTPUT_FILES.items():
+            self._gruppe_schreiben(schluessel)
+            self._spalten[schluessel].close()
+            pfad = self.ziel / spaltendatei(dateiname)
+            (self._teil / spaltendatei(dateiname)).replace(pfad)
+            self.spaltendateien[schluessel] = str(pfad)
+        return super().abschliessen()
+
+    def verwerfen(self) -> None:
+        for schluessel, dateiname in OUTPUT_FILES.items():
+            self._spalten[schluessel].close()
+            (self._teil / spaltendatei(dateiname)).unlink(missing_ok=True)
+        super().verwerfen()
+
+    def _leeren(self, schluessel: str) -> None:
+        beginn = time.perf_counter()
+        super()._leeren(schluessel)
+        self.schreibzeit['csv'] += time.perf_counter() - beginn
+
+    def _gruppe_schreiben(self, schluessel: str) -> None:
+        zeilen = self._gruppen[schluessel]
+        if not zeilen:
+            return
+        beginn = time.perf_counter()
+        self._spalten[schluessel].write_table(_ausgabezeilen_als_tabelle(zeilen))
+        self._gruppen[schluessel] = []
+        self.schreibzeit['parquet'] += time.perf_counter() - beginn
+
+
+def kandidaten_schreiben(datenbank, job_id: int, pfad,
+                         zeilen_je_gruppe: int = GRUPPEN_ZEILEN) -> str:
+    """
+    Schreibt alle Kandidaten des Jobs nach `pfad`, eine Zeilengruppe je
+    `zeilen_je_gruppe` Kandidaten. Erst unter einem anderen Namen, dann ans
+    Ziel: eine halbe Datei bleibt nie liegen.
+    """
+    pa, pq = _arrow()
+    pfad = Path(pfad)
+    teil = pfad.with_name(pfad.name + '.teil')
+    schema = kandidaten_schema()
+    anzahl = 0
+    with pq.ParquetWriter(teil, schema, compression=KOMPRESSION) as schreiber:
+        for block in datenbank.kandidaten_bloecke(job_id, zeilen_je_gruppe):
+            schreiber.write_table(pa.Table.from_pydict(
+                {spalte: [_roh(spalte, zeile[spalte]) for zeile in block]
+                 for spalte in KANDIDATEN_SPALTEN}, schema=schema))
+            anzahl += len(block)
+    teil.replace(pfad)
+    logger.info(f'kandidaten: {anzahl} Kandidaten → {pfad}')
+    return str(pfad)
@@ -286,7 +286,7 @@ def browser(tmp_path, monkeypatch):
     monkeypatch.setattr(webapp, 'UPLOADS', tmp_path / 'uploads')
     monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
     webapp.UPLOADS.mkdir(parents=True, exist_ok=True)
-    webapp.zustand['worker'] = None
+    webapp.zustand['planer'] = None
     webapp.zustand['hochgeladen'] = None
     webapp.zustand['provider'] = FakeProvider()
 
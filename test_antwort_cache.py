@@ -0,0 +1,261 @@
+# test_antwort_cache.py
+# The response cache in front of a provider: hits, misses, expiry, size cap,
+# and a second run over the same file without a single provider call.
+# Nothing here touches the network.
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import antwort_cache
+import webapp
+from antwort_cache import (Antwortspeicher, ZwischengespeicherterProvider,
+                           davorlegen, schluessel_text)
+from data_cleaner import OUTPUT_FILES
+from db import Datenbank
+from fake_provider import FakeProvider
+from google_provider import GoogleProvider
+from pipeline import Lauf
+from place_provider import Candidate, OhneAntwort, QuelleNichtVerfuegbar
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def eingabedatei_aus_fixture(tmp_path: Path) -> Path:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    df = df[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    ziel = tmp_path / 'eingabe.csv'
+    df.to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+class ZaehlenderProvider:
+    """Ein FakeProvider, der mitzählt, wie oft er gefragt wurde."""
+
+    def __init__(self, provider=None):
+        self.provider = provider or FakeProvider.aus_csv(str(FIXTURE))
+        self.texte = []
+        self.ids = []
+
+    def fetch_by_text(self, search_string, plz):
+        self.texte.append((search_string, plz))
+        return self.provider.fetch_by_text(search_string, plz)
+
+    def fetch_by_id(self, place_id):
+        self.ids.append(place_id)
+        return self.provider.fetch_by_id(place_id)
+
+
+LADEN = Candidate(title='Muster Laden', street='Hauptstrasse 1',
+                  postal_code='5620', place_id='PLACE_X')
+
+
+# ============================================================================
+# Der Speicher
+# ============================================================================
+
+def test_zweite_frage_kommt_aus_dem_speicher():
+    quelle = ZaehlenderProvider(FakeProvider({('Muster Laden', '5620'): [LADEN]}))
+    provider = ZwischengespeicherterProvider(quelle, Antwortspeicher())
+
+    assert provider.fetch_by_text('Muster Laden', '5620') == [LADEN]
+    assert provider.fetch_by_text(' Muster Laden ', '5620') == [LADEN]
+
+    assert quelle.texte == [('Muster Laden', '5620')]
+    assert provider.statistik() == {'treffer': 1, 'fehlgriffe': 1,
+                                    'trefferquote': 0.5, 'eintraege': 1}
+
+
+def test_nichts_gefunden_ist_auch_eine_antwort():
+    quelle = ZaehlenderProvider(FakeProvider({}))
+    provider = ZwischengespeicherterProvider(quelle, Antwortspeicher())
+
+    assert provider.fetch_by_text('Unbekannt', '5620') == []
+    assert provider.fetch_by_text('Unbekannt', '5620') == []
+    assert len(quelle.texte) == 1
+
+
+def test_fehler_und_ausgebliebene_antworten_werden_nicht_gespeichert():
+    class Unzuverlaessig:
+        def __init__(self):
+            self.aufrufe = 0
+
+        def fetch_by_text(self, search_string, plz):
+            self.aufrufe += 1
+            if self.aufrufe == 1:
+                raise QuelleNichtVerfuegbar('Netz weg.', endgueltig=False)
+            if self.aufrufe == 2:
+                return OhneAntwort()
+            return [LADEN]
+
+        def fetch_by_id(self, place_id):
+            return None
+
+    speicher = Antwortspeicher()
+    provider = ZwischengespeicherterProvider(Unzuverlaessig(), speicher)
+
+    with pytest.raises(QuelleNichtVerfuegbar):
+        provider.fetch_by_text('Muster Laden', '5620')
+    assert provider.fetch_by_text('Muster Laden', '5620') == []
+    assert speicher.eintraege() == 0
+    assert provider.fetch_by_text('Muster Laden', '5620') == [LADEN]
+    assert provider.fetch_by_text('Muster Laden', '5620') == [LADEN]
+    assert provider.provider.aufrufe == 3
+
+
+def test_abfrage_ueber_id_wird_ebenfalls_gespeichert():
+    quelle = ZaehlenderProvider(FakeProvider({('Muster Laden', '5620'): [LADEN]}))
+    provider = ZwischengespeicherterProvider(quelle, Antwortspeicher())
+
+    assert provider.fetch_by_id('PLACE_X') == LADEN
+    assert provider.fetch_by_id('PLACE_X') == LADEN
+    assert provider.fetch_by_id('PLACE_WEG') is None
+    assert provider.fetch_by_id('PLACE_WEG') is None
+    assert quelle.ids == ['PLACE_X', 'PLACE_WEG']
+
+
+def test_abgelaufene_antwort_wird_neu_geholt(monkeypatch):
+    jetzt = [1_000_000.0]
+    monkeypatch.setattr(antwort_cache.time, 'time', lambda: jetzt[0])
+    quelle = ZaehlenderProvider(FakeProvider({('Muster Laden', '5620'): [LADEN]}))
+    provider = ZwischengespeicherterProvider(quelle, Antwortspeicher(gueltig_tage=1))
+
+    provider.fetch_by_text('Muster Laden', '5620')
+    jetzt[0] += 86_000
+    provider.fetch_by_text('Muster Laden', '5620')
+    assert len(quelle.texte) == 1
+
+    jetzt[0] += 1_000
+    provider.fetch_by_text('Muster Laden', '5620')
+    assert len(quelle.texte) == 2
+
+
+def test_obergrenze_verdraengt_die_am_laengsten_ungenutzte(monkeypatch):
+    jetzt = [1_000_000.0]
+    monkeypatch.setattr(antwort_cache.time, 'time', lambda: jetzt[0])
+    speicher = Antwortspeicher(max_eintraege=2)
+
+    for schluessel in ('a', 'b'):
+        jetzt[0] += 1
+        speicher.schreiben(schluessel, [LADEN])
+    jetzt[0] += 1
+    assert speicher.lesen('a') == [LADEN]
+    jetzt[0] += 1
+    speicher.schreiben('c', [])
+
+    assert speicher.eintraege() == 2
+    assert speicher.lesen('b') is None
+    assert speicher.lesen('a') == [LADEN]
+    assert speicher.lesen('c') == []
+
+
+def test_speicher_ueberlebt_das_schliessen(tmp_path):
+    with Antwortspeicher(tmp_path / 'antworten.sqlite') as speicher:
+        speicher.schreiben(schluessel_text('apify', 'Muster Laden', '5620'), [LADEN])
+    with Antwortspeicher(tmp_path / 'antworten.sqlite') as speicher:
+        assert speicher.lesen(schluessel_text('apify', 'Muster Laden', '5620')) == [LADEN]
+
+
+def test_stapel_fragt_nur_was_fehlt():
+    class Stapelnd(ZaehlenderProvider):
+        def fetch_by_texts(self, anfragen):
+            self.texte.append(list(anfragen))
+            return [self.provider.fetch_by_text(*a) for a in anfragen]
+
+    quelle = Stapelnd(FakeProvider({('A', '5620'): [LADEN]}))
+    provider = ZwischengespeicherterProvider(quelle, Antwortspeicher())
+    provider.fetch_by_text('A', '5620')
+
+    assert provider.fetch_by_texts([('A', '5620'), ('B', '5620')]) == [[LADEN], []]
+    assert quelle.texte == [('A', '5620'), [('B', '5620')]]
+
+
+@pytest.mark.parametrize('quelle', [
+    FakeProvider({}), ZaehlenderProvider(), GoogleProvider('kein-schluessel')])
+def test_provider_ohne_stapel_wird_nicht_gestapelt(quelle):
+    # Ohne `fetch_by_texts` dahinter fragt der Lauf jeden Kunden einzeln, mit
+    # eigener Frist — wie ohne Zwischenspeicher.
+    provider = ZwischengespeicherterProvider(quelle, Antwortspeicher())
+    assert not hasattr(provider, 'fetch_by_texts')
+
+    with Datenbank(':memory:') as datenbank:
+        lauf = Lauf(provider, datenbank, stapelgroesse=5)
+        offen = [('1', {'PLZ': '5620'}), ('2', {'PLZ': '5620'})]
+        assert list(lauf._stapel_bilden(offen)) == [[offen[0]], [offen[1]]]
+
+
+def test_ohne_frist_bleibt_der_provider_wie_er_ist(tmp_path):
+    provider = FakeProvider({})
+    assert davorlegen(provider, tmp_path / 'laeufe.sqlite', 'fake', 0) is provider
+
+
+def test_async_provider_wird_abgewiesen():
+    class Asynchron:
+        async def fetch_by_text(self, search_string, plz):
+            return []
+
+        async def fetch_by_id(self, place_id):
+            return None
+
+    with pytest.raises(ValueError):
+        ZwischengespeicherterProvider(Asynchron(), Antwortspeicher())
+
+
+# ============================================================================
+# Zweiter Lauf über dieselbe Datei
+# ============================================================================
+
+def test_zweiter_lauf_ohne_abfrage_mit_denselben_dateien(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    quelle = ZaehlenderProvider()
+    provider = davorlegen(quelle, tmp_path / 'laeufe.sqlite', 'fake', 35)
+
+    with Datenbank(tmp_path / 'laeufe.sqlite') as datenbank:
+        Lauf(provider, datenbank).ausfuehren(eingabe, str(tmp_path / 'erst'))
+        gefragt = len(quelle.texte)
+        Lauf(provider, datenbank).ausfuehren(eingabe, str(tmp_path / 'zweit'))
+
+    assert gefragt == 10
+    assert len(quelle.texte) == 10
+    assert provider.statistik()['treffer'] == 10
+    for dateiname in OUTPUT_FILES.values():
+        assert ((tmp_path / 'zweit' / dateiname).read_bytes()
+                == (tmp_path / 'erst' / dateiname).read_bytes())
+
+
+# ============================================================================
+# Weboberfläche
+# ============================================================================
+
+def test_weboberflaeche_oeffnet_den_speicher_einmal(tmp_path, monkeypatch):
+    class MitSchluessel:
+        APIFY_API_TOKEN = 'token'
+        ACTOR_ID = 'muster~actor'
+
+    monkeypatch.setitem(sys.modules, 'config', MitSchluessel)
+    monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
+    monkeypatch.setitem(webapp.zustand, 'provider', None)
+    monkeypatch.setitem(webapp.zustand, 'antwortspeicher', None)
+    monkeypatch.setitem(webapp.zustand, 'planer', None)
+
+    with TestClient(webapp.app):
+        speicher = webapp.zustand['antwortspeicher']
+        erster, zweiter = webapp.provider_holen('A'), webapp.provider_holen('A')
+        assert erster.speicher is speicher
+        assert zweiter.speicher is speicher
+        assert speicher.pfad == str(tmp_path / antwort_cache.DATEINAME)
+
+    # Beim Beenden geschlossen.
+    assert webapp.zustand['antwortspeicher'] is None
+    with pytest.raises(sqlite3.ProgrammingError):
+        speicher.eintraege()
@@ -0,0 +1,239 @@
+# test_asynchroner_lauf.py
+# The asyncio run loop for providers with `async def fetch_by_text/fetch_by_id`.
+# Same results, same deadline, same abort and failure rules as the thread loop.
+# Nothing here touches the network.
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from data_cleaner import OUTPUT_FILES
+from db import Datenbank
+from fake_provider import FakeProvider
+from pipeline import (AUSGEFALLENE_ABFRAGE_GRUND, MAX_FEHLSCHLAEGE_HINTEREINANDER,
+                      ZEITUEBERSCHREITUNG_MELDUNG, Lauf)
+from place_provider import Candidate, QuelleNichtVerfuegbar, ist_asynchron
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+HAUPTDATEIEN = ('fertig_fuer_erp', 'zur_pruefung', 'nicht_moeglich')
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def lies(pfad) -> pd.DataFrame:
+    return pd.read_csv(pfad, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+
+
+def eingabedatei_aus_fixture(tmp_path: Path) -> Path:
+    df = lies(FIXTURE)[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    ziel = tmp_path / 'eingabe.csv'
+    df.to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def viele_kunden(tmp_path: Path, anzahl: int) -> Path:
+    ziel = tmp_path / 'viele.csv'
+    pd.DataFrame([{'SearchString': f'Laden {n}, Hauptstrasse {n}, 5620 Musterdorf',
+                   'PLZ': '5620', 'Stadt': 'Musterdorf', 'KundenNr': str(800000 + n)}
+                  for n in range(anzahl)]).to_csv(
+        ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+class AsynchronerFake:
+    """Der FakeProvider hinter `async def`, mit einstellbarer Wartezeit."""
+
+    def __init__(self, warten: float = 0.0):
+        self.fake = FakeProvider.aus_csv(str(FIXTURE))
+        self.warten = warten
+        self.gleichzeitig = 0
+        self.hoechstens = 0
+
+    async def fetch_by_text(self, search_string, plz):
+        self.gleichzeitig += 1
+        self.hoechstens = max(self.hoechstens, self.gleichzeitig)
+        try:
+            await asyncio.sleep(self.warten)
+            return self.fake.fetch_by_text(search_string, plz)
+        finally:
+            self.gleichzeitig -= 1
+
+    async def fetch_by_id(self, place_id):
+        return self.fake.fetch_by_id(place_id)
+
+
+class HaengenderAsynchronerProvider:
+    async def fetch_by_text(self, search_string, plz):
+        await asyncio.sleep(3600)
+
+    async def fetch_by_id(self, place_id):
+        await asyncio.sleep(3600)
+
+
+# ============================================================================
+# Dasselbe Ergebnis
+# ============================================================================
+
+def test_provider_mit_async_wird_erkannt():
+    assert ist_asynchron(AsynchronerFake())
+    assert not ist_asynchron(FakeProvider({}))
+
+
+def test_asynchroner_lauf_ergibt_dieselben_dateien(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    with Datenbank(tmp_path / 'sync.sqlite') as datenbank:
+        Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank).ausfuehren(
+            eingabe, str(tmp_path / 'sync'))
+    with Datenbank(tmp_path / 'async.sqlite') as datenbank:
+        ergebnis = Lauf(AsynchronerFake(), datenbank).ausfuehren(
+            eingabe, str(tmp_path / 'async'))
+
+    assert ergebnis['status'] == 'FERTIG'
+    for schluessel in HAUPTDATEIEN:
+        dateiname = OUTPUT_FILES[schluessel]
+        assert ((tmp_path / 'async' / dateiname).read_text(encoding='utf-8-sig')
+                == (tmp_path / 'sync' / dateiname).read_text(encoding='utf-8-sig'))
+
+
+# ============================================================================
+# Viele Abfragen offen, ohne Thread je Abfrage
+# ============================================================================
+
+def test_hunderte_abfragen_gleichzeitig_ohne_threads(tmp_path):
+    provider = AsynchronerFake(warten=0.5)
+    threads_vorher = threading.active_count()
+    beobachtet = []
+
+    class Zaehlender(Lauf):
+        def _einen_kunden(self, *args):
+            beobachtet.append(threading.active_count())
+            return super()._einen_kunden(*args)
+
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        start = time.monotonic()
+        ergebnis = Zaehlender(provider, datenbank, arbeiter=300).ausfuehren(
+            viele_kunden(tmp_path, 600), str(tmp_path / 'aus'))
+        dauer = time.monotonic() - start
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert provider.hoechstens == 300
+    # Zwei Wellen zu einer halben Sekunde, nicht 600 halbe Sekunden.
+    assert dauer < 30
+    assert max(beobachtet) <= threads_vorher
+
+
+# ============================================================================
+# Frist, Abbruch, Fehlschläge
+# ============================================================================
+
+def test_zeitueberschreitung_zaehlt_zu_den_zehn(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(HaengenderAsynchronerProvider(), datenbank,
+                        timeout_sekunden=0.3, arbeiter=2).ausfuehren(
+            viele_kunden(tmp_path, 30), str(tmp_path / 'aus'))
+
+    assert ergebnis['status'] == 'FEHLER'
+    assert ergebnis['fehlermeldung'] == ZEITUEBERSCHREITUNG_MELDUNG
+
+
+def test_abbruch_greift_unter_fuenf_sekunden(tmp_path):
+    abbruch = threading.Event()
+    threading.Timer(0.5, abbruch.set).start()
+
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        start = time.monotonic()
+        ergebnis = Lauf(HaengenderAsynchronerProvider(), datenbank,
+                        abbruch=abbruch, arbeiter=50).ausfuehren(
+            viele_kunden(tmp_path, 100), str(tmp_path / 'aus'))
+        dauer = time.monotonic() - start
+
+    assert ergebnis['status'] == 'ABGEBROCHEN'
+    assert dauer < 5
+    assert not (tmp_path / 'aus').exists()
+
+
+def test_einzelne_fehlschlaege_werden_geduldet(tmp_path):
+    class ErstDreiMalNicht(AsynchronerFake):
+        def __init__(self):
+            super().__init__()
+            self.aufrufe = 0
+
+        async def fetch_by_text(self, search_string, plz):
+            self.aufrufe += 1
+            if self.aufrufe <= 3:
+                raise QuelleNichtVerfuegbar('Netz weg.', endgueltig=False)
+            return await super().fetch_by_text(search_string, plz)
+
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(ErstDreiMalNicht(), datenbank, arbeiter=1).ausfuehren(
+            eingabedatei_aus_fixture(tmp_path), str(tmp_path / 'aus'))
+        kunden = datenbank.kunden_lesen(ergebnis['job_id'])
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert [k['grund'] == AUSGEFALLENE_ABFRAGE_GRUND for k in kunden][:4] == [
+        True, True, True, False]
+
+
+def test_mehr_arbeiter_als_der_standard_ohne_zeitueberschreitung(tmp_path):
+    """
+    `fetch_by_id` ohne `async def` läuft in einem Vorrat von Threads. Hat der
+    weniger Threads als der Lauf Arbeiter, warten Abfragen auf einen Thread,
+    und die Frist läuft dabei schon.
+    """
+    class IdOhneAsync:
+        def __init__(self):
+            self._sperre = threading.Lock()
+            self.gleichzeitig = 0
+            self.hoechstens = 0
+
+        async def fetch_by_text(self, search_string, plz):
+            raise AssertionError('Im Modus B wird nicht gesucht.')
+
+        def fetch_by_id(self, place_id):
+            with self._sperre:
+                self.gleichzeitig += 1
+                self.hoechstens = max(self.hoechstens, self.gleichzeitig)
+            time.sleep(0.4)
+            with self._sperre:
+                self.gleichzeitig -= 1
+            return Candidate(title='Muster Laden', street='Hauptstrasse 1',
+                             postal_code='5620', place_id=place_id)
+
+    eingabe = tmp_path / 'IDs.csv'
+    pd.DataFrame([{'placeId': f'PLACE_{n}', 'lat': '', 'lng': '',
+                   'KundenNr': str(900000 + n)} for n in range(20)]).to_csv(
+        eingabe, sep=';', index=False, encoding='utf-8-sig')
+    provider = IdOhneAsync()
+
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(provider, datenbank, modus='B', arbeiter=10,
+                        timeout_sekunden=0.7).ausfuehren(eingabe, str(tmp_path / 'aus'))
+        kunden = datenbank.kunden_lesen(ergebnis['job_id'])
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert provider.hoechstens == 10
+    assert not [k for k in kunden if k['grund'] == AUSGEFALLENE_ABFRAGE_GRUND]
+
+
+def test_zehn_fehlschlaege_hintereinander_stoppen_den_lauf(tmp_path):
+    class NieErreichbar:
+        async def fetch_by_text(self, search_string, plz):
+            raise QuelleNichtVerfuegbar('Netz weg.', endgueltig=False)
+
+        async def fetch_by_id(self, place_id):
+            return None
+
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(NieErreichbar(), datenbank, arbeiter=1).ausfuehren(
+            viele_kunden(tmp_path, 30), str(tmp_path / 'aus'))
+        kunden = datenbank.kunden_lesen(ergebnis['job_id'])
+
+    assert ergebnis['status'] == 'FEHLER'
+    assert len(kunden) == MAX_FEHLSCHLAEGE_HINTEREINANDER - 1
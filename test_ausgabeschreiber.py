@@ -0,0 +1,143 @@
+# test_ausgabeschreiber.py
+# Output files written as customers finish (data_cleaner.Ausgabeschreiber)
+# and the input order restored on the way (pipeline.Reihenfolge): the same
+# bytes as writing everything at the end, nothing left behind on abort, and
+# only the customers behind an open query held in memory.
+# Nothing here touches the network.
+
+import random
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from data_cleaner import (OUTPUT_FILES, Ausgabeschreiber, DataCleaner,
+                          leere_ablage, schreibe_ausgabedateien)
+from db import Datenbank
+from pipeline import Lauf, Reihenfolge
+from place_provider import Candidate
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def ablagen_aus_fixture() -> list:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    cleaner = DataCleaner()
+    return [cleaner.entscheide_kunde(nr, gruppe)
+            for nr, gruppe in df.groupby('KundenNr', sort=False)]
+
+
+def gleiche_dateien(links: Path, rechts: Path) -> None:
+    for dateiname in OUTPUT_FILES.values():
+        assert (links / dateiname).read_bytes() == (rechts / dateiname).read_bytes()
+
+
+class MerkenderSchreiber:
+    def __init__(self):
+        self.geschrieben = []
+
+    def anhaengen(self, ablage):
+        self.geschrieben.append(ablage['nr'])
+
+
+class ZufaelligLangsamerProvider:
+    """Antwortet nach einer zufälligen Pause — die Arbeiter werden durcheinander fertig."""
+
+    def __init__(self):
+        self._zufall = random.Random(10)
+        self._sperre = threading.Lock()
+
+    def fetch_by_text(self, search_string, plz):
+        with self._sperre:
+            pause = self._zufall.random() * 0.02
+        time.sleep(pause)
+        name = search_string.split(',')[0]
+        return [Candidate(title=name, street='Hauptstrasse 1', postal_code=plz),
+                Candidate(title=f'{name} Filiale', street='Dorfstrasse 2',
+                          postal_code=plz)]
+
+    def fetch_by_id(self, place_id):
+        return None
+
+
+# ============================================================================
+# Der Schreiber
+# ============================================================================
+
+def test_dieselben_bytes_wie_am_stueck(tmp_path):
+    ablagen = ablagen_aus_fixture()
+    gesamt = leere_ablage()
+    for ablage in ablagen:
+        for datei, zeilen in ablage.items():
+            gesamt[datei].extend(zeilen)
+    schreibe_ausgabedateien(gesamt, str(tmp_path / 'am_stueck'))
+
+    with Ausgabeschreiber(tmp_path / 'nach_und_nach', zeilen_je_block=3) as schreiber:
+        for ablage in ablagen:
+            schreiber.anhaengen(ablage)
+
+    gleiche_dateien(tmp_path / 'am_stueck', tmp_path / 'nach_und_nach')
+    assert not (tmp_path / 'nach_und_nach.teil').exists()
+
+
+def test_ohne_kunden_nur_kopfzeilen(tmp_path):
+    schreibe_ausgabedateien(leere_ablage(), str(tmp_path / 'am_stueck'))
+    Ausgabeschreiber(tmp_path / 'nach_und_nach').abschliessen()
+
+    gleiche_dateien(tmp_path / 'am_stueck', tmp_path / 'nach_und_nach')
+
+
+def test_verwerfen_hinterlaesst_nichts(tmp_path):
+    schreiber = Ausgabeschreiber(tmp_path / 'ergebnis', zeilen_je_block=1)
+    for ablage in ablagen_aus_fixture():
+        schreiber.anhaengen(ablage)
+
+    assert not (tmp_path / 'ergebnis').exists()
+    schreiber.verwerfen()
+    assert list(tmp_path.iterdir()) == []
+
+
+# ============================================================================
+# Die Reihenfolge
+# ============================================================================
+
+def test_fertige_warten_nur_hinter_einer_offenen_abfrage():
+    kunden = [(str(n), {}) for n in range(6)]
+    schreiber = MerkenderSchreiber()
+    reihenfolge = Reihenfolge(kunden, {'1': {'kunden_nr': '1'}},
+                              lambda kunde: {'nr': kunde['kunden_nr']}, schreiber)
+
+    reihenfolge.ablegen('2', {'nr': '2'})
+    reihenfolge.ablegen('3', {'nr': '3'})
+    assert schreiber.geschrieben == []
+    assert len(reihenfolge._wartend) == 2
+
+    reihenfolge.ablegen('0', {'nr': '0'})
+    assert schreiber.geschrieben == ['0', '1', '2', '3']
+    assert reihenfolge._wartend == {}
+
+    reihenfolge.ablegen('5', {'nr': '5'})
+    reihenfolge.ablegen('4', {'nr': '4'})
+    assert schreiber.geschrieben == ['0', '1', '2', '3', '4', '5']
+
+
+def test_durcheinander_fertig_dieselben_dateien_wie_einzeln(tmp_path):
+    eingabe = tmp_path / 'eingabe.csv'
+    pd.DataFrame([{'SearchString': f'Laden {n}, Hauptstrasse 1, 5620 Musterdorf',
+                   'PLZ': '5620', 'Stadt': 'Musterdorf', 'KundenNr': str(900000 + n)}
+                  for n in range(60)]).to_csv(eingabe, sep=';', index=False,
+                                              encoding='utf-8-sig')
+
+    for name, arbeiter in (('einzeln', 1), ('parallel', 8)):
+        with Datenbank(tmp_path / f'{name}.sqlite') as datenbank:
+            ergebnis = Lauf(ZufaelligLangsamerProvider(), datenbank,
+                            arbeiter=arbeiter).ausfuehren(eingabe, str(tmp_path / name))
+        assert ergebnis['status'] == 'FERTIG'
+
+    gleiche_dateien(tmp_path / 'einzeln', tmp_path / 'parallel')
@@ -0,0 +1,232 @@
+# test_drosselung.py
+# Staying under the limits of the data source (drosselung.py): a token
+# bucket paces all calls to one source, a monthly cost budget stops a run
+# before the source would, the cache in front costs nothing, and the cost
+# of a file can be estimated before it starts.
+# Nothing here touches the network.
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import antwort_cache
+import drosselung
+from db import Datenbank
+from drosselung import Budget, Eimer, GedrosselterProvider
+from fake_provider import FakeProvider
+from pipeline import Lauf
+from place_provider import QuelleNichtVerfuegbar, ist_asynchron
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+class Uhr:
+    def __init__(self):
+        self.jetzt = 100.0
+
+    def __call__(self):
+        return self.jetzt
+
+
+class ZaehlenderProvider:
+    """Antwortet sofort und merkt sich, wann gefragt wurde."""
+
+    anfragen_je_sekunde = 0
+    kosten_je_abfrage = 0.25
+
+    def __init__(self):
+        self.zeiten = []
+        self._sperre = threading.Lock()
+
+    def fetch_by_text(self, search_string, plz):
+        with self._sperre:
+            self.zeiten.append(time.monotonic())
+        return []
+
+    def fetch_by_id(self, place_id):
+        with self._sperre:
+            self.zeiten.append(time.monotonic())
+        return None
+
+
+class AsynchronerProvider:
+    async def fetch_by_text(self, search_string, plz):
+        return []
+
+    async def fetch_by_id(self, place_id):
+        return None
+
+
+class StapelProvider(ZaehlenderProvider):
+    def fetch_by_texts(self, anfragen):
+        self.fetch_by_text(*anfragen[0])
+        return [[] for _ in anfragen]
+
+
+def eingabedatei_aus_fixture(tmp_path: Path) -> Path:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    df = df[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    ziel = tmp_path / 'eingabe.csv'
+    df.to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+# ============================================================================
+# Der Eimer
+# ============================================================================
+
+def test_eimer_laesst_warten_und_fuellt_nach():
+    uhr = Uhr()
+    eimer = Eimer(10, vorrat=2, uhr=uhr)
+
+    assert [round(eimer.reservieren(), 3) for _ in range(4)] == [0, 0, 0.1, 0.2]
+
+    # Eine Sekunde Ruhe: der Eimer ist wieder voll, aber nicht voller.
+    uhr.jetzt += 1.0
+    assert [round(eimer.reservieren(), 3) for _ in range(3)] == [0, 0, 0.1]
+
+
+def test_arbeiter_fragen_im_takt(tmp_path):
+    provider = ZaehlenderProvider()
+    gedrosselt = GedrosselterProvider(provider, Eimer(50))
+
+    start = time.monotonic()
+    arbeiter = [threading.Thread(target=lambda: [gedrosselt.fetch_by_text('A', '5620')
+                                                 for _ in range(5)])
+                for _ in range(6)]
+    for thread in arbeiter:
+        thread.start()
+    for thread in arbeiter:
+        thread.join()
+
+    # 30 Aufrufe zu 50 je Sekunde: die erste Marke liegt bereit, die übrigen
+    # 29 tropfen im Abstand von 20 ms nach.
+    assert time.monotonic() - start >= 29 / 50 - 0.02
+    zeiten = sorted(provider.zeiten)
+    assert len(zeiten) == 30
+    assert zeiten[-1] - zeiten[0] >= 29 / 50 - 0.02
+
+
+def test_ein_eimer_je_quelle():
+    assert drosselung.eimer_fuer('test-a', 5) is drosselung.eimer_fuer('test-a', 5)
+    assert drosselung.eimer_fuer('test-a', 5) is not drosselung.eimer_fuer('test-b', 5)
+
+
+def test_asynchron_bleibt_asynchron(tmp_path):
+    gedrosselt = drosselung.davorlegen(AsynchronerProvider(), tmp_path / 'lauf.sqlite',
+                                       'test', 1.0)
+    assert ist_asynchron(gedrosselt)
+    assert asyncio.run(gedrosselt.fetch_by_text('A', '5620')) == []
+
+
+def test_stapel_nur_wenn_der_provider_stapelt():
+    assert not hasattr(GedrosselterProvider(ZaehlenderProvider()), 'fetch_by_texts')
+    assert hasattr(GedrosselterProvider(StapelProvider()), 'fetch_by_texts')
+
+
+# ============================================================================
+# Das Budget
+# ============================================================================
+
+def test_budget_haelt_an_bevor_es_reisst(tmp_path):
+    pfad = tmp_path / 'verbrauch.sqlite'
+    provider = ZaehlenderProvider()
+    gedrosselt = GedrosselterProvider(provider, budget=Budget(pfad, 'apify', 1.0, 0.25))
+
+    for _ in range(4):
+        gedrosselt.fetch_by_text('A', '5620')
+    with pytest.raises(QuelleNichtVerfuegbar) as fehler:
+        gedrosselt.fetch_by_text('A', '5620')
+
+    assert fehler.value.endgueltig
+    assert 'Monatsbudget für Apify' in fehler.value.meldung
+    assert len(provider.zeiten) == 4
+
+    # Ein zweiter Prozess auf derselben Datei sieht denselben Verbrauch.
+    assert Budget(pfad, 'apify', 1.0, 0.25).rest() == 0
+    assert Budget(pfad, 'google', 1.0, 0.25).rest() == 1.0
+
+
+def test_neuer_monat_neues_budget(tmp_path):
+    monat = ['2026-09']
+    budget = Budget(tmp_path / 'verbrauch.sqlite', 'apify', 0.5, 0.25,
+                    monat=lambda: monat[0])
+    budget.belasten(2)
+    with pytest.raises(QuelleNichtVerfuegbar):
+        budget.belasten()
+
+    monat[0] = '2026-10'
+    budget.belasten(2)
+    assert budget.verbraucht() == 0.5
+
+
+def test_stapel_kostet_je_suchbegriff(tmp_path):
+    budget = Budget(tmp_path / 'verbrauch.sqlite', 'apify', 0, 0.25)
+    GedrosselterProvider(StapelProvider(), budget=budget).fetch_by_texts(
+        [('A', '5620'), ('B', '5620'), ('C', '5620')])
+    assert budget.verbraucht() == 0.75
+    assert budget.rest() is None
+
+
+def test_schaetzung_vor_dem_start(tmp_path):
+    budget = Budget(tmp_path / 'verbrauch.sqlite', 'apify', 1.0, 0.25)
+    budget.belasten()
+
+    assert budget.schaetzen(3)['passt']
+    zu_viel = budget.schaetzen(4)
+    assert not zu_viel['passt']
+    assert zu_viel['kosten'] == 1.0 and zu_viel['rest'] == 0.75
+    assert 'reicht nicht' in drosselung.schaetzung_als_text('apify', zu_viel)
+
+
+# ============================================================================
+# Im Lauf
+# ============================================================================
+
+def test_lauf_endet_fortsetzbar_wenn_das_budget_aufgebraucht_ist(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    pfad = tmp_path / 'lauf.sqlite'
+    fake = FakeProvider.aus_csv(str(FIXTURE))
+    fake.kosten_je_abfrage = 0.1
+
+    with Datenbank(pfad) as datenbank:
+        gedrosselt = drosselung.davorlegen(fake, pfad, 'test', monatsbudget=0.5)
+        ergebnis = Lauf(gedrosselt, datenbank, arbeiter=1).ausfuehren(
+            eingabe, str(tmp_path / 'aus'))
+        assert ergebnis['status'] == 'FEHLER'
+        assert 'Monatsbudget' in ergebnis['fehlermeldung']
+        assert len(datenbank.kunden_lesen(ergebnis['job_id'])) == 5
+
+        # Mehr Budget, und der Lauf geht dort weiter, wo er stand.
+        gedrosselt = drosselung.davorlegen(fake, pfad, 'test', monatsbudget=5)
+        weiter = Lauf(gedrosselt, datenbank).fortsetzen(
+            ergebnis['job_id'], eingabe, str(tmp_path / 'aus'))
+    assert weiter['status'] == 'FERTIG'
+
+
+def test_zwischenspeicher_kostet_nichts(tmp_path):
+    pfad = tmp_path / 'lauf.sqlite'
+    provider = ZaehlenderProvider()
+    gedrosselt = drosselung.davorlegen(provider, pfad, 'test', monatsbudget=10)
+    vorne = antwort_cache.davorlegen(gedrosselt, pfad, 'test', 35)
+
+    for _ in range(5):
+        vorne.fetch_by_text('Laden A', '5620')
+
+    assert len(provider.zeiten) == 1
+    assert drosselung.budget_von(vorne).verbraucht() == 0.25
+
+
+def test_ohne_grenzen_bleibt_der_provider_wie_er_ist(tmp_path):
+    fake = FakeProvider({})
+    assert drosselung.davorlegen(fake, tmp_path / 'lauf.sqlite', 'test') is fake
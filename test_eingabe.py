@@ -0,0 +1,189 @@
+# test_eingabe.py
+# The block-wise reader for input files (eingabe.py): same customers, same
+# first-wins rule and same upload report as reading the whole file, with
+# memory that does not grow with the file — and a run that reads only as far
+# as it has asked. The peak-memory comparison runs only with LANGSAME_TESTS=1.
+# Nothing here touches the network.
+
+import os
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import eingabe
+from db import Datenbank
+from eingabe import Eingabedatei
+from pipeline import Lauf
+from upload_pruefung import pruefe_datei
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def datei_schreiben(tmp_path: Path, zeilen: list, name: str = 'eingabe.csv') -> Path:
+    ziel = tmp_path / name
+    pd.DataFrame(zeilen, columns=['SearchString', 'PLZ', 'Stadt', 'KundenNr']).to_csv(
+        ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def viele_zeilen(anzahl: int) -> list:
+    return [(f'Muster Laden {n}, Hauptstrasse {n}, 5620 Musterdorf', '5620',
+             'Musterdorf', str(900000 + n)) for n in range(anzahl)]
+
+
+def ganz_gelesen(pfad: Path) -> list:
+    """Die frühere Lesart: ganze Datei, eine Gruppe je KundenNr."""
+    df = pd.read_csv(pfad, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    return [(str(nr), gruppe.iloc[0].to_dict())
+            for nr, gruppe in df.groupby('KundenNr', sort=False)]
+
+
+def spitze_beim_lesen(lesen) -> int:
+    tracemalloc.start()
+    try:
+        lesen()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# ============================================================================
+# Dieselben Kunden
+# ============================================================================
+
+def test_fixture_gleich_wie_ganz_gelesen():
+    datei = Eingabedatei(FIXTURE, block_zeilen=4)
+
+    assert list(datei.kunden()) == ganz_gelesen(FIXTURE)
+    assert datei.zeilen == len(pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig'))
+
+
+def test_doppelte_ueber_blockgrenzen_erste_zeile_gewinnt(tmp_path):
+    quelle = datei_schreiben(tmp_path, [
+        ('Laden A, Hauptstrasse 1, 5620 Musterdorf', '5620', '', '900001'),
+        ('Laden B, Hauptstrasse 2, 5620 Musterdorf', '5620', '', '900002'),
+        ('Laden C, Hauptstrasse 3, 5620 Musterdorf', '5620', '', '900003'),
+        ('Laden A zweimal, Hauptstrasse 9, 5620 Musterdorf', '5620', '', '900001'),
+        ('Laden D, Hauptstrasse 4, 5620 Musterdorf', '', '', '900004'),
+        ('Laden B zweimal, Hauptstrasse 9, 5620 Musterdorf', '5620', '', '900002'),
+    ])
+    datei = Eingabedatei(quelle, block_zeilen=2)
+
+    kunden = list(datei.kunden())
+
+    assert kunden == ganz_gelesen(quelle)
+    assert [nr for nr, _ in kunden] == ['900001', '900002', '900003', '900004']
+    assert kunden[0][1]['SearchString'] == 'Laden A, Hauptstrasse 1, 5620 Musterdorf'
+    assert kunden[3][1]['PLZ'] == ''
+    assert datei.doppelte == 2
+
+
+# ============================================================================
+# Derselbe Bericht
+# ============================================================================
+
+def test_beispielzeile_aus_einem_spaeteren_block(tmp_path, monkeypatch):
+    zeilen = viele_zeilen(10)
+    zeilen[7] = ('Denner Musterdorf', '5620', 'Musterdorf', '900007')
+    zeilen[9] = ('Volg', '5620', 'Musterdorf', '900009')
+    quelle = datei_schreiben(tmp_path, zeilen)
+    ganz = pruefe_datei(quelle)
+
+    monkeypatch.setattr(eingabe, 'BLOCK_ZEILEN', 3)
+    bericht = pruefe_datei(quelle)
+
+    befund = bericht.befund('unvollstaendig')
+    assert befund.anzahl == 2
+    assert befund.zeilennummer == 9
+    assert befund.beispiel_zeile == 'Denner Musterdorf;5620;Musterdorf;900007'
+    assert bericht.als_text() == ganz.als_text()
+    assert (bericht.zeilen, bericht.kunden) == (10, 10)
+
+
+# ============================================================================
+# Flacher Speicher
+# ============================================================================
+
+def test_liest_nur_den_naechsten_block(tmp_path):
+    quelle = datei_schreiben(tmp_path, viele_zeilen(25))
+    datei = Eingabedatei(quelle, block_zeilen=10)
+    bloecke = datei.bloecke()
+
+    assert len(next(bloecke)) == 10
+    assert datei.zeilen == 10
+    assert [len(block) for block in bloecke] == [10, 5]
+    assert datei.zeilen == 25
+
+
+@pytest.mark.skipif(not os.environ.get('LANGSAME_TESTS'),
+                    reason='Vergleicht Speicherspitzen, die von der Umgebung '
+                           'abhängen. Mit LANGSAME_TESTS=1 ausführen.')
+def test_speicher_waechst_nicht_mit_der_datei(tmp_path, monkeypatch):
+    monkeypatch.setattr(eingabe, 'BLOCK_ZEILEN', 1_000)
+    klein = datei_schreiben(tmp_path, viele_zeilen(5_000), 'klein.csv')
+    gross = datei_schreiben(tmp_path, viele_zeilen(50_000), 'gross.csv')
+
+    def durchlaufen(pfad):
+        return lambda: sum(1 for _ in Eingabedatei(pfad).bloecke())
+
+    spitze_klein = spitze_beim_lesen(durchlaufen(klein))
+    spitze_gross = spitze_beim_lesen(durchlaufen(gross))
+    spitze_ganz = spitze_beim_lesen(lambda: pd.read_csv(
+        gross, sep=';', encoding='utf-8-sig', dtype=str).fillna(''))
+
+    # Zehnmal so viele Zeilen, aber kaum mehr Speicher — und ein Bruchteil
+    # dessen, was schon die ganze Datei ohne Gruppen belegt.
+    assert spitze_gross < spitze_klein * 2
+    assert spitze_gross * 5 < spitze_ganz
+
+
+# ============================================================================
+# Der Lauf liest mit
+# ============================================================================
+
+class MerktDenLesestand:
+    """Merkt sich bei jeder Abfrage, wie viele Zeilen bis dahin gelesen sind."""
+
+    def __init__(self, gelesen: list):
+        self.gelesen = gelesen
+        self.stand = []
+
+    def fetch_by_text(self, search_string, plz):
+        self.stand.append(sum(self.gelesen))
+        return []
+
+
+def test_lauf_liest_nur_so_weit_wie_er_fragt(tmp_path, monkeypatch):
+    monkeypatch.setattr(eingabe, 'BLOCK_ZEILEN', 10)
+    quelle = datei_schreiben(tmp_path, viele_zeilen(500))
+    gelesen = []
+    bloecke = Eingabedatei.bloecke
+
+    def gezaehlt(self):
+        for block in bloecke(self):
+            gelesen.append(len(block))
+            yield block
+
+    monkeypatch.setattr(Eingabedatei, 'bloecke', gezaehlt)
+    provider = MerktDenLesestand(gelesen)
+
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(provider, datenbank, arbeiter=2).ausfuehren(
+            quelle, str(tmp_path / 'ergebnis'))
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert ergebnis['kunden_total'] == 500
+    # Zweimal ganz gelesen: einmal zum Zählen, einmal für den Lauf.
+    assert sum(gelesen) == 1_000
+    # Beim n-ten Kunden hat der Lauf nur wenig mehr als n Kunden gelesen —
+    # einen Block und die Abfragen, die gleichzeitig unterwegs sind.
+    assert len(provider.stand) == 500
+    for n, stand in enumerate(provider.stand):
+        assert stand - 500 <= n + 1 + 10 + 2 * 2
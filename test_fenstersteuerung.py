@@ -0,0 +1,138 @@
+# test_fenstersteuerung.py
+# The adaptive number of parallel queries: grow by one on a healthy window,
+# halve on errors, and every decision visible in the job's progress data.
+# Nothing here touches the network.
+
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from db import Datenbank
+from fake_provider import FakeProvider
+from fenstersteuerung import LATENZ_TOLERANZ, Fenstersteuerung
+from pipeline import Lauf
+from place_provider import Candidate, QuelleNichtVerfuegbar
+
+
+def viele_kunden(tmp_path: Path, anzahl: int) -> Path:
+    ziel = tmp_path / 'viele.csv'
+    pd.DataFrame([{'SearchString': f'Laden {n}, Hauptstrasse {n}, 5620 Musterdorf',
+                   'PLZ': '5620', 'Stadt': 'Musterdorf', 'KundenNr': str(800000 + n)}
+                  for n in range(anzahl)]).to_csv(
+        ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+# ============================================================================
+# Die Steuerung allein
+# ============================================================================
+
+def test_ein_volles_fenster_ohne_fehler_erhoeht_um_eins():
+    steuerung = Fenstersteuerung(4)
+    gruende = [steuerung.erfolg(1.0) for _ in range(4)]
+
+    assert gruende[:3] == [None, None, None]
+    assert gruende[3].startswith('erhöht')
+    assert steuerung.fenster == 5
+
+
+def test_fehlschlag_halbiert_einmal_je_fenster():
+    steuerung = Fenstersteuerung(8)
+
+    assert steuerung.fehlschlag().startswith('halbiert')
+    assert steuerung.fenster == 4
+    # Die übrigen sieben waren schon unterwegs — sie halbieren nicht noch einmal.
+    assert [steuerung.fehlschlag() for _ in range(7)] == [None] * 7
+    assert steuerung.fenster == 4
+    assert steuerung.fehlschlag() is not None
+    assert steuerung.fenster == 2
+
+
+def test_grenzen_werden_eingehalten():
+    steuerung = Fenstersteuerung(2, minimum=2, maximum=3)
+    for _ in range(20):
+        steuerung.erfolg(1.0)
+    assert steuerung.fenster == 3
+    steuerung.fehlschlag()
+    assert steuerung.fenster == 2
+
+
+def test_langsame_antworten_halten_das_fenster():
+    steuerung = Fenstersteuerung(2)
+    steuerung.erfolg(1.0)
+    steuerung.erfolg(1.0)
+    assert steuerung.fenster == 3
+
+    gruende = [steuerung.erfolg(LATENZ_TOLERANZ * 10) for _ in range(9)]
+
+    assert steuerung.fenster == 3
+    gehalten = [g for g in gruende if g]
+    assert len(gehalten) == 1 and gehalten[0].startswith('gehalten')
+
+
+# ============================================================================
+# Im Lauf
+# ============================================================================
+
+class DrosselnderProvider:
+    """Wie Apify unter Last: mehr als `grenze` gleichzeitig wird abgewiesen."""
+
+    def __init__(self, grenze: int):
+        self.grenze = grenze
+        self.gleichzeitig = 0
+        self._sperre = threading.Lock()
+
+    def fetch_by_text(self, search_string, plz):
+        with self._sperre:
+            self.gleichzeitig += 1
+            zu_viele = self.gleichzeitig > self.grenze
+        try:
+            time.sleep(0.05)
+            if zu_viele:
+                raise QuelleNichtVerfuegbar('Zu viele Anfragen.', endgueltig=False)
+            return [Candidate(title=search_string.split(',')[0],
+                              street='Hauptstrasse 1', postal_code=plz)]
+        finally:
+            with self._sperre:
+                self.gleichzeitig -= 1
+
+    def fetch_by_id(self, place_id):
+        return None
+
+
+def test_drosselung_verkleinert_das_fenster(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(DrosselnderProvider(grenze=3), datenbank, arbeiter=8,
+                        anpassend=True).ausfuehren(viele_kunden(tmp_path, 80),
+                                                   str(tmp_path / 'aus'))
+        stand = datenbank.fortschritt_lesen(ergebnis['job_id'])
+        entscheide = datenbank.fenster_entscheide_lesen(ergebnis['job_id'])
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert entscheide[0]['grund'] == 'Start mit 8 gleichzeitig'
+    assert any(e['grund'].startswith('halbiert') for e in entscheide)
+    assert stand['gleichzeitig'] == entscheide[-1]['fenster']
+    assert stand['gleichzeitig'] < 8
+    assert stand['fenster_entscheide'] == entscheide[-10:]
+
+
+def test_gesunde_quelle_bekommt_mehr_gleichzeitige_abfragen(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(DrosselnderProvider(grenze=100), datenbank, arbeiter=2,
+                        anpassend=True).ausfuehren(viele_kunden(tmp_path, 60),
+                                                   str(tmp_path / 'aus'))
+        stand = datenbank.fortschritt_lesen(ergebnis['job_id'])
+
+    assert stand['gleichzeitig'] > 2
+
+
+def test_ohne_steuerung_steht_nichts_im_fortschritt(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(FakeProvider({}), datenbank).ausfuehren(
+            viele_kunden(tmp_path, 3), str(tmp_path / 'aus'))
+        stand = datenbank.fortschritt_lesen(ergebnis['job_id'])
+
+    assert stand['gleichzeitig'] is None
+    assert stand['fenster_entscheide'] == []
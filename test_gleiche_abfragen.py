@@ -0,0 +1,232 @@
+# test_gleiche_abfragen.py
+# Customers with the same query inside one run (branches billed under their
+# own KundenNr): the provider is asked once, every customer still gets its
+# own `kunde`/`kandidat` rows, the output files are the same as asking for
+# each, and the run reports how many calls it saved.
+# Nothing here touches the network.
+
+import asyncio
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from data_cleaner import OUTPUT_FILES
+from db import Datenbank
+from fake_provider import FakeProvider
+from pipeline import AUSGEFALLENE_ABFRAGE_GRUND, Lauf
+from place_provider import Candidate, QuelleNichtVerfuegbar
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+class Absturz(BaseException):
+    """Wie ein abgeschossener Prozess: kein except Exception fängt ihn."""
+
+
+class ZaehlenderProvider:
+    """Der FakeProvider, mit gezählten Aufrufen je Abfrage."""
+
+    def __init__(self):
+        self.fake = FakeProvider.aus_csv(str(FIXTURE))
+        self.aufrufe = {}
+        self._sperre = threading.Lock()
+
+    def _zaehlen(self, schluessel) -> None:
+        with self._sperre:
+            self.aufrufe[schluessel] = self.aufrufe.get(schluessel, 0) + 1
+
+    def fetch_by_text(self, search_string, plz):
+        self._zaehlen((search_string, plz))
+        return self.fake.fetch_by_text(search_string, plz)
+
+    def fetch_by_id(self, place_id):
+        self._zaehlen(place_id)
+        return Candidate(title='Muster Laden', street='Hauptstrasse 1',
+                         postal_code='5620', place_id=place_id)
+
+
+class AsynchronZaehlend(ZaehlenderProvider):
+    async def fetch_by_text(self, search_string, plz):
+        await asyncio.sleep(0.001)
+        return super().fetch_by_text(search_string, plz)
+
+    async def fetch_by_id(self, place_id):
+        return super().fetch_by_id(place_id)
+
+
+class FaelltAus(ZaehlenderProvider):
+    """Die Abfrage eines Suchbegriffs kommt nicht zurück, alle anderen schon."""
+
+    def __init__(self, ausfall: str):
+        super().__init__()
+        self.ausfall = ausfall
+
+    def fetch_by_text(self, search_string, plz):
+        if search_string != self.ausfall:
+            return super().fetch_by_text(search_string, plz)
+        self._zaehlen((search_string, plz))
+        raise QuelleNichtVerfuegbar('Kurz nicht erreichbar.', endgueltig=False)
+
+
+def mit_filialen(tmp_path: Path) -> Path:
+    """Die Kunden der Fixture, dazwischen je zwei Filialen mit eigener KundenNr."""
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    kunden = df[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr']).to_dict('records')
+    zeilen = []
+    for n, kunde in enumerate(kunden):
+        zeilen.append(kunde)
+        if n % 3 == 0:
+            for filiale in (1, 2):
+                zeilen.append({**kunde, 'KundenNr': str(990000 + n * 10 + filiale)})
+    zeilen += [{**kunden[0], 'KundenNr': '999999'}]
+    ziel = tmp_path / 'filialen.csv'
+    pd.DataFrame(zeilen).to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def lauf(tmp_path: Path, name: str, eingabe: Path, provider, **optionen) -> dict:
+    with Datenbank(tmp_path / f'{name}.sqlite') as datenbank:
+        return Lauf(provider, datenbank, **optionen).ausfuehren(
+            eingabe, str(tmp_path / name))
+
+
+def gleiche_dateien(links: Path, rechts: Path) -> None:
+    for dateiname in OUTPUT_FILES.values():
+        assert (links / dateiname).read_bytes() == (rechts / dateiname).read_bytes()
+
+
+def lies(pfad: Path) -> pd.DataFrame:
+    return pd.read_csv(pfad, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+
+
+# ============================================================================
+# Eine Abfrage, eigene Zeilen
+# ============================================================================
+
+def test_eine_abfrage_je_suchbegriff_und_plz(tmp_path):
+    eingabe = mit_filialen(tmp_path)
+    kunden = lies(eingabe)
+    provider = ZaehlenderProvider()
+
+    ergebnis = lauf(tmp_path, 'gemeinsam', eingabe, provider, arbeiter=4)
+
+    eindeutig = kunden[['SearchString', 'PLZ']].drop_duplicates()
+    assert set(provider.aufrufe.values()) == {1}
+    assert len(provider.aufrufe) == len(eindeutig)
+    assert ergebnis['gesparte_abfragen'] == len(kunden) - len(eindeutig)
+    assert ergebnis['kunden_erledigt'] == len(kunden)
+
+
+def test_dieselben_dateien_wie_jeder_fuer_sich(tmp_path):
+    eingabe = mit_filialen(tmp_path)
+
+    lauf(tmp_path, 'gemeinsam', eingabe, ZaehlenderProvider(), arbeiter=4)
+    einzeln = lauf(tmp_path, 'einzeln', eingabe, ZaehlenderProvider(),
+                   zusammenlegen=False, arbeiter=4)
+
+    assert einzeln['gesparte_abfragen'] == 0
+    gleiche_dateien(tmp_path / 'gemeinsam', tmp_path / 'einzeln')
+
+
+def test_jeder_kunde_mit_eigenen_zeilen(tmp_path):
+    eingabe = mit_filialen(tmp_path)
+    ergebnis = lauf(tmp_path, 'gemeinsam', eingabe, ZaehlenderProvider())
+
+    with Datenbank(tmp_path / 'gemeinsam.sqlite') as datenbank:
+        kunden = {k['kunden_nr']: k for k in datenbank.kunden_lesen(ergebnis['job_id'])}
+        assert len(kunden) == len(lies(eingabe))
+        haupt, filiale = kunden[lies(eingabe)['KundenNr'][0]], kunden['990001']
+        assert haupt['id'] != filiale['id']
+        assert (haupt['ergebnis'], haupt['qualitaet']) == (filiale['ergebnis'],
+                                                           filiale['qualitaet'])
+
+        def ohne_kunde(zeilen):
+            return [{k: v for k, v in z.items() if k not in ('id', 'kunde_id')}
+                    for z in zeilen]
+
+        assert (ohne_kunde(datenbank.kandidaten_lesen(filiale['id']))
+                == ohne_kunde(datenbank.kandidaten_lesen(haupt['id'])))
+
+
+def test_asynchron_ebenso(tmp_path):
+    eingabe = mit_filialen(tmp_path)
+    provider = AsynchronZaehlend()
+
+    ergebnis = lauf(tmp_path, 'asynchron', eingabe, provider, arbeiter=8)
+    lauf(tmp_path, 'einzeln', eingabe, ZaehlenderProvider(), zusammenlegen=False)
+
+    assert set(provider.aufrufe.values()) == {1}
+    assert ergebnis['gesparte_abfragen'] > 0
+    gleiche_dateien(tmp_path / 'asynchron', tmp_path / 'einzeln')
+
+
+def test_modus_b_nach_google_id(tmp_path):
+    eingabe = tmp_path / 'IDs.csv'
+    pd.DataFrame([{'placeId': place_id, 'lat': '', 'lng': '', 'KundenNr': str(900000 + n)}
+                  for n, place_id in enumerate(['PLACE_1', 'PLACE_2', 'PLACE_1', '',
+                                                '', 'PLACE_1'])]).to_csv(
+        eingabe, sep=';', index=False, encoding='utf-8-sig')
+    provider = ZaehlenderProvider()
+
+    ergebnis = lauf(tmp_path, 'b', eingabe, provider, modus='B')
+
+    assert provider.aufrufe == {'PLACE_1': 1, 'PLACE_2': 1}
+    # Ohne Id gibt es nichts zu fragen, also auch nichts zu sparen.
+    assert ergebnis['gesparte_abfragen'] == 2
+    assert len(lies(tmp_path / 'b' / OUTPUT_FILES['fertig_fuer_erp'])) == 4
+
+
+# ============================================================================
+# Ausfall und Absturz
+# ============================================================================
+
+def test_ausgefallen_fuer_alle_die_mitfragen(tmp_path):
+    eingabe = mit_filialen(tmp_path)
+    erster = lies(eingabe).iloc[0]
+    provider = FaelltAus(erster['SearchString'])
+
+    lauf(tmp_path, 'aus', eingabe, provider, arbeiter=1)
+
+    assert set(provider.aufrufe.values()) == {1}
+    nicht_moeglich = lies(tmp_path / 'aus' / OUTPUT_FILES['nicht_moeglich'])
+    ausgefallen = nicht_moeglich[nicht_moeglich['grund'] == AUSGEFALLENE_ABFRAGE_GRUND]
+    assert set(ausgefallen['KundenNr']) == {erster['KundenNr'], '990001', '990002',
+                                            '999999'}
+
+
+def test_absturz_mitten_in_den_filialen(tmp_path):
+    eingabe = mit_filialen(tmp_path)
+
+    class StuerztAb(Lauf):
+        verbucht = 0
+
+        def _einen_kunden(self, *args):
+            if self.verbucht == 2:
+                raise Absturz()
+            self.verbucht += 1
+            return super()._einen_kunden(*args)
+
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        with pytest.raises(Absturz):
+            StuerztAb(ZaehlenderProvider(), datenbank, arbeiter=1).ausfuehren(
+                eingabe, str(tmp_path / 'aus'))
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        provider = ZaehlenderProvider()
+        job_id = datenbank.offener_job()['id']
+        ergebnis = Lauf(provider, datenbank).fortsetzen(job_id, eingabe,
+                                                        str(tmp_path / 'aus'))
+
+    # Der erste Kunde und eine Filiale lagen vor; die zweite Filiale fragt neu.
+    erster = tuple(lies(eingabe).iloc[0][['SearchString', 'PLZ']])
+    assert provider.aufrufe[erster] == 1
+    assert ergebnis['status'] == 'FERTIG'
+    lauf(tmp_path, 'einzeln', eingabe, ZaehlenderProvider(), zusammenlegen=False)
+    gleiche_dateien(tmp_path / 'aus', tmp_path / 'einzeln')
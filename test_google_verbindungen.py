@@ -0,0 +1,171 @@
+# test_google_verbindungen.py
+# The Google provider (Modus B) against a local stand-in for Place Details:
+# all workers share one session whose connection pool is as large as the
+# number of workers, connections are kept open and reused, and every call is
+# timed by phase (connect, TLS, server, read).
+# Nothing here touches the network — the stand-in listens on 127.0.0.1.
+
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import google_provider
+from google_provider import GoogleProvider, Zeitmessung
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+class Platzhalter(ThreadingHTTPServer):
+    """Beantwortet /v1/places/<id> wie Google und zählt die Verbindungen."""
+
+    daemon_threads = True
+
+    def __init__(self, pause: float = 0.0):
+        super().__init__(('127.0.0.1', 0), Antworter)
+        self.pause = pause
+        self.verbindungen = 0
+        self.abrufe = 0
+        self._sperre = threading.Lock()
+
+    @property
+    def basis_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/v1/places'
+
+    def zaehlen(self, neue_verbindung: bool) -> None:
+        with self._sperre:
+            self.abrufe += 1
+            self.verbindungen += neue_verbindung
+
+
+class Antworter(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Verbindungen bleiben offen
+
+    def setup(self):
+        super().setup()
+        self.neu = True
+
+    def do_GET(self):
+        self.server.zaehlen(self.neu)
+        self.neu = False
+        time.sleep(self.server.pause)
+        kennung = self.path.split('?')[0].rsplit('/', 1)[-1]
+        if kennung.startswith('WEG'):
+            rumpf, status = b'{"error": {"status": "NOT_FOUND"}}', 404
+        else:
+            rumpf, status = json.dumps({
+                'id': kennung,
+                'displayName': {'text': f'Muster Laden {kennung}'},
+                'formattedAddress': 'Hauptstrasse 1, 5620 Musterdorf',
+                'businessStatus': 'OPERATIONAL',
+            }).encode(), 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(rumpf)))
+        self.end_headers()
+        self.wfile.write(rumpf)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def platzhalter():
+    server = Platzhalter(pause=0.005)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def abrufen(provider, anzahl: int, arbeiter: int) -> list:
+    with ThreadPoolExecutor(max_workers=arbeiter) as ausfuehrer:
+        return list(ausfuehrer.map(provider.fetch_by_id,
+                                   [f'PLACE_{n}' for n in range(anzahl)]))
+
+
+# ============================================================================
+# Verbindungen
+# ============================================================================
+
+def test_verbindungen_werden_wiederverwendet(platzhalter):
+    provider = GoogleProvider('schluessel', verbindungen=6,
+                              basis_url=platzhalter.basis_url)
+
+    treffer = abrufen(provider, 120, arbeiter=6)
+
+    assert [t.place_id for t in treffer] == [f'PLACE_{n}' for n in range(120)]
+    assert platzhalter.abrufe == 120
+    assert platzhalter.verbindungen <= 6
+    assert provider.zeitmessung.neue_verbindungen == platzhalter.verbindungen
+
+
+def test_ohne_passenden_vorrat_wird_neu_verbunden(platzhalter):
+    """Zu kleiner Vorrat: was nicht hineinpasst, wird nach dem Abruf geschlossen."""
+    zu_klein = GoogleProvider('schluessel', verbindungen=1,
+                              basis_url=platzhalter.basis_url)
+
+    abrufen(zu_klein, 60, arbeiter=6)
+
+    assert platzhalter.verbindungen > 6
+
+
+def test_vorrat_so_gross_wie_angegeben():
+    adapter = GoogleProvider('schluessel', verbindungen=12)._sitzung.get_adapter(
+        google_provider.BASIS_URL)
+    assert adapter.poolmanager.connection_pool_kw['maxsize'] == 12
+    assert adapter.max_retries.connect == 1
+    assert adapter.max_retries.read == 0
+
+
+def test_unbekannte_id_bleibt_eine_aussage(platzhalter):
+    provider = GoogleProvider('schluessel', basis_url=platzhalter.basis_url)
+    assert provider.fetch_by_id('WEG_1') is None
+
+
+def test_aus_konfiguration_gibt_die_verbindungen_weiter(monkeypatch):
+    class MitSchluessel:
+        GOOGLE_API_KEY = 'schluessel'
+
+    monkeypatch.setitem(sys.modules, 'config', MitSchluessel)
+    provider = google_provider.aus_konfiguration(verbindungen=24)
+    assert provider.verbindungen == 24
+
+
+# ============================================================================
+# Zeitmessung
+# ============================================================================
+
+def test_abschnitte_je_abruf(platzhalter):
+    platzhalter.pause = 0.02
+    provider = GoogleProvider('schluessel', verbindungen=2,
+                              basis_url=platzhalter.basis_url)
+
+    abrufen(provider, 10, arbeiter=2)
+    zeiten = provider.zeitmessung.zusammenfassung()
+
+    assert zeiten['abrufe'] == 10
+    assert 1 <= zeiten['neue_verbindungen'] <= 2
+    assert zeiten['server_ms'] >= 20
+    assert zeiten['verbinden_ms'] > 0
+    assert zeiten['tls_ms'] >= 0  # http: kein TLS
+    teile = sum(zeiten[f'{phase}_ms'] for phase in Zeitmessung.PHASEN)
+    assert teile == pytest.approx(zeiten['gesamt_ms'], abs=0.5)
+
+
+def test_zeitmessung_ohne_kopfzeit():
+    """Eine Sitzung ohne `elapsed` (wie in den Tests): alles ausser Aufbau ist Server."""
+    messung = Zeitmessung()
+    messung.erfassen({'verbinden': 0.01, 'tls': 0.02, 'neu': 1}, 0.1)
+
+    zeiten = messung.zusammenfassung()
+    assert zeiten['server_ms'] == pytest.approx(70)
+    assert zeiten['lesen_ms'] == 0
+    assert zeiten['neue_verbindungen'] == 1
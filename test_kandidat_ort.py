@@ -0,0 +1,209 @@
+# test_kandidat_ort.py
+# The location of a candidate as numbers (table `kandidat_ort`): written
+# together with the candidate, read back with it, used by the distance check
+# of mode B instead of parsing `kandidat.location` again, and filled in for
+# databases written before the table existed.
+# Nothing here touches the network. All place ids and coordinates are made up.
+
+import ast
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import modus_b
+import place_provider
+from data_cleaner import OUTPUT_FILES
+from db import Datenbank
+from pipeline import Lauf
+from place_provider import Candidate, candidate_aus_zeile
+
+# Erfundene Koordinaten. Musterdorf liegt bei 47.3500 / 8.2400.
+MUSTERDORF = (47.3500, 8.2400)
+HAUPTDATEIEN = ('fertig_fuer_erp', 'zur_pruefung', 'nicht_moeglich')
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def kandidat(nummer: int, location) -> Candidate:
+    return Candidate(title=f'Muster Laden {nummer}', street='Hauptstrasse 5',
+                     postal_code='5620', city='Musterdorf',
+                     address='Hauptstrasse 5, 5620 Musterdorf',
+                     place_id=f'PLACE_{nummer}', location=location,
+                     permanently_closed='False')
+
+
+def kunde_mit_kandidaten(datenbank: Datenbank, kandidaten: list) -> int:
+    job_id = datenbank.job_anlegen('A', 'eingabe.csv', 1)
+    kunde_id = datenbank.kunde_schreiben(job_id, '9000001', 'Muster Laden', '5620',
+                                         'Musterdorf', ergebnis='pruefung')
+    datenbank.kandidaten_schreiben(kunde_id, [(k, 50.0, 'vorgeschlagen', 'Test')
+                                              for k in kandidaten])
+    return kunde_id
+
+
+def orte(pfad) -> dict:
+    with sqlite3.connect(pfad) as verbindung:
+        return {kandidat_id: (lat, lng) for kandidat_id, lat, lng in
+                verbindung.execute('SELECT kandidat_id, lat, lng FROM kandidat_ort')}
+
+
+def eingabe_b(tmp_path: Path, zeilen: list) -> Path:
+    ziel = tmp_path / 'IDs.csv'
+    pd.DataFrame(zeilen).to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+class IdProvider:
+    def __init__(self, antworten: dict):
+        self.antworten = antworten
+
+    def fetch_by_id(self, place_id):
+        return self.antworten.get(place_id)
+
+    def fetch_by_text(self, search_string, plz):
+        raise AssertionError('Im Modus B darf nicht gesucht werden.')
+
+
+def kein_parser(*_):
+    raise AssertionError('Der Standort wurde erneut aus dem Text gelesen.')
+
+
+# ============================================================================
+# Schreiben und lesen
+# ============================================================================
+
+def test_standort_wird_beim_schreiben_abgelegt(tmp_path):
+    with Datenbank(tmp_path / 'ort.sqlite') as datenbank:
+        kunde_id = kunde_mit_kandidaten(datenbank, [
+            kandidat(1, str({'lat': MUSTERDORF[0], 'lng': MUSTERDORF[1]})),
+            kandidat(2, ''),
+            kandidat(3, 'kein Standort'),
+            kandidat(4, "{'lat': -33.8688, 'lng': 151.2093}")])
+        gelesen = datenbank.kandidaten_lesen(kunde_id)
+
+    ids = [zeile['id'] for zeile in gelesen]
+    assert orte(tmp_path / 'ort.sqlite') == {ids[0]: MUSTERDORF,
+                                             ids[3]: (-33.8688, 151.2093)}
+    assert [(zeile['lat'], zeile['lng']) for zeile in gelesen] == [
+        MUSTERDORF, (None, None), (None, None), (-33.8688, 151.2093)]
+
+
+def test_kandidat_aus_der_datenbank_liest_location_nicht(tmp_path, monkeypatch):
+    with Datenbank(tmp_path / 'ort.sqlite') as datenbank:
+        kunde_id = kunde_mit_kandidaten(datenbank, [
+            kandidat(1, str({'lat': MUSTERDORF[0], 'lng': MUSTERDORF[1]})),
+            kandidat(2, '')])
+        zeilen = datenbank.kandidaten_lesen(kunde_id)
+        je_kunde = datenbank.kandidaten_des_jobs(
+            datenbank.kunde_lesen(kunde_id)['job_id'])
+
+    monkeypatch.setattr(place_provider, 'koordinaten', kein_parser)
+    gefunden = [candidate_aus_zeile(zeile) for zeile in zeilen]
+    assert [k.standort() for k in gefunden] == [MUSTERDORF, None]
+    assert [candidate_aus_zeile(z).standort() for z in je_kunde[kunde_id]] == [
+        MUSTERDORF, None]
+    # Der Standort ist kein Feld: gleich bleibt gleich.
+    assert gefunden[0] == kandidat(1, str({'lat': MUSTERDORF[0], 'lng': MUSTERDORF[1]}))
+
+
+def test_standort_wird_je_kandidat_nur_einmal_gelesen(monkeypatch):
+    gefunden = kandidat(1, str({'lat': MUSTERDORF[0], 'lng': MUSTERDORF[1]}))
+    aufrufe = []
+    original = place_provider.koordinaten
+    monkeypatch.setattr(place_provider, 'koordinaten',
+                        lambda text: aufrufe.append(text) or original(text))
+
+    assert gefunden.standort() == MUSTERDORF
+    assert gefunden.standort() == MUSTERDORF
+    assert len(aufrufe) == 1
+
+
+# ============================================================================
+# Modus B
+# ============================================================================
+
+def test_wiederaufnahme_rechnet_mit_den_gespeicherten_zahlen(tmp_path, monkeypatch):
+    weit_weg = str({'lat': MUSTERDORF[0] + 0.01, 'lng': MUSTERDORF[1]})
+    eingabe = eingabe_b(tmp_path, [
+        {'placeId': 'PLACE_1', 'lat': '47.35', 'lng': '8.24', 'KundenNr': '9000001'},
+        {'placeId': 'PLACE_2', 'lat': '47.35', 'lng': '8.24', 'KundenNr': '9000002'}])
+    antworten = {'PLACE_1': kandidat(1, str({'lat': MUSTERDORF[0], 'lng': MUSTERDORF[1]})),
+                 'PLACE_2': kandidat(2, weit_weg)}
+    ziel, zweites_ziel = tmp_path / 'aus', tmp_path / 'aus2'
+
+    with Datenbank(tmp_path / 'b.sqlite') as datenbank:
+        ergebnis = Lauf(IdProvider(antworten), datenbank, modus='B').ausfuehren(
+            eingabe, str(ziel))
+        datenbank.status_setzen(ergebnis['job_id'], 'LAEUFT')
+
+    monkeypatch.setattr(place_provider, 'koordinaten', kein_parser)
+    monkeypatch.setattr(ast, 'literal_eval', kein_parser)
+    with Datenbank(tmp_path / 'b.sqlite') as datenbank:
+        nachher = Lauf(IdProvider({}), datenbank, modus='B').fortsetzen(
+            ergebnis['job_id'], eingabe, str(zweites_ziel))
+
+    assert nachher['status'] == 'FERTIG'
+    for name in HAUPTDATEIEN:
+        assert (ziel / OUTPUT_FILES[name]).read_text('utf-8-sig') == \
+            (zweites_ziel / OUTPUT_FILES[name]).read_text('utf-8-sig')
+    assert 'Standort abweichend' in (zweites_ziel / OUTPUT_FILES['zur_pruefung']
+                                     ).read_text('utf-8-sig')
+
+
+def test_viele_kunden_mit_gespeicherten_zahlen(tmp_path, monkeypatch):
+    with Datenbank(tmp_path / 'ort.sqlite') as datenbank:
+        kunde_id = kunde_mit_kandidaten(datenbank, [
+            kandidat(1, str({'lat': MUSTERDORF[0] + 0.01, 'lng': MUSTERDORF[1]}))])
+        gespeichert = candidate_aus_zeile(datenbank.kandidaten_lesen(kunde_id)[0])
+
+    monkeypatch.setattr(place_provider, 'koordinaten', kein_parser)
+    stamm = {'placeId': 'PLACE_1', 'lat': '47.35', 'lng': '8.24'}
+    ablage = modus_b.entscheide_kunden([('9000001', stamm, gespeichert)])[0]
+
+    assert ablage['zur_pruefung'][0]['qualitaet'] == 'PRUEFUNG (Standort abweichend)'
+
+
+# ============================================================================
+# Ältere Datenbanken
+# ============================================================================
+
+def test_aeltere_datenbank_bekommt_die_zahlen_nachgetragen(tmp_path):
+    pfad = tmp_path / 'alt.sqlite'
+    with Datenbank(pfad) as datenbank:
+        kunde_id = kunde_mit_kandidaten(datenbank, [
+            kandidat(nummer, str({'lat': MUSTERDORF[0] + nummer / 1000,
+                                  'lng': MUSTERDORF[1]}))
+            for nummer in range(5)] + [kandidat(5, ''), kandidat(6, 'unlesbar')])
+        ids = [zeile['id'] for zeile in datenbank.kandidaten_lesen(kunde_id)]
+    # So sah eine Datei vor der Tabelle aus.
+    with sqlite3.connect(pfad) as verbindung:
+        verbindung.execute('DROP TABLE kandidat_ort')
+        verbindung.execute('PRAGMA user_version = 0')
+
+    with Datenbank(pfad) as datenbank:
+        gelesen = datenbank.kandidaten_lesen(kunde_id)
+
+    erwartet = {ids[nummer]: (MUSTERDORF[0] + nummer / 1000, MUSTERDORF[1])
+                for nummer in range(5)}
+    assert orte(pfad) == pytest.approx(erwartet)
+    assert [zeile['lat'] is None for zeile in gelesen] == [False] * 5 + [True, True]
+
+
+def test_nachtragen_in_mehreren_bloecken(tmp_path, monkeypatch):
+    import db
+    monkeypatch.setattr(db, '_NACHTRAG_ZEILEN', 2)
+    pfad = tmp_path / 'alt.sqlite'
+    with Datenbank(pfad) as datenbank:
+        kunde_mit_kandidaten(datenbank, [
+            kandidat(nummer, str({'lat': 47 + nummer, 'lng': 8})) for nummer in range(7)])
+    with sqlite3.connect(pfad) as verbindung:
+        verbindung.execute('DELETE FROM kandidat_ort')
+        verbindung.execute('PRAGMA user_version = 0')
+
+    Datenbank(pfad).schliessen()
+
+    assert sorted(orte(pfad).values()) == [(47.0 + nummer, 8.0) for nummer in range(7)]
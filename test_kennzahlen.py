@@ -0,0 +1,251 @@
+# test_kennzahlen.py
+# Where the time of a run goes (kennzahlen.py): histograms per stage and
+# counters, filled by the run itself, summarised per job in `job_kennzahl`
+# and exposed for Prometheus on /metrics.
+# Nothing here touches the network.
+
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import antwort_cache
+import kennzahlen
+from db import Datenbank
+from fake_provider import FakeProvider
+from kennzahlen import Histogramm, Kennzahlen
+from pipeline import Lauf
+from place_provider import QuelleNichtVerfuegbar
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def eingabedatei_aus_fixture(tmp_path: Path) -> Path:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    df = df[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    ziel = tmp_path / 'eingabe.csv'
+    df.to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+class LaunischerProvider:
+    """Der FakeProvider, der bei einem Suchbegriff schweigt und bei einem scheitert."""
+
+    def __init__(self, schweigt: str, scheitert: str):
+        self.provider = FakeProvider.aus_csv(str(FIXTURE))
+        self.schweigt = schweigt
+        self.scheitert = scheitert
+
+    def fetch_by_text(self, search_string, plz):
+        if search_string.startswith(self.schweigt):
+            time.sleep(1)
+        if search_string.startswith(self.scheitert):
+            raise QuelleNichtVerfuegbar('Verbindung abgebrochen', endgueltig=False)
+        return self.provider.fetch_by_text(search_string, plz)
+
+    def fetch_by_id(self, place_id):
+        return self.provider.fetch_by_id(place_id)
+
+
+def zeilen_nach_name(text: str) -> dict:
+    return {name: float(wert) for name, wert in
+            (zeile.rsplit(' ', 1) for zeile in text.splitlines()
+             if zeile and not zeile.startswith('#'))}
+
+
+# ============================================================================
+# Histogramm und Zähler
+# ============================================================================
+
+def test_quantil_auf_eine_grenze_genau():
+    werte = Histogramm()
+    for _ in range(90):
+        werte.beobachten(0.003)
+    for _ in range(10):
+        werte.beobachten(0.7)
+
+    assert werte.anzahl == 100
+    assert werte.summe == pytest.approx(0.27 + 7.0)
+    assert werte.quantil(0.50) == 0.005
+    # Das Fach reicht bis 1 s; gemessen wurde aber nie mehr als 0.7 s.
+    assert werte.quantil(0.95) == 0.7
+    assert werte.hoechstens == 0.7
+    assert Histogramm().quantil(0.5) == 0.0
+
+
+def test_ueber_der_letzten_grenze_zaehlt_der_hoechstwert():
+    werte = Histogramm()
+    werte.beobachten(95.0)
+    assert werte.quantil(0.95) == 95.0
+
+
+def test_messung_geht_auch_nach_oben():
+    prozess = Kennzahlen()
+    lauf = Kennzahlen(prozess)
+
+    with lauf.messen('entscheidung'):
+        pass
+    lauf.zaehlen('kunden', 3)
+    lauf.zaehlen('fehlschlaege', 0)
+
+    assert [z['name'] for z in lauf.zusammenfassung()] == ['entscheidung', 'kunden']
+    assert prozess.zaehler('kunden') == 3
+
+
+def test_zaehlen_aus_vielen_threads():
+    zahlen = Kennzahlen()
+    arbeiter = [threading.Thread(target=lambda: [zahlen.zaehlen('kunden')
+                                                 for _ in range(1000)])
+                for _ in range(8)]
+    for thread in arbeiter:
+        thread.start()
+    for thread in arbeiter:
+        thread.join()
+    assert zahlen.zaehler('kunden') == 8000
+
+
+def test_prometheus_textformat():
+    zahlen = Kennzahlen()
+    for sekunden in (0.0004, 0.02, 0.02, 3.0):
+        zahlen.beobachten('abfrage', sekunden)
+    zahlen.zaehlen('zeitueberschreitungen', 2)
+
+    text = zahlen.als_prometheus()
+    werte = zeilen_nach_name(text)
+
+    assert '# TYPE anreicherung_stufe_sekunden histogram' in text
+    assert werte['anreicherung_stufe_sekunden_bucket{stufe="abfrage",le="0.0005"}'] == 1
+    assert werte['anreicherung_stufe_sekunden_bucket{stufe="abfrage",le="0.025"}'] == 3
+    assert werte['anreicherung_stufe_sekunden_bucket{stufe="abfrage",le="+Inf"}'] == 4
+    assert werte['anreicherung_stufe_sekunden_count{stufe="abfrage"}'] == 4
+    assert werte['anreicherung_stufe_sekunden_sum{stufe="abfrage"}'] == pytest.approx(3.0404)
+    assert werte['anreicherung_zeitueberschreitungen_total'] == 2
+    assert werte['anreicherung_kunden_total'] == 0
+
+    # Kumuliert: kein Fach zählt weniger als das davor.
+    for stufe in kennzahlen.STUFEN:
+        faecher = [wert for name, wert in werte.items()
+                   if name.startswith(f'anreicherung_stufe_sekunden_bucket{{stufe="{stufe}"')]
+        assert faecher == sorted(faecher)
+
+
+# ============================================================================
+# Im Lauf
+# ============================================================================
+
+def test_lauf_legt_je_job_eine_zusammenfassung_ab(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank).ausfuehren(
+            eingabedatei_aus_fixture(tmp_path), str(tmp_path / 'aus'))
+        zusammenfassung = datenbank.kennzahlen_lesen(ergebnis['job_id'])
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert zusammenfassung['kunden']['anzahl'] == 10
+    assert zusammenfassung['kunden']['summe_sekunden'] is None
+    for stufe in ('abfrage', 'uebergabe', 'quelle', 'entscheidung', 'datenbank',
+                  'ausgabe', 'abschluss'):
+        werte = zusammenfassung[stufe]
+        assert werte['anzahl'] > 0, stufe
+        assert 0 <= werte['p50_sekunden'] <= werte['p95_sekunden']
+    assert zusammenfassung['abfrage']['anzahl'] == 10
+    assert zusammenfassung['entscheidung']['anzahl'] == 10
+    assert 'zeitueberschreitungen' not in zusammenfassung
+
+
+def test_zeitueberschreitung_und_fehlschlag_werden_gezaehlt(tmp_path):
+    provider = LaunischerProvider(schweigt='Denner', scheitert='Volg')
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(provider, datenbank, timeout_sekunden=0.2,
+                        arbeiter=1).ausfuehren(
+            eingabedatei_aus_fixture(tmp_path), str(tmp_path / 'aus'))
+        zusammenfassung = datenbank.kennzahlen_lesen(ergebnis['job_id'])
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert zusammenfassung['zeitueberschreitungen']['anzahl'] == 1
+    # Auch die Zeitüberschreitung ist ein Fehlschlag.
+    assert zusammenfassung['fehlschlaege']['anzahl'] == 2
+    assert zusammenfassung['abfrage']['hoechstens_sekunden'] >= 0.2
+
+
+def test_treffer_des_zwischenspeichers(tmp_path):
+    pfad = tmp_path / 'lauf.sqlite'
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    provider = antwort_cache.davorlegen(FakeProvider.aus_csv(str(FIXTURE)), pfad, 'test')
+
+    with Datenbank(pfad) as datenbank:
+        erster = Lauf(provider, datenbank).ausfuehren(eingabe, str(tmp_path / 'eins'))
+        zweiter = Lauf(provider, datenbank).ausfuehren(eingabe, str(tmp_path / 'zwei'))
+        vorher = datenbank.kennzahlen_lesen(erster['job_id'])
+        nachher = datenbank.kennzahlen_lesen(zweiter['job_id'])
+
+    assert vorher['zwischenspeicher_fehlgriffe']['anzahl'] == 10
+    assert 'zwischenspeicher_treffer' not in vorher
+    assert nachher['zwischenspeicher_treffer']['anzahl'] == 10
+    assert 'zwischenspeicher_fehlgriffe' not in nachher
+
+
+def test_fortsetzen_ersetzt_die_zusammenfassung(tmp_path):
+    pfad = tmp_path / 'lauf.sqlite'
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    fake = FakeProvider.aus_csv(str(FIXTURE))
+
+    with Datenbank(pfad) as datenbank:
+        abbruch = threading.Event()
+
+        class BrichtAb:
+            def __init__(self):
+                self.aufrufe = 0
+
+            def fetch_by_text(self, search_string, plz):
+                self.aufrufe += 1
+                if self.aufrufe == 4:
+                    abbruch.set()
+                return fake.fetch_by_text(search_string, plz)
+
+            def fetch_by_id(self, place_id):
+                return fake.fetch_by_id(place_id)
+
+        erster = Lauf(BrichtAb(), datenbank, arbeiter=1, abbruch=abbruch).ausfuehren(
+            eingabe, str(tmp_path / 'aus'))
+        assert erster['status'] == 'ABGEBROCHEN'
+        abgebrochen = datenbank.kennzahlen_lesen(erster['job_id'])['kunden']['anzahl']
+
+        weiter = Lauf(fake, datenbank).fortsetzen(
+            erster['job_id'], eingabe, str(tmp_path / 'aus'))
+        fortgesetzt = datenbank.kennzahlen_lesen(erster['job_id'])['kunden']['anzahl']
+
+    assert weiter['status'] == 'FERTIG'
+    assert 0 < abgebrochen < 10
+    assert fortgesetzt == 10 - abgebrochen
+
+
+# ============================================================================
+# Der Endpunkt /metrics
+# ============================================================================
+
+def test_metrics_fuer_prometheus(tmp_path, monkeypatch):
+    import webapp
+    from fastapi.testclient import TestClient
+
+    vorher = kennzahlen.PROZESS.zaehler('kunden')
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank).ausfuehren(
+            eingabedatei_aus_fixture(tmp_path), str(tmp_path / 'aus'))
+
+    monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
+    with TestClient(webapp.app) as klient:
+        antwort = klient.get('/metrics')
+
+    assert antwort.status_code == 200
+    assert antwort.headers['content-type'].startswith('text/plain; version=0.0.4')
+    werte = zeilen_nach_name(antwort.text)
+    assert werte['anreicherung_kunden_total'] >= vorher + 10
+    assert werte['anreicherung_stufe_sekunden_count{stufe="entscheidung"}'] >= 10
@@ -0,0 +1,211 @@
+# test_lauf_strom.py
+# The progress stream of the status page (/lauf/{job_id}/strom): the run
+# reports changes through the in-process bus (ereignisse.py), the stream pushes
+# them, and several open tabs share one database read per change.
+# Nothing here touches the network.
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import ereignisse
+import webapp
+from db import Datenbank
+from ereignisse import Ereignisbus
+from fake_provider import FakeProvider
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+class LangsamerProvider:
+    """Jeder Kunde braucht seine Zeit — so gibt es etwas zu melden."""
+
+    def __init__(self, sekunden: float):
+        self.sekunden = sekunden
+
+    def fetch_by_text(self, search_string, plz):
+        time.sleep(self.sekunden)
+        return []
+
+    def fetch_by_id(self, place_id):
+        return None
+
+
+@pytest.fixture
+def browser(tmp_path, monkeypatch):
+    monkeypatch.setattr(webapp, 'LAUFDATEN', tmp_path)
+    monkeypatch.setattr(webapp, 'UPLOADS', tmp_path / 'uploads')
+    monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
+    monkeypatch.setattr(webapp, 'STROM_ABSTAND', 0.02)
+    webapp.UPLOADS.mkdir(parents=True, exist_ok=True)
+    webapp.zustand['planer'] = None
+    webapp.zustand['hochgeladen'] = None
+    webapp.zustand['kunden'] = 0
+    webapp.zustand['provider'] = FakeProvider.aus_csv(str(FIXTURE))
+    with TestClient(webapp.app) as klient:
+        yield klient
+    planer = webapp.zustand['planer']
+    if planer:
+        for job_id in planer.laufend:
+            planer.abbrechen(job_id, timeout=10)
+        planer.beenden(timeout=10)
+
+
+def starten(browser, kunden: int, sekunden: float) -> int:
+    # Der Planer läuft schon; er bekommt die langsame Quelle für beide Modi.
+    langsam = LangsamerProvider(sekunden)
+    webapp.zustand['provider'] = langsam
+    webapp.zustand['planer'].provider_je_modus.update(A=langsam, B=langsam)
+    inhalt = pd.DataFrame([{'SearchString': f'Laden {n}, Hauptstrasse 1, 5620 Musterdorf',
+                            'PLZ': '5620', 'Stadt': 'Musterdorf',
+                            'KundenNr': str(900000 + n)} for n in range(kunden)])
+    browser.get('/datei', params={'modus': 'A'})
+    browser.post('/datei', files={'datei': ('Strom.csv', inhalt.to_csv(
+        sep=';', index=False).encode('utf-8-sig'), 'text/csv')})
+    antwort = browser.post('/starten', follow_redirects=False)
+    return int(antwort.headers['location'].rsplit('/', 1)[1])
+
+
+def strom_lesen(browser, job_id: int) -> list:
+    """Die Nachrichten des Stroms als (ereignis, daten), bis er zu Ende ist."""
+    nachrichten = []
+    with browser.stream('GET', f'/lauf/{job_id}/strom') as antwort:
+        assert antwort.headers['content-type'].startswith('text/event-stream')
+        text = ''.join(antwort.iter_text())
+    for block in text.split('\n\n'):
+        zeilen = [z for z in block.split('\n') if z and not z.startswith(':')]
+        if not zeilen:
+            continue
+        ereignis = zeilen[0].removeprefix('event: ')
+        daten = '\n'.join(z.removeprefix('data: ') for z in zeilen[1:])
+        nachrichten.append((ereignis, daten))
+    return nachrichten
+
+
+def tabs_oeffnen(browser, job_id: int, anzahl: int) -> list:
+    ergebnisse = [None] * anzahl
+
+    def tab(nummer):
+        ergebnisse[nummer] = strom_lesen(browser, job_id)
+
+    faeden = [threading.Thread(target=tab, args=(n,)) for n in range(anzahl)]
+    for faden in faeden:
+        faden.start()
+    for faden in faeden:
+        faden.join(timeout=60)
+    return ergebnisse
+
+
+def lesungen_zaehlen(monkeypatch) -> list:
+    gelesen = []
+    echt = webapp.stand_lesen
+
+    def zaehlend(job_id):
+        gelesen.append(job_id)
+        return echt(job_id)
+
+    monkeypatch.setattr(webapp, 'stand_lesen', zaehlend)
+    return gelesen
+
+
+# ============================================================================
+# Der Bus
+# ============================================================================
+
+def test_abwarten_kehrt_bei_einer_meldung_zurueck():
+    bus = Ereignisbus()
+    bus.melden(7)
+
+    async def ablauf():
+        sofort = await bus.abwarten(7, 0, timeout=5)
+        start = time.monotonic()
+        threading.Timer(0.05, bus.melden, args=(7,)).start()
+        geweckt = await bus.abwarten(7, sofort, timeout=5)
+        return sofort, geweckt, time.monotonic() - start
+
+    sofort, geweckt, dauer = asyncio.run(ablauf())
+
+    assert (sofort, geweckt) == (1, 2)
+    assert dauer < 1
+    assert bus.zuhoerer(7) == 0
+
+
+def test_ohne_meldung_nach_der_frist_derselbe_stand():
+    bus = Ereignisbus()
+    assert asyncio.run(bus.abwarten(3, 0, timeout=0.05)) == 0
+
+
+def test_gemeldet_wird_erst_nach_dem_commit(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = datenbank.job_anlegen('A', 'eingabe.csv')
+        datenbank.sammeln(kunden=3)
+        vorher = ereignisse.BUS.stand(job_id)
+
+        datenbank.fortschritt_setzen(job_id, 1)
+        datenbank.fortschritt_setzen(job_id, 2)
+        assert ereignisse.BUS.stand(job_id) == vorher
+
+        datenbank.festschreiben()
+        assert ereignisse.BUS.stand(job_id) == vorher + 1
+
+
+# ============================================================================
+# Der Strom
+# ============================================================================
+
+def test_strom_zeigt_den_fortschritt_und_dann_das_ende(browser):
+    job_id = starten(browser, kunden=12, sekunden=0.05)
+
+    nachrichten = strom_lesen(browser, job_id)
+
+    staende = [daten for ereignis, daten in nachrichten if ereignis == 'stand']
+    assert len(staende) >= 3
+    assert all('hx-trigger' not in daten and 'id="stand"' in daten for daten in staende)
+    assert nachrichten[-1] == ('ende', f'/ergebnis/{job_id}')
+
+
+def test_statusseite_hoert_auf_den_strom(browser):
+    job_id = starten(browser, kunden=30, sekunden=0.05)
+    seite = browser.get(f'/lauf/{job_id}').text
+
+    assert f"new EventSource('/lauf/{job_id}/strom')" in seite
+    # Ohne EventSource wird wie bisher nachgeladen.
+    assert 'hx-trigger="every 5s"' in seite
+
+
+def test_unbekannter_auftrag(browser):
+    assert browser.get('/lauf/999/strom').status_code == 404
+
+
+# ============================================================================
+# Last: mehrere Tabs
+# ============================================================================
+
+def test_acht_tabs_lesen_nicht_mehr_als_einer(browser, monkeypatch):
+    gelesen = lesungen_zaehlen(monkeypatch)
+
+    job_id = starten(browser, kunden=20, sekunden=0.05)
+    ein_tab = tabs_oeffnen(browser, job_id, 1)
+    einmal = len(gelesen)
+
+    gelesen.clear()
+    job_id = starten(browser, kunden=20, sekunden=0.05)
+    acht_tabs = tabs_oeffnen(browser, job_id, 8)
+    achtmal = len(gelesen)
+
+    assert ein_tab[0][-1][0] == 'ende'
+    assert all(nachrichten[-1] == ('ende', f'/ergebnis/{job_id}')
+               for nachrichten in acht_tabs)
+    # Höchstens eine Lesung je Abstand, egal wie viele zusehen — nachgefragt
+    # hätte jeder Tab für sich.
+    assert achtmal <= einmal + 3
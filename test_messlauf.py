@@ -0,0 +1,144 @@
+# test_messlauf.py
+# The benchmark run (messlauf.py, `cli.py messlauf`): invented customer files
+# of a given size, a FakeProvider with a chosen latency distribution and
+# error rate, a full run with timings per stage, and the results as JSON.
+# Nothing here touches the network.
+
+import json
+import random
+import statistics
+
+import pandas as pd
+import pytest
+
+import cli
+import messlauf
+from data_cleaner import OUTPUT_FILES
+from pipeline import AUSGEFALLENE_ABFRAGE_GRUND
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def lies(pfad) -> pd.DataFrame:
+    return pd.read_csv(pfad, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+
+
+def kunden_je_datei(ordner) -> dict:
+    return {schluessel: set(lies(ordner / dateiname)['KundenNr'])
+            for schluessel, dateiname in OUTPUT_FILES.items()
+            if schluessel != 'aussortiert'}
+
+
+# ============================================================================
+# Wartezeit
+# ============================================================================
+
+def test_wartezeiten_lesen():
+    zufall = random.Random(3)
+    assert messlauf.verteilung_lesen('fest:20')(zufall) == 0.02
+
+    gleich = [messlauf.verteilung_lesen('gleich:5-10')(zufall) for _ in range(200)]
+    assert 0.005 <= min(gleich) and max(gleich) <= 0.010
+
+    lognormal = [messlauf.verteilung_lesen('lognormal:20,0.5')(zufall)
+                 for _ in range(2000)]
+    assert statistics.median(lognormal) == pytest.approx(0.020, rel=0.1)
+    assert max(lognormal) > 0.040
+
+
+@pytest.mark.parametrize('text', ['kaputt', 'fest:', 'fest:-1', 'gleich:10-5',
+                                  'lognormal:0,1', 'normal:20'])
+def test_unlesbare_wartezeit_meldet_deutsch(text):
+    with pytest.raises(ValueError) as fehler:
+        messlauf.verteilung_lesen(text)
+    assert 'Millisekunden' in str(fehler.value)
+
+
+def test_perzentil_nach_rang():
+    werte = sorted(range(1, 101))
+    assert messlauf.perzentil(werte, 0.50) == 50
+    assert messlauf.perzentil(werte, 0.99) == 99
+    assert messlauf.perzentil([7], 0.95) == 7
+    assert messlauf.perzentil([], 0.5) == 0.0
+
+
+# ============================================================================
+# Erfundene Kunden
+# ============================================================================
+
+def test_erfundene_kunden_sind_gleich_bei_gleichem_startwert(tmp_path):
+    erste, _ = messlauf.kunden_erfinden(500, tmp_path / 'eins', 'A', random.Random(5))
+    zweite, _ = messlauf.kunden_erfinden(500, tmp_path / 'zwei', 'A', random.Random(5))
+
+    kunden = lies(erste)
+    assert erste.read_bytes() == zweite.read_bytes()
+    assert list(kunden.columns) == ['SearchString', 'PLZ', 'Stadt', 'KundenNr']
+    assert kunden['KundenNr'].is_unique
+    assert kunden['KundenNr'].str.startswith('9').all()
+
+
+# ============================================================================
+# Der Messlauf
+# ============================================================================
+
+def test_messlauf_von_vorn_bis_hinten(tmp_path):
+    lauf = messlauf.messen(400, tmp_path, wartezeit='fest:0')
+
+    assert lauf['status'] == 'FERTIG'
+    assert lauf['kunden_erledigt'] == 400
+    assert lauf['kunden_je_sekunde'] > 0
+    for stufe in messlauf.STUFEN:
+        werte = lauf['stufen'][stufe]
+        assert werte['anzahl'] == 400
+        assert 0 <= werte['p50_ms'] <= werte['p95_ms'] <= werte['p99_ms']
+    assert lauf['spitze_threads'] > 1
+    assert lauf['spitze_speicher_mb'] > 0
+
+    # Die erfundenen Antworten verteilen die Kunden auf alle drei Dateien.
+    dateien = kunden_je_datei(tmp_path / 'A_400' / 'ausgabe')
+    assert all(dateien.values())
+    assert sum(len(kunden) for kunden in dateien.values()) == 400
+
+
+def test_wartezeit_landet_in_der_abfrage(tmp_path):
+    lauf = messlauf.messen(60, tmp_path, wartezeit='fest:15', arbeiter=6)
+
+    assert lauf['stufen']['abfrage']['p50_ms'] >= 15
+    assert lauf['stufen']['entscheidung']['p50_ms'] < 15
+
+
+def test_eingestreute_ausfaelle(tmp_path):
+    lauf = messlauf.messen(300, tmp_path, wartezeit='fest:0', fehlerquote=0.05)
+
+    assert lauf['status'] == 'FERTIG'
+    assert lauf['eingestreute_ausfaelle'] > 0
+    nicht_moeglich = lies(tmp_path / 'A_300' / 'ausgabe' / OUTPUT_FILES['nicht_moeglich'])
+    ausgefallen = nicht_moeglich[nicht_moeglich['grund'] == AUSGEFALLENE_ABFRAGE_GRUND]
+    assert len(ausgefallen) == lauf['eingestreute_ausfaelle']
+
+
+def test_messlauf_im_modus_b(tmp_path):
+    lauf = messlauf.messen(300, tmp_path, modus='B', wartezeit='fest:0')
+
+    assert lauf['status'] == 'FERTIG'
+    assert lauf['stufen']['entscheidung']['anzahl'] == 300
+    assert all(kunden_je_datei(tmp_path / 'B_300' / 'ausgabe').values())
+
+
+# ============================================================================
+# Über die Kommandozeile
+# ============================================================================
+
+def test_benchmark_schreibt_json(tmp_path, capsys):
+    ziel = tmp_path / 'messung.json'
+    code = cli.main(['benchmark', '--groessen', '50', '120', '--wartezeit', 'fest:0',
+                     '--json', str(ziel), '--ordner', str(tmp_path / 'arbeit')])
+
+    assert code == 0
+    bericht = json.loads(ziel.read_text(encoding='utf-8'))
+    assert [lauf['kunden'] for lauf in bericht['laeufe']] == [50, 120]
+    assert bericht['einstellungen']['wartezeit'] == 'fest:0'
+    assert set(bericht['laeufe'][0]['stufen']) == set(messlauf.STUFEN)
+    assert 'je Sekunde' in capsys.readouterr().out
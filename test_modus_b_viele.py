@@ -0,0 +1,137 @@
+# test_modus_b_viele.py
+# Modus B for many customers at once (modus_b.entscheide_kunden): the
+# coordinates are read once into arrays, all distances come from one
+# vectorized haversine, and every customer lands in the same file with the
+# same row as when decided one by one.
+# Nothing here touches the network. All place ids and coordinates are made up.
+
+import ast
+import math
+import random
+
+import numpy as np
+import pytest
+
+import modus_b
+from place_provider import Candidate
+
+# Erfundene Koordinaten. Musterdorf liegt bei 47.3500 / 8.2400.
+MUSTERDORF = (47.3500, 8.2400)
+
+# Rund so viele Meter je Grad Breite.
+METER_JE_GRAD = 111_195
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def kandidat(nummer: int, location, geschlossen: bool = False) -> Candidate:
+    return Candidate(title=f'Muster Laden {nummer}', street='Hauptstrasse 5',
+                     postal_code='5620', city='Musterdorf',
+                     address='Hauptstrasse 5, 5620 Musterdorf',
+                     place_id=f'PLACE_{nummer}', location=location,
+                     permanently_closed=str(geschlossen))
+
+
+def gemischte_kunden(anzahl: int, zufall: random.Random) -> tuple:
+    """Alle Fälle aus 03_ENTSCHEIDUNGEN.md B4, bunt gemischt."""
+    kunden, erreichbar = [], []
+    for nummer in range(anzahl):
+        fall = zufall.randrange(8)
+        breite = MUSTERDORF[0] + zufall.uniform(-0.5, 0.5)
+        laenge = MUSTERDORF[1] + zufall.uniform(-0.5, 0.5)
+        # Bis rund 400 m daneben: ein Teil liegt über der Grenze von 200 m.
+        weg = zufall.uniform(0, 400) / METER_JE_GRAD
+        location = str({'lat': round(breite + weg, 7), 'lng': laenge})
+        stamm = {'placeId': f'PLACE_{nummer}', 'lat': str(breite), 'lng': str(laenge)}
+        gefunden = kandidat(nummer, location)
+        if fall == 0:
+            stamm['placeId'] = ''
+        elif fall == 1:
+            gefunden = None
+        elif fall == 2:
+            gefunden = kandidat(nummer, location, geschlossen=True)
+        elif fall == 3:
+            stamm['lat'] = ''
+        elif fall == 4:
+            gefunden = kandidat(nummer, '')
+        elif fall == 5:
+            gefunden = kandidat(nummer, f'{breite + weg} / {laenge}')
+        elif fall == 6:
+            stamm['lng'] = str(laenge).replace('.', ',')
+        kunden.append((str(9_100_000 + nummer), stamm, gefunden))
+        erreichbar.append(zufall.random() > 0.05)
+    return kunden, erreichbar
+
+
+# ============================================================================
+# Entfernungen
+# ============================================================================
+
+def test_entfernungen_wie_einzeln():
+    zufall = random.Random(4)
+    von = np.array([[47 + zufall.random(), 8 + zufall.random()] for _ in range(500)])
+    nach = von + np.array([[zufall.gauss(0, 0.01), zufall.gauss(0, 0.01)]
+                           for _ in range(500)])
+
+    alle = modus_b.entfernungen_meter(von, nach)
+
+    einzeln = [modus_b.entfernung_meter(tuple(a), tuple(b))
+               for a, b in zip(von.tolist(), nach.tolist())]
+    assert alle.tolist() == pytest.approx(einzeln, abs=1e-6)
+
+
+def test_ohne_koordinate_keine_entfernung():
+    von = np.array([MUSTERDORF, (np.nan, 8.24), MUSTERDORF])
+    nach = np.array([MUSTERDORF, MUSTERDORF, (47.36, np.nan)])
+
+    alle = modus_b.entfernungen_meter(von, nach)
+
+    assert alle[0] == pytest.approx(0)
+    assert math.isnan(alle[1]) and math.isnan(alle[2])
+
+
+@pytest.mark.parametrize('text', [
+    "{'lat': 47.35, 'lng': 8.24}",
+    "{'lat': -33.8688, 'lng': 151.2093}",
+    "{'lat': 47, 'lng': 8.}",
+    "{'lat': 4.735e1, 'lng': 8.24}",
+])
+def test_standort_ohne_parser_gleich_wie_mit(text):
+    werte = ast.literal_eval(text)
+    assert modus_b.koordinaten(text) == (float(werte['lat']), float(werte['lng']))
+
+
+# ============================================================================
+# Die Entscheidung
+# ============================================================================
+
+def test_dieselbe_aufteilung_wie_kunde_fuer_kunde():
+    kunden, erreichbar = gemischte_kunden(2_000, random.Random(7))
+
+    alle = modus_b.entscheide_kunden(kunden, erreichbar)
+
+    einzeln = [modus_b.entscheide_kunde(nr, stamm, gefunden, erreichbar=ja)
+               for (nr, stamm, gefunden), ja in zip(kunden, erreichbar)]
+    assert alle == einzeln
+    qualitaeten = {ablage[datei][0]['qualitaet'] for ablage in alle
+                   for datei in ('fertig_fuer_erp', 'zur_pruefung', 'nicht_moeglich')
+                   if ablage[datei]}
+    # Jeder Fall kommt vor, auch die Prüfung wegen des Standorts.
+    assert qualitaeten == {'OK (ID)', 'PRUEFUNG (geschlossen)',
+                           'PRUEFUNG (Standort abweichend)',
+                           'NICHT_MOEGLICH (Eingabe unbrauchbar)',
+                           'NICHT_MOEGLICH (ID ungueltig)',
+                           'NICHT_MOEGLICH (kein Ergebnis)'}
+
+
+def test_ohne_angabe_ist_jeder_erreichbar():
+    kunden, _ = gemischte_kunden(50, random.Random(8))
+
+    assert modus_b.entscheide_kunden(kunden) == [
+        modus_b.entscheide_kunde(nr, stamm, gefunden) for nr, stamm, gefunden in kunden]
+
+
+def test_keine_kunden_keine_ablage():
+    assert modus_b.entscheide_kunden([]) == []
@@ -0,0 +1,205 @@
+# test_neu_entscheiden.py
+# Re-deciding stored jobs with other thresholds (neu_entscheiden.py,
+# `cli.py neu-entscheiden`): customers and candidates come block by block
+# from SQLite, every customer is decided with today's and with the proposed
+# thresholds, in this process or in a process pool, and the customers that
+# would change file end up in a CSV report.
+# Nothing here touches the network. All customers are made up.
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import cli
+import neu_entscheiden
+from data_cleaner import DataCleaner
+from db import Datenbank
+from fake_provider import FakeProvider
+from pipeline import Lauf
+from place_provider import Candidate
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def eingabedatei_aus_fixture(tmp_path: Path) -> Path:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    df = df[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    ziel = tmp_path / 'eingabe.csv'
+    df.to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def lauf_aus_fixture(datenbank: Datenbank, tmp_path: Path) -> int:
+    ergebnis = Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank).ausfuehren(
+        eingabedatei_aus_fixture(tmp_path), str(tmp_path / 'aus'))
+    assert ergebnis['status'] == 'FERTIG'
+    return ergebnis['job_id']
+
+
+def treffer(titel: str) -> Candidate:
+    return Candidate(title=titel, street='Hauptstrasse 5', postal_code='5620',
+                     city='Musterdorf', address='Hauptstrasse 5, 5620 Musterdorf',
+                     place_id=f'PLACE_{titel.replace(" ", "_")}')
+
+
+def job_mit_kunden(datenbank: Datenbank, kunden: list, modus: str = 'A') -> int:
+    """`kunden`: je Kunde die Titel seiner Kandidaten. Gesucht wird «Muster Laden»."""
+    job_id = datenbank.job_anlegen(modus, 'muster.csv', len(kunden))
+    for nummer, titel in enumerate(kunden):
+        kunde_id = datenbank.kunde_schreiben(job_id, str(9_000_000 + nummer), 'Muster Laden',
+                                             '5620', 'Musterdorf', ergebnis='pruefung')
+        datenbank.kandidaten_schreiben(kunde_id, [(treffer(t), 0.0, 'vorgeschlagen', '')
+                                                  for t in titel])
+    datenbank.status_setzen(job_id, 'FERTIG')
+    return job_id
+
+
+# Mit der Schwelle 80 ist nur «Muster Laden» hoch (100 gegen 69), mit 60 sind
+# es beide.
+WECHSELT = ['Muster Laden', 'Musterbeck']
+BLEIBT = ['Muster Laden']
+
+
+# ============================================================================
+# Lesen
+# ============================================================================
+
+def test_kunden_in_bloecken_samt_kandidaten(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = lauf_aus_fixture(datenbank, tmp_path)
+        bloecke = list(datenbank.kunden_bloecke(job_id, 3))
+        kandidaten = datenbank.kandidaten_des_jobs(job_id)
+
+    assert [len(block) for block in bloecke] == [3, 3, 3, 1]
+    kunden = [kunde for block in bloecke for kunde, _ in block]
+    assert [kunde['id'] for kunde in kunden] == sorted(kunde['id'] for kunde in kunden)
+    for block in bloecke:
+        for kunde, zeilen in block:
+            assert [z['id'] for z in zeilen] == [z['id'] for z in kandidaten.get(kunde['id'], [])]
+    # Ein Kunde ohne einen einzigen Treffer kommt trotzdem, mit leerer Liste.
+    assert any(not zeilen for block in bloecke for _, zeilen in block)
+
+
+def test_letzte_fertige_jobs_zuerst(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        erster = job_mit_kunden(datenbank, [BLEIBT])
+        modus_b = job_mit_kunden(datenbank, [BLEIBT], modus='B')
+        dritter = job_mit_kunden(datenbank, [BLEIBT])
+        offen = datenbank.job_anlegen('A', 'offen.csv', 1)
+
+        assert [job['id'] for job in datenbank.letzte_jobs(5, modus='A')] == [dritter, erster]
+        assert [job['id'] for job in datenbank.letzte_jobs(2)] == [dritter, modus_b]
+        assert offen not in [job['id'] for job in datenbank.letzte_jobs(5)]
+
+
+# ============================================================================
+# Entscheiden
+# ============================================================================
+
+def test_mit_gerechnetem_score_dieselbe_entscheidung():
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    cleaner = DataCleaner()
+    for kunden_nr, gruppe in df.groupby('KundenNr', sort=False):
+        zeilen = gruppe.to_dict('records')
+        assert (cleaner.entscheide_kunde(kunden_nr, zeilen, cleaner.scores_fuer(zeilen))
+                == cleaner.entscheide_kunde(kunden_nr, zeilen))
+
+
+def test_ohne_neue_schwellen_wie_im_lauf(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = lauf_aus_fixture(datenbank, tmp_path)
+        auswertung = neu_entscheiden.neu_entscheiden(datenbank, [job_id], {}, prozesse=1)
+        gespeichert = pd.read_sql('SELECT ergebnis FROM kunde WHERE job_id = ?',
+                                  datenbank.verbindung, params=(job_id,))
+
+    zahlen = auswertung['jobs'][job_id]
+    assert zahlen['kunden'] == 10
+    assert zahlen['vorher'] == zahlen['nachher']
+    assert auswertung['wechsel'] == []
+    # Dieselbe Aufteilung, wie sie der Lauf in `kunde.ergebnis` abgelegt hat.
+    damals = gespeichert['ergebnis'].value_counts().to_dict()
+    assert zahlen['vorher'] == {'fertig_fuer_erp': damals.get('fertig', 0),
+                                'zur_pruefung': damals.get('pruefung', 0),
+                                'nicht_moeglich': damals.get('nicht_moeglich', 0)}
+
+
+def test_niedrigere_schwelle_schickt_kunden_zur_pruefung(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = job_mit_kunden(datenbank, [WECHSELT, BLEIBT, [], WECHSELT])
+        auswertung = neu_entscheiden.neu_entscheiden(datenbank, [job_id], {'hoch': 60},
+                                                     prozesse=1)
+
+    assert auswertung['vorher']['hoch'] == DataCleaner.HIGH_SCORE_THRESHOLD
+    assert auswertung['nachher']['hoch'] == 60
+    assert auswertung['jobs'][job_id] == {
+        'kunden': 4,
+        'vorher': {'fertig_fuer_erp': 3, 'zur_pruefung': 0, 'nicht_moeglich': 1},
+        'nachher': {'fertig_fuer_erp': 1, 'zur_pruefung': 2, 'nicht_moeglich': 1}}
+    assert [(w['KundenNr'], w['vorher'], w['nachher']) for w in auswertung['wechsel']] == [
+        ('9000000', 'fertig_fuer_erp', 'zur_pruefung'),
+        ('9000003', 'fertig_fuer_erp', 'zur_pruefung')]
+    assert auswertung['wechsel'][0]['qualitaet_vorher'] == 'OK (Score)'
+
+
+def test_prozesse_entscheiden_wie_einer(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        erster = job_mit_kunden(datenbank, [WECHSELT, BLEIBT, []] * 5)
+        zweiter = lauf_aus_fixture(datenbank, tmp_path)
+        einzeln = neu_entscheiden.neu_entscheiden(
+            datenbank, [erster, zweiter], {'hoch': 60, 'abstand': 10}, prozesse=1,
+            kunden_je_block=4)
+        im_pool = neu_entscheiden.neu_entscheiden(
+            datenbank, [erster, zweiter], {'hoch': 60, 'abstand': 10}, prozesse=2,
+            kunden_je_block=4)
+
+    assert im_pool['prozesse'] == 2
+    assert im_pool['jobs'] == einzeln['jobs']
+    assert im_pool['wechsel'] == einzeln['wechsel']
+    assert len(einzeln['wechsel']) >= 5
+
+
+# ============================================================================
+# Kommandozeile
+# ============================================================================
+
+def test_befehl_schreibt_den_bericht(tmp_path, capsys):
+    pfad = tmp_path / 'lauf.sqlite'
+    with Datenbank(pfad) as datenbank:
+        job_id = job_mit_kunden(datenbank, [WECHSELT, BLEIBT])
+    bericht = tmp_path / 'bericht.csv'
+
+    code = cli.main(['neu-entscheiden', '--datenbank', str(pfad), '--hoch', '60',
+                     '--prozesse', '1', '--bericht', str(bericht)])
+
+    assert code == 0
+    ausgabe = capsys.readouterr().out
+    assert 'Schwelle hoch' in ausgabe and '→ 60' in ausgabe
+    assert f'Auftrag Nummer {job_id}' in ausgabe
+    zeilen = pd.read_csv(bericht, sep=';', encoding='utf-8-sig', dtype=str)
+    assert list(zeilen.columns) == neu_entscheiden.BERICHT_SPALTEN
+    assert zeilen['KundenNr'].tolist() == ['9000000']
+    assert zeilen['nachher'].tolist() == ['zur_pruefung']
+
+
+@pytest.mark.parametrize('argumente, meldung', [
+    (['--jobs', '99'], 'Einen Auftrag Nummer 99 gibt es nicht'),
+    (['--jobs', '1'], 'lief im Modus B'),
+])
+def test_befehl_ohne_passenden_auftrag(tmp_path, capsys, argumente, meldung):
+    pfad = tmp_path / 'lauf.sqlite'
+    with Datenbank(pfad) as datenbank:
+        job_mit_kunden(datenbank, [BLEIBT], modus='B')
+
+    code = cli.main(['neu-entscheiden', '--datenbank', str(pfad),
+                     '--bericht', str(tmp_path / 'bericht.csv'), *argumente])
+
+    assert code == 1
+    assert meldung in capsys.readouterr().out
+    assert not (tmp_path / 'bericht.csv').exists()
@@ -0,0 +1,119 @@
+# test_normalisierung.py
+# The bounded cache in front of the text helpers of DataCleaner: same results
+# as the former str.replace / re.sub chains, a hit-rate statistic, a size cap,
+# and a micro-benchmark on the fixture (only with LANGSAME_TESTS=1).
+
+import os
+import random
+import re
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import data_cleaner
+from data_cleaner import (NORMALISIERUNG_MAX_EINTRAEGE, DataCleaner,
+                          normalisierung_leeren, normalisierung_statistik)
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+def normalisiert_wie_frueher(text) -> str:
+    """Die Kette aus _normalize_text vor dem Zwischenspeicher, unverändert."""
+    if not text:
+        return ''
+    text = str(text).lower().strip()
+    text = text.replace('ä', 'ae').replace('ö', 'oe').replace('ü', 'ue')
+    text = text.replace('é', 'e').replace('è', 'e').replace('ê', 'e')
+    text = text.replace('à', 'a').replace('â', 'a')
+    text = text.replace('str.', 'strasse').replace('str ', 'strasse ')
+    text = text.replace('g.', 'gasse')
+    text = text.replace('pl.', 'platz')
+    text = text.replace('-', ' ').replace('/', ' ')
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def fixture_texte() -> list:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    return list(df['title']) + list(df['street']) + list(df['SearchString'])
+
+
+def test_gleiche_ergebnisse_wie_ohne_zwischenspeicher():
+    cleaner = DataCleaner()
+    zufall = random.Random(7)
+    zeichen = 'aäöüéèêàâ-/ .gstrplSTRÄ12 3ab\tAG gmbh sàrl co'
+    for _ in range(5000):
+        text = ''.join(zufall.choice(zeichen) for _ in range(zufall.randint(0, 20)))
+        norm = normalisiert_wie_frueher(text)
+        assert cleaner._normalize_text(text) == norm
+        assert cleaner._strip_legal_suffixes(norm) == re.sub(
+            r'\s+', ' ', re.sub(DataCleaner.LEGAL_SUFFIXES, '', norm)).strip()
+        zahlen = re.findall(r'\d+\s*[a-zA-Z]?', norm)
+        assert cleaner._extract_house_number(norm) == (zahlen[-1].strip() if zahlen else '')
+        assert cleaner._extract_street_name(norm) == re.sub(
+            r'\d+\s*[a-zA-Z]?\s*$', '', norm).strip()
+
+
+def test_zahlen_und_wahrheitswerte_teilen_keinen_eintrag():
+    normalisierung_leeren()
+    cleaner = DataCleaner()
+    werte = [1, 1.0, True, 0, 0.0, False, 2, 2.0]
+    erst = [cleaner._normalize_text(wert) for wert in werte]
+    zweit = [cleaner._normalize_text(wert) for wert in reversed(werte)][::-1]
+
+    assert erst == zweit == [normalisiert_wie_frueher(wert) for wert in werte]
+    assert erst[:3] == ['1', '1.0', 'true']
+
+
+def test_zweite_bereinigung_kommt_aus_dem_zwischenspeicher(tmp_path):
+    normalisierung_leeren()
+    DataCleaner().clean_data(str(FIXTURE), str(tmp_path / 'erst'))
+    erst = normalisierung_statistik()['normalisieren']
+    DataCleaner().clean_data(str(FIXTURE), str(tmp_path / 'zweit'))
+    zweit = normalisierung_statistik()['normalisieren']
+
+    assert zweit['fehlgriffe'] == erst['fehlgriffe']
+    assert zweit['treffer'] > erst['treffer']
+    assert 0 < zweit['trefferquote'] <= 1
+    assert set(normalisierung_statistik()) == {
+        'normalisieren', 'rechtsform', 'hausnummer', 'strassenname'}
+
+
+def test_zwischenspeicher_ist_begrenzt():
+    normalisierung_leeren()
+    cleaner = DataCleaner()
+    for nummer in range(NORMALISIERUNG_MAX_EINTRAEGE + 100):
+        cleaner._normalize_text(f'Laden {nummer}')
+
+    assert normalisierung_statistik()['normalisieren']['eintraege'] == NORMALISIERUNG_MAX_EINTRAEGE
+
+
+@pytest.mark.skipif(not os.environ.get('LANGSAME_TESTS'),
+                    reason='Mikromessung, auf einer ausgelasteten Maschine '
+                           'unzuverlässig. Mit LANGSAME_TESTS=1 ausführen.')
+def test_mikromessung_auf_der_fixture():
+    """Zwischengespeichert mindestens dreimal so schnell wie die nackte Kette."""
+    rechtsformen = DataCleaner()._rechtsformen
+    texte = fixture_texte()
+    funktionen = (data_cleaner._normalisiert, data_cleaner._ohne_rechtsform,
+                  data_cleaner._hausnummer, data_cleaner._strassenname)
+
+    def messen(normalisieren, rechtsform, hausnummer, strassenname) -> float:
+        bestes = float('inf')
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(100):
+                for text in texte:
+                    norm = normalisieren(text)
+                    rechtsform(norm, rechtsformen)
+                    hausnummer(norm)
+                    strassenname(norm)
+            bestes = min(bestes, time.perf_counter() - start)
+        return bestes
+
+    ohne = messen(*(f.__wrapped__ for f in funktionen))
+    mit = messen(*funktionen)
+
+    assert mit * 3 < ohne
@@ -42,15 +42,16 @@ def app(tmp_path, monkeypatch):
     monkeypatch.setattr(webapp, 'UPLOADS', tmp_path / 'uploads')
     monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
     webapp.UPLOADS.mkdir(parents=True, exist_ok=True)
-    webapp.zustand['worker'] = None
+    webapp.zustand['planer'] = None
     webapp.zustand['hochgeladen'] = None
     webapp.zustand['kunden'] = 0
     webapp.zustand['provider'] = FakeProvider.aus_csv(str(FIXTURE))
     yield webapp
-    worker = webapp.zustand['worker']
-    if worker and worker.laeuft:
-        worker.abbrechen()
-        worker.warten(timeout=10)
+    planer = webapp.zustand['planer']
+    if planer:
+        for job_id in planer.laufend:
+            planer.abbrechen(job_id, timeout=10)
+        planer.beenden(timeout=10)
 
 
 @pytest.fixture
@@ -59,6 +60,22 @@ def browser(app):
         yield klient
 
 
+def provider_setzen(provider) -> None:
+    """Die Datenquelle für beide Modi, auch für den Planer, der schon läuft."""
+    webapp.zustand['provider'] = provider
+    if webapp.zustand['planer']:
+        webapp.zustand['planer'].provider_je_modus.update(A=provider, B=provider)
+
+
+def abwarten(timeout: float = 30) -> None:
+    """Bis die Warteschlange leer ist: alle gestarteten Aufträge sind durch."""
+    assert webapp.zustand['planer'].warten(timeout=timeout)
+
+
+def abbrechen(job_id: int) -> None:
+    webapp.zustand['planer'].abbrechen(job_id, timeout=10)
+
+
 def lauf_durchfuehren(browser, inhalt: bytes = None, name: str = 'InputData.csv') -> int:
     """Der Weg des Nutzers: Art wählen, Datei hochladen, starten, warten."""
     browser.get('/')
@@ -66,13 +83,7 @@ def lauf_durchfuehren(browser, inhalt: bytes = None, name: str = 'InputData.csv'
     browser.post('/datei', files={'datei': (name, inhalt or eingabe_csv(), 'text/csv')})
     antwort = browser.post('/starten', follow_redirects=False)
     job_id = int(antwort.headers['location'].rsplit('/', 1)[1])
-
-    frist = time.monotonic() + 30
-    while time.monotonic() < frist:
-        if not webapp.zustand['worker'].laeuft:
-            break
-        time.sleep(0.05)
-    webapp.zustand['worker'].warten(timeout=10)
+    abwarten()
     return job_id
 
 
@@ -103,7 +114,7 @@ def test_vollstaendiger_durchlauf_ohne_terminal(browser):
     lauf = browser.get(f'/lauf/{job_id}')
     assert lauf.status_code == 200
 
-    webapp.zustand['worker'].warten(timeout=30)
+    abwarten()
 
     ergebnis = browser.get(f'/ergebnis/{job_id}')
     assert ergebnis.status_code == 200
@@ -142,7 +153,7 @@ def test_statusseite_laedt_den_stand_alle_fuenf_sekunden(browser):
 def test_stand_ist_ein_ausschnitt_keine_ganze_seite(app, browser, monkeypatch):
     """Der Ausschnitt trägt die Anweisung, sich alle 5 Sekunden zu erneuern."""
     langsam = _LangsamerProvider(FakeProvider.aus_csv(str(FIXTURE)), 10)
-    webapp.zustand['provider'] = langsam
+    provider_setzen(langsam)
 
     browser.get('/datei', params={'modus': 'A'})
     browser.post('/datei', files={'datei': ('InputData.csv', eingabe_csv(), 'text/csv')})
@@ -157,8 +168,7 @@ def test_stand_ist_ein_ausschnitt_keine_ganze_seite(app, browser, monkeypatch):
         assert 'von 10 Kunden' in stand.text
         assert 'HX-Redirect' not in stand.headers
     finally:
-        webapp.zustand['worker'].abbrechen()
-        webapp.zustand['worker'].warten(timeout=10)
+        abbrechen(job_id)
 
 
 def test_stand_schickt_am_ende_zur_ergebnisseite(browser):
@@ -171,7 +181,7 @@ def test_stand_schickt_am_ende_zur_ergebnisseite(browser):
 
 def test_fortschritt_waechst_waehrend_des_laufs(browser):
     langsam = _LangsamerProvider(FakeProvider.aus_csv(str(FIXTURE)), 0.3)
-    webapp.zustand['provider'] = langsam
+    provider_setzen(langsam)
 
     browser.get('/datei', params={'modus': 'A'})
     browser.post('/datei', files={'datei': ('InputData.csv', eingabe_csv(), 'text/csv')})
@@ -181,16 +191,17 @@ def test_fortschritt_waechst_waehrend_des_laufs(browser):
     try:
         staende = []
         frist = time.monotonic() + 20
-        while webapp.zustand['worker'].laeuft and time.monotonic() < frist:
-            text = browser.get(f'/lauf/{job_id}/stand').text
-            treffer = re.search(r'<strong>(\d+)</strong> von', text)
+        while time.monotonic() < frist:
+            stand = browser.get(f'/lauf/{job_id}/stand')
+            if 'HX-Redirect' in stand.headers:
+                break
+            treffer = re.search(r'<strong>(\d+)</strong> von', stand.text)
             if treffer:
                 staende.append(int(treffer.group(1)))
             time.sleep(0.1)
-        webapp.zustand['worker'].warten(timeout=10)
+        abwarten(timeout=10)
     finally:
-        if webapp.zustand['worker'].laeuft:
-            webapp.zustand['worker'].abbrechen()
+        abbrechen(job_id)
 
     assert staende, 'kein einziger Stand abgerufen'
     assert staende == sorted(staende), 'die Zahl ist zwischendurch gesunken'
@@ -204,7 +215,7 @@ def test_fortschritt_waechst_waehrend_des_laufs(browser):
 def test_fenster_schliessen_und_wieder_oeffnen(app):
     """Zwei getrennte Browsersitzungen sehen denselben Lauf."""
     langsam = _LangsamerProvider(FakeProvider.aus_csv(str(FIXTURE)), 0.3)
-    webapp.zustand['provider'] = langsam
+    provider_setzen(langsam)
 
     with TestClient(app.app) as erster:
         erster.get('/datei', params={'modus': 'A'})
@@ -214,14 +225,14 @@ def test_fenster_schliessen_und_wieder_oeffnen(app):
         job_id = int(antwort.headers['location'].rsplit('/', 1)[1])
     # Fenster zu.
 
-    assert webapp.zustand['worker'].laeuft, 'der Lauf ist mit dem Fenster gestorben'
+    assert job_id in webapp.zustand['planer'].laufend, 'der Lauf ist mit dem Fenster gestorben'
 
     with TestClient(app.app) as zweiter:  # Fenster wieder auf
         seite = zweiter.get(f'/lauf/{job_id}')
         assert seite.status_code == 200
         assert 'von 10 Kunden' in seite.text or 'Fertig' in seite.text
 
-        webapp.zustand['worker'].warten(timeout=30)
+        abwarten()
         ergebnis = zweiter.get(f'/ergebnis/{job_id}')
         assert 'Herunterladen' in ergebnis.text
 
@@ -230,10 +241,13 @@ def test_fenster_schliessen_und_wieder_oeffnen(app):
     assert job['kunden_erledigt'] == 10
 
 
-def test_startseite_fuehrt_zum_laufenden_auftrag(app, browser):
-    """Wer während des Laufs auf die Startseite geht, landet beim Lauf."""
+def test_startseite_zeigt_den_laufenden_auftrag(app, browser):
+    """
+    Wer während des Laufs auf die Startseite geht, findet dort den Weg zum
+    Lauf — und kann trotzdem eine weitere Datei einreihen.
+    """
     langsam = _LangsamerProvider(FakeProvider.aus_csv(str(FIXTURE)), 0.3)
-    webapp.zustand['provider'] = langsam
+    provider_setzen(langsam)
 
     browser.get('/datei', params={'modus': 'A'})
     browser.post('/datei', files={'datei': ('InputData.csv', eingabe_csv(), 'text/csv')})
@@ -242,11 +256,11 @@ def test_startseite_fuehrt_zum_laufenden_auftrag(app, browser):
 
     try:
         start = browser.get('/', follow_redirects=False)
-        assert start.status_code == 303
-        assert start.headers['location'] == f'/lauf/{job_id}'
+        assert start.status_code == 200
+        assert f'href="/lauf/{job_id}"' in start.text
+        assert 'Was haben Sie zu den Kunden?' in start.text
     finally:
-        webapp.zustand['worker'].abbrechen()
-        webapp.zustand['worker'].warten(timeout=10)
+        abbrechen(job_id)
 
 
 def test_offener_auftrag_wird_zur_fortsetzung_angeboten(app, browser):
@@ -254,7 +268,6 @@ def test_offener_auftrag_wird_zur_fortsetzung_angeboten(app, browser):
     job_id = lauf_durchfuehren(browser)
     with Datenbank(webapp.DATENBANK) as datenbank:
         datenbank.status_setzen(job_id, 'LAEUFT')
-    webapp.zustand['worker'] = None
 
     start = browser.get('/')
     assert 'Ein Auftrag ist noch offen' in start.text
@@ -263,7 +276,7 @@ def test_offener_auftrag_wird_zur_fortsetzung_angeboten(app, browser):
     weiter = browser.post('/fortsetzen', follow_redirects=False)
     assert weiter.status_code == 303
     assert weiter.headers['location'] == f'/lauf/{job_id}'
-    webapp.zustand['worker'].warten(timeout=30)
+    abwarten()
 
     with Datenbank(webapp.DATENBANK) as datenbank:
         job = datenbank.job_lesen(job_id)
@@ -301,7 +314,7 @@ def test_umlaute_kommen_unbeschaedigt_an(browser):
 
 def test_datei_vor_dem_ende_gibt_eine_erklaerung(app, browser):
     langsam = _LangsamerProvider(FakeProvider.aus_csv(str(FIXTURE)), 0.3)
-    webapp.zustand['provider'] = langsam
+    provider_setzen(langsam)
 
     browser.get('/datei', params={'modus': 'A'})
     browser.post('/datei', files={'datei': ('InputData.csv', eingabe_csv(), 'text/csv')})
@@ -314,8 +327,7 @@ def test_datei_vor_dem_ende_gibt_eine_erklaerung(app, browser):
         assert 'liegt nicht bereit' in frueh.text
         assert 'Traceback' not in frueh.text
     finally:
-        webapp.zustand['worker'].abbrechen()
-        webapp.zustand['worker'].warten(timeout=10)
+        abbrechen(job_id)
 
 
 # ============================================================================
@@ -510,7 +522,7 @@ def test_dauer_in_worten(sekunden, erwartet):
 
 def test_abbruch_ueber_die_oberflaeche(app, browser):
     langsam = _LangsamerProvider(FakeProvider.aus_csv(str(FIXTURE)), 30)
-    webapp.zustand['provider'] = langsam
+    provider_setzen(langsam)
 
     browser.get('/datei', params={'modus': 'A'})
     browser.post('/datei', files={'datei': ('InputData.csv', eingabe_csv(), 'text/csv')})
@@ -582,8 +594,8 @@ def test_server_beendet_sich_unter_zehn_sekunden(tmp_path):
     Der Server wird mitten im Lauf gestoppt.
 
     Verlangt sind drei Dinge: er ist in unter zehn Sekunden weg, der Auftrag
-    steht danach als LAEUFT in der Datenbank, und der nächste Start bietet ihn
-    zur Fortsetzung an.
+    steht danach als LAEUFT in der Datenbank, und der nächste Start setzt ihn
+    fort.
     """
     import httpx
 
@@ -630,10 +642,16 @@ def test_server_beendet_sich_unter_zehn_sekunden(tmp_path):
         job = datenbank.job_lesen(job_id)
     assert job['status'] == 'LAEUFT', 'der Auftrag muss offen bleiben'
 
-    # Und der nächste Start bietet ihn an.
-    from worker import offener_lauf
-    offen = offener_lauf(tmp_path / 'laeufe.sqlite')
-    assert offen is not None and offen['id'] == job_id
+    # Und der nächste Start setzt ihn fort: er steht noch in der Warteschlange.
+    from worker import Planer
+    planer = Planer({'A': FakeProvider.aus_csv(str(FIXTURE))}, tmp_path / 'laeufe.sqlite')
+    planer.starten()
+    try:
+        assert planer.warten(timeout=30)
+    finally:
+        planer.beenden(timeout=10)
+    with Datenbank(tmp_path / 'laeufe.sqlite') as datenbank:
+        assert datenbank.job_lesen(job_id)['status'] == 'FERTIG'
 
 
 # ============================================================================
@@ -658,14 +658,15 @@ def browser(tmp_path, monkeypatch):
     monkeypatch.setattr(webapp, 'UPLOADS', tmp_path / 'uploads')
     monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
     webapp.UPLOADS.mkdir(parents=True, exist_ok=True)
-    webapp.zustand.update(worker=None, hochgeladen=None, kunden=0, modus='A',
+    webapp.zustand.update(planer=None, hochgeladen=None, kunden=0, modus='A',
                           provider=IdProvider({'PLACE_A001': kandidat()}))
     with TestClient(webapp.app) as klient:
         yield klient
-    worker = webapp.zustand['worker']
-    if worker and worker.laeuft:
-        worker.abbrechen()
-        worker.warten(timeout=10)
+    planer = webapp.zustand['planer']
+    if planer:
+        for job_id in planer.laufend:
+            planer.abbrechen(job_id, timeout=10)
+        planer.beenden(timeout=10)
 
 
 def test_startseite_bietet_beide_arten_an(browser):
@@ -694,7 +695,7 @@ def test_durchlauf_im_modus_b_ueber_den_browser(browser, tmp_path):
 
     gestartet = browser.post('/starten', follow_redirects=False)
     job_id = int(gestartet.headers['location'].rsplit('/', 1)[1])
-    webapp.zustand['worker'].warten(timeout=30)
+    assert webapp.zustand['planer'].warten(timeout=30)
 
     ergebnis = browser.get(f'/ergebnis/{job_id}')
     assert 'Fertig' in ergebnis.text
@@ -1126,14 +1126,15 @@ def browser(tmp_path, monkeypatch):
     monkeypatch.setattr(webapp, 'UPLOADS', tmp_path / 'uploads')
     monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
     webapp.UPLOADS.mkdir(parents=True, exist_ok=True)
-    webapp.zustand.update(worker=None, hochgeladen=None, kunden=0, modus='A',
+    webapp.zustand.update(planer=None, hochgeladen=None, kunden=0, modus='A',
                           email='', provider=FakeProvider.aus_csv(str(FIXTURE)))
     with TestClient(webapp.app) as klient:
         yield klient
-    worker = webapp.zustand['worker']
-    if worker and worker.laeuft:
-        worker.abbrechen()
-        worker.warten(timeout=10)
+    planer = webapp.zustand['planer']
+    if planer:
+        for job_id in planer.laufend:
+            planer.abbrechen(job_id, timeout=10)
+        planer.beenden(timeout=10)
 
 
 def eingabe_csv() -> bytes:
@@ -1160,7 +1161,7 @@ def test_adresse_landet_im_job(browser, postfach):
     antwort = browser.post('/starten', data={'email': 'kollege@example.ch'},
                            follow_redirects=False)
     job_id = int(antwort.headers['location'].rsplit('/', 1)[1])
-    webapp.zustand['worker'].warten(timeout=30)
+    assert webapp.zustand['planer'].warten(timeout=30)
 
     with Datenbank(webapp.DATENBANK) as datenbank:
         job = datenbank.job_lesen(job_id)
@@ -1193,14 +1194,15 @@ def test_ohne_adresse_verspricht_die_seite_keine_mail(browser):
 
 
 def test_gestoppter_lauf_erklaert_sich_auf_der_ergebnisseite(browser, tmp_path):
-    webapp.zustand['provider'] = ErschoepfterProvider(nach=2)
+    # Der Planer läuft schon; er bekommt die erschöpfte Quelle.
+    webapp.zustand['planer'].provider_je_modus['A'] = ErschoepfterProvider(nach=2)
 
     browser.get('/datei', params={'modus': 'A'})
     browser.post('/datei', data={'modus': 'A'},
                  files={'datei': ('InputData.csv', eingabe_csv(), 'text/csv')})
     antwort = browser.post('/starten', data={'email': ''}, follow_redirects=False)
     job_id = int(antwort.headers['location'].rsplit('/', 1)[1])
-    webapp.zustand['worker'].warten(timeout=30)
+    assert webapp.zustand['planer'].warten(timeout=30)
 
     seite = browser.get(f'/ergebnis/{job_id}').text
     assert 'Gestoppt' in seite
@@ -5,7 +5,6 @@
 
 import html
 import re
-import time
 from pathlib import Path
 
 import pandas as pd
@@ -45,15 +44,16 @@ def app(tmp_path, monkeypatch):
     monkeypatch.setattr(webapp, 'UPLOADS', tmp_path / 'uploads')
     monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
     webapp.UPLOADS.mkdir(parents=True, exist_ok=True)
-    webapp.zustand['worker'] = None
+    webapp.zustand['planer'] = None
     webapp.zustand['hochgeladen'] = None
     webapp.zustand['kunden'] = 0
     webapp.zustand['provider'] = FakeProvider.aus_csv(str(FIXTURE))
     yield webapp
-    worker = webapp.zustand['worker']
-    if worker and worker.laeuft:
-        worker.abbrechen()
-        worker.warten(timeout=10)
+    planer = webapp.zustand['planer']
+    if planer:
+        for job_id in planer.laufend:
+            planer.abbrechen(job_id, timeout=10)
+        planer.beenden(timeout=10)
 
 
 @pytest.fixture
@@ -70,10 +70,7 @@ def lauf_durchfuehren(browser, name: str = 'InputData.csv') -> int:
     antwort = browser.post('/starten', follow_redirects=False)
     job_id = int(antwort.headers['location'].rsplit('/', 1)[1])
 
-    frist = time.monotonic() + 30
-    while time.monotonic() < frist and webapp.zustand['worker'].laeuft:
-        time.sleep(0.05)
-    webapp.zustand['worker'].warten(timeout=10)
+    assert webapp.zustand['planer'].warten(timeout=30)
     return job_id
 
 
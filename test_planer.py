@@ -0,0 +1,484 @@
+# test_planer.py
+# Several jobs at once (worker.Planer): a queue in the database that outlives
+# the process, a concurrency budget per data source shared fairly between the
+# jobs using it, a quick refresh that does not wait behind a long first run,
+# and each queued job resumed on its own after a crash — also behind the web
+# interface, where every start goes through one Planer.
+# Nothing here touches the network.
+
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import webapp
+from data_cleaner import OUTPUT_FILES
+from db import Datenbank, lesend
+from fake_provider import FakeProvider
+from pipeline import Lauf
+from apify_provider import ApifyProvider
+from place_provider import Candidate
+from worker import Kontingent, Planer, Worker, einreihen
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+class Absturz(BaseException):
+    """Wie ein abgeschossener Prozess: kein except Exception fängt ihn."""
+
+
+class StuerztAb(Lauf):
+    """Stürzt vor dem achten Kunden ab."""
+
+    verbucht = 0
+
+    def _einen_kunden(self, *args):
+        if self.verbucht == 7:
+            raise Absturz()
+        self.verbucht += 1
+        return super()._einen_kunden(*args)
+
+
+class ZaehlenderProvider:
+    """Reicht an einen anderen Provider weiter und zählt die Suchen."""
+
+    def __init__(self, innen):
+        self.innen = innen
+        self.suchen = 0
+        self._sperre = threading.Lock()
+
+    def fetch_by_text(self, search_string, plz):
+        with self._sperre:
+            self.suchen += 1
+        return self.innen.fetch_by_text(search_string, plz)
+
+    def fetch_by_id(self, place_id):
+        return self.innen.fetch_by_id(place_id)
+
+
+class GleichzeitigProvider:
+    """
+    Antwortet nach einer Pause und merkt sich, wie viele Suchen höchstens
+    gleichzeitig offen waren — insgesamt und je Job (das erste Wort der Suche).
+    `nebeneinander` zählt je Job nur, solange auch ein anderer Job offen hat:
+    ist der andere fertig, darf der übrige das ganze Kontingent nutzen.
+    """
+
+    def __init__(self, pause: float):
+        self.pause = pause
+        self._sperre = threading.Lock()
+        self._offen = {}
+        self.hoechstens = {}
+        self.nebeneinander = {}
+        self.hoechstens_gesamt = 0
+
+    def fetch_by_text(self, search_string, plz):
+        job = search_string.split()[0]
+        with self._sperre:
+            self._offen[job] = self._offen.get(job, 0) + 1
+            self.hoechstens[job] = max(self.hoechstens.get(job, 0), self._offen[job])
+            self.hoechstens_gesamt = max(self.hoechstens_gesamt,
+                                         sum(self._offen.values()))
+            offen = {j: n for j, n in self._offen.items() if n}
+            if len(offen) > 1:
+                for j, n in offen.items():
+                    self.nebeneinander[j] = max(self.nebeneinander.get(j, 0), n)
+        time.sleep(self.pause)
+        with self._sperre:
+            self._offen[job] -= 1
+        name = search_string.split(',')[0]
+        return [Candidate(title=name, street='Hauptstrasse 1', postal_code=plz)]
+
+    def fetch_by_id(self, place_id):
+        time.sleep(self.pause)
+        return Candidate(title='Muster Laden', street='Hauptstrasse 1',
+                         postal_code='5620', place_id=place_id)
+
+
+class HaengenderApify:
+    """
+    Spielt den Apify-Client nach. Jeder Lauf rechnet, bis er abgebrochen oder
+    mit `freigeben` beendet wird; merkt sich, welcher Suchbegriff zu welchem
+    Lauf gehört und welche Läufe abgebrochen wurden.
+    """
+
+    def __init__(self):
+        self.suchbegriffe = {}
+        self.abgebrochen = set()
+        self.frei = threading.Event()
+        self._sperre = threading.Lock()
+
+    def actor(self, actor_id):
+        return self
+
+    def start(self, run_input, timeout_secs):
+        with self._sperre:
+            lauf_id = f'LAUF_{len(self.suchbegriffe)}'
+            self.suchbegriffe[lauf_id] = run_input['searchStringsArray'][0]
+        return {'id': lauf_id}
+
+    def run(self, lauf_id):
+        client = self
+
+        class Lauf_:
+            def wait_for_finish(self, wait_secs=None):
+                ende = time.monotonic() + wait_secs
+                while (not client.frei.wait(0.01) and lauf_id not in client.abgebrochen
+                       and time.monotonic() < ende):
+                    pass
+                status = 'ABORTED' if lauf_id in client.abgebrochen else 'SUCCEEDED'
+                return {'status': status, 'defaultDatasetId': lauf_id}
+
+            def abort(self):
+                client.abgebrochen.add(lauf_id)
+
+        return Lauf_()
+
+    def dataset(self, lauf_id):
+        text = self.suchbegriffe[lauf_id]
+
+        class Datensatz:
+            def iterate_items(self):
+                return iter([{'title': text.split(',')[0], 'street': 'Hauptstrasse 1',
+                              'postalCode': '5620', 'city': 'Musterdorf',
+                              'searchString': text}])
+
+        return Datensatz()
+
+    def laeufe_von(self, name: str) -> set:
+        with self._sperre:
+            return {lauf_id for lauf_id, text in self.suchbegriffe.items()
+                    if text.startswith(name)}
+
+    def freigeben(self) -> None:
+        self.frei.set()
+
+
+def eingabe_a(tmp_path: Path, name: str, anzahl: int, start: int = 0) -> Path:
+    ziel = tmp_path / f'{name}.csv'
+    pd.DataFrame([{'SearchString': f'{name} Laden {n}, Hauptstrasse 1, 5620 Musterdorf',
+                   'PLZ': '5620', 'Stadt': 'Musterdorf', 'KundenNr': str(900000 + n)}
+                  for n in range(start, start + anzahl)]).to_csv(
+        ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def eingabe_b(tmp_path: Path, anzahl: int) -> Path:
+    ziel = tmp_path / 'IDs.csv'
+    pd.DataFrame([{'placeId': f'PLACE_{n}', 'lat': '', 'lng': '',
+                   'KundenNr': str(900000 + n)} for n in range(anzahl)]).to_csv(
+        ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def eingabedatei_aus_fixture(tmp_path: Path) -> Path:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    df = df[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    ziel = tmp_path / 'eingabe.csv'
+    df.to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def am_stueck(tmp_path: Path, eingabe: Path) -> Path:
+    with Datenbank(tmp_path / 'am_stueck.sqlite') as datenbank:
+        Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank).ausfuehren(
+            eingabe, str(tmp_path / 'am_stueck'))
+    return tmp_path / 'am_stueck'
+
+
+def gleiche_dateien(links: Path, rechts: Path) -> None:
+    for dateiname in OUTPUT_FILES.values():
+        assert (links / dateiname).read_bytes() == (rechts / dateiname).read_bytes()
+
+
+def abarbeiten(planer: Planer) -> None:
+    planer.starten()
+    try:
+        assert planer.warten(timeout=30)
+    finally:
+        planer.beenden(timeout=10)
+
+
+def zustand(pfad: Path, job_id: int) -> str:
+    with lesend(pfad) as datenbank:
+        return datenbank.job_lesen(job_id)['status']
+
+
+# ============================================================================
+# Das Kontingent
+# ============================================================================
+
+def test_kontingent_zu_gleichen_teilen():
+    kontingent = Kontingent(6)
+    assert kontingent.anteil(1) == 6
+
+    kontingent.anmelden(1)
+    assert kontingent.anteil(1) == 6
+    kontingent.anmelden(2)
+    assert [kontingent.anteil(j) for j in (1, 2)] == [3, 3]
+    kontingent.anmelden(4)
+    kontingent.anmelden(3)
+    # Was sich nicht teilen lässt, bekommen die älteren.
+    assert [kontingent.anteil(j) for j in (1, 2, 3, 4)] == [2, 2, 1, 1]
+
+    for job_id in range(5, 9):
+        kontingent.anmelden(job_id)
+    assert {kontingent.anteil(j) for j in range(1, 9)} == {1}
+
+    kontingent.abmelden(1)
+    kontingent.abmelden(2)
+    assert kontingent.jobs == 6
+    assert kontingent.anteil(3) == 1
+
+
+# ============================================================================
+# Die Warteschlange
+# ============================================================================
+
+def test_eingereiht_ohne_planer_laeuft_beim_naechsten_start(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    pfad = tmp_path / 'laeufe.sqlite'
+    job_id = einreihen(pfad, str(eingabe), 'A', str(tmp_path / 'aus'))
+
+    with Datenbank(pfad) as datenbank:
+        assert [a['job_id'] for a in datenbank.warteschlange_lesen()] == [job_id]
+        assert datenbank.job_lesen(job_id)['status'] == 'NEU'
+
+    abarbeiten(Planer({'A': FakeProvider.aus_csv(str(FIXTURE))}, pfad))
+
+    assert zustand(pfad, job_id) == 'FERTIG'
+    with Datenbank(pfad) as datenbank:
+        assert datenbank.warteschlange_lesen() == []
+    gleiche_dateien(tmp_path / 'aus', am_stueck(tmp_path, eingabe))
+
+
+def test_offener_job_uebersieht_eingereihte(tmp_path):
+    pfad = tmp_path / 'laeufe.sqlite'
+    job_id = einreihen(pfad, str(eingabe_a(tmp_path, 'Erst', 3)), 'A')
+    with Datenbank(pfad) as datenbank:
+        datenbank.status_setzen(job_id, 'LAEUFT')
+        assert datenbank.offener_job() is None
+
+    # Die Weboberfläche startet trotzdem: den eingereihten setzt der Planer fort.
+    worker = Worker(GleichzeitigProvider(0), pfad)
+    worker.starten(eingabe_a(tmp_path, 'Zweit', 3), str(tmp_path / 'aus'))
+    assert worker.warten(timeout=10)
+    assert worker.ergebnis['status'] == 'FERTIG'
+
+
+def test_ohne_quelle_fuer_den_modus_gescheitert(tmp_path):
+    pfad = tmp_path / 'laeufe.sqlite'
+    job_id = einreihen(pfad, str(eingabe_b(tmp_path, 3)), 'B')
+
+    abarbeiten(Planer({'A': GleichzeitigProvider(0)}, pfad))
+
+    with Datenbank(pfad) as datenbank:
+        job = datenbank.job_lesen(job_id)
+        assert datenbank.warteschlange_lesen() == []
+    assert job['status'] == 'FEHLER'
+    assert 'Modus B' in job['fehlermeldung']
+
+
+# ============================================================================
+# Mehrere Jobs gleichzeitig
+# ============================================================================
+
+def test_auffrischen_wartet_nicht_hinter_der_erstanreicherung(tmp_path):
+    pfad = tmp_path / 'laeufe.sqlite'
+    quelle = GleichzeitigProvider(0.02)
+    lang = einreihen(pfad, str(eingabe_a(tmp_path, 'Lang', 120)), 'A',
+                     str(tmp_path / 'lang'))
+    kurz = einreihen(pfad, str(eingabe_b(tmp_path, 6)), 'B', str(tmp_path / 'kurz'))
+
+    planer = Planer({'A': quelle, 'B': quelle}, pfad, kontingente={'A': 2, 'B': 2})
+    planer.starten()
+    try:
+        frist = time.monotonic() + 20
+        while zustand(pfad, kurz) != 'FERTIG' and time.monotonic() < frist:
+            time.sleep(0.02)
+        assert zustand(pfad, kurz) == 'FERTIG'
+        assert zustand(pfad, lang) == 'LAEUFT'
+        assert planer.warten(timeout=30)
+    finally:
+        planer.beenden(timeout=10)
+
+    assert zustand(pfad, lang) == 'FERTIG'
+
+
+def test_zwei_jobs_teilen_sich_die_quelle(tmp_path):
+    pfad = tmp_path / 'laeufe.sqlite'
+    quelle = GleichzeitigProvider(0.01)
+    erster = einreihen(pfad, str(eingabe_a(tmp_path, 'Erster', 40)), 'A',
+                       str(tmp_path / 'erster'))
+    zweiter = einreihen(pfad, str(eingabe_a(tmp_path, 'Zweiter', 40, start=100)), 'A',
+                        str(tmp_path / 'zweiter'))
+
+    abarbeiten(Planer({'A': quelle}, pfad, kontingente={'A': 4}))
+
+    assert {zustand(pfad, erster), zustand(pfad, zweiter)} == {'FERTIG'}
+    assert set(quelle.nebeneinander) == {'Erster', 'Zweiter'}
+    assert max(quelle.nebeneinander.values()) <= 2
+    assert quelle.hoechstens_gesamt <= 4
+
+
+def test_hoechstens_so_viele_laeufe_wie_erlaubt(tmp_path):
+    pfad = tmp_path / 'laeufe.sqlite'
+    quelle = GleichzeitigProvider(0.01)
+    for name in ('Eins', 'Zwei', 'Drei'):
+        einreihen(pfad, str(eingabe_a(tmp_path, name, 10)), 'A', str(tmp_path / name))
+
+    planer = Planer({'A': quelle}, pfad, max_laeufe=2)
+    gleichzeitig = []
+    planer.starten()
+    try:
+        while not planer.warten(timeout=0.01):
+            gleichzeitig.append(len(planer.laufend))
+    finally:
+        planer.beenden(timeout=10)
+
+    assert max(gleichzeitig) == 2
+    with lesend(pfad) as datenbank:
+        assert {datenbank.job_lesen(j)['status'] for j in (1, 2, 3)} == {'FERTIG'}
+
+
+# ============================================================================
+# Abbrechen
+# ============================================================================
+
+def test_abbruch_stoppt_nur_die_apify_laeufe_des_jobs(tmp_path):
+    """
+    Beide Jobs teilen sich einen ApifyProvider, wie hinter der Weboberfläche.
+    Der Abbruch des einen beendet dessen Läufe bei Apify — sonst rechnen sie
+    weiter und kosten —, aber keinen des anderen, und der Provider liefert
+    danach weiter Treffer.
+    """
+    client = HaengenderApify()
+    pfad = tmp_path / 'laeufe.sqlite'
+    planer = Planer({'A': ApifyProvider('token', 'actor', client=client)}, pfad,
+                    kontingente={'A': 4})
+    eins = planer.einreihen(str(eingabe_a(tmp_path, 'Eins', 20)), 'A', str(tmp_path / 'eins'))
+    zwei = planer.einreihen(str(eingabe_a(tmp_path, 'Zwei', 2)), 'A', str(tmp_path / 'zwei'))
+    planer.starten()
+    try:
+        frist = time.monotonic() + 10
+        while not (client.laeufe_von('Eins') and client.laeufe_von('Zwei')):
+            assert time.monotonic() < frist
+            time.sleep(0.01)
+
+        planer.abbrechen(eins, timeout=10)
+
+        assert zustand(pfad, eins) == 'ABGEBROCHEN'
+        assert client.abgebrochen == client.laeufe_von('Eins')
+
+        client.freigeben()
+        drei = planer.einreihen(str(eingabe_a(tmp_path, 'Drei', 2)), 'A',
+                                str(tmp_path / 'drei'))
+        assert planer.warten(timeout=30)
+    finally:
+        planer.beenden(timeout=10)
+
+    assert not client.abgebrochen & (client.laeufe_von('Zwei') | client.laeufe_von('Drei'))
+    for job_id in (zwei, drei):
+        assert zustand(pfad, job_id) == 'FERTIG'
+        with lesend(pfad) as datenbank:
+            assert datenbank.verbindung.execute(
+                'SELECT COUNT(*) FROM kandidat JOIN kunde ON kunde.id = kandidat.kunde_id '
+                'WHERE kunde.job_id = ?', (job_id,)).fetchone()[0] == 2
+
+
+# ============================================================================
+# Nach einem Absturz
+# ============================================================================
+
+def test_abgestuerzter_job_wird_fuer_sich_fortgesetzt(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    pfad = tmp_path / 'laeufe.sqlite'
+    job_id = einreihen(pfad, str(eingabe), 'A', str(tmp_path / 'aus'))
+    with Datenbank(pfad) as datenbank:
+        with pytest.raises(Absturz):
+            StuerztAb(FakeProvider.aus_csv(str(FIXTURE)), datenbank, arbeiter=1).fortsetzen(
+                job_id, eingabe, str(tmp_path / 'aus'))
+    assert zustand(pfad, job_id) == 'LAEUFT'
+
+    quelle = ZaehlenderProvider(FakeProvider.aus_csv(str(FIXTURE)))
+    abarbeiten(Planer({'A': quelle}, pfad))
+
+    kunden = pd.read_csv(eingabe, sep=';', encoding='utf-8-sig', dtype=str)
+    assert quelle.suchen == len(kunden) - 7
+    assert zustand(pfad, job_id) == 'FERTIG'
+    gleiche_dateien(tmp_path / 'aus', am_stueck(tmp_path, eingabe))
+
+
+# ============================================================================
+# Weboberfläche
+# ============================================================================
+
+@pytest.fixture
+def browser(tmp_path, monkeypatch):
+    monkeypatch.setattr(webapp, 'LAUFDATEN', tmp_path)
+    monkeypatch.setattr(webapp, 'UPLOADS', tmp_path / 'uploads')
+    monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
+    webapp.UPLOADS.mkdir(parents=True, exist_ok=True)
+    monkeypatch.setitem(webapp.zustand, 'planer', None)
+    monkeypatch.setitem(webapp.zustand, 'hochgeladen', None)
+    monkeypatch.setitem(webapp.zustand, 'provider', GleichzeitigProvider(0.05))
+    with TestClient(webapp.app) as klient:
+        yield klient
+    planer = webapp.zustand['planer']
+    if planer:
+        for job_id in planer.laufend:
+            planer.abbrechen(job_id, timeout=10)
+        planer.beenden(timeout=10)
+
+
+def im_browser_starten(browser, eingabe: Path, modus: str) -> int:
+    browser.get('/datei', params={'modus': modus})
+    browser.post('/datei', data={'modus': modus},
+                 files={'datei': (eingabe.name, eingabe.read_bytes(), 'text/csv')})
+    antwort = browser.post('/starten', follow_redirects=False)
+    assert antwort.status_code == 303
+    return int(antwort.headers['location'].rsplit('/', 1)[1])
+
+
+def test_auffrischen_im_browser_neben_der_erstanreicherung(browser, tmp_path):
+    pfad = webapp.DATENBANK
+    lang = im_browser_starten(browser, eingabe_a(tmp_path, 'Lang', 400), 'A')
+    # Der zweite Start wird nicht abgewiesen, und er wartet nicht.
+    kurz = im_browser_starten(browser, eingabe_b(tmp_path, 6), 'B')
+
+    frist = time.monotonic() + 20
+    while zustand(pfad, kurz) != 'FERTIG' and time.monotonic() < frist:
+        time.sleep(0.02)
+    assert zustand(pfad, kurz) == 'FERTIG'
+    assert zustand(pfad, lang) == 'LAEUFT'
+    assert f'href="/lauf/{lang}"' in browser.get('/').text
+
+    # Abgebrochen wird über die Nummer, der andere Auftrag bleibt unberührt.
+    abbruch = browser.post(f'/lauf/{lang}/abbrechen', follow_redirects=False)
+    assert abbruch.headers['location'] == f'/ergebnis/{lang}'
+    assert zustand(pfad, lang) == 'ABGEBROCHEN'
+    assert zustand(pfad, kurz) == 'FERTIG'
+
+
+def test_wartender_auftrag_zeigt_sich_als_wartend(browser, tmp_path):
+    pfad = webapp.DATENBANK
+    # Eingereiht, aber der Planer nimmt ihn noch nicht: sein Takt steht.
+    webapp.zustand['planer'].beenden(timeout=10, abbrechen=False)
+    job_id = webapp.zustand['planer'].einreihen(str(eingabe_a(tmp_path, 'Spaeter', 3)))
+
+    stand = browser.get(f'/lauf/{job_id}/stand')
+    assert 'Wartet' in stand.text
+    assert 'HX-Redirect' not in stand.headers
+    assert 'wartet, bis ein anderer fertig ist' in browser.get('/').text
+
+    browser.post(f'/lauf/{job_id}/abbrechen')
+    assert zustand(pfad, job_id) == 'ABGEBROCHEN'
@@ -0,0 +1,211 @@
+# test_pruefmaske_schreiben.py
+# Writing the output files from the run database after decisions in the
+# review mask: the full export reads the whole job with two queries, and a
+# single decision only replaces that customer's rows — with the same bytes as
+# rewriting everything. How much faster is timed only with LANGSAME_TESTS=1.
+# Nothing here touches the network.
+
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import pruefmaske
+from data_cleaner import OUTPUT_FILES
+from db import Datenbank
+from fake_provider import FakeProvider
+from pipeline import Lauf
+from place_provider import Candidate
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def pruefaelle_anlegen(datenbank: Datenbank, anzahl: int) -> int:
+    """Ein fertiger Job mit `anzahl` Prüffällen, je zwei gleich guten Treffern."""
+    job_id = datenbank.job_anlegen('A', 'Viele.csv', kunden_total=anzahl)
+    for nummer in range(1, anzahl + 1):
+        datenbank.kunde_mit_kandidaten_schreiben(
+            job_id, f'9{nummer:05d}',
+            [(Candidate(title=f'Muster Laden {nummer}', street=f'Hauptstrasse {nummer}',
+                        postal_code='5620', city='Musterdorf',
+                        place_id=f'PLACE_{nummer}_A'),
+              84.0, 'vorgeschlagen', f'Treffer A für Kunde {nummer}.'),
+             (Candidate(title=f'Muster Markt {nummer}', street=f'Dorfstrasse {nummer}',
+                        postal_code='5620', city='Musterdorf',
+                        place_id=f'PLACE_{nummer}_B'),
+              81.0, 'vorgeschlagen', f'Treffer B für Kunde {nummer}.')],
+            search_string=f'Muster Laden {nummer}, Hauptstrasse {nummer}, 5620 Musterdorf',
+            plz='5620', stadt='Musterdorf', ergebnis='pruefung',
+            qualitaet='PRUEFUNG (mehrere hohe Treffer)', grund='Zwei Treffer gleich gut.')
+    datenbank.status_setzen(job_id, 'FERTIG')
+    return job_id
+
+
+class RueckwaertsFertig:
+    """
+    Der FakeProvider, nur antwortet er dem letzten Kunden der Eingabe zuerst:
+    mit genug Arbeitern werden die Kunden in umgekehrter Reihenfolge fertig,
+    `kunde.id` läuft also gegen die Eingabe.
+    """
+
+    def __init__(self, suchbegriffe: list):
+        self.fake = FakeProvider.aus_csv(str(FIXTURE))
+        self.stelle = {text: nummer for nummer, text in enumerate(suchbegriffe)}
+        self.anzahl = len(suchbegriffe)
+
+    def fetch_by_text(self, search_string, plz):
+        time.sleep(0.05 * (self.anzahl - self.stelle[search_string]))
+        return self.fake.fetch_by_text(search_string, plz)
+
+    def fetch_by_id(self, place_id):
+        return self.fake.fetch_by_id(place_id)
+
+
+def kundennummern(pfad: Path) -> list:
+    return list(dict.fromkeys(pd.read_csv(pfad, sep=';', encoding='utf-8-sig',
+                                          dtype=str)['KundenNr']))
+
+
+def gleiche_dateien(links: Path, rechts: Path) -> None:
+    # Die Diagnosedatei kommt nur aus dem Lauf; ganz neu geschrieben in einen
+    # anderen Ordner wäre sie leer.
+    for schluessel, dateiname in OUTPUT_FILES.items():
+        if schluessel == 'aussortiert':
+            continue
+        assert (links / dateiname).read_bytes() == (rechts / dateiname).read_bytes()
+
+
+# ============================================================================
+# Alles neu schreiben
+# ============================================================================
+
+def test_ganzer_job_mit_zwei_abfragen(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = pruefaelle_anlegen(datenbank, 50)
+        anweisungen = []
+        datenbank.verbindung.set_trace_callback(anweisungen.append)
+
+        pruefmaske.dateien_neu_schreiben(datenbank, job_id, str(tmp_path / 'aus'))
+
+    assert sum('kandidat' in a for a in anweisungen) == 1
+    assert sum(a.lstrip().startswith('SELECT') for a in anweisungen) <= 3
+
+
+# ============================================================================
+# Nur den entschiedenen Kunden
+# ============================================================================
+
+def test_angepasst_wie_ganz_neu_geschrieben(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = pruefaelle_anlegen(datenbank, 12)
+        pruefmaske.dateien_neu_schreiben(datenbank, job_id, str(tmp_path / 'angepasst'))
+        faelle = datenbank.pruefaelle_lesen(job_id)
+
+        # Vorne, hinten, in der Mitte, keiner passt — und eine Entscheidung,
+        # die nachträglich geändert wird.
+        entscheidungen = [(faelle[0], 'A'), (faelle[-1], 'B'), (faelle[5], None),
+                          (faelle[6], 'A'), (faelle[6], 'B')]
+        for fall, welcher in entscheidungen:
+            kandidaten = datenbank.kandidaten_lesen(fall['id'])
+            gewaehlt = next((k['id'] for k in kandidaten
+                             if k['place_id'].endswith('_' + welcher)), None) \
+                if welcher else None
+            pruefmaske.entscheiden(datenbank, fall['id'], gewaehlt)
+            pruefmaske.kunde_in_dateien_anpassen(datenbank, fall['id'],
+                                                 str(tmp_path / 'angepasst'))
+
+        pruefmaske.dateien_neu_schreiben(datenbank, job_id, str(tmp_path / 'neu'))
+
+    gleiche_dateien(tmp_path / 'angepasst', tmp_path / 'neu')
+
+
+def test_nach_einem_lauf_wie_ganz_neu_geschrieben(tmp_path):
+    eingabe = tmp_path / 'eingabe.csv'
+    eingabe.write_bytes(FIXTURE.read_bytes())
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank, arbeiter=1).ausfuehren(
+            eingabe, str(tmp_path / 'angepasst'))['job_id']
+        for fall in datenbank.pruefaelle_lesen(job_id):
+            pruefmaske.entscheiden(datenbank, fall['id'], None)
+            pruefmaske.kunde_in_dateien_anpassen(datenbank, fall['id'],
+                                                 str(tmp_path / 'angepasst'))
+        pruefmaske.dateien_neu_schreiben(datenbank, job_id, str(tmp_path / 'neu'))
+
+    gleiche_dateien(tmp_path / 'angepasst', tmp_path / 'neu')
+
+
+def test_eingabe_nicht_nach_id_sortiert(tmp_path):
+    """
+    Die Ausgabedateien stehen in der Reihenfolge der Eingabe, nicht in der von
+    `kunde.id`. Ein entschiedener Kunde kommt in seiner neuen Datei an die
+    Stelle, die ihm nach der Eingabe zusteht — und das Ganze ist dasselbe wie
+    alles neu geschrieben.
+    """
+    stamm = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    stamm = stamm[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    eingabe = tmp_path / 'eingabe.csv'
+    stamm.to_csv(eingabe, sep=';', index=False, encoding='utf-8-sig')
+    reihenfolge = list(stamm['KundenNr'])
+    ordner = tmp_path / 'angepasst'
+
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = Lauf(RueckwaertsFertig(list(stamm['SearchString'])), datenbank,
+                      arbeiter=len(stamm)).ausfuehren(eingabe, str(ordner))['job_id']
+        nach_id = [k['kunden_nr'] for k in datenbank.kunden_lesen(job_id)]
+        assert nach_id != reihenfolge
+
+        faelle = datenbank.pruefaelle_lesen(job_id)
+        assert faelle
+        for fall in faelle:
+            pruefmaske.entscheiden(datenbank, fall['id'], None)
+            pruefmaske.kunde_in_dateien_anpassen(datenbank, fall['id'], str(ordner))
+        pruefmaske.dateien_neu_schreiben(datenbank, job_id, str(tmp_path / 'neu'))
+
+    gleiche_dateien(ordner, tmp_path / 'neu')
+    for schluessel in ('fertig_fuer_erp', 'nicht_moeglich'):
+        nummern = kundennummern(ordner / OUTPUT_FILES[schluessel])
+        assert nummern == [nr for nr in reihenfolge if nr in nummern]
+    assert {fall['kunden_nr'] for fall in faelle} <= set(
+        kundennummern(ordner / OUTPUT_FILES['nicht_moeglich']))
+
+
+def test_fehlende_dateien_werden_ganz_geschrieben(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = pruefaelle_anlegen(datenbank, 3)
+        fall = datenbank.pruefaelle_lesen(job_id)[0]
+        pruefmaske.entscheiden(datenbank, fall['id'], None)
+
+        pruefmaske.kunde_in_dateien_anpassen(datenbank, fall['id'],
+                                             str(tmp_path / 'angepasst'))
+        pruefmaske.dateien_neu_schreiben(datenbank, job_id, str(tmp_path / 'neu'))
+
+    gleiche_dateien(tmp_path / 'angepasst', tmp_path / 'neu')
+
+
+@pytest.mark.skipif(not os.environ.get('LANGSAME_TESTS'),
+                    reason='Zeitvergleich bei 3000 Prüffällen, hängt von der '
+                           'Maschine ab. Mit LANGSAME_TESTS=1 ausführen.')
+def test_eine_entscheidung_viel_schneller_als_alles_neu(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = pruefaelle_anlegen(datenbank, 3000)
+        ordner = str(tmp_path / 'aus')
+        pruefmaske.dateien_neu_schreiben(datenbank, job_id, ordner)
+        fall = datenbank.pruefaelle_lesen(job_id)[1500]
+        pruefmaske.entscheiden(datenbank, fall['id'], None)
+
+        start = time.perf_counter()
+        pruefmaske.dateien_neu_schreiben(datenbank, job_id, ordner)
+        alles = time.perf_counter() - start
+        start = time.perf_counter()
+        pruefmaske.kunde_in_dateien_anpassen(datenbank, fall['id'], ordner)
+        einzeln = time.perf_counter() - start
+
+    assert einzeln * 5 < alles
@@ -0,0 +1,148 @@
+# test_pruefstand.py
+# Progress and "next open case" in the review mask come from counting and
+# index lookups instead of reading all customers of the job: same answers as
+# before, and the time per click does not grow with the job (timed only with
+# LANGSAME_TESTS=1; the index use is checked by default).
+# Nothing here touches the network.
+
+import os
+import time
+
+import pytest
+
+import pruefmaske
+from db import Datenbank
+from pruefmaske import GEWAEHLT_QUALITAET, KEINER_QUALITAET
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def job_mit_kunden(datenbank: Datenbank, kunden: list) -> int:
+    """`kunden` ist eine Liste von (ergebnis, qualitaet), erfundene Nummern."""
+    job_id = datenbank.job_anlegen('A', 'Viele.csv', kunden_total=len(kunden))
+    with datenbank.verbindung:
+        datenbank.verbindung.executemany(
+            'INSERT INTO kunde (job_id, kunden_nr, ergebnis, qualitaet) VALUES (?, ?, ?, ?)',
+            [(job_id, str(900000 + n), ergebnis, qualitaet)
+             for n, (ergebnis, qualitaet) in enumerate(kunden)])
+    return job_id
+
+
+def gemischt(anzahl: int, alle: int) -> list:
+    """Jeder `alle`-te Kunde ist ein Prüffall, abwechselnd mit zwei Qualitäten."""
+    return [('pruefung', ('PRUEFUNG (mehrere hohe Treffer)', 'PRUEFUNG (Score knapp)',
+                          None)[n % 3])
+            if n % alle == 0 else ('fertig', 'OK (Score)')
+            for n in range(anzahl)]
+
+
+def bisher_fortschritt(datenbank, job_id: int) -> dict:
+    """Die frühere Rechnung: alle offenen und alle Kunden lesen, in Python zählen."""
+    offen = len(datenbank.pruefaelle_lesen(job_id))
+    entschieden = sum(1 for kunde in datenbank.kunden_lesen(job_id)
+                      if kunde['qualitaet'] in (GEWAEHLT_QUALITAET, KEINER_QUALITAET))
+    return {'offen': offen, 'entschieden': entschieden}
+
+
+def bisher_naechster(datenbank, job_id: int, nach_kunde_id: int = None) -> int:
+    offen = [k['id'] for k in datenbank.pruefaelle_lesen(job_id)]
+    dahinter = [i for i in offen if nach_kunde_id is not None and i > nach_kunde_id]
+    return (dahinter or offen or [None])[0]
+
+
+def entscheiden(datenbank, kunde_id: int, ergebnis: str, qualitaet: str) -> None:
+    with datenbank.verbindung:
+        datenbank.verbindung.execute(
+            'UPDATE kunde SET ergebnis = ?, qualitaet = ? WHERE id = ?',
+            (ergebnis, qualitaet, kunde_id))
+
+
+# ============================================================================
+# Dieselben Antworten
+# ============================================================================
+
+def test_gleich_wie_bisher_waehrend_der_ganzen_pruefung(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = job_mit_kunden(datenbank, gemischt(60, 4))
+        faelle = [k['id'] for k in datenbank.pruefaelle_lesen(job_id)]
+        # Nicht der Reihe nach: so gibt es offene Fälle vor und hinter dem
+        # gerade entschiedenen.
+        reihenfolge = faelle[5:] + faelle[:5]
+
+        for nummer, kunde_id in enumerate(reihenfolge):
+            stand = pruefmaske.fortschritt(datenbank, job_id)
+            for schluessel, wert in bisher_fortschritt(datenbank, job_id).items():
+                assert stand[schluessel] == wert
+            for nach in (None, kunde_id, faelle[-1], faelle[0] - 1):
+                assert (pruefmaske.naechster_offener(datenbank, job_id, nach)
+                        == bisher_naechster(datenbank, job_id, nach))
+            entscheiden(datenbank, kunde_id, *(('fertig', GEWAEHLT_QUALITAET)
+                                               if nummer % 2 else
+                                               ('nicht_moeglich', KEINER_QUALITAET)))
+
+        stand = pruefmaske.fortschritt(datenbank, job_id)
+        assert (stand['offen'], stand['entschieden']) == (0, len(faelle))
+        assert stand['alle_entschieden']
+        assert pruefmaske.naechster_offener(datenbank, job_id, faelle[3]) is None
+
+
+def test_andere_jobs_zaehlen_nicht_mit(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        erster = job_mit_kunden(datenbank, gemischt(20, 2))
+        zweiter = job_mit_kunden(datenbank, gemischt(20, 5))
+
+        assert pruefmaske.fortschritt(datenbank, zweiter)['offen'] == 4
+        assert (pruefmaske.naechster_offener(datenbank, erster, 10_000)
+                == datenbank.pruefaelle_lesen(erster)[0]['id'])
+
+
+def test_kein_kunde_wird_gelesen(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        job_id = job_mit_kunden(datenbank, gemischt(20, 3))
+        anweisungen = []
+        datenbank.verbindung.set_trace_callback(anweisungen.append)
+
+        pruefmaske.fortschritt(datenbank, job_id)
+        pruefmaske.naechster_offener(datenbank, job_id, 5)
+
+        for anweisung in anweisungen:
+            assert 'SELECT *' not in anweisung
+            plan = ' '.join(zeile[3] for zeile in datenbank.verbindung.execute(
+                'EXPLAIN QUERY PLAN ' + anweisung))
+            assert 'COVERING INDEX ix_kunde_pruefstand' in plan
+            assert 'SCAN kunde' not in plan
+
+
+# ============================================================================
+# Gleich schnell, egal wie gross der Job
+# ============================================================================
+
+@pytest.mark.skipif(not os.environ.get('LANGSAME_TESTS'),
+                    reason='Misst Millisekunden je Klick, abhängig von der '
+                           'Maschine. Mit LANGSAME_TESTS=1 ausführen.')
+def test_ein_klick_kostet_bei_10000_kunden_nicht_mehr(tmp_path):
+    def je_klick(anzahl: int) -> float:
+        """
+        Ein Job mit 200 Prüffällen unter `anzahl` Kunden, von denen die
+        vorderen 190 schon entschieden sind — der teuerste Augenblick für
+        das frühere Vorgehen.
+        """
+        with Datenbank(tmp_path / f'{anzahl}.sqlite') as datenbank:
+            job_id = job_mit_kunden(datenbank, gemischt(anzahl, anzahl // 200))
+            for kunde in datenbank.pruefaelle_lesen(job_id)[:190]:
+                entscheiden(datenbank, kunde['id'], 'fertig', GEWAEHLT_QUALITAET)
+            letzter = datenbank.pruefaelle_lesen(job_id)[-1]['id']
+
+            start = time.perf_counter()
+            for _ in range(200):
+                pruefmaske.fortschritt(datenbank, job_id)
+                pruefmaske.naechster_offener(datenbank, job_id, letzter)
+            return (time.perf_counter() - start) / 200
+
+    klein, gross = je_klick(1_000), je_klick(10_000)
+
+    # Zehnmal so viele Kunden, dieselbe Zeit; und weit unter einer Millisekunde.
+    assert gross < klein * 2
+    assert gross < 0.001
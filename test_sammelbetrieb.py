@@ -0,0 +1,191 @@
+# test_sammelbetrieb.py
+# Group commit in the run database: several customers share one commit, each
+# customer is still written completely or not at all, and a crash loses at
+# most the open window, which the resume fetches again.
+# Nothing here touches the network.
+
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from data_cleaner import OUTPUT_FILES
+from db import Datenbank
+from fake_provider import FakeProvider
+from pipeline import Lauf
+from place_provider import Candidate
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def eingabedatei_aus_fixture(tmp_path: Path) -> Path:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    df = df[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    ziel = tmp_path / 'eingabe.csv'
+    df.to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def gesehen_von_aussen(pfad: Path) -> int:
+    """Wie viele Kunden eine zweite Verbindung sieht, etwa die Statusanzeige."""
+    verbindung = sqlite3.connect(pfad)
+    try:
+        return verbindung.execute('SELECT COUNT(*) FROM kunde').fetchone()[0]
+    finally:
+        verbindung.close()
+
+
+def kunde_schreiben(datenbank: Datenbank, job_id: int, kunden_nr: str) -> None:
+    datenbank.kunde_mit_kandidaten_schreiben(
+        job_id, kunden_nr, [(Candidate(title='Laden'), 90.0, 'gewaehlt', 'passt')],
+        search_string='Laden', ergebnis='fertig', qualitaet='OK (Score)', grund='passt')
+
+
+class ZaehlenderProvider:
+    def __init__(self):
+        self.provider = FakeProvider.aus_csv(str(FIXTURE))
+        self.texte = []
+
+    def fetch_by_text(self, search_string, plz):
+        self.texte.append(search_string)
+        return self.provider.fetch_by_text(search_string, plz)
+
+    def fetch_by_id(self, place_id):
+        return self.provider.fetch_by_id(place_id)
+
+
+class Absturz(BaseException):
+    """Wie ein abgeschossener Prozess: kein except Exception fängt ihn."""
+
+
+# ============================================================================
+# Die Datenbank
+# ============================================================================
+
+def test_festgeschrieben_wird_nach_n_kunden(tmp_path):
+    pfad = tmp_path / 'lauf.sqlite'
+    with Datenbank(pfad) as datenbank:
+        job_id = datenbank.job_anlegen('A', 'eingabe.csv')
+        datenbank.sammeln(kunden=3)
+
+        for nummer in range(2):
+            kunde_schreiben(datenbank, job_id, str(nummer))
+            datenbank.fortschritt_setzen(job_id, nummer + 1)
+        assert gesehen_von_aussen(pfad) == 0
+
+        kunde_schreiben(datenbank, job_id, '2')
+        assert gesehen_von_aussen(pfad) == 3
+
+
+def test_festgeschrieben_wird_nach_der_zeit(tmp_path):
+    pfad = tmp_path / 'lauf.sqlite'
+    with Datenbank(pfad) as datenbank:
+        job_id = datenbank.job_anlegen('A', 'eingabe.csv')
+        datenbank.sammeln(kunden=100, millisekunden=50)
+
+        kunde_schreiben(datenbank, job_id, '1')
+        assert not datenbank.festschreiben_wenn_faellig()
+        assert gesehen_von_aussen(pfad) == 0
+
+        time.sleep(0.06)
+        assert datenbank.festschreiben_wenn_faellig()
+        assert gesehen_von_aussen(pfad) == 1
+
+
+def test_gescheiterter_kunde_nimmt_nur_sich_zurueck(tmp_path):
+    pfad = tmp_path / 'lauf.sqlite'
+    with Datenbank(pfad) as datenbank:
+        job_id = datenbank.job_anlegen('A', 'eingabe.csv')
+        datenbank.sammeln(kunden=10)
+        kunde_schreiben(datenbank, job_id, '1')
+
+        with pytest.raises(sqlite3.IntegrityError):
+            kunde_schreiben(datenbank, job_id, '1')
+        kunde_schreiben(datenbank, job_id, '2')
+        datenbank.festschreiben()
+
+        kunden = datenbank.kunden_lesen(job_id)
+        assert [k['kunden_nr'] for k in kunden] == ['1', '2']
+        assert datenbank.kandidaten_zaehlen(job_id) == 2
+
+
+def test_synchronous_ist_einstellbar(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite', synchronous='normal') as datenbank:
+        assert datenbank.verbindung.execute('PRAGMA synchronous').fetchone()[0] == 1
+    with pytest.raises(ValueError):
+        Datenbank(tmp_path / 'lauf.sqlite', synchronous='schnell')
+
+
+# ============================================================================
+# Im Lauf
+# ============================================================================
+
+def test_weniger_commits_und_dieselben_dateien(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    commits = {}
+    for name, sammeln in (('einzeln', 1), ('gesammelt', 50)):
+        with Datenbank(tmp_path / f'{name}.sqlite') as datenbank:
+            anweisungen = []
+            datenbank.verbindung.set_trace_callback(anweisungen.append)
+            ergebnis = Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank,
+                            sammel_kunden=sammeln).ausfuehren(
+                eingabe, str(tmp_path / name))
+            commits[name] = sum(a.strip().upper() == 'COMMIT' for a in anweisungen)
+        assert ergebnis['status'] == 'FERTIG'
+
+    # Zehn Kunden: zwanzig Commits einzeln, eine Handvoll gesammelt.
+    assert commits['einzeln'] >= 20
+    assert commits['gesammelt'] <= 6
+    for dateiname in OUTPUT_FILES.values():
+        assert ((tmp_path / 'gesammelt' / dateiname).read_bytes()
+                == (tmp_path / 'einzeln' / dateiname).read_bytes())
+
+
+def test_absturz_verliert_hoechstens_das_offene_fenster(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    pfad = tmp_path / 'lauf.sqlite'
+
+    class StuerztAb(Lauf):
+        verbucht = 0
+
+        def _einen_kunden(self, *args):
+            if self.verbucht == 7:
+                raise Absturz()
+            self.verbucht += 1
+            return super()._einen_kunden(*args)
+
+    datenbank = Datenbank(pfad)
+    with pytest.raises(Absturz):
+        StuerztAb(FakeProvider.aus_csv(str(FIXTURE)), datenbank, arbeiter=1,
+                  sammel_kunden=5).ausfuehren(eingabe, str(tmp_path / 'aus'))
+    # Kein Commit mehr: die Verbindung geht weg wie bei einem Absturz.
+    datenbank.verbindung.close()
+
+    assert gesehen_von_aussen(pfad) == 5
+    provider = ZaehlenderProvider()
+    with Datenbank(pfad) as datenbank:
+        job_id = datenbank.offener_job()['id']
+        # Die Anzeige darf hinterherhinken, massgebend ist die Tabelle kunde.
+        assert datenbank.job_lesen(job_id)['kunden_erledigt'] <= 5
+        ergebnis = Lauf(provider, datenbank, sammel_kunden=5).fortsetzen(
+            job_id, eingabe, str(tmp_path / 'aus'))
+        kunden = datenbank.kunden_lesen(job_id)
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert len(provider.texte) == 5
+    assert len(kunden) == 10
+
+    with Datenbank(tmp_path / 'ohne.sqlite') as datenbank:
+        Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank).ausfuehren(
+            eingabe, str(tmp_path / 'ohne'))
+    for dateiname in OUTPUT_FILES.values():
+        assert ((tmp_path / 'aus' / dateiname).read_bytes()
+                == (tmp_path / 'ohne' / dateiname).read_bytes())
@@ -0,0 +1,121 @@
+# test_scoring.py
+# The column-wise scorer in DataCleaner against the scores of the former
+# row-by-row loop. agent/testdaten/golden_scores.csv was written by that loop
+# (fuzz.ratio / fuzz.token_set_ratio one pair at a time) before it was
+# replaced; every score must come out bit-identical, otherwise the thresholds
+# of 03_ENTSCHEIDUNGEN.md B would silently shift.
+
+import random
+from pathlib import Path
+
+import pandas as pd
+from thefuzz import fuzz
+
+from data_cleaner import (OUTPUT_FILES, DataCleaner, leere_ablage,
+                          schreibe_ausgabedateien)
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+GOLDEN = REPO / 'agent' / 'testdaten' / 'golden_scores.csv'
+
+
+def lies(pfad) -> pd.DataFrame:
+    return pd.read_csv(pfad, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+
+
+def score_zeilenweise(cleaner: DataCleaner, search_string: str, title: str) -> float:
+    """Die frühere Rechnung für ein Paar, Schritt für Schritt."""
+    teil = search_string.split(',')[0].strip() if search_string else ''
+    suche = cleaner._strip_legal_suffixes(cleaner._normalize_text(teil))
+    erstes_suche = suche.split()[0] if suche.split() else ''
+    gewicht_erst, gewicht_ganz = cleaner._get_scoring_weights(erstes_suche)
+    titel = cleaner._strip_legal_suffixes(cleaner._normalize_text(str(title)))
+    erstes_titel = titel.split()[0] if titel.split() else ''
+    core = fuzz.ratio(erstes_suche, erstes_titel) if erstes_suche and erstes_titel else 0
+    full = fuzz.token_set_ratio(suche, titel)
+    return round(gewicht_erst * core + gewicht_ganz * full, 2)
+
+
+def test_scores_gleichen_der_golden_datei():
+    golden = lies(GOLDEN)
+    scores = DataCleaner()._scores_berechnen(golden['SearchString'], golden['title'])
+
+    assert [repr(s) for s in scores] == golden['score'].tolist()
+
+
+def test_scores_gleichen_den_einzelaufrufen_auch_bei_zufaelligen_texten():
+    zufall = random.Random(20)
+    zeichen = 'abcdeäöüéèàâßç AGgmbh-/.,&0123456789ÄÖÜ'
+    paare = [(''.join(zufall.choice(zeichen) for _ in range(zufall.randint(0, 25))),
+              ''.join(zufall.choice(zeichen) for _ in range(zufall.randint(0, 25))))
+             for _ in range(2000)]
+    cleaner = DataCleaner()
+
+    scores = cleaner._scores_berechnen([s for s, _ in paare], [t for _, t in paare])
+
+    assert scores == [score_zeilenweise(cleaner, s, t) for s, t in paare]
+
+
+def test_gruppe_und_ganze_datei_rechnen_gleich():
+    df = lies(FIXTURE)
+    cleaner = DataCleaner()
+    for _, gruppe in df.groupby('KundenNr', sort=False):
+        suche = gruppe.iloc[0]['SearchString']
+        je_kunde = cleaner._scores_berechnen([suche] * len(gruppe), gruppe['title'])
+        assert je_kunde == [score_zeilenweise(cleaner, suche, t) for t in gruppe['title']]
+        assert je_kunde == cleaner.scores_fuer(gruppe.to_dict('records'))
+
+
+def test_bereinigung_liefert_dieselben_dateien_wie_je_kunde(tmp_path):
+    cleaner = DataCleaner()
+    cleaner.clean_data(str(FIXTURE), str(tmp_path / 'datei'))
+
+    ablage = leere_ablage()
+    for kunden_nr, gruppe in lies(FIXTURE).groupby('KundenNr', sort=False):
+        for datei, zeilen in cleaner.entscheide_kunde(kunden_nr, gruppe).items():
+            ablage[datei].extend(zeilen)
+    schreibe_ausgabedateien(ablage, str(tmp_path / 'je_kunde'))
+
+    for dateiname in OUTPUT_FILES.values():
+        assert ((tmp_path / 'datei' / dateiname).read_bytes()
+                == (tmp_path / 'je_kunde' / dateiname).read_bytes())
+
+
+def test_suchbegriff_aus_der_ersten_zeile_mit_treffer(tmp_path):
+    """
+    Wie vor der spaltenweisen Rechnung: jeder Kandidat wird mit dem
+    SearchString der ersten Zeile verglichen, die einen Treffer trägt. Eine
+    leere erste Zeile mit anderem Suchbegriff zählt nicht — weder beim
+    Bereinigen der ganzen Datei noch je Kunde.
+    """
+    leer = {'SearchString': 'Volg Musterdorf, Dorfstrasse 1, 5620 Musterdorf',
+            'PLZ': '5620', 'Stadt': 'Musterdorf', 'KundenNr': '900501',
+            'title': '', 'address': '', 'street': '', 'postalCode': '',
+            'city': '', 'placeId': ''}
+    erster = {**leer, 'SearchString': 'Muster Laden, Hauptstrasse 1, 5620 Musterdorf',
+              'title': 'Muster Laden Musterdorf', 'street': 'Hauptstrasse 1',
+              'address': 'Hauptstrasse 1, 5620 Musterdorf', 'postalCode': '5620',
+              'city': 'Musterdorf', 'placeId': 'PLACE_501'}
+    zweiter = {**erster, 'title': 'Volg Musterdorf', 'street': 'Dorfstrasse 1',
+               'address': 'Dorfstrasse 1, 5620 Musterdorf', 'placeId': 'PLACE_502'}
+    zeilen = [leer, erster, zweiter]
+    quelle = tmp_path / 'eingabe.csv'
+    pd.DataFrame(zeilen).to_csv(quelle, sep=';', index=False, encoding='utf-8-sig')
+    cleaner = DataCleaner()
+
+    erwartet = {z['placeId']: score_zeilenweise(cleaner, erster['SearchString'], z['title'])
+                for z in (erster, zweiter)}
+    assert erwartet != {z['placeId']: score_zeilenweise(cleaner, leer['SearchString'],
+                                                        z['title'])
+                        for z in (erster, zweiter)}
+
+    dateien = cleaner.clean_data(str(quelle), str(tmp_path / 'datei'))
+    aus_der_datei = {z['placeId']: float(z['score'])
+                     for pfad in dateien.values() for _, z in lies(pfad).iterrows()
+                     if z['placeId']}
+    je_kunde = {z['placeId']: z['score']
+                for ausgabe in cleaner.entscheide_kunde('900501', zeilen).values()
+                for z in ausgabe if z.get('placeId')}
+
+    assert aus_der_datei == erwartet
+    assert je_kunde == erwartet
@@ -0,0 +1,181 @@
+# test_spaltenexport.py
+# The optional Parquet export (spaltenexport.py, `--spalten`): the same rows
+# as the CSV files in row groups, the full candidate history of a job, the
+# benchmark comparing both formats, and a clear message without pyarrow.
+# The pyarrow tests are skipped where pyarrow is not installed.
+# Nothing here touches the network.
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import cli
+import messlauf
+import spaltenexport
+from data_cleaner import OUTPUT_COLUMNS, OUTPUT_FILES, DataCleaner
+from db import Datenbank
+from fake_provider import FakeProvider
+from pipeline import Lauf
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+
+mit_pyarrow = pytest.mark.skipif(not spaltenexport.verfuegbar(),
+                                 reason='pyarrow ist nicht installiert')
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def eingabedatei_aus_fixture(tmp_path: Path) -> Path:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    df = df[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    ziel = tmp_path / 'eingabe.csv'
+    df.to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def ablagen_aus_fixture() -> list:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    cleaner = DataCleaner()
+    return [cleaner.entscheide_kunde(nr, gruppe)
+            for nr, gruppe in df.groupby('KundenNr', sort=False)]
+
+
+def lies_csv(pfad) -> pd.DataFrame:
+    return pd.read_csv(pfad, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+
+
+def lies_parquet(pfad) -> pd.DataFrame:
+    import pyarrow.parquet as pq
+    return pq.read_table(pfad).to_pandas()
+
+
+def lauf_mit_spalten(tmp_path: Path) -> tuple:
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank,
+                        spalten=True).ausfuehren(
+            eingabedatei_aus_fixture(tmp_path), str(tmp_path / 'aus'))
+        kandidaten = sum(len(liste) for liste in
+                         datenbank.kandidaten_des_jobs(ergebnis['job_id']).values())
+    return ergebnis, kandidaten
+
+
+# ============================================================================
+# Ohne pyarrow
+# ============================================================================
+
+def test_ohne_spalten_bleibt_alles_wie_es_war(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank).ausfuehren(
+            eingabedatei_aus_fixture(tmp_path), str(tmp_path / 'aus'))
+
+    assert ergebnis['spaltendateien'] is None
+    assert not list((tmp_path / 'aus').glob('*.parquet'))
+
+
+def test_ohne_pyarrow_meldet_der_lauf_was_fehlt(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(spaltenexport, 'verfuegbar', lambda: False)
+
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        with pytest.raises(ValueError) as fehler:
+            Lauf(FakeProvider({}), datenbank, spalten=True)
+    assert 'pip install pyarrow' in str(fehler.value)
+
+    code = cli.main(['lauf', str(eingabedatei_aus_fixture(tmp_path)), '--spalten',
+                     '--datenbank', str(tmp_path / 'cli.sqlite')])
+    assert code == 1
+    assert 'fehlt pyarrow' in capsys.readouterr().out
+
+
+def test_kandidaten_in_bloecken(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        ergebnis = Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank).ausfuehren(
+            eingabedatei_aus_fixture(tmp_path), str(tmp_path / 'aus'))
+        job_id = ergebnis['job_id']
+        bloecke = list(datenbank.kandidaten_bloecke(job_id, 3))
+        alle = [zeile['id'] for liste in datenbank.kandidaten_des_jobs(job_id).values()
+                for zeile in liste]
+
+    assert all(len(block) <= 3 for block in bloecke)
+    assert [zeile['id'] for block in bloecke for zeile in block] == alle
+    assert bloecke[0][0]['kunden_nr'].startswith('9')
+
+
+# ============================================================================
+# Mit pyarrow
+# ============================================================================
+
+@mit_pyarrow
+def test_dieselben_zeilen_wie_die_csv(tmp_path):
+    schreiber = spaltenexport.SpaltenAusgabeschreiber(
+        tmp_path / 'aus', zeilen_je_block=2, zeilen_je_gruppe=3)
+    for ablage in ablagen_aus_fixture():
+        schreiber.anhaengen(ablage)
+    dateien = schreiber.abschliessen()
+
+    for schluessel in OUTPUT_FILES:
+        csv = lies_csv(dateien[schluessel])
+        spalten = lies_parquet(schreiber.spaltendateien[schluessel])
+        assert list(spalten.columns) == OUTPUT_COLUMNS
+        assert len(spalten) == len(csv)
+        assert spalten['score'].dtype == 'float64'
+        ohne_score = [spalte for spalte in OUTPUT_COLUMNS if spalte != 'score']
+        pd.testing.assert_frame_equal(spalten[ohne_score], csv[ohne_score])
+        if len(csv):
+            assert spalten['score'].tolist() == csv['score'].astype(float).tolist()
+    assert not Path(str((tmp_path / 'aus').resolve()) + '.teil').exists()
+
+
+@mit_pyarrow
+def test_zeilengruppen_begrenzen_den_speicher(tmp_path):
+    import pyarrow.parquet as pq
+
+    schreiber = spaltenexport.SpaltenAusgabeschreiber(tmp_path / 'aus',
+                                                      zeilen_je_gruppe=2)
+    for ablage in ablagen_aus_fixture():
+        schreiber.anhaengen(ablage)
+    schreiber.abschliessen()
+
+    datei = pq.ParquetFile(schreiber.spaltendateien['aussortiert'])
+    assert datei.metadata.num_row_groups > 1
+    assert all(datei.metadata.row_group(n).num_rows <= 2 + 3
+               for n in range(datei.metadata.num_row_groups))
+
+
+@mit_pyarrow
+def test_verwerfen_hinterlaesst_keine_parquet(tmp_path):
+    schreiber = spaltenexport.SpaltenAusgabeschreiber(tmp_path / 'aus')
+    schreiber.anhaengen(ablagen_aus_fixture()[0])
+    schreiber.verwerfen()
+
+    assert not (tmp_path / 'aus').exists()
+    assert not list(tmp_path.glob('*.teil'))
+
+
+@mit_pyarrow
+def test_lauf_schreibt_alle_kandidaten(tmp_path):
+    ergebnis, anzahl = lauf_mit_spalten(tmp_path)
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert set(ergebnis['spaltendateien']) == set(OUTPUT_FILES) | {'kandidaten'}
+    kandidaten = lies_parquet(ergebnis['spaltendateien']['kandidaten'])
+    assert list(kandidaten.columns) == list(spaltenexport.KANDIDATEN_SPALTEN)
+    assert len(kandidaten) == anzahl
+    assert set(kandidaten['entscheid']) <= {'gewaehlt', 'abgelehnt', 'vorgeschlagen'}
+    assert kandidaten['kunden_nr'].str.startswith('9').all()
+
+
+@mit_pyarrow
+def test_messlauf_vergleicht_die_formate(tmp_path):
+    lauf = messlauf.messen(300, tmp_path, wartezeit='fest:0', spalten=True)
+
+    assert lauf['status'] == 'FERTIG'
+    formate = lauf['ausgabeformate']
+    assert set(formate) == {'csv', 'parquet'}
+    assert all(werte['kb'] > 0 and werte['schreiben_ms'] > 0
+               for werte in formate.values())
+    assert 'parquet' in messlauf.als_text(lauf)
@@ -0,0 +1,288 @@
+# test_stapelabfrage.py
+# Several customers share one Apify actor run (batched query).
+# Nothing here touches the network: Apify is replaced by a local stand-in
+# client that answers from the invented fixture.
+
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from apify_provider import ApifyProvider
+from data_cleaner import OUTPUT_FILES
+from db import Datenbank
+from fake_provider import FakeProvider
+from pipeline import AUSGEFALLENE_ABFRAGE_GRUND, Lauf
+from place_provider import (STAPEL_ZUSCHLAG_SEKUNDEN, QuelleNichtVerfuegbar,
+                            stapel_frist)
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+HAUPTDATEIEN = ('fertig_fuer_erp', 'zur_pruefung', 'nicht_moeglich')
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def lies(pfad) -> pd.DataFrame:
+    return pd.read_csv(pfad, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+
+
+def rohdaten_aus_fixture() -> dict:
+    """(SearchString, PLZ) → Treffer so, wie Apify sie liefert."""
+    antworten = {}
+    for _, zeile in lies(FIXTURE).iterrows():
+        schluessel = (zeile['SearchString'], zeile['PLZ'])
+        eintrag = {k: v for k, v in zeile.items()
+                   if k not in ('SearchString', 'PLZ', 'Stadt', 'KundenNr')}
+        antworten.setdefault(schluessel, [])
+        if eintrag['title']:
+            antworten[schluessel].append(eintrag)
+    return antworten
+
+
+def eingabe_mit_kopien(tmp_path: Path, kopien: int) -> Path:
+    """
+    Jeder Kunde der Fixture `kopien` Mal hintereinander, mit eigener KundenNr.
+    So gibt es mehrere Kunden je PLZ, ohne dass sich an Suchbegriff und
+    Treffern etwas ändert. Die Läufe damit legen gleiche Abfragen nicht
+    zusammen (`zusammenlegen=False`) — sonst bliebe nichts zu stapeln.
+    """
+    stamm = lies(FIXTURE)[['SearchString', 'PLZ', 'Stadt', 'KundenNr']]
+    stamm = stamm.drop_duplicates(subset=['KundenNr'])
+    zeilen = [{**zeile, 'KundenNr': f'{zeile["KundenNr"]}-{nummer}'}
+              for zeile in stamm.to_dict('records') for nummer in range(kopien)]
+    ziel = tmp_path / 'eingabe.csv'
+    pd.DataFrame(zeilen).to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+class ApifyStellvertreter:
+    """
+    Spielt den Apify-Client nach: actor().start, run().wait_for_finish,
+    dataset().iterate_items. Jeder Treffer trägt wie bei Apify den
+    Suchbegriff, aus dem er stammt.
+    """
+
+    def __init__(self, antworten: dict, status: str = 'SUCCEEDED'):
+        self.antworten = antworten
+        self.status = status
+        self.laeufe = []
+        self.fristen = []
+        self.zusatz = []
+        self._ergebnisse = {}
+        self._sperre = threading.Lock()
+
+    def actor(self, actor_id):
+        return self
+
+    def start(self, run_input, timeout_secs):
+        with self._sperre:
+            self.laeufe.append(list(run_input['searchStringsArray']))
+            self.fristen.append(timeout_secs)
+            nummer = len(self.laeufe) - 1
+        plz = run_input['postalCode']
+        treffer = [{**eintrag, 'searchString': text}
+                   for text in run_input['searchStringsArray']
+                   for eintrag in self.antworten.get((text, plz), [])]
+        self._ergebnisse[f'DS_{nummer}'] = treffer + self.zusatz
+        return {'id': f'LAUF_{nummer}'}
+
+    def run(self, lauf_id):
+        stellvertreter = self
+
+        class Lauf_:
+            def wait_for_finish(self, wait_secs=None):
+                return {'status': stellvertreter.status,
+                        'defaultDatasetId': lauf_id.replace('LAUF', 'DS')}
+
+            def abort(self):
+                pass
+
+        return Lauf_()
+
+    def dataset(self, datensatz_id):
+        treffer = self._ergebnisse[datensatz_id]
+
+        class Datensatz:
+            def iterate_items(self):
+                return iter(treffer)
+
+        return Datensatz()
+
+
+def apify_mit_stellvertreter(antworten: dict = None, **kwargs):
+    client = ApifyStellvertreter(antworten if antworten is not None
+                                 else rohdaten_aus_fixture(), **kwargs)
+    return ApifyProvider('token', 'actor', client=client), client
+
+
+# ============================================================================
+# Der Provider: ein Lauf, viele Suchbegriffe
+# ============================================================================
+
+def test_stapel_teilt_die_treffer_nach_suchbegriff():
+    antworten = {
+        ('Laden Eins', '5620'): [{'title': 'Laden Eins', 'placeId': 'P1'}],
+        ('Laden Zwei', '5620'): [{'title': 'Laden Zwei', 'placeId': 'P2'},
+                                 {'title': 'Laden Zwei Filiale', 'placeId': 'P3'}],
+    }
+    provider, client = apify_mit_stellvertreter(antworten)
+
+    ergebnis = provider.fetch_by_texts([('Laden Eins', '5620'),
+                                        ('Laden Zwei', '5620'),
+                                        ('Laden Drei', '5620'),
+                                        ('Laden Eins', '5620')])
+
+    assert [[k.place_id for k in t] for t in ergebnis] == [
+        ['P1'], ['P2', 'P3'], [], ['P1']]
+    # Ein Lauf, jeder Suchbegriff einmal.
+    assert client.laeufe == [['Laden Eins', 'Laden Zwei', 'Laden Drei']]
+
+
+def test_stapel_verlaengert_die_frist_je_suchbegriff():
+    provider, client = apify_mit_stellvertreter({})
+    provider.fetch_by_texts([('A', '5620'), ('B', '5620'), ('C', '5620')])
+    provider.fetch_by_text('A', '5620')
+
+    assert client.fristen == [180 + 2 * STAPEL_ZUSCHLAG_SEKUNDEN - 5, 175]
+    assert stapel_frist(180, 1) == 180
+
+
+def test_stapel_braucht_eine_einzige_plz():
+    provider, client = apify_mit_stellvertreter({})
+    with pytest.raises(ValueError, match='einzige PLZ'):
+        provider.fetch_by_texts([('A', '5620'), ('B', '8000')])
+    assert client.laeufe == []
+
+
+def test_treffer_mit_fremdem_suchbegriff_werden_verworfen():
+    provider, client = apify_mit_stellvertreter(
+        {('A', '5620'): [{'title': 'Laden A', 'placeId': 'PA'}]})
+    client.zusatz = [{'title': 'Irrläufer', 'placeId': 'PX', 'searchString': 'Z'}]
+
+    ergebnis = provider.fetch_by_texts([('A', '5620'), ('B', '5620')])
+
+    assert [[k.place_id for k in t] for t in ergebnis] == [['PA'], []]
+
+
+def test_einzelsuche_nimmt_treffer_ohne_suchbegriff_an():
+    """Ein Lauf mit nur einem Begriff braucht die Zuordnung nicht."""
+    provider, client = apify_mit_stellvertreter({})
+    client.zusatz = [{'title': 'Laden A', 'placeId': 'PA'}]
+
+    assert [k.place_id for k in provider.fetch_by_text('A', '5620')] == ['PA']
+
+
+def test_stapel_ohne_erfolgreichen_lauf_liefert_je_anfrage_nichts():
+    provider, _ = apify_mit_stellvertreter(status='TIMED-OUT')
+    assert provider.fetch_by_texts([('A', '5620'), ('B', '5620')]) == [[], []]
+
+
+# ============================================================================
+# Der Lauf: Stapel bilden, je Kunde schreiben
+# ============================================================================
+
+def test_lauf_mit_stapeln_ergibt_dieselben_dateien_wie_einzeln(tmp_path):
+    eingabe = eingabe_mit_kopien(tmp_path, kopien=3)
+
+    einzeln, client_einzeln = apify_mit_stellvertreter()
+    with Datenbank(tmp_path / 'einzeln.sqlite') as datenbank:
+        Lauf(einzeln, datenbank, zusammenlegen=False).ausfuehren(
+            eingabe, str(tmp_path / 'einzeln'))
+
+    gestapelt, client_stapel = apify_mit_stellvertreter()
+    with Datenbank(tmp_path / 'stapel.sqlite') as datenbank:
+        ergebnis = Lauf(gestapelt, datenbank, stapelgroesse=3,
+                        zusammenlegen=False).ausfuehren(
+            eingabe, str(tmp_path / 'stapel'))
+        assert datenbank.fortschritt_lesen(ergebnis['job_id'])['kunden_erledigt'] == 30
+        assert len(datenbank.kunden_lesen(ergebnis['job_id'])) == 30
+
+    assert ergebnis['status'] == 'FERTIG'
+    assert len(client_einzeln.laeufe) == 30
+    assert len(client_stapel.laeufe) == 10
+
+    for schluessel in HAUPTDATEIEN:
+        dateiname = OUTPUT_FILES[schluessel]
+        alt = (tmp_path / 'einzeln' / dateiname).read_text(encoding='utf-8-sig')
+        neu = (tmp_path / 'stapel' / dateiname).read_text(encoding='utf-8-sig')
+        assert neu == alt, f'{dateiname} unterscheidet sich mit Stapeln'
+
+
+def test_stapel_gruppiert_nach_plz_in_einem_fenster(tmp_path):
+    provider, _ = apify_mit_stellvertreter({})
+    with Datenbank(':memory:') as datenbank:
+        lauf = Lauf(provider, datenbank, stapelgroesse=2)
+        offen = [(str(nr), {'PLZ': plz}) for nr, plz in
+                 enumerate(['1000', '2000', '1000', '3000', '2000', '3000', '4000'])]
+        stapel = [[nr for nr, _ in s] for s in lauf._stapel_bilden(offen)]
+
+    assert stapel == [['0', '2'], ['1', '4'], ['3', '5'], ['6']]
+
+
+def test_ohne_stapelfaehigen_provider_bleibt_es_einzeln():
+    with Datenbank(':memory:') as datenbank:
+        lauf = Lauf(FakeProvider({}), datenbank, stapelgroesse=5)
+        offen = [('1', {'PLZ': '1000'}), ('2', {'PLZ': '1000'})]
+        assert list(lauf._stapel_bilden(offen)) == [[offen[0]], [offen[1]]]
+
+
+def test_ausgefallener_stapel_zaehlt_einmal(tmp_path):
+    """Der ganze Stapel ist ausgefallen — jeder Kunde sagt das, der Lauf zählt eins."""
+
+    class StapelOhneVerbindung:
+        def fetch_by_text(self, search_string, plz):
+            return []
+
+        def fetch_by_texts(self, anfragen):
+            raise QuelleNichtVerfuegbar('Keine Verbindung.', endgueltig=False)
+
+        def fetch_by_id(self, place_id):
+            return None
+
+    eingabe = eingabe_mit_kopien(tmp_path, kopien=3)
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        lauf = Lauf(StapelOhneVerbindung(), datenbank, stapelgroesse=3, arbeiter=1,
+                    zusammenlegen=False)
+        ergebnis = lauf.ausfuehren(eingabe, str(tmp_path / 'aus'))
+        kunden = datenbank.kunden_lesen(ergebnis['job_id'])
+
+    # Zehn Stapel, zehn Fehlschläge hintereinander — bei 30 Einzelabfragen
+    # wäre nach dem zehnten Kunden Schluss gewesen, hier erst beim letzten
+    # Stapel.
+    assert ergebnis['status'] == 'FEHLER'
+    assert len(kunden) == 27
+    assert all(k['grund'] == AUSGEFALLENE_ABFRAGE_GRUND for k in kunden)
+
+
+def test_fortsetzen_nach_abbruch_mitten_im_stapel(tmp_path):
+    eingabe = eingabe_mit_kopien(tmp_path, kopien=3)
+
+    class AbbruchNachZweiKunden(Lauf):
+        def _einen_kunden(self, job_id, kunden_nr, stamm, kandidaten):
+            ablage = super()._einen_kunden(job_id, kunden_nr, stamm, kandidaten)
+            if len(self.datenbank.kunden_lesen(job_id)) == 2:
+                self.abbruch.set()
+            return ablage
+
+    provider, client = apify_mit_stellvertreter()
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        erst = AbbruchNachZweiKunden(provider, datenbank, stapelgroesse=3, arbeiter=1,
+                                     zusammenlegen=False).ausfuehren(eingabe, str(tmp_path / 'aus'))
+        assert erst['status'] == 'ABGEBROCHEN'
+        assert len(datenbank.kunden_lesen(erst['job_id'])) == 2
+
+        weiter, client_weiter = apify_mit_stellvertreter()
+        zweit = Lauf(weiter, datenbank, stapelgroesse=3, zusammenlegen=False).fortsetzen(
+            erst['job_id'], eingabe, str(tmp_path / 'aus'))
+        kunden = datenbank.kunden_lesen(erst['job_id'])
+
+    assert zweit['status'] == 'FERTIG'
+    assert len(kunden) == 30
+    # Vom ersten Stapel wird nur der Kunde noch einmal gefragt, der nicht
+    # mehr geschrieben wurde; die zwei anderen stehen in der Datenbank.
+    gefragt = [text for lauf in client_weiter.laeufe for text in lauf]
+    assert len(gefragt) == 10
@@ -0,0 +1,167 @@
+# test_verbindungen.py
+# Opening the run database cheaply: the schema scripts only run when the
+# schema stand in the file is not the current one, readers get a per-thread
+# connection that stays open and cannot write, and the web interface answers
+# faster for it (timed only with LANGSAME_TESTS=1).
+# Nothing here touches the network.
+
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import db
+import webapp
+from db import Datenbank, lesend
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+def schema_anlegen_zaehlen(monkeypatch) -> list:
+    aufrufe = []
+    echt = Datenbank._schema_anlegen
+
+    def zaehlend(self):
+        aufrufe.append(self.pfad)
+        echt(self)
+
+    monkeypatch.setattr(Datenbank, '_schema_anlegen', zaehlend)
+    return aufrufe
+
+
+class WieBisher(Datenbank):
+    """Öffnet jedes Mal neu und legt jedes Mal das Schema an — wie vorher."""
+
+    def __init__(self, pfad, **_):
+        super().__init__(pfad)
+        self.verbindung.execute('PRAGMA user_version = 0')
+
+
+def in_eigenem_thread(aufruf):
+    ergebnis = []
+    faden = threading.Thread(target=lambda: ergebnis.append(aufruf()))
+    faden.start()
+    faden.join()
+    return ergebnis[0]
+
+
+# ============================================================================
+# Schema nur, wenn nötig
+# ============================================================================
+
+def test_schema_nur_beim_ersten_oeffnen(tmp_path, monkeypatch):
+    aufrufe = schema_anlegen_zaehlen(monkeypatch)
+
+    for _ in range(3):
+        with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+            assert datenbank.verbindung.execute(
+                'PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    assert len(aufrufe) == 1
+
+
+def test_aeltere_datei_bekommt_das_neue_schema(tmp_path, monkeypatch):
+    pfad = tmp_path / 'lauf.sqlite'
+    with Datenbank(pfad) as datenbank:
+        datenbank.verbindung.execute('DROP INDEX ix_kunde_pruefstand')
+        datenbank.verbindung.execute('PRAGMA user_version = 12345')
+    aufrufe = schema_anlegen_zaehlen(monkeypatch)
+
+    with Datenbank(pfad) as datenbank:
+        indizes = {z[0] for z in datenbank.verbindung.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        stand = datenbank.verbindung.execute('PRAGMA user_version').fetchone()[0]
+
+    assert len(aufrufe) == 1
+    assert 'ix_kunde_pruefstand' in indizes
+    assert stand == db.SCHEMA_STAND
+
+
+def test_lesende_verbindung_schreibt_nicht(tmp_path):
+    with Datenbank(tmp_path / 'lauf.sqlite', nur_lesen=True) as datenbank:
+        assert datenbank.job_lesen(1) is None
+        with pytest.raises(sqlite3.OperationalError):
+            datenbank.job_anlegen('A', 'eingabe.csv')
+
+
+# ============================================================================
+# Eine lesende Verbindung je Thread
+# ============================================================================
+
+def test_je_thread_eine_verbindung_die_offen_bleibt(tmp_path):
+    pfad = tmp_path / 'lauf.sqlite'
+
+    with lesend(pfad) as erste:
+        pass
+    with lesend(pfad) as zweite:
+        assert zweite is erste
+        assert zweite.job_lesen(1) is None
+
+    assert in_eigenem_thread(lambda: lesend(pfad)) is not erste
+
+
+def test_sieht_was_andere_inzwischen_schreiben(tmp_path):
+    pfad = tmp_path / 'lauf.sqlite'
+    leser = lesend(pfad)
+    assert leser.job_lesen(1) is None
+
+    with Datenbank(pfad) as schreiber:
+        job_id = schreiber.job_anlegen('A', 'eingabe.csv')
+        schreiber.fortschritt_setzen(job_id, 3)
+
+    assert lesend(pfad).job_lesen(job_id)['kunden_erledigt'] == 3
+
+
+def test_andere_oder_ersetzte_datei_oeffnet_neu(tmp_path):
+    erste = lesend(tmp_path / 'a.sqlite')
+    zweite = lesend(tmp_path / 'b.sqlite')
+    assert zweite is not erste
+    with pytest.raises(sqlite3.ProgrammingError):
+        erste.job_lesen(1)
+
+    for endung in ('', '-wal', '-shm'):
+        (tmp_path / f'b.sqlite{endung}').unlink(missing_ok=True)
+    with Datenbank(tmp_path / 'b.sqlite') as neu:
+        job_id = neu.job_anlegen('A', 'eingabe.csv')
+
+    assert lesend(tmp_path / 'b.sqlite').job_lesen(job_id)['dateiname'] == 'eingabe.csv'
+
+
+# ============================================================================
+# Vorher und nachher
+# ============================================================================
+
+@pytest.mark.skipif(not os.environ.get('LANGSAME_TESTS'),
+                    reason='Vergleicht Antwortzeiten, die mit der Last schwanken. '
+                           'Mit LANGSAME_TESTS=1 ausführen.')
+def test_statusanfrage_schneller_als_mit_neuer_verbindung(tmp_path, monkeypatch):
+    monkeypatch.setattr(webapp, 'DATENBANK', tmp_path / 'laeufe.sqlite')
+    with Datenbank(webapp.DATENBANK) as datenbank:
+        job_id = datenbank.job_anlegen('A', 'eingabe.csv', kunden_total=10)
+        datenbank.status_setzen(job_id, 'LAEUFT')
+
+    def messen(klient) -> tuple:
+        """(Millisekunden je Anfrage, je stand_lesen), jeweils der Median."""
+        anfragen, lesen = [], []
+        for _ in range(100):
+            start = time.perf_counter()
+            klient.get(f'/lauf/{job_id}/stand')
+            anfragen.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            webapp.stand_lesen(job_id)
+            lesen.append(time.perf_counter() - start)
+        return statistics.median(anfragen), statistics.median(lesen)
+
+    with TestClient(webapp.app) as klient:
+        nachher_anfrage, nachher_lesen = messen(klient)
+        monkeypatch.setattr(webapp, 'lesend', WieBisher)
+        vorher_anfrage, vorher_lesen = messen(klient)
+
+    assert nachher_lesen * 5 < vorher_lesen
+    assert nachher_anfrage < vorher_anfrage
@@ -0,0 +1,199 @@
+# test_wiederaufnahme.py
+# Resuming a crashed run: the stored candidates of all finished customers come
+# with one joined query, and with wiederaufnahme='uebernehmen' the output rows
+# are built straight from `kunde`/`kandidat` instead of deciding again. A
+# sample is still decided again; if it disagrees, everything is. The speed
+# comparison runs only with LANGSAME_TESTS=1.
+# Nothing here touches the network.
+
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from data_cleaner import OUTPUT_FILES
+from db import Datenbank
+from fake_provider import FakeProvider
+from pipeline import Lauf
+from place_provider import Candidate
+
+REPO = Path(__file__).parent
+FIXTURE = REPO / 'agent' / 'testdaten' / 'fixture_optimierte_daten.csv'
+HAUPTDATEIEN = ('fertig_fuer_erp', 'zur_pruefung', 'nicht_moeglich')
+
+
+# ============================================================================
+# Hilfen
+# ============================================================================
+
+class Absturz(BaseException):
+    """Wie ein abgeschossener Prozess: kein except Exception fängt ihn."""
+
+
+class StuerztAb(Lauf):
+    """Stürzt vor dem achten Kunden ab."""
+
+    verbucht = 0
+
+    def _einen_kunden(self, *args):
+        if self.verbucht == 7:
+            raise Absturz()
+        self.verbucht += 1
+        return super()._einen_kunden(*args)
+
+
+class VieleTrefferProvider:
+    """Vier Treffer je Suche, einer davon passt — genug Arbeit für die Fachlogik."""
+
+    def fetch_by_text(self, search_string, plz):
+        name = search_string.split(',')[0]
+        return [Candidate(title=name, street='Hauptstrasse 1', postal_code=plz),
+                Candidate(title=f'{name} Filiale', street='Hauptstrasse 1',
+                          postal_code=plz),
+                Candidate(title='Volg', street='Dorfstrasse 2', postal_code='8000'),
+                Candidate(title='Restaurant Löwen', street='Hauptstrasse 3',
+                          postal_code=plz)]
+
+    def fetch_by_id(self, place_id):
+        return None
+
+
+def eingabedatei_aus_fixture(tmp_path: Path) -> Path:
+    df = pd.read_csv(FIXTURE, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+    df = df[['SearchString', 'PLZ', 'Stadt', 'KundenNr']].drop_duplicates(
+        subset=['KundenNr'])
+    ziel = tmp_path / 'eingabe.csv'
+    df.to_csv(ziel, sep=';', index=False, encoding='utf-8-sig')
+    return ziel
+
+
+def abgestuerzt(tmp_path: Path, eingabe: Path) -> Path:
+    pfad = tmp_path / 'lauf.sqlite'
+    datenbank = Datenbank(pfad)
+    with pytest.raises(Absturz):
+        StuerztAb(FakeProvider.aus_csv(str(FIXTURE)), datenbank, arbeiter=1).ausfuehren(
+            eingabe, str(tmp_path / 'aus'))
+    datenbank.verbindung.close()
+    return pfad
+
+
+def fortsetzen(pfad: Path, eingabe: Path, ziel: Path, lauf_klasse=Lauf, **optionen):
+    """Setzt fort und zählt die Abfragen auf `kandidat` je Kunde."""
+    with Datenbank(pfad) as datenbank:
+        anweisungen = []
+        datenbank.verbindung.set_trace_callback(anweisungen.append)
+        job_id = datenbank.offener_job()['id']
+        ergebnis = lauf_klasse(FakeProvider.aus_csv(str(FIXTURE)), datenbank,
+                               **optionen).fortsetzen(job_id, eingabe, str(ziel))
+    assert ergebnis['status'] == 'FERTIG'
+    return sum('FROM kandidat WHERE kunde_id = ?' in a for a in anweisungen)
+
+
+def am_stueck(tmp_path: Path, eingabe: Path) -> Path:
+    with Datenbank(tmp_path / 'am_stueck.sqlite') as datenbank:
+        Lauf(FakeProvider.aus_csv(str(FIXTURE)), datenbank).ausfuehren(
+            eingabe, str(tmp_path / 'am_stueck'))
+    return tmp_path / 'am_stueck'
+
+
+def lies(pfad: Path) -> pd.DataFrame:
+    return pd.read_csv(pfad, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
+
+
+# ============================================================================
+# Herleiten und übernehmen
+# ============================================================================
+
+def test_herleiten_mit_einer_abfrage_fuer_alle(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    pfad = abgestuerzt(tmp_path, eingabe)
+
+    je_kunde = fortsetzen(pfad, eingabe, tmp_path / 'aus')
+
+    assert je_kunde == 0
+    referenz = am_stueck(tmp_path, eingabe)
+    for dateiname in OUTPUT_FILES.values():
+        assert ((tmp_path / 'aus' / dateiname).read_bytes()
+                == (referenz / dateiname).read_bytes())
+
+
+def test_uebernehmen_gibt_dieselben_hauptdateien(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    pfad = abgestuerzt(tmp_path, eingabe)
+
+    je_kunde = fortsetzen(pfad, eingabe, tmp_path / 'aus', wiederaufnahme='uebernehmen')
+
+    assert je_kunde == 0
+    referenz = am_stueck(tmp_path, eingabe)
+    for datei in HAUPTDATEIEN:
+        assert ((tmp_path / 'aus' / OUTPUT_FILES[datei]).read_bytes()
+                == (referenz / OUTPUT_FILES[datei]).read_bytes())
+
+    # Die Diagnosezeilen gibt es nur für die Kunden nach dem Absturz.
+    uebernommen = set(lies(eingabe)['KundenNr'][:7])
+    aussortiert = lies(tmp_path / 'aus' / OUTPUT_FILES['aussortiert'])
+    vollstaendig = lies(referenz / OUTPUT_FILES['aussortiert'])
+    assert not set(aussortiert['KundenNr']) & uebernommen
+    assert (aussortiert.to_dict('records')
+            == vollstaendig[~vollstaendig['KundenNr'].isin(uebernommen)].to_dict('records'))
+
+
+def test_abweichende_stichprobe_fuehrt_zum_herleiten(tmp_path):
+    eingabe = eingabedatei_aus_fixture(tmp_path)
+    pfad = abgestuerzt(tmp_path, eingabe)
+
+    class Abweichend(Lauf):
+        def _aus_datenbank(self, kunde, kandidaten_zeilen=None):
+            ablage = super()._aus_datenbank(kunde, kandidaten_zeilen)
+            for zeilen in ablage.values():
+                for zeile in zeilen:
+                    zeile['grund'] = 'neu hergeleitet'
+            return ablage
+
+    fortsetzen(pfad, eingabe, tmp_path / 'aus', lauf_klasse=Abweichend,
+               wiederaufnahme='uebernehmen', stichprobe=3)
+
+    erp = lies(tmp_path / 'aus' / OUTPUT_FILES['fertig_fuer_erp'])
+    uebernommen = erp[erp['KundenNr'].isin(lies(eingabe)['KundenNr'][:7])]
+    assert len(uebernommen) and set(uebernommen['grund']) == {'neu hergeleitet'}
+
+
+def test_unbekannte_art_der_wiederaufnahme():
+    with pytest.raises(ValueError):
+        Lauf(FakeProvider({}), None, wiederaufnahme='raten')
+
+
+# ============================================================================
+# Schneller
+# ============================================================================
+
+@pytest.mark.skipif(not os.environ.get('LANGSAME_TESTS'),
+                    reason='Zeitvergleich über 1500 Kunden, schwankt mit der Last. '
+                           'Mit LANGSAME_TESTS=1 ausführen.')
+def test_uebernehmen_mindestens_doppelt_so_schnell_wie_bisher(tmp_path):
+    eingabe = tmp_path / 'viele.csv'
+    pd.DataFrame([{'SearchString': f'Laden {n}, Hauptstrasse 1, 5620 Musterdorf',
+                   'PLZ': '5620', 'Stadt': 'Musterdorf', 'KundenNr': str(900000 + n)}
+                  for n in range(1500)]).to_csv(eingabe, sep=';', index=False,
+                                                encoding='utf-8-sig')
+    with Datenbank(tmp_path / 'lauf.sqlite') as datenbank:
+        lauf = Lauf(VieleTrefferProvider(), datenbank, sammel_kunden=500)
+        job_id = lauf.ausfuehren(eingabe, str(tmp_path / 'aus'))['job_id']
+        bereits = {k['kunden_nr']: k for k in datenbank.kunden_lesen(job_id)}
+
+        def messen(wiederherstellen) -> float:
+            start = time.perf_counter()
+            for kunde in bereits.values():
+                wiederherstellen(kunde)
+            return time.perf_counter() - start
+
+        # Bisher: eine Abfrage je Kunde und die ganze Fachlogik.
+        bisher = messen(lauf._aus_datenbank)
+        lauf.wiederaufnahme = 'uebernehmen'
+        start = time.perf_counter()
+        uebernehmen = lauf._wiederherstellung(job_id, bereits)
+        schnell = messen(uebernehmen) + time.perf_counter() - start
+
+    assert schnell * 2 < bisher
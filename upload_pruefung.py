@@ -32,6 +32,7 @@ from pathlib import Path
 import pandas as pd
 
 from data_cleaner import DataCleaner
+from eingabe import Eingabedatei, rohzeilen
 
 logger = logging.getLogger(__name__)
 
@@ -252,6 +253,9 @@ def pruefe_datei(pfad: str, modus: str = 'A') -> Pruefbericht:
     Strassenfeld, an dem etwas falsch sein könnte. Geprüft werden die
     Pflichtspalten und die Zeilenobergrenze.
 
+    Die Datei wird blockweise gelesen (eingabe.py): im Speicher liegen ein
+    Block, die Kundennummern und je Prüfung der erste Treffer.
+
     Wirft keine Ausnahme wegen des Inhalts — was nicht stimmt, steht im
     Bericht. Nur eine Datei, die sich gar nicht lesen lässt, führt zu einem
     Fehler beim Aufrufer.
@@ -262,82 +266,140 @@ def pruefe_datei(pfad: str, modus: str = 'A') -> Pruefbericht:
     quelle = Path(pfad)
     bericht = Pruefbericht(dateiname=quelle.name, modus=modus)
 
-    df = pd.read_csv(quelle, sep=';', encoding='utf-8-sig', dtype=str).fillna('')
-    rohzeilen = _rohzeilen(quelle)
+    eingabe = Eingabedatei(quelle)
+    inhaltlich = modus == 'A' and 'SearchString' in eingabe.spalten
+    treffer = ({art: _Treffer(trifft) for art, trifft in INHALTLICHE_PRUEFUNGEN.items()}
+               if inhaltlich else {})
+    kundennummern = set()
+
+    for block in eingabe.bloecke():
+        erste = eingabe.zeilen - len(block)
+        if 'KundenNr' in block.columns:
+            kundennummern.update(block['KundenNr'])
+        for eintrag in treffer.values():
+            eintrag.zaehlen(block, erste)
 
-    bericht.zeilen = len(df)
-    bericht.kunden = df['KundenNr'].nunique() if 'KundenNr' in df.columns else 0
+    bericht.zeilen = eingabe.zeilen
+    bericht.kunden = len(kundennummern)
+    rohzeilen = _rohzeilen(quelle, {1} | {t.zeilennummer for t in treffer.values()
+                                          if t.anzahl})
 
-    _pruefe_zeilenzahl(df, bericht)
-    _pruefe_pflichtspalten(df, rohzeilen, bericht)
+    _pruefe_zeilenzahl(bericht)
+    _pruefe_pflichtspalten(eingabe.spalten, rohzeilen, bericht)
 
-    if modus == 'A' and 'SearchString' in df.columns:
-        _pruefe_unvollstaendige_suchbegriffe(df, rohzeilen, bericht)
-        _pruefe_kostenstellen(df, rohzeilen, bericht)
-        _pruefe_kategorietitel(df, rohzeilen, bericht)
+    if inhaltlich:
+        _pruefe_unvollstaendige_suchbegriffe(treffer['unvollstaendig'], rohzeilen, bericht)
+        _pruefe_kostenstellen(treffer['kostenstelle'], rohzeilen, bericht)
+        _pruefe_kategorietitel(treffer['kategorietitel'], rohzeilen, bericht)
 
     logger.info(f'Prüfung {quelle.name}: {len(bericht.befunde)} Befunde, '
                 f'Start möglich: {bericht.start_moeglich}')
     return bericht
 
 
-def _rohzeilen(quelle: Path) -> list:
+# Je Prüfung: trifft sie auf diesen Suchbegriff zu?
+INHALTLICHE_PRUEFUNGEN = {
+    'unvollstaendig': ist_unvollstaendig,
+    'kostenstelle': lambda wert: (not ist_unvollstaendig(wert)
+                                  and ist_kostenstelle(strassenteil(wert))),
+    'kategorietitel': lambda wert: ist_kategorietitel(titelteil(wert)),
+}
+
+
+class _Treffer:
+    """Wie viele Zeilen eine Prüfung trifft, und welche als erste."""
+
+    def __init__(self, trifft):
+        self.trifft = trifft
+        self.anzahl = 0
+        self.index = None
+        self.tabellenzeile = ''
+
+    @property
+    def zeilennummer(self) -> int:
+        """
+        Die Nummer der ersten Trefferzeile in der Datei.
+
+        Zeile 1 ist die Kopfzeile, der erste Datensatz steht also auf Zeile 2 —
+        dieselbe Zählung wie in Excel.
+        """
+        return self.index + 2
+
+    def zaehlen(self, block: pd.DataFrame, erste: int) -> None:
+        for i, wert in enumerate(block['SearchString']):
+            if not self.trifft(wert):
+                continue
+            if self.index is None:
+                self.index = erste + i
+                self.tabellenzeile = ';'.join(str(w) for w in block.iloc[i].tolist())
+            self.anzahl += 1
+
+
+@dataclass
+class _Rohzeilen:
+    """Wie viele Textzeilen die Datei hat, und die wenigen, die gebraucht werden."""
+
+    anzahl: int = 0
+    text: dict = field(default_factory=dict)
+
+
+def _rohzeilen(quelle: Path, nummern: set) -> _Rohzeilen:
     """
     Die Datei so, wie sie geschrieben wurde — für die Beispielzeile im Bericht.
 
     Der Nutzer sucht die Zeile in Excel; er soll dort genau das sehen, was im
     Bericht steht. Passt die Zeilenzahl nicht zur Tabelle (mehrzeilige Felder),
-    wird die Beispielzeile aus der Tabelle zusammengesetzt.
+    wird die Beispielzeile aus der Tabelle zusammengesetzt. Behalten werden
+    nur die Zeilen mit den gewünschten Nummern, gezählt werden alle.
     """
+    ergebnis = _Rohzeilen()
     try:
-        return quelle.read_text(encoding='utf-8-sig').splitlines()
+        for nummer, zeile in enumerate(rohzeilen(quelle), start=1):
+            if nummer in nummern:
+                ergebnis.text[nummer] = zeile
+            ergebnis.anzahl = nummer
     except Exception as fehler:
         logger.warning(f'Rohzeilen von {quelle.name} nicht lesbar: {fehler}')
-        return []
-
+        return _Rohzeilen()
+    return ergebnis
 
-def _beispiel(df: pd.DataFrame, rohzeilen: list, index: int) -> tuple:
-    """
-    Beispielzeile und ihre Nummer in der Datei.
 
-    Zeile 1 ist die Kopfzeile, der erste Datensatz steht also auf Zeile 2 —
-    dieselbe Zählung wie in Excel.
-    """
-    zeilennummer = index + 2
-    passend = len(rohzeilen) == len(df) + 1
-    if passend and 0 <= zeilennummer - 1 < len(rohzeilen):
-        return rohzeilen[zeilennummer - 1].strip(), zeilennummer
-    return ';'.join(str(wert) for wert in df.iloc[index].tolist()), zeilennummer
+def _beispiel(treffer: _Treffer, rohzeilen: _Rohzeilen, zeilen: int) -> tuple:
+    """Beispielzeile und ihre Nummer in der Datei."""
+    nummer = treffer.zeilennummer
+    if rohzeilen.anzahl == zeilen + 1 and nummer in rohzeilen.text:
+        return rohzeilen.text[nummer].strip(), nummer
+    return treffer.tabellenzeile, nummer
 
 
-def _pruefe_zeilenzahl(df: pd.DataFrame, bericht: Pruefbericht) -> None:
-    if len(df) <= MAX_ZEILEN:
+def _pruefe_zeilenzahl(bericht: Pruefbericht) -> None:
+    if bericht.zeilen <= MAX_ZEILEN:
         return
     bericht.befunde.append(Befund(
-        art='zeilenzahl', schwere=ABWEISUNG, anzahl=len(df),
-        meldung=(f'Die Datei hat {zahl(len(df))} Zeilen. Erlaubt sind höchstens '
+        art='zeilenzahl', schwere=ABWEISUNG, anzahl=bericht.zeilen,
+        meldung=(f'Die Datei hat {zahl(bericht.zeilen)} Zeilen. Erlaubt sind höchstens '
                  f'{zahl(MAX_ZEILEN)}. Bitte die Datei aufteilen und die Teile '
                  f'nacheinander laufen lassen.')))
 
 
-def _pruefe_pflichtspalten(df: pd.DataFrame, rohzeilen: list,
+def _pruefe_pflichtspalten(spalten: list, rohzeilen: _Rohzeilen,
                            bericht: Pruefbericht) -> None:
     fehlend = [spalte for spalte in PFLICHTSPALTEN_JE_MODUS[bericht.modus]
-               if spalte not in df.columns]
+               if spalte not in spalten]
     if not fehlend:
         return
 
     welche = ', '.join(f'«{spalte}»' for spalte in fehlend)
-    kopfzeile = rohzeilen[0].strip() if rohzeilen else ''
+    kopfzeile = rohzeilen.text.get(1, '').strip()
     bericht.befunde.append(Befund(
-        art='pflichtspalten', schwere=ABWEISUNG, anzahl=len(df),
+        art='pflichtspalten', schwere=ABWEISUNG, anzahl=bericht.zeilen,
         meldung=(f'In der Datei fehlt die Spalte {welche}. '
                  f'Die erste Zeile muss so aussehen: '
                  f'{KOPFZEILE_JE_MODUS[bericht.modus]}'),
         beispiel_zeile=kopfzeile, zeilennummer=1))
 
 
-def _pruefe_unvollstaendige_suchbegriffe(df: pd.DataFrame, rohzeilen: list,
+def _pruefe_unvollstaendige_suchbegriffe(treffer: _Treffer, rohzeilen: _Rohzeilen,
                                          bericht: Pruefbericht) -> None:
     """
     Zeilen, deren Suchbegriff nicht aus drei Teilen besteht.
@@ -353,24 +415,22 @@ def _pruefe_unvollstaendige_suchbegriffe(df: pd.DataFrame, rohzeilen: list,
     Prüfungen und aus demselben Grund: Der Nutzer entscheidet, ob er die Zeilen
     zuerst korrigiert oder den Lauf trotzdem startet.
     """
-    treffer = [i for i, wert in enumerate(df['SearchString'])
-               if ist_unvollstaendig(wert)]
-    if not treffer:
+    if not treffer.anzahl:
         return
 
-    beispiel, nummer = _beispiel(df, rohzeilen, treffer[0])
+    beispiel, nummer = _beispiel(treffer, rohzeilen, bericht.zeilen)
     # «1 Zeile hat», nicht «1 Zeilen haben» — der Satz steht in der Oberfläche.
-    betroffene = ('1 Zeile hat' if len(treffer) == 1
-                  else f'{zahl(len(treffer))} Zeilen haben')
+    betroffene = ('1 Zeile hat' if treffer.anzahl == 1
+                  else f'{zahl(treffer.anzahl)} Zeilen haben')
     bericht.befunde.append(Befund(
-        art='unvollstaendig', schwere=HINWEIS, anzahl=len(treffer),
+        art='unvollstaendig', schwere=HINWEIS, anzahl=treffer.anzahl,
         meldung=(f'{betroffene} keinen vollständigen Suchbegriff. Erwartet '
                  f'werden drei durch Komma getrennte Teile: Name, Strasse mit '
                  f'Hausnummer, PLZ mit Ort.'),
         beispiel_zeile=beispiel, zeilennummer=nummer))
 
 
-def _pruefe_kostenstellen(df: pd.DataFrame, rohzeilen: list,
+def _pruefe_kostenstellen(treffer: _Treffer, rohzeilen: _Rohzeilen,
                           bericht: Pruefbericht) -> None:
     """
     Zeilen, in deren Strassenfeld keine Strasse steht.
@@ -383,34 +443,30 @@ def _pruefe_kostenstellen(df: pd.DataFrame, rohzeilen: list,
     `Emil Frey AG, KST 715611 0, 5745 Safenwil` bleibt hier: Der Suchbegriff
     ist vollständig, nur sein Inhalt taugt nicht.
     """
-    treffer = [i for i, wert in enumerate(df['SearchString'])
-               if not ist_unvollstaendig(wert) and ist_kostenstelle(strassenteil(wert))]
-    if not treffer:
+    if not treffer.anzahl:
         return
 
-    beispiel, nummer = _beispiel(df, rohzeilen, treffer[0])
-    betroffene = ('1 Zeile hat' if len(treffer) == 1
-                  else f'{zahl(len(treffer))} Zeilen haben')
+    beispiel, nummer = _beispiel(treffer, rohzeilen, bericht.zeilen)
+    betroffene = ('1 Zeile hat' if treffer.anzahl == 1
+                  else f'{zahl(treffer.anzahl)} Zeilen haben')
     bericht.befunde.append(Befund(
-        art='kostenstelle', schwere=HINWEIS, anzahl=len(treffer),
+        art='kostenstelle', schwere=HINWEIS, anzahl=treffer.anzahl,
         meldung=(f'{betroffene} im Strassenfeld keinen Strassennamen, sondern '
                  f'zum Beispiel eine Kostenstelle. Ohne Strasse findet die '
                  f'Suche die Adresse nicht.'),
         beispiel_zeile=beispiel, zeilennummer=nummer))
 
 
-def _pruefe_kategorietitel(df: pd.DataFrame, rohzeilen: list,
+def _pruefe_kategorietitel(treffer: _Treffer, rohzeilen: _Rohzeilen,
                            bericht: Pruefbericht) -> None:
-    treffer = [i for i, wert in enumerate(df['SearchString'])
-               if ist_kategorietitel(titelteil(wert))]
-    if not treffer:
+    if not treffer.anzahl:
         return
 
-    beispiel, nummer = _beispiel(df, rohzeilen, treffer[0])
-    betroffene = ('1 Zeile trägt' if len(treffer) == 1
-                  else f'{zahl(len(treffer))} Zeilen tragen')
+    beispiel, nummer = _beispiel(treffer, rohzeilen, bericht.zeilen)
+    betroffene = ('1 Zeile trägt' if treffer.anzahl == 1
+                  else f'{zahl(treffer.anzahl)} Zeilen tragen')
     bericht.befunde.append(Befund(
-        art='kategorietitel', schwere=HINWEIS, anzahl=len(treffer),
+        art='kategorietitel', schwere=HINWEIS, anzahl=treffer.anzahl,
         meldung=(f'{betroffene} als Namen nur eine Branche statt eines '
                  f'Firmennamens. Die Suche findet dann viele gleich gute '
                  f'Treffer und kann nicht entscheiden.'),
@@ -12,29 +12,39 @@
 #     Restzeit, die aus den bereits verarbeiteten Kunden gerechnet ist.
 #   - „Wir schicken eine Mail" — Mailversand kommt in Phase 7.
 #
-# Ein Nutzer, ein Auftrag. Zustand steht in der Datenbank, nicht im Speicher:
+# Jeder Start reiht einen Auftrag ein; ein Planer (worker.py) lässt mehrere
+# nebeneinander laufen. Zustand steht in der Datenbank, nicht im Speicher:
 # Wer das Fenster schliesst und später wiederkommt, sieht denselben Stand.
 
 import argparse
+import asyncio
 import logging
 import os
 import shutil
 import sys
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
 import uvicorn
 from fastapi import FastAPI, Form, Request, UploadFile
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import (FileResponse, HTMLResponse, RedirectResponse, Response,
+                               StreamingResponse)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
+import antwort_cache
+import drosselung
+import ereignisse
+import kennzahlen
 import pruefmaske
 from data_cleaner import OUTPUT_FILES
-from db import Datenbank
+from db import Datenbank, lesend
 from fake_provider import FakeProvider
 from upload_pruefung import pruefe_datei, zahl
-from worker import LaeuftBereits, Worker, offener_lauf
+from worker import ENDZUSTAENDE, Planer, offener_lauf
 
 WURZEL = Path(__file__).resolve().parent
 LAUFDATEN = WURZEL / 'laufdaten'
@@ -49,19 +59,33 @@ app.mount('/static', StaticFiles(directory=WURZEL / 'static'), name='static')
 vorlagen = Jinja2Templates(directory=WURZEL / 'templates')
 vorlagen.env.globals['zahl'] = zahl
 
-# Ein Nutzer, ein Auftrag (03_ENTSCHEIDUNGEN.md C).
 zustand = {
-    'worker': None,       # der laufende Worker
+    'planer': None,       # arbeitet die Aufträge ab (s. beim_starten)
     'hochgeladen': None,  # Pfad der zuletzt geprüften Datei
     'modus': 'A',         # A = Erstanreicherung, B = Auffrischen über die Id
     'email': '',          # Adresse für die Benachrichtigung, freiwillig
     'kunden': 0,          # Kundenzahl aus der Prüfung, für die erste Anzeige
     'provider': None,     # wird beim Start gesetzt
+    # Der Zwischenspeicher vor Apify, einer für alle Läufe (s. beim_starten).
+    'antwortspeicher': None,
     # Nur der echte Serverbetrieb beendet den Prozess hart (s. beim_beenden).
     # Im Test würde das die Testsuite mitnehmen.
     'harter_stopp': False,
 }
 
+# Der Strom der Statusanzeige (/lauf/{job_id}/strom). Er schickt den Stand,
+# sobald der Lauf eine Änderung meldet (ereignisse.py), aber nicht öfter als
+# alle STROM_ABSTAND Sekunden — bei schnellen Läufen sieht ohnehin niemand
+# jede Zahl. Kommt STROM_HERZSCHLAG Sekunden lang keine Meldung, wird der
+# Stand trotzdem gelesen: ein Lauf aus cli.py meldet nichts in diesen Prozess.
+STROM_ABSTAND = 0.5
+STROM_HERZSCHLAG = 15.0
+
+# Zuletzt gelesener Stand je Job: (Zähler des Busses, Zeitpunkt, Ausschnitt,
+# fertig). Alle offenen Tabs teilen ihn.
+_strom_staende = {}
+_strom_sperre = threading.Lock()
+
 # Beschriftungen der drei Ausgabedateien (02_DATENVERTRAG.md §2).
 # Die Prüf- und Fehlerfälle entstehen in den beiden Modi aus verschiedenen
 # Gründen — der Text sagt deshalb je Modus etwas anderes.
@@ -149,7 +173,7 @@ def restzeit_schaetzen(job: dict) -> str:
 
 def stand_lesen(job_id: int) -> dict:
     """Alles, was die Statusanzeige braucht — frisch aus der Datenbank."""
-    with Datenbank(DATENBANK) as datenbank:
+    with lesend(DATENBANK) as datenbank:
         job = datenbank.job_lesen(job_id)
         if not job:
             return None
@@ -158,12 +182,13 @@ def stand_lesen(job_id: int) -> dict:
 
     total = job['kunden_total'] or 0
     erledigt = job['kunden_erledigt'] or 0
-    laeuft = job['status'] == 'LAEUFT'
+    # Ein eingereihter Auftrag steht auf NEU, bis der Planer ihn startet.
+    wartet = job['status'] in ('NEU', 'VALIDIERT')
 
     ueberschriften = {
         'LAEUFT': 'Läuft', 'FERTIG': 'Fertig',
         'ABGEBROCHEN': 'Abgebrochen', 'FEHLER': 'Gestoppt',
-        'NEU': 'Bereit', 'VALIDIERT': 'Bereit',
+        'NEU': 'Wartet', 'VALIDIERT': 'Wartet',
     }
     abschluss = {
         'FERTIG': 'Der Lauf ist durch. Die drei Dateien liegen bereit.',
@@ -175,14 +200,15 @@ def stand_lesen(job_id: int) -> dict:
 
     return {
         'status': job['status'],
-        'fertig': not laeuft,
+        'fertig': job['status'] in ENDZUSTAENDE,
         'ueberschrift': ueberschriften.get(job['status'], job['status']),
         'abschlusstext': abschluss.get(job['status'], ''),
         'weiter_zu': f'/ergebnis/{job_id}',
         'erledigt': erledigt,
         'total': total,
         'prozent': round(100 * erledigt / total) if total else 0,
-        'restzeit': restzeit_schaetzen(job),
+        'restzeit': ('Der Auftrag beginnt, sobald ein anderer fertig ist.'
+                     if wartet else restzeit_schaetzen(job)),
         'fertig_anzahl': gezaehlt['fertig'],
         'pruefung_anzahl': gezaehlt['pruefung'],
         'nicht_moeglich_anzahl': gezaehlt['nicht_moeglich'],
@@ -200,14 +226,25 @@ def provider_holen(modus: str = 'A'):
     feste Antwortdatei eingerichtet, gilt sie für beide Modi — damit lässt sich
     die Oberfläche vollständig bedienen, ohne Kontingent zu verbrauchen und
     ohne Netz.
+
+    Vor Apify liegt der Zwischenspeicher (antwort_cache.py). Vor Google nicht:
+    Auffrischen soll den heutigen Stand holen, nicht den gespeicherten. Beide
+    Quellen laufen durch die Drosselung (drosselung.py), der Zwischenspeicher
+    davor — was er beantwortet, kostet nichts.
     """
     if zustand['provider'] is not None:
         return zustand['provider']
     if modus == 'B':
         import google_provider
-        return google_provider.aus_konfiguration()
+        return drosselung.davorlegen(
+            google_provider.aus_konfiguration(), DATENBANK, 'google',
+            drosselung.monatsbudget_aus_konfiguration('google'))
     import apify_provider
-    return apify_provider.aus_konfiguration()
+    gedrosselt = drosselung.davorlegen(
+        apify_provider.aus_konfiguration(), DATENBANK, 'apify',
+        drosselung.monatsbudget_aus_konfiguration('apify'))
+    return antwort_cache.davorlegen(gedrosselt, DATENBANK, 'apify',
+                                    speicher=zustand['antwortspeicher'])
 
 
 # ==========================================================================
@@ -216,11 +253,12 @@ def provider_holen(modus: str = 'A'):
 
 @app.get('/', response_class=HTMLResponse)
 def art_waehlen(request: Request):
-    worker = zustand['worker']
-    if worker and worker.laeuft:
-        return RedirectResponse(f'/lauf/{worker.job_id}', status_code=303)
-
-    return seite(request, 'art_waehlen.html', 'art', offener_lauf=offener_lauf(DATENBANK))
+    with lesend(DATENBANK) as datenbank:
+        auftraege = [datenbank.job_lesen(auftrag['job_id'])
+                     for auftrag in datenbank.warteschlange_lesen()]
+    return seite(request, 'art_waehlen.html', 'art', offener_lauf=offener_lauf(DATENBANK),
+                 auftraege=[job for job in auftraege
+                            if job and job['status'] not in ENDZUSTAENDE])
 
 
 # ==========================================================================
@@ -285,17 +323,11 @@ def lauf_starten(request: Request, email: str = Form('')):
         return fehlerseite(request, 'Die Datei ist nicht mehr da',
                            'Bitte die Datei noch einmal hochladen.')
 
-    worker = Worker(provider_holen(zustand['modus']), DATENBANK,
-                    modus=zustand['modus'])
-    try:
-        job_id = worker.starten(quelle, email=zustand['email'] or None,
-                                kunden_total=zustand['kunden'])
-    except LaeuftBereits as hinweis:
-        return fehlerseite(request, 'Es läuft bereits ein Auftrag', str(hinweis),
-                           'Bitte den laufenden Auftrag abwarten oder abbrechen.',
-                           code=409)
-
-    zustand['worker'] = worker
+    # Läuft schon einer, wartet dieser in der Warteschlange — je Quelle:
+    # ein Auffrischen startet neben einer Erstanreicherung sofort.
+    job_id = zustand['planer'].einreihen(quelle, zustand['modus'],
+                                         email=zustand['email'] or None,
+                                         kunden_total=zustand['kunden'])
     return RedirectResponse(f'/lauf/{job_id}', status_code=303)
 
 
@@ -313,16 +345,7 @@ def lauf_fortsetzen(request: Request):
             f'Sie liegt nicht mehr im Ordner der hochgeladenen Dateien.',
             'Bitte dieselbe Datei erneut hochladen und einen neuen Lauf starten.')
 
-    worker = Worker(provider_holen(offen['modus']), DATENBANK,
-                    modus=offen['modus'])
-    try:
-        worker.fortsetzen(offen['id'], quelle)
-    except LaeuftBereits as hinweis:
-        return fehlerseite(request, 'Es läuft bereits ein Auftrag', str(hinweis),
-                           'Bitte den laufenden Auftrag abwarten oder abbrechen.',
-                           code=409)
-
-    zustand['worker'] = worker
+    zustand['planer'].einreihen(quelle, offen['modus'], job_id=offen['id'])
     return RedirectResponse(f'/lauf/{offen["id"]}', status_code=303)
 
 
@@ -343,7 +366,11 @@ def lauf_zeigen(request: Request, job_id: int):
 
 @app.get('/lauf/{job_id}/stand', response_class=HTMLResponse)
 def lauf_stand(request: Request, job_id: int):
-    """Wird alle 5 Sekunden nachgeladen — nur dieser Ausschnitt, nicht die Seite."""
+    """
+    Wird alle 5 Sekunden nachgeladen — nur dieser Ausschnitt, nicht die Seite.
+    Mit EventSource kommt der Stand über /lauf/{job_id}/strom, und hierher
+    fragt nur noch ein Browser ohne.
+    """
     stand = stand_lesen(job_id)
     if not stand:
         return Response(status_code=404)
@@ -356,12 +383,85 @@ def lauf_stand(request: Request, job_id: int):
     return antwort
 
 
+def stand_fuer_strom(job_id: int) -> tuple:
+    """
+    (Zähler, Ausschnitt, fertig) für den Strom. Gelesen wird höchstens alle
+    STROM_ABSTAND Sekunden, egal wie viele Tabs offen sind — und auch dann
+    nur, wenn der Lauf seit dem letzten Lesen etwas gemeldet hat oder der
+    Herzschlag fällig ist.
+
+    Die Sperre ist Absicht: Wachen zehn Tabs auf dieselbe Meldung hin auf,
+    liest der erste, und die übrigen bekommen seinen Ausschnitt. Geliefert
+    wird der Zähler von vor dem Lesen; wer einen älteren Ausschnitt bekommt,
+    wartet also nicht, sondern fragt nach dem Abstand gleich wieder.
+    """
+    with _strom_sperre:
+        zaehler = ereignisse.BUS.stand(job_id)
+        zuletzt = _strom_staende.get(job_id)
+        if zuletzt:
+            alter = time.monotonic() - zuletzt[1]
+            if alter < STROM_ABSTAND or (zuletzt[0] == zaehler
+                                         and alter < STROM_HERZSCHLAG):
+                return zuletzt[0], zuletzt[2], zuletzt[3]
+
+        stand = stand_lesen(job_id)
+        if not stand:
+            _strom_staende.pop(job_id, None)
+            return None
+        ausschnitt = vorlagen.get_template('lauf_stand.html').render(
+            job_id=job_id, stand=stand, strom=True)
+        _strom_staende[job_id] = (zaehler, time.monotonic(), ausschnitt, stand['fertig'])
+        return zaehler, ausschnitt, stand['fertig']
+
+
+def sse(ereignis: str, daten: str) -> str:
+    """Eine Nachricht im Format text/event-stream; jede Zeile ein eigenes data:."""
+    zeilen = ''.join(f'data: {zeile}\n' for zeile in daten.splitlines() or [''])
+    return f'event: {ereignis}\n{zeilen}\n'
+
+
+@app.get('/lauf/{job_id}/strom')
+async def lauf_strom(request: Request, job_id: int):
+    """
+    Der Stand als Server-Sent Events — statt dass jeder Tab alle 5 Sekunden
+    fragt. `stand` trägt den Ausschnitt wie /lauf/{job_id}/stand, nur ohne
+    die Anweisung zum Nachladen; `ende` die Adresse der Ergebnisseite.
+    """
+    erster = await run_in_threadpool(stand_fuer_strom, job_id)
+    if not erster:
+        return Response(status_code=404)
+
+    async def senden():
+        zaehler, ausschnitt, fertig = erster
+        gesendet = None
+        while not fertig:
+            if ausschnitt != gesendet:
+                yield sse('stand', ausschnitt)
+                gesendet = ausschnitt
+            await asyncio.sleep(STROM_ABSTAND)
+            neu = await ereignisse.BUS.abwarten(job_id, zaehler, STROM_HERZSCHLAG)
+            if neu == zaehler:
+                if await request.is_disconnected():
+                    return
+                # Ein Kommentar hält die Verbindung durch Proxys hindurch offen.
+                yield ': noch da\n\n'
+            gelesen = await run_in_threadpool(stand_fuer_strom, job_id)
+            if not gelesen:
+                return
+            zaehler, ausschnitt, fertig = gelesen
+        yield sse('ende', f'/ergebnis/{job_id}')
+
+    return StreamingResponse(senden(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache',
+                                      'X-Accel-Buffering': 'no'})
+
+
 @app.post('/lauf/{job_id}/abbrechen')
 def lauf_abbrechen(job_id: int):
-    worker = zustand['worker']
-    if worker and worker.job_id == job_id:
-        worker.abbrechen()
-        worker.warten(timeout=10)
+    with lesend(DATENBANK) as datenbank:
+        job = datenbank.job_lesen(job_id)
+    if job and job['status'] not in ENDZUSTAENDE:
+        zustand['planer'].abbrechen(job_id, timeout=10)
     return RedirectResponse(f'/ergebnis/{job_id}', status_code=303)
 
 
@@ -371,7 +471,7 @@ def lauf_abbrechen(job_id: int):
 
 @app.get('/ergebnis/{job_id}', response_class=HTMLResponse)
 def ergebnis_zeigen(request: Request, job_id: int):
-    with Datenbank(DATENBANK) as datenbank:
+    with lesend(DATENBANK) as datenbank:
         job = datenbank.job_lesen(job_id)
         gezaehlt = datenbank.ergebnis_zaehlen(job_id) if job else {}
         pruefstand = pruefmaske.fortschritt(datenbank, job_id) if job else {}
@@ -425,7 +525,7 @@ def datei_herunterladen(request: Request, job_id: int, schluessel: str):
         return fehlerseite(request, 'Diese Datei gibt es nicht',
                            'Der Verweis führt ins Leere.', code=404)
 
-    with Datenbank(DATENBANK) as datenbank:
+    with lesend(DATENBANK) as datenbank:
         job = datenbank.job_lesen(job_id)
     if not job:
         return fehlerseite(request, 'Diesen Auftrag gibt es nicht',
@@ -459,7 +559,7 @@ def ergebnisordner(dateiname: str) -> Path:
 
 def _pruefjob(request: Request, job_id: int):
     """Der Job, wenn er da ist und Prüffälle haben kann. Sonst eine Fehlerseite."""
-    with Datenbank(DATENBANK) as datenbank:
+    with lesend(DATENBANK) as datenbank:
         job = datenbank.job_lesen(job_id)
     if not job:
         return None, fehlerseite(request, 'Diesen Auftrag gibt es nicht',
@@ -481,7 +581,7 @@ def pruefung_liste(request: Request, job_id: int):
     if fehler:
         return fehler
 
-    with Datenbank(DATENBANK) as datenbank:
+    with lesend(DATENBANK) as datenbank:
         offen = datenbank.pruefaelle_lesen(job_id)
         stand = pruefmaske.fortschritt(datenbank, job_id)
         faelle = [{
@@ -503,7 +603,7 @@ def pruefung_fall(request: Request, job_id: int, kunde_id: int):
     if fehler:
         return fehler
 
-    with Datenbank(DATENBANK) as datenbank:
+    with lesend(DATENBANK) as datenbank:
         kunde = datenbank.kunde_lesen(kunde_id)
         if not kunde or kunde['job_id'] != job_id:
             return fehlerseite(request, 'Diesen Fall gibt es nicht',
@@ -551,8 +651,8 @@ def pruefung_entscheiden(request: Request, job_id: int, kunde_id: int,
             return fehlerseite(request, 'Diese Auswahl gibt es nicht',
                                str(hinweis))
 
-        pruefmaske.dateien_neu_schreiben(
-            datenbank, job_id, str(ergebnisordner(job['dateiname'])))
+        pruefmaske.kunde_in_dateien_anpassen(
+            datenbank, kunde_id, str(ergebnisordner(job['dateiname'])))
         weiter = pruefmaske.naechster_offener(datenbank, job_id,
                                               nach_kunde_id=kunde_id)
 
@@ -571,6 +671,21 @@ def gelaufene_zeit(job: dict) -> str:
     return dauer_in_worten((ende - beginn).total_seconds())
 
 
+# ==========================================================================
+# Kennzahlen für den Betrieb
+# ==========================================================================
+
+@app.get('/metrics')
+def metrics():
+    """
+    Die Dauer jeder Stufe und die Zähler aller Läufe seit dem Start, im
+    Textformat von Prometheus. Für den Abfrager, nicht für Menschen; die
+    Zusammenfassung je Auftrag steht in `job_kennzahl`.
+    """
+    return Response(kennzahlen.PROZESS.als_prometheus(),
+                    media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # ==========================================================================
 # Fehler, die trotzdem passieren
 # ==========================================================================
@@ -590,6 +705,36 @@ def unerwarteter_fehler(request: Request, fehler: Exception):
 # Starten und beenden
 # ==========================================================================
 
+@app.on_event('startup')
+def beim_starten():
+    """
+    Öffnet den Zwischenspeicher vor Apify, wenn die echte Quelle gilt, und
+    startet den Planer.
+
+    Beides einmal für den ganzen Prozess: jeder Lauf bekommt denselben
+    Zwischenspeicher, statt mit jedem Start eine weitere Verbindung zur Datei
+    zu öffnen, und dieselbe Datenquelle je Modus — nur so teilen sich die
+    Aufträge einer Quelle ihr Kontingent. Eine Quelle, die sich nicht
+    einrichten lässt, sperrt die andere nicht; ihre Aufträge enden mit einer
+    Meldung (s. Planer).
+
+    Eingereihte Aufträge aus dem letzten Programmstart setzt der Planer von
+    selbst fort.
+    """
+    if zustand['provider'] is None and zustand['antwortspeicher'] is None:
+        zustand['antwortspeicher'] = antwort_cache.Antwortspeicher(
+            antwort_cache.pfad_neben(DATENBANK))
+    if zustand['planer'] is None:
+        provider_je_modus = {}
+        for modus in ('A', 'B'):
+            try:
+                provider_je_modus[modus] = provider_holen(modus)
+            except Exception as fehler:
+                logger.error(f'Modus {modus}: keine Datenquelle: {fehler}')
+        zustand['planer'] = Planer(provider_je_modus, DATENBANK)
+    zustand['planer'].starten()
+
+
 @app.on_event('shutdown')
 def beim_beenden():
     """
@@ -599,15 +744,27 @@ def beim_beenden():
     Eine Apify-Abfrage kann bis zu 175 Sekunden brauchen — so lange darf sich
     das Fenster nicht weigern zuzugehen, das sieht wie ein Absturz aus.
 
-    Der laufende Auftrag bleibt bewusst auf LAEUFT stehen. Nach jedem Kunden
-    ist der Stand geschrieben; beim nächsten Start bietet die Oberfläche die
-    Fortsetzung an (02_DATENVERTRAG.md §6). Genau dafür wurde die
-    Wiederaufnahme in Phase 3 gebaut.
+    Die laufenden Aufträge bleiben bewusst auf LAEUFT stehen und eingereiht:
+    der Planer startet keinen neuen mehr, bricht aber keinen ab. Nach jedem
+    Kunden ist der Stand geschrieben; beim nächsten Start setzt der Planer
+    sie fort (02_DATENVERTRAG.md §6). Genau dafür wurde die Wiederaufnahme
+    in Phase 3 gebaut.
     """
-    worker = zustand['worker']
-    if worker and worker.laeuft:
-        logger.info(f'Server wird beendet, Auftrag {worker.job_id} bleibt offen '
-                    f'und kann fortgesetzt werden.')
+    planer = zustand['planer']
+    laufend = planer.laufend if planer else []
+    if planer:
+        planer.beenden(timeout=5, abbrechen=False)
+    if laufend:
+        # Die Läufe arbeiten weiter, mit Planer und Zwischenspeicher; startet
+        # derselbe Prozess wieder, übernimmt er beide, wie sie sind.
+        logger.info(f'Server wird beendet, Aufträge {", ".join(map(str, laufend))} '
+                    f'bleiben offen und werden beim nächsten Start fortgesetzt.')
+    else:
+        zustand['planer'] = None
+        speicher = zustand['antwortspeicher']
+        if speicher is not None:
+            zustand['antwortspeicher'] = None
+            speicher.schliessen()
     if not zustand['harter_stopp']:
         return
     logging.shutdown()
@@ -630,9 +787,9 @@ def provider_einrichten(antworten: str = None, quelle: str = 'fake'):
     """
     Legt fest, woher die Treffer kommen.
 
-    «echt» heisst: Apify für Modus A, Google für Modus B — die Wahl fällt erst
-    beim Start des Laufs, weil sie am Modus hängt. Sonst feste Antworten aus
-    einer Datei, für beide Modi.
+    «echt» heisst: Apify für Modus A, Google für Modus B — gebaut werden sie
+    beim Start des Servers, je Modus einmal für den Planer. Sonst feste
+    Antworten aus einer Datei, für beide Modi.
     """
     if quelle == 'echt':
         zustand['provider'] = None
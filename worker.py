@@ -1,5 +1,6 @@
 # worker.py
-# Der Lauf im Hintergrund. Ein Job zur Zeit.
+# Die Läufe im Hintergrund: eingereiht in einer Warteschlange, mehrere
+# nebeneinander.
 #
 # Warum überhaupt: ein Lauf über 2'500 Kunden dauert Stunden. Der Sachbearbeiter
 # soll das Browserfenster schliessen können, ohne dass der Lauf stirbt, und nach
@@ -8,37 +9,75 @@
 # Die SQLite-Verbindung des Laufs entsteht im Arbeitsthread und gehört ihm
 # allein. Wer von aussen den Fortschritt lesen will, öffnet eine eigene
 # Verbindung — dafür steht die Datenbank im WAL-Modus.
+#
+# Mehrere Abteilungen reihen Dateien ein, über die Weboberfläche wie über
+# `cli.py einreihen`. Der Planer nimmt sie aus der Warteschlange in der
+# Datenbank und lässt bis zu `STANDARD_MAX_LAEUFE` gleichzeitig laufen, jeden
+# in einem eigenen Worker. Je Datenquelle gibt es ein Kontingent
+# gleichzeitiger Abfragen, das sich die Jobs dieser Quelle zu gleichen Teilen
+# teilen; ein Auffrischen über Google wartet so nicht stundenlang hinter einer
+# Erstanreicherung über Apify. Die Warteschlange überdauert den Prozess: nach
+# einem Absturz setzt der nächste Planer jeden Job für sich fort.
+#
+# Ein Worker fährt genau einen Lauf. Der Planer gibt jedem Job seinen eigenen;
+# ohne Planer startet `cli.py starten` einen einzelnen.
 
 import logging
 import threading
 from pathlib import Path
 
 import mail
-from db import Datenbank
-from pipeline import STANDARD_ARBEITER, STANDARD_TIMEOUT_SEKUNDEN, Lauf
+from db import Datenbank, lesend
+from place_provider import ABBRUCH
+from pipeline import (STANDARD_ARBEITER, STANDARD_STAPELGROESSE,
+                      STANDARD_STICHPROBE, STANDARD_TIMEOUT_SEKUNDEN, Lauf)
 
 logger = logging.getLogger(__name__)
 
-# Ein Nutzer, ein Job (03_ENTSCHEIDUNGEN.md C). Die Sperre verhindert, dass zwei
-# Starts im selben Prozess aneinander vorbeilaufen.
+# Für `cli.py starten`: ohne Planer gilt weiter ein Job zur Zeit, auch
+# gegenüber einem offenen Job aus einem früheren Programmstart. Die Sperre
+# verhindert, dass zwei Starts im selben Prozess aneinander vorbeilaufen.
+# Der Planer weist nie ab — er reiht ein und setzt jeden Job mit einem
+# frischen Worker fort, an dem `LaeuftBereits` nicht auftreten kann.
 _START_SPERRE = threading.Lock()
 
 
 class LaeuftBereits(Exception):
-    """Es läuft schon ein Auftrag. Die Meldung ist für den Nutzer bestimmt."""
+    """
+    Es läuft schon ein Auftrag (`cli.py starten`). Die Meldung ist für den
+    Nutzer bestimmt.
+    """
 
 
 class Worker:
-    """Startet, überwacht und stoppt genau einen Lauf im Hintergrund."""
+    """
+    Startet, überwacht und stoppt genau einen Lauf im Hintergrund — allein
+    für `cli.py starten` oder als einer von mehreren unter dem Planer.
+    """
 
     def __init__(self, provider, datenbank_pfad: str,
                  timeout_sekunden: float = STANDARD_TIMEOUT_SEKUNDEN,
-                 arbeiter: int = STANDARD_ARBEITER, modus: str = 'A'):
+                 arbeiter: int = STANDARD_ARBEITER, modus: str = 'A',
+                 stapelgroesse: int = STANDARD_STAPELGROESSE,
+                 anpassend: bool = False, sammel_kunden: int = 1,
+                 sammel_ms: float = 0, synchronous: str = None,
+                 wiederaufnahme: str = 'herleiten',
+                 stichprobe: int = STANDARD_STICHPROBE, kontingent=None,
+                 spalten: bool = False):
         self.provider = provider
         self.datenbank_pfad = str(datenbank_pfad)
         self.timeout_sekunden = timeout_sekunden
         self.arbeiter = arbeiter
         self.modus = modus
+        self.stapelgroesse = stapelgroesse
+        self.anpassend = anpassend
+        self.sammel_kunden = sammel_kunden
+        self.sammel_ms = sammel_ms
+        self.synchronous = synchronous
+        self.wiederaufnahme = wiederaufnahme
+        self.stichprobe = stichprobe
+        self.kontingent = kontingent
+        self.spalten = spalten
 
         self._thread = None
         self._abbruch = threading.Event()
@@ -117,12 +156,17 @@ class Worker:
         # Der Job existiert bereits — beim ersten Start hat ihn `starten`
         # angelegt, beim Fortsetzen steht er seit dem Absturz da. Für den Lauf
         # ist das derselbe Fall: weitermachen bei dem, was noch offen ist.
-        datenbank = Datenbank(self.datenbank_pfad)
+        datenbank = Datenbank(self.datenbank_pfad, synchronous=self.synchronous)
         try:
             lauf = Lauf(self.provider, datenbank,
                         timeout_sekunden=self.timeout_sekunden,
                         arbeiter=self.arbeiter, abbruch=self._abbruch,
-                        modus=self.modus)
+                        modus=self.modus, stapelgroesse=self.stapelgroesse,
+                        anpassend=self.anpassend, sammel_kunden=self.sammel_kunden,
+                        sammel_ms=self.sammel_ms,
+                        wiederaufnahme=self.wiederaufnahme,
+                        stichprobe=self.stichprobe, kontingent=self.kontingent,
+                        spalten=self.spalten)
             self.ergebnis = lauf.fortsetzen(job_id, eingabe_pfad, ausgabe_ordner)
         except Exception as fehler:
             self.fehler = fehler
@@ -158,14 +202,21 @@ class Worker:
         Zwei Dinge werden gestoppt: die Schleife über die Kunden und der
         Aufruf, der gerade bei der Datenquelle läuft. Ohne das Zweite rechnet
         Apify weiter und stellt in Rechnung, was niemand mehr abholt.
+
+        Beim Provider gilt der Abbruch nur den Abfragen dieses Laufs
+        (`place_provider.ABBRUCH`) — unter dem Planer nutzen andere Jobs
+        dieselbe Quelle weiter.
         """
         self._abbruch.set()
         abbrechen_beim_provider = getattr(self.provider, 'abbrechen', None)
         if callable(abbrechen_beim_provider):
+            marke = ABBRUCH.set(self._abbruch)
             try:
                 abbrechen_beim_provider()
             except Exception as fehler:
                 logger.warning(f'Die Datenquelle liess sich nicht stoppen: {fehler}')
+            finally:
+                ABBRUCH.reset(marke)
 
     def warten(self, timeout: float = None) -> bool:
         """Wartet, bis der Lauf zu Ende ist. True, wenn er zu Ende ist."""
@@ -187,10 +238,303 @@ class Worker:
         """
         if not self.job_id:
             return None
-        with Datenbank(self.datenbank_pfad) as datenbank:
+        with lesend(self.datenbank_pfad) as datenbank:
             return datenbank.fortschritt_lesen(self.job_id)
 
 
+# ==========================================================================
+# Mehrere Jobs: Warteschlange und Planer
+# ==========================================================================
+
+# Gleichzeitige Abfragen je Datenquelle, über alle Jobs dieser Quelle. Apify
+# wie ein einzelner Lauf (03_ENTSCHEIDUNGEN.md C); Google beantwortet einen
+# Direktabruf in Sekundenbruchteilen und verträgt dieselbe Zahl ohne Weiteres.
+STANDARD_KONTINGENTE = {'A': STANDARD_ARBEITER, 'B': STANDARD_ARBEITER}
+
+# So viele Jobs laufen höchstens gleichzeitig, über alle Quellen. Jeder hält
+# eine Verbindung zur Datenbank und ihren Schreibzugriff für kurze Zeit.
+STANDARD_MAX_LAEUFE = 4
+
+# So oft sieht der Planer nach, ob ein Job fertig ist oder einer wartet,
+# auch wenn ihn niemand weckt.
+PLANER_TAKT_SEKUNDEN = 1.0
+
+ENDZUSTAENDE = ('FERTIG', 'ABGEBROCHEN', 'FEHLER')
+
+
+def einreihen(datenbank_pfad: str, eingabe_pfad: str, modus: str = 'A',
+              ausgabe_ordner: str = None, email: str = None,
+              kunden_total: int = 0, job_id: int = None) -> int:
+    """
+    Legt den Job an und reiht ihn ein. Gestartet wird er von einem Planer auf
+    derselben Datenbank — jetzt, wenn einer läuft, sonst beim nächsten Start.
+
+    Mit `job_id` wird ein bestehender Job eingereiht, statt einen anzulegen:
+    ein Lauf, der ohne Planer gestartet wurde und stehengeblieben ist
+    (`offener_lauf`). Er geht weiter bei dem, was noch offen ist.
+    """
+    with Datenbank(datenbank_pfad) as datenbank:
+        if job_id is None:
+            job_id = datenbank.job_anlegen(modus, Path(eingabe_pfad).name,
+                                           kunden_total=kunden_total, email=email)
+        datenbank.einreihen(job_id, str(eingabe_pfad), ausgabe_ordner)
+    return job_id
+
+
+class Kontingent:
+    """
+    Die gleichzeitigen Abfragen an eine Datenquelle, geteilt von allen Jobs,
+    die sie gerade nutzen.
+
+    Jeder Job bekommt gleich viel; was sich nicht teilen lässt, bekommen die
+    älteren. Ein angemeldeter Job bekommt immer mindestens eine Abfrage —
+    deshalb startet der Planer je Quelle nie mehr Jobs, als das Kontingent
+    gross ist.
+    """
+
+    def __init__(self, groesse: int):
+        self.groesse = max(1, int(groesse))
+        self._sperre = threading.Lock()
+        self._jobs = []
+
+    def anmelden(self, job_id: int) -> None:
+        with self._sperre:
+            if job_id not in self._jobs:
+                self._jobs.append(job_id)
+                self._jobs.sort()
+
+    def abmelden(self, job_id: int) -> None:
+        with self._sperre:
+            if job_id in self._jobs:
+                self._jobs.remove(job_id)
+
+    @property
+    def jobs(self) -> int:
+        with self._sperre:
+            return len(self._jobs)
+
+    def anteil(self, job_id: int) -> int:
+        """Wie viele Abfragen der Job gerade offen haben darf."""
+        with self._sperre:
+            if job_id not in self._jobs:
+                return self.groesse
+            je_job, rest = divmod(self.groesse, len(self._jobs))
+            return max(1, je_job + (1 if self._jobs.index(job_id) < rest else 0))
+
+
+class Planer:
+    """
+    Nimmt eingereihte Aufträge aus der Warteschlange in der Datenbank und
+    lässt bis zu `max_laeufe` gleichzeitig laufen.
+
+    Jeder Job läuft in einem eigenen `Worker` mit eigener Verbindung — nach
+    einem Absturz wird jeder für sich fortgesetzt, sobald ein Planer auf
+    derselben Datenbank wieder startet. Die Reihenfolge ist die des
+    Einreihens, aber je Quelle: ist das Kontingent von Apify voll, startet
+    ein wartender Job über Google trotzdem.
+
+    `provider_je_modus` ordnet jedem Modus seine Datenquelle zu; die übrigen
+    Angaben gehen an jeden `Worker`.
+    """
+
+    def __init__(self, provider_je_modus: dict, datenbank_pfad: str,
+                 kontingente: dict = None, max_laeufe: int = STANDARD_MAX_LAEUFE,
+                 **worker_optionen):
+        self.provider_je_modus = dict(provider_je_modus)
+        self.datenbank_pfad = str(datenbank_pfad)
+        self.kontingente = {modus: Kontingent(groesse) for modus, groesse in
+                            {**STANDARD_KONTINGENTE, **(kontingente or {})}.items()}
+        self.max_laeufe = max(1, int(max_laeufe))
+        self.worker_optionen = worker_optionen
+
+        self._laufend = {}
+        self._sperre = threading.Lock()
+        self._wecken = threading.Event()
+        self._ende = threading.Event()
+        self._leer = threading.Event()
+        self._nachlaufen = False
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Einreihen, starten, beenden
+    # ------------------------------------------------------------------
+
+    def einreihen(self, eingabe_pfad: str, modus: str = 'A',
+                  ausgabe_ordner: str = None, email: str = None,
+                  kunden_total: int = 0, job_id: int = None) -> int:
+        """Reiht einen Auftrag ein (s. `einreihen`) und weckt den Planer."""
+        job_id = einreihen(self.datenbank_pfad, eingabe_pfad, modus,
+                           ausgabe_ordner, email, kunden_total, job_id)
+        self._leer.clear()
+        self._wecken.set()
+        return job_id
+
+    def starten(self) -> None:
+        """Startet den Planer im Hintergrund. Eingereihtes aus früheren Läufen zählt mit."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._ende.clear()
+        self._leer.clear()
+        self._nachlaufen = False
+        self._thread = threading.Thread(target=self._planen, name='planer', daemon=True)
+        self._thread.start()
+
+    def abbrechen(self, job_id: int, timeout: float = 0) -> None:
+        """
+        Bricht einen Job ab, ob er läuft oder noch wartet. Bei der
+        Datenquelle stoppt nur, was für diesen Job rechnet — andere Jobs
+        nutzen sie weiter.
+
+        Ein laufender Job steht erst, wenn der Lauf den Abbruch bemerkt hat;
+        darauf wird höchstens `timeout` Sekunden gewartet.
+        """
+        with self._sperre:
+            worker = self._laufend.get(job_id)
+        if worker:
+            worker.abbrechen()
+            if timeout:
+                worker.warten(timeout)
+            return
+        with Datenbank(self.datenbank_pfad) as datenbank:
+            job = datenbank.job_lesen(job_id)
+            if job and job['status'] not in ENDZUSTAENDE:
+                datenbank.status_setzen(job_id, 'ABGEBROCHEN')
+            datenbank.austragen(job_id)
+        self._wecken.set()
+
+    def warten(self, timeout: float = None) -> bool:
+        """Wartet, bis die Warteschlange leer ist. True, wenn sie es ist."""
+        return self._leer.wait(timeout)
+
+    def beenden(self, timeout: float = None, abbrechen: bool = True) -> None:
+        """
+        Hält den Planer an und bricht die laufenden Jobs ab. Was noch wartet,
+        bleibt eingereiht und startet beim nächsten Start des Planers.
+
+        `abbrechen=False` lässt die laufenden Jobs weiterlaufen: sie bleiben
+        eingereiht und auf LAEUFT. Endet der Prozess, setzt sie der nächste
+        Planer fort (02_DATENVERTRAG.md §6); startet dieser Planer wieder,
+        übernimmt er sie, wie sie sind.
+        """
+        self._nachlaufen = not abbrechen
+        self._ende.set()
+        self._wecken.set()
+        if abbrechen:
+            with self._sperre:
+                laufend = list(self._laufend.values())
+            for worker in laufend:
+                worker.abbrechen()
+        if self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def laufend(self) -> list:
+        """Die Jobs, die gerade laufen."""
+        with self._sperre:
+            return sorted(self._laufend)
+
+    # ------------------------------------------------------------------
+    # Der Planer
+    # ------------------------------------------------------------------
+
+    def _planen(self) -> None:
+        datenbank = Datenbank(self.datenbank_pfad)
+        try:
+            while not self._ende.is_set():
+                try:
+                    self._runde(datenbank)
+                except Exception:
+                    logger.exception('Der Planer ist über einen Fehler gestolpert')
+                self._wecken.wait(PLANER_TAKT_SEKUNDEN)
+                self._wecken.clear()
+            if self._nachlaufen:
+                return
+            with self._sperre:
+                laufend = list(self._laufend.items())
+            for job_id, worker in laufend:
+                worker.warten()
+                self._abraeumen(datenbank, job_id, worker)
+        finally:
+            datenbank.schliessen()
+
+    def _runde(self, datenbank: Datenbank) -> None:
+        """Räumt Fertiges ab und startet, was Platz hat."""
+        with self._sperre:
+            fertig = [(job_id, w) for job_id, w in self._laufend.items() if not w.laeuft]
+        for job_id, worker in fertig:
+            self._abraeumen(datenbank, job_id, worker)
+
+        eingereiht = datenbank.warteschlange_lesen()
+        starten = []
+        with self._sperre:
+            for auftrag in eingereiht:
+                job_id, modus = auftrag['job_id'], auftrag['modus']
+                if job_id in self._laufend:
+                    continue
+                if auftrag['status'] in ENDZUSTAENDE:
+                    # Zu Ende gelaufen, aber vor dem Austragen abgestürzt.
+                    datenbank.austragen(job_id)
+                    continue
+                if len(self._laufend) + len(starten) >= self.max_laeufe:
+                    break
+                kontingent = self.kontingente.get(modus)
+                if kontingent is None or kontingent.jobs >= kontingent.groesse:
+                    continue
+                # Erst alle anmelden, dann starten: so fragt kein Job mit dem
+                # ganzen Kontingent los, das er gleich wieder teilen muss.
+                kontingent.anmelden(job_id)
+                starten.append(auftrag)
+
+        for auftrag in starten:
+            self._job_starten(datenbank, auftrag)
+
+        with self._sperre:
+            leer = not self._laufend and not starten
+        if leer and not datenbank.warteschlange_lesen():
+            self._leer.set()
+
+    def _job_starten(self, datenbank: Datenbank, auftrag: dict) -> None:
+        job_id, modus = auftrag['job_id'], auftrag['modus']
+        kontingent = self.kontingente[modus]
+        provider = self.provider_je_modus.get(modus)
+        if provider is None:
+            kontingent.abmelden(job_id)
+            datenbank.status_setzen(job_id, 'FEHLER',
+                                    f'Für Modus {modus} ist keine Datenquelle eingerichtet.')
+            datenbank.austragen(job_id)
+            return
+
+        worker = Worker(provider, self.datenbank_pfad, modus=modus,
+                        arbeiter=kontingent.groesse, kontingent=kontingent,
+                        **self.worker_optionen)
+        with self._sperre:
+            self._laufend[job_id] = worker
+        logger.info(f'Planer: Job {job_id} (Modus {modus}) startet, '
+                    f'{kontingent.jobs} Jobs teilen sich die Quelle.')
+        worker.fortsetzen(job_id, auftrag['eingabe_pfad'], auftrag['ausgabe_ordner'])
+        self._ueberwachen(job_id, worker)
+
+    def _ueberwachen(self, job_id: int, worker: Worker) -> None:
+        """Weckt den Planer, sobald der Job zu Ende ist — nicht erst im nächsten Takt."""
+        def beobachten():
+            worker.warten()
+            self._wecken.set()
+        threading.Thread(target=beobachten, name=f'planer-{job_id}', daemon=True).start()
+
+    def _abraeumen(self, datenbank: Datenbank, job_id: int, worker: Worker) -> None:
+        with self._sperre:
+            self._laufend.pop(job_id, None)
+        self.kontingente[worker.modus].abmelden(job_id)
+        job = datenbank.job_lesen(job_id)
+        if not job or job['status'] not in ENDZUSTAENDE:
+            # Der Lauf ist ausgestiegen, bevor er einen Endzustand setzen
+            # konnte (etwa eine Eingabedatei ohne Pflichtspalten). Nicht
+            # endlos neu starten: der Job ist gescheitert.
+            logger.error(f'Planer: Job {job_id} endete ohne Endzustand: {worker.fehler}')
+            datenbank.status_setzen(job_id, 'FEHLER', str(worker.fehler or 'Unbekannter Fehler'))
+        datenbank.austragen(job_id)
+
+
 def offener_lauf(datenbank_pfad: str) -> dict:
     """
     Der Lauf, der beim letzten Mal nicht zu Ende gekommen ist.
@@ -198,5 +542,5 @@ def offener_lauf(datenbank_pfad: str) -> dict:
     Beim Programmstart aufrufen: steht dort ein Job, wurde er von einem Absturz
     unterbrochen und kann fortgesetzt werden (02_DATENVERTRAG.md §6).
     """
-    with Datenbank(datenbank_pfad) as datenbank:
+    with lesend(datenbank_pfad) as datenbank:
         return datenbank.offener_job()